@@ -0,0 +1,3 @@
+from .server import ScoringAPI
+
+__all__ = ['ScoringAPI']
\ No newline at end of file
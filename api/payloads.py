@@ -0,0 +1,68 @@
+import math
+from datetime import datetime
+from typing import Dict, Any, Optional
+from models.borrower import Borrower
+
+BORROWER_FIELDS = [
+    "full_name", "passport_number", "passport_series", "birth_date", "income",
+    "expenses", "credit_history_score", "existing_loans", "employment_years",
+    "employer_name", "position", "address", "phone"
+]
+
+# Денежные поля и счетчики не бывают отрицательными; оценка кредитной истории - от 0 до 100, как в форме
+NON_NEGATIVE_FIELDS = ("income", "expenses", "existing_loans", "employment_years")
+CREDIT_HISTORY_RANGE = (0, 100)
+
+
+class ApiError(Exception):
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _check_ranges(borrower: Borrower):
+
+    for name in NON_NEGATIVE_FIELDS:
+        value = getattr(borrower, name)
+        if not math.isfinite(value) or value < 0:
+            raise ApiError(400, f"Поле {name} должно быть неотрицательным числом")
+
+    low, high = CREDIT_HISTORY_RANGE
+    if not low <= borrower.credit_history_score <= high:
+        raise ApiError(400, f"Поле credit_history_score должно быть от {low} до {high}")
+
+
+def borrower_from_payload(payload: Dict[str, Any], created_by: Optional[str] = None) -> Borrower:
+
+    if not isinstance(payload, dict):
+        raise ApiError(400, "Данные заемщика должны быть JSON-объектом")
+
+    missing_fields = [name for name in BORROWER_FIELDS if name not in payload]
+    if missing_fields:
+        raise ApiError(400, f"Не заполнены поля заемщика: {', '.join(missing_fields)}")
+
+    try:
+        borrower = Borrower.create_new(
+            full_name=str(payload["full_name"]),
+            passport_number=str(payload["passport_number"]),
+            passport_series=str(payload["passport_series"]),
+            birth_date=datetime.fromisoformat(payload["birth_date"]),
+            income=float(payload["income"]),
+            expenses=float(payload["expenses"]),
+            credit_history_score=int(payload["credit_history_score"]),
+            existing_loans=float(payload["existing_loans"]),
+            employment_years=int(payload["employment_years"]),
+            employer_name=str(payload["employer_name"]),
+            position=str(payload["position"]),
+            address=str(payload["address"]),
+            phone=str(payload["phone"]),
+            email=payload.get("email") or "",
+            created_by=created_by
+        )
+    except (TypeError, ValueError, OverflowError) as e:
+        raise ApiError(400, f"Неверные данные заемщика: {e}")
+
+    _check_ranges(borrower)
+    return borrower
@@ -0,0 +1,423 @@
+import asyncio
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple, Dict, Any, Callable
+from api.payloads import ApiError, borrower_from_payload
+from api.tokens import ApiTokens, TOKENS_FILE_NAME
+from controllers.data_controller import DataController
+from controllers.data_server import open_data_controller
+from controllers.credit_controller import CreditController
+from controllers.report_controller import ReportController
+from controllers.report_query import QueryError
+from controllers.partitions import user_departments
+from models.borrower import Borrower
+from models.user import User
+
+# Параметры по умолчанию можно переопределить переменными окружения
+BATCH_MAX_SIZE = int(os.environ.get("CREDIT_API_BATCH_MAX_SIZE", "64"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("CREDIT_API_BATCH_MAX_WAIT_MS", "5"))
+PERSIST_WORKERS = int(os.environ.get("CREDIT_API_PERSIST_WORKERS", "2"))
+PERSIST_QUEUE_LIMIT = int(os.environ.get("CREDIT_API_PERSIST_QUEUE_LIMIT", "256"))
+QUERY_MAX_LIMIT = int(os.environ.get("CREDIT_API_QUERY_MAX_LIMIT", "1000"))
+
+REPORT_PATH = re.compile(r"^/reports/(?P<report_id>[\w-]+)$")
+
+
+class ScoringBatcher:
+    """Собирает одиночные запросы скоринга в пакеты и считает их одним вызовом"""
+
+    def __init__(self, credit_controller: CreditController, executor: ThreadPoolExecutor,
+                 max_size: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS):
+        self.credit_controller = credit_controller
+        self.executor = executor
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_started(self):
+
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, borrower: Borrower) -> Tuple:
+
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((borrower, future))
+        return await future
+
+    async def _run(self):
+
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Повторы одной заявки в пакете считаются один раз и получают результат первой
+            unique: Dict[Tuple, int] = {}
+            borrowers: List[Borrower] = []
+            positions = []
+            for borrower, _ in batch:
+                key = self.credit_controller.submission_key(borrower)
+                if key not in unique:
+                    unique[key] = len(borrowers)
+                    borrowers.append(borrower)
+                positions.append(unique[key])
+
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self.credit_controller.analyze_borrowers, borrowers)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), position in zip(batch, positions):
+                if not future.done():
+                    future.set_result(results[position])
+
+    async def close(self):
+
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+
+class ScoringAPI:
+    """ASGI-приложение для скоринга заемщиков без интерфейса Streamlit"""
+
+    def __init__(self, data_controller: Optional[DataController] = None):
+        self.data_controller = data_controller or open_data_controller()
+        self.credit_controller = CreditController(self.data_controller)
+        self.tokens = ApiTokens(os.path.join(self.data_controller.data_dir, TOKENS_FILE_NAME))
+        # ReportController на каждую область отделов: запросы видят только отчеты отделов владельца токена
+        self._report_controllers: Dict[Tuple, ReportController] = {}
+
+        # Скоринг и запись на диск выполняются в отдельных ограниченных пулах,
+        # чтобы медленная запись не задерживала расчеты
+        self.scoring_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scoring")
+        self.persist_executor = ThreadPoolExecutor(max_workers=PERSIST_WORKERS,
+                                                   thread_name_prefix="persist")
+        self._persist_slots: Optional[asyncio.Semaphore] = None
+        # Сохраняемые сейчас заявки: повтор, пришедший до окончания записи, получает ее отчет
+        self._persisting: Dict[Tuple, asyncio.Future] = {}
+
+        self.batcher = ScoringBatcher(self.credit_controller, self.scoring_executor)
+
+    async def __call__(self, scope, receive, send):
+
+        if scope["type"] == "lifespan":
+            await self._handle_lifespan(receive, send)
+            return
+
+        if scope["type"] != "http":
+            return
+
+        try:
+            body = await self._read_body(receive)
+            status, payload = await self._dispatch(scope["method"], scope["path"], body,
+                                                   dict(scope.get("headers") or []))
+        except ApiError as e:
+            status, payload = e.status, {"error": e.message}
+        except Exception as e:
+            status, payload = 500, {"error": f"Внутренняя ошибка: {e}"}
+
+        await self._send_json(send, status, payload)
+
+    async def _handle_lifespan(self, receive, send):
+
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.batcher.close()
+                self.scoring_executor.shutdown(wait=True)
+                self.persist_executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _read_body(self, receive) -> bytes:
+
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def _send_json(self, send, status: int, payload):
+
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json; charset=utf-8"),
+                (b"content-length", str(len(body)).encode("ascii")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def _parse_json(self, body: bytes) -> Dict[str, Any]:
+
+        try:
+            payload = json.loads(body or b"{}")
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise ApiError(400, "Тело запроса должно быть в формате JSON")
+        if not isinstance(payload, dict):
+            raise ApiError(400, "Тело запроса должно быть JSON-объектом")
+        return payload
+
+    def _authenticate(self, headers: Dict[bytes, bytes]) -> User:
+        """Пользователь, которому выдан токен из заголовка Authorization: Bearer <токен>"""
+
+        scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+        if scheme.lower() != "bearer" or not token.strip():
+            raise ApiError(401, "Нужен заголовок Authorization: Bearer <токен>")
+
+        user_id = self.tokens.user_id_for(token.strip())
+        user = self.data_controller.get_user_by_id(user_id) if user_id else None
+        if not user or not user.is_active:
+            raise ApiError(401, "Недействительный токен")
+        return user
+
+    def _report_controller(self, user: User) -> ReportController:
+
+        departments = user_departments(user)
+        key = tuple(departments) if departments is not None else None
+        controller = self._report_controllers.get(key)
+        if controller is None:
+            controller = self._report_controllers.setdefault(key, ReportController(self.data_controller, departments))
+        return controller
+
+    async def _dispatch(self, method: str, path: str, body: bytes, headers: Dict[bytes, bytes]):
+
+        if path == "/health":
+            return 200, {"status": "ok"}
+
+        user = self._authenticate(headers)
+
+        if path == "/score":
+            self._require_method(method, "POST")
+            return 200, await self._score(self._parse_json(body), user)
+
+        if path == "/score/batch":
+            self._require_method(method, "POST")
+            return 200, await self._score_batch(self._parse_json(body), user)
+
+        report_controller = self._report_controller(user)
+
+        if path == "/statistics":
+            self._require_method(method, "GET")
+            return 200, {
+                "system": self.data_controller.get_statistics(report_controller.departments),
+                "reports": report_controller.get_reports_statistics(),
+                "analysis_cache": self.credit_controller.cache_stats()
+            }
+
+        if path == "/reports/query":
+            self._require_method(method, "POST")
+            return 200, await self._query_reports(self._parse_json(body), report_controller)
+
+        match = REPORT_PATH.match(path)
+        if match:
+            self._require_method(method, "GET")
+            report = report_controller.get_report_by_id(match.group("report_id"))
+            if not report:
+                raise ApiError(404, "Отчет не найден")
+            return 200, report.to_dict()
+
+        raise ApiError(404, "Метод API не найден")
+
+    def _require_method(self, method: str, expected: str):
+
+        if method != expected:
+            raise ApiError(405, f"Ожидается метод {expected}")
+
+    @staticmethod
+    def _persisting_user(payload: Dict[str, Any], user: User) -> Optional[User]:
+
+        # Отчет сохраняется от имени владельца токена; чужой user_id в запросе не принимается
+        if not payload.get("persist"):
+            return None
+        if payload.get("user_id") not in (None, user.id):
+            raise ApiError(403, "Сохранять отчеты можно только от имени владельца токена")
+        return user
+
+    async def _persist_once(self, borrower: Borrower, result: Tuple, user,
+                            response: Dict[str, Any]) -> Dict[str, Any]:
+        """Сохраняет заявку, если такая же не сохранена недавно и не сохраняется прямо сейчас"""
+
+        key = self.credit_controller.submission_key(borrower)
+        pending = self._persisting.get(key)
+        if pending is not None:
+            saved = await asyncio.shield(pending)
+            response["duplicate_of"] = saved["report_id"]
+            return response
+
+        duplicate = self.credit_controller.find_recent_duplicate(borrower)
+        if duplicate:
+            response["duplicate_of"] = duplicate.id
+            return response
+
+        pending = asyncio.get_running_loop().create_future()
+        self._persisting[key] = pending
+        try:
+            saved = await self._persist(borrower, result, user)
+            pending.set_result(saved)
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            del self._persisting[key]
+        response.update(saved)
+        return response
+
+    async def _persist(self, borrower: Borrower, result: Tuple, user) -> Dict[str, Any]:
+
+        if self._persist_slots is None:
+            self._persist_slots = asyncio.Semaphore(PERSIST_QUEUE_LIMIT)
+
+        analysis_result, is_blacklisted, blacklist_reason = result
+
+        async with self._persist_slots:
+            report = await asyncio.get_running_loop().run_in_executor(
+                self.persist_executor,
+                self.credit_controller.save_analysis,
+                borrower, analysis_result, is_blacklisted, blacklist_reason,
+                user.id, user.full_name
+            )
+
+        return {"report_id": report.id, "borrower_id": report.borrower_id,
+                "status": report.status.value}
+
+    def _result_payload(self, result: Tuple) -> Dict[str, Any]:
+
+        analysis_result, is_blacklisted, blacklist_reason = result
+        payload = analysis_result.to_dict()
+        payload["blacklisted"] = is_blacklisted
+        payload["blacklist_reason"] = blacklist_reason
+        return payload
+
+    async def _query_reports(self, payload: Dict[str, Any], report_controller: ReportController) -> Dict[str, Any]:
+
+        expression = payload.get("query")
+        if not isinstance(expression, str) or not expression.strip():
+            raise ApiError(400, "Ожидается непустое выражение query")
+        try:
+            limit = min(int(payload.get("limit", 100)), QUERY_MAX_LIMIT)
+        except (TypeError, ValueError):
+            raise ApiError(400, "limit должен быть числом")
+
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                None, report_controller.query_reports, expression)
+        except QueryError as e:
+            raise ApiError(400, f"Ошибка в выражении: {e}")
+
+        response = {"total": len(result.reports), "reports": [r.to_dict() for r in result.reports[:limit]]}
+        if payload.get("explain"):
+            response["explain"] = result.explain
+        return response
+
+    async def _score(self, payload: Dict[str, Any], caller: User) -> Dict[str, Any]:
+
+        user = self._persisting_user(payload, caller)
+        borrower = borrower_from_payload(payload.get("borrower", {}), user.id if user else None)
+
+        result = await self.batcher.submit(borrower)
+        response = self._result_payload(result)
+
+        if user:
+            await self._persist_once(borrower, result, user, response)
+        return response
+
+    async def _score_batch(self, payload: Dict[str, Any], caller: User) -> Dict[str, Any]:
+
+        user = self._persisting_user(payload, caller)
+        items = payload.get("borrowers")
+        if not isinstance(items, list) or not items:
+            raise ApiError(400, "Ожидается непустой список borrowers")
+
+        borrowers = [borrower_from_payload(item, user.id if user else None) for item in items]
+
+        # Повторы одной заявки в пакете считаются и сохраняются один раз
+        unique: Dict[Tuple, int] = {}
+        positions = [unique.setdefault(self.credit_controller.submission_key(borrower), i)
+                     for i, borrower in enumerate(borrowers)]
+        first = sorted(unique.values())
+
+        scored = await asyncio.get_running_loop().run_in_executor(
+            self.scoring_executor, self.credit_controller.analyze_borrowers, [borrowers[i] for i in first])
+        results = dict(zip(first, scored))
+
+        responses = [self._result_payload(results[position]) for position in positions]
+
+        if user:
+            await asyncio.gather(*(self._persist_once(borrowers[i], results[i], user, responses[i])
+                                   for i in first))
+            for i, position in enumerate(positions):
+                if position != i:
+                    responses[i]["duplicate_of"] = responses[position].get("report_id",
+                                                                         responses[position].get("duplicate_of"))
+
+        return {"results": responses}
+
+
+class LazyApp:
+    """ASGI-приложение, которое создает ScoringAPI при первом обращении сервера, а не при импорте:
+    импорт модуля не читает и не переносит данные"""
+
+    def __init__(self, factory: Callable[[], ScoringAPI]):
+        self._factory = factory
+        self._api: Optional[ScoringAPI] = None
+        self._lock = threading.Lock()
+
+    @property
+    def api(self) -> ScoringAPI:
+
+        if self._api is None:
+            with self._lock:
+                if self._api is None:
+                    self._api = self._factory()
+        return self._api
+
+    async def __call__(self, scope, receive, send):
+
+        await self.api(scope, receive, send)
+
+
+app = LazyApp(ScoringAPI)
+
+
+def main():
+
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="HTTP API скоринга заемщиков")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    uvicorn.run("api.server:app", host=args.host, port=args.port, log_level="warning")
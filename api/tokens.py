@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import secrets
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+TOKENS_FILE_NAME = "api_tokens.json"
+
+
+class ApiTokens:
+    """Токены доступа к API: в файле хранится только хэш токена и id пользователя-владельца"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._tokens: Dict[str, Dict[str, Any]] = {}
+        self._mtime: Optional[float] = None
+
+    @staticmethod
+    def _digest(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def _reload(self):
+
+        # Токены выпускает отдельный скрипт, поэтому файл перечитывается при изменении
+        try:
+            mtime = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            self._tokens, self._mtime = {}, None
+            return
+        if mtime == self._mtime:
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            self._tokens = json.load(f).get("tokens", {})
+        self._mtime = mtime
+
+    def _save(self):
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "tokens": self._tokens}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    def issue(self, user_id: str) -> str:
+        """Выпускает новый токен пользователя; сам токен возвращается один раз и нигде не сохраняется"""
+
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._reload()
+            self._tokens[self._digest(token)] = {"user_id": user_id, "created_at": datetime.now().isoformat()}
+            self._save()
+        return token
+
+    def revoke_user(self, user_id: str) -> int:
+
+        with self._lock:
+            self._reload()
+            revoked = [digest for digest, entry in self._tokens.items() if entry["user_id"] == user_id]
+            for digest in revoked:
+                del self._tokens[digest]
+            if revoked:
+                self._save()
+            return len(revoked)
+
+    def user_id_for(self, token: str) -> Optional[str]:
+
+        digest = self._digest(token)
+        with self._lock:
+            self._reload()
+            entry = self._tokens.get(digest)
+        return entry["user_id"] if entry else None
@@ -1,28 +1,26 @@
-import streamlit as st
-from controllers.data_controller import DataController
-from controllers.auth_controller import AuthController
-from controllers.credit_controller import CreditController
-from controllers.report_controller import ReportController
-from views.auth_view import AuthView
-from views.dashboard_view import DashboardView
-from views.credit_officer_view import CreditOfficerView
-from views.bank_manager_view import BankManagerView
+from controllers.startup_profiler import profiler
+
+# Для страницы входа нужны только данные пользователей и AuthView;
+# представления ролей и pandas импортируются при первом обращении
+with profiler.stage("import.app"):
+    import streamlit as st
+    from controllers.data_server import open_data_controller
+    from controllers.auth_controller import AuthController
+    from views.auth_view import AuthView
 
 
 def initialize_session_state():
 
     if 'data_controller' not in st.session_state:
-        st.session_state.data_controller = DataController()
+        with profiler.stage("data.open"):
+            st.session_state.data_controller = open_data_controller()
+        # Манифесты отчетов догружаются в фоне, пока показывается страница входа;
+        # заемщики - после входа, когда известен отдел пользователя
+        st.session_state.data_controller.preload(borrowers=False)
 
     if 'auth_controller' not in st.session_state:
         st.session_state.auth_controller = AuthController(st.session_state.data_controller)
 
-    if 'credit_controller' not in st.session_state:
-        st.session_state.credit_controller = CreditController(st.session_state.data_controller)
-
-    if 'report_controller' not in st.session_state:
-        st.session_state.report_controller = ReportController(st.session_state.data_controller)
-
     if 'logged_in' not in st.session_state:
         st.session_state.logged_in = False
 
@@ -30,6 +28,24 @@ def initialize_session_state():
         st.session_state.current_page = "dashboard"
 
 
+def initialize_role_controllers():
+
+    with profiler.stage("import.controllers"):
+        from controllers.credit_controller import CreditController
+        from controllers.report_controller import ReportController
+        from controllers.partitions import user_departments
+
+    if 'report_controller' not in st.session_state:
+        # Сессия загружает только разделы отделов, с которыми работает пользователь
+        departments = user_departments(st.session_state.user)
+        st.session_state.data_controller.set_scope(departments)
+        st.session_state.data_controller.preload()
+        st.session_state.report_controller = ReportController(st.session_state.data_controller, departments)
+
+    if 'credit_controller' not in st.session_state:
+        st.session_state.credit_controller = CreditController(st.session_state.data_controller)
+
+
 class CreditAnalysisSystem:
 
     def __init__(self):
@@ -50,9 +66,12 @@ class CreditAnalysisSystem:
         if not st.session_state.logged_in:
             auth_view = AuthView(st.session_state.data_controller)
             auth_view.render()
+            profiler.mark_first_render("login")
             return
 
+        initialize_role_controllers()
         self._render_main_interface()
+        profiler.mark_first_render(st.session_state.current_page)
 
     def _apply_custom_styles(self):
 
@@ -116,7 +135,8 @@ class CreditAnalysisSystem:
                     "👤 Ввод данных заемщика": "enter_data",
                     "📋 Мои отчеты": "my_reports",
                     "❌ Отказы": "rejections",
-                    "🔍 Поиск заемщиков": "search"
+                    "🔍 Поиск заемщиков": "search",
+                    "🧪 Что если": "what_if"
                 }
             else:
                 menu_options = {
@@ -146,12 +166,18 @@ class CreditAnalysisSystem:
 
         user = st.session_state.user
 
+        with profiler.stage("import.views"):
+            from views.dashboard_view import DashboardView
+
         dashboard_view = DashboardView(
             st.session_state.data_controller,
             st.session_state.report_controller
         )
 
         if user.role.value == "Сотрудник кредитного отдела":
+            with profiler.stage("import.views.credit_officer"):
+                from views.credit_officer_view import CreditOfficerView
+
             credit_officer_view = CreditOfficerView(
                 st.session_state.data_controller,
                 st.session_state.credit_controller,
@@ -168,8 +194,13 @@ class CreditAnalysisSystem:
                 credit_officer_view._render_rejections()
             elif st.session_state.current_page == "search":
                 credit_officer_view._render_search_borrowers()
+            elif st.session_state.current_page == "what_if":
+                credit_officer_view._render_what_if()
 
         else:
+            with profiler.stage("import.views.bank_manager"):
+                from views.bank_manager_view import BankManagerView
+
             bank_manager_view = BankManagerView(
                 st.session_state.data_controller,
                 st.session_state.report_controller
@@ -1,6 +1,17 @@
-from .auth_controller import AuthController
-from .credit_controller import CreditController
-from .report_controller import ReportController
-from .data_controller import DataController
+import importlib
 
-__all__ = ['AuthController', 'CreditController', 'ReportController', 'DataController']
\ No newline at end of file
+# Контроллеры импортируются при первом обращении, чтобы не загружать лишнее при старте
+_MODULES = {
+    'AuthController': '.auth_controller',
+    'CreditController': '.credit_controller',
+    'ReportController': '.report_controller',
+    'DataController': '.data_controller'
+}
+
+__all__ = ['AuthController', 'CreditController', 'ReportController', 'DataController']
+
+
+def __getattr__(name):
+    if name in _MODULES:
+        return getattr(importlib.import_module(_MODULES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
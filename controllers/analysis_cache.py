@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Optional, Tuple, Dict, Any, Hashable
+from models.borrower import Borrower
+from models.report import AnalysisResult
+
+# Размер кэша результатов анализа и окно, в котором повторная отправка считается дублем
+ANALYSIS_CACHE_SIZE = 4096
+RESUBMISSION_WINDOW_SECONDS = 600
+
+
+class AnalysisCache:
+    """LRU-кэш результатов анализа по отпечатку входных данных скоринга"""
+
+    def __init__(self, max_size: int = ANALYSIS_CACHE_SIZE,
+                 resubmission_window: float = RESUBMISSION_WINDOW_SECONDS):
+        self.max_size = max_size
+        self.resubmission_window = resubmission_window
+
+        self._results: "OrderedDict[Hashable, AnalysisResult]" = OrderedDict()
+        self._submissions: "OrderedDict[Hashable, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Версия правил, для которой накоплены результаты; версия черного списка входит в ключ
+        self._rules_token: Optional[Tuple] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def fingerprint(borrower: Borrower, blacklisted: bool, rules_version: str, blacklist_version: int = 0) -> Tuple:
+
+        # Черный список у каждой сессии свой, поэтому его версия различает записи, а не сбрасывает кэш:
+        # сессии с разными версиями не вытесняют результаты друг друга, устаревшие записи уходят по LRU
+        return (borrower.income, borrower.expenses, borrower.credit_history_score,
+                borrower.existing_loans, borrower.employment_years, blacklisted, rules_version, blacklist_version)
+
+    @staticmethod
+    def _copy(result: AnalysisResult) -> AnalysisResult:
+
+        return replace(result, recommendations=list(result.recommendations))
+
+    def validate(self, rules):
+
+        # Перекомпилированные правила сбрасывают кэш целиком
+        token = (id(rules), rules.version)
+        if token != self._rules_token:
+            with self._lock:
+                if token != self._rules_token:
+                    if self._rules_token is not None:
+                        self.invalidations += 1
+                    self._results.clear()
+                    self._submissions.clear()
+                    self._rules_token = token
+
+    def get(self, key: Hashable) -> Optional[AnalysisResult]:
+
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+        # Каждый вызывающий получает свою копию, чтобы его правки не попали в кэш
+        return self._copy(result)
+
+    def put(self, key: Hashable, result: AnalysisResult):
+
+        with self._lock:
+            self._results[key] = self._copy(result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def find_submission(self, key: Hashable, identity: Tuple) -> Optional[str]:
+
+        with self._lock:
+            submission = self._submissions.get((key, identity))
+            if submission is None:
+                return None
+
+            report_id, submitted_at = submission
+            if time.monotonic() - submitted_at > self.resubmission_window:
+                del self._submissions[(key, identity)]
+                return None
+            return report_id
+
+    def record_submission(self, key: Hashable, identity: Tuple, report_id: str):
+
+        with self._lock:
+            self._submissions[(key, identity)] = (report_id, time.monotonic())
+            self._submissions.move_to_end((key, identity))
+            while len(self._submissions) > self.max_size:
+                self._submissions.popitem(last=False)
+
+    def clear(self):
+
+        with self._lock:
+            self._results.clear()
+            self._submissions.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+
+        total = self.hits + self.misses
+        return {
+            "size": len(self._results),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total > 0 else 0.0,
+            "invalidations": self.invalidations
+        }
+
+
+# Общий кэш процесса: его используют все сессии и API
+shared_analysis_cache = AnalysisCache()
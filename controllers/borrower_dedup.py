@@ -0,0 +1,71 @@
+from dataclasses import replace
+from typing import List, Dict, Any, Tuple
+from models.borrower import Borrower
+from .data_controller import DataController, passport_key, BORROWER_UPDATE_FIELDS
+
+
+class BorrowerDeduplicator:
+    """Разовое объединение заемщиков-дублей с одинаковым паспортом"""
+
+    def __init__(self, data_controller: DataController):
+        self.data_controller = data_controller
+
+    def find_duplicates(self) -> Dict[Tuple[str, str], List[Borrower]]:
+
+        groups: Dict[Tuple[str, str], List[Borrower]] = {}
+        for borrower in self.data_controller.borrowers:
+            key = passport_key(borrower)
+            if key is not None:
+                groups.setdefault(key, []).append(borrower)
+        return {key: members for key, members in groups.items() if len(members) > 1}
+
+    def plan(self) -> Tuple[Dict[str, str], List[Borrower]]:
+        """Возвращает замену id дублей на id основной записи и итоговый список заемщиков"""
+
+        borrower_ids: Dict[str, str] = {}
+        merged: Dict[str, Borrower] = {}
+
+        for members in self.find_duplicates().values():
+            members = sorted(members, key=lambda b: b.created_at)
+            # Сохраняется id самой ранней записи, а данные берутся из самой свежей
+            survivor, latest = members[0], members[-1]
+            merged_borrower = replace(survivor, **{name: getattr(latest, name)
+                                                   for name in BORROWER_UPDATE_FIELDS})
+            merged_borrower.blacklisted = any(b.blacklisted for b in members)
+            if merged_borrower.blacklisted and not merged_borrower.blacklist_reason:
+                merged_borrower.blacklist_reason = next(
+                    (b.blacklist_reason for b in reversed(members) if b.blacklist_reason), None)
+
+            merged[survivor.id] = merged_borrower
+            for duplicate in members[1:]:
+                borrower_ids[duplicate.id] = survivor.id
+
+        borrowers = [merged.get(b.id, b) for b in self.data_controller.borrowers
+                     if b.id not in borrower_ids]
+        return borrower_ids, borrowers
+
+    def run(self, dry_run: bool = False) -> Dict[str, Any]:
+
+        borrower_ids, borrowers = self.plan()
+
+        reports = [r for r in self.data_controller.get_all_reports() if r.borrower_id in borrower_ids]
+        result = {
+            "duplicate_groups": len(set(borrower_ids.values())),
+            "merged_borrowers": len(borrower_ids),
+            "reports_updated": len(reports),
+            # Архивные сегменты читаются только при реальном объединении
+            "archived_reports_updated": None if dry_run else 0
+        }
+
+        if dry_run or not borrower_ids:
+            return result
+
+        # Сначала переносятся отчеты, затем удаляются дубли: после сбоя повторный запуск
+        # найдет те же группы и доведет объединение до конца
+        self.data_controller.update_reports(
+            [replace(r, borrower_id=borrower_ids[r.borrower_id]) for r in reports],
+            author_id="system", author_name="Объединение дублей заемщиков")
+        result["archived_reports_updated"] = self.data_controller.archive.reassign_borrowers(borrower_ids)
+        self.data_controller.replace_borrowers(borrowers)
+
+        return result
@@ -0,0 +1,245 @@
+import bisect
+import json
+import os
+import threading
+import time
+import warnings
+import zlib
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator, Tuple
+from .derived_store import read_snapshot, write_snapshot
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+ENTITIES = ("user", "borrower", "report")
+OPERATIONS = ("add", "update", "delete", "archive")
+
+# Каждое SPARSE_INDEX_INTERVAL-е событие запоминается со смещением в файле,
+# чтобы чтение с сохраненного номера не просматривало ленту с начала
+SPARSE_INDEX_INTERVAL = 1000
+
+FOLLOW_POLL_SECONDS = 1.0
+
+# Контрольная точка индекса сохраняется, если при запуске пришлось дочитать столько байт ленты
+CHECKPOINT_MIN_BYTES = 1 << 20
+# Хвост ленты перед сохраненной позицией, по которому проверяется, что файл не подменили
+CHECKPOINT_TAIL_BYTES = 4096
+
+
+class ChangeFeed:
+    """Упорядоченная лента изменений данных: append-only файл с номерами событий и подписчики в процессе"""
+
+    def __init__(self, root_dir: str, index_interval: int = SPARSE_INDEX_INTERVAL):
+        self.root_dir = root_dir
+        self.log_file = os.path.join(root_dir, "changes.jsonl")
+        self.checkpoint_file = os.path.join(root_dir, "changes.idx")
+        self.index_interval = index_interval
+
+        os.makedirs(root_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._subscribers: Dict[int, Tuple[Callable[[Dict[str, Any]], None], Optional[frozenset]]] = {}
+        self._next_token = 1
+
+        # Последний номер события, разреженный индекс (номер, смещение) и размер прочитанной части файла;
+        # вычисляются при первом обращении
+        self._last_seq: Optional[int] = None
+        self._index: List[Tuple[int, int]] = []
+        self._size = 0
+
+    def _scan(self, f, start: int):
+        """Дочитывает файл с позиции start: обновляет номер и индекс до последней полной строки.
+
+        Недописанная строка не обрезается: ее, возможно, еще пишет другой процесс.
+        """
+
+        f.seek(start)
+        offset = start
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            seq = json.loads(line)["seq"]
+            if seq % self.index_interval == 1 or not self._index:
+                self._index.append((seq, offset))
+            self._last_seq = seq
+            offset += len(line)
+        self._size = offset
+
+    @staticmethod
+    def _tail_checksum(f, size: int) -> int:
+
+        start = max(0, size - CHECKPOINT_TAIL_BYTES)
+        f.seek(start)
+        return zlib.crc32(f.read(size - start))
+
+    def _load_checkpoint(self, f) -> bool:
+        """Восстанавливает номер и индекс из контрольной точки, если она соответствует файлу ленты"""
+
+        snapshot = read_snapshot(self.checkpoint_file)
+        if snapshot is None:
+            return False
+        meta = snapshot.meta
+        size = meta.get("size", -1)
+        if (meta.get("index_interval") != self.index_interval or not 0 <= size <= os.fstat(f.fileno()).st_size
+                or self._tail_checksum(f, size) != meta.get("tail_checksum")):
+            return False
+
+        self._index = [(seq, offset) for seq, offset in snapshot.arrays["index"].tolist()]
+        self._last_seq = meta["last_seq"]
+        self._size = size
+        return True
+
+    def _save_checkpoint(self, f):
+
+        import numpy as np
+
+        meta = {"size": self._size, "last_seq": self._last_seq, "index_interval": self.index_interval,
+                "tail_checksum": self._tail_checksum(f, self._size)}
+        write_snapshot(self.checkpoint_file, meta, {"index": np.array(self._index, dtype=np.int64).reshape(-1, 2)})
+
+    def _ensure_loaded(self, f):
+
+        if self._last_seq is None:
+            # После перезапуска лента дочитывается с контрольной точки, а не с начала
+            if not self._load_checkpoint(f):
+                self._last_seq = 0
+                self._index = []
+                self._size = 0
+            start = self._size
+            self._scan(f, start)
+            if self._size - start >= CHECKPOINT_MIN_BYTES:
+                self._save_checkpoint(f)
+        elif os.fstat(f.fileno()).st_size != self._size:
+            # В ленту писал другой процесс (например, API рядом с веб-интерфейсом)
+            self._scan(f, self._size)
+
+    @property
+    def last_seq(self) -> int:
+
+        with self._lock:
+            with open(self.log_file, "a+b") as f:
+                self._ensure_loaded(f)
+            return self._last_seq
+
+    def append(self, entity: str, op: str, record_id: str,
+               data: Optional[Dict[str, Any]] = None) -> int:
+
+        return self.append_many([(entity, op, record_id, data)])[-1]
+
+    def append_many(self, changes: Iterable[Tuple[str, str, str, Optional[Dict[str, Any]]]]) -> List[int]:
+        """Записывает события одним блоком и уведомляет подписчиков; возвращает номера событий"""
+
+        at = datetime.now().isoformat()
+        events = []
+
+        with self._lock:
+            with open(self.log_file, "a+b") as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    self._ensure_loaded(f)
+                    # Под блокировкой файл никто не дописывает: хвост без перевода строки остался от сбоя
+                    if os.fstat(f.fileno()).st_size > self._size:
+                        f.truncate(self._size)
+
+                    lines = []
+                    offset = self._size
+                    indexed = len(self._index)
+                    for entity, op, record_id, data in changes:
+                        if entity not in ENTITIES or op not in OPERATIONS:
+                            raise ValueError(f"Неизвестное событие: {entity}/{op}")
+                        self._last_seq += 1
+                        event = {"seq": self._last_seq, "at": at, "entity": entity,
+                                 "op": op, "id": record_id, "data": data}
+                        line = json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n"
+                        if self._last_seq % self.index_interval == 1 or not self._index:
+                            self._index.append((self._last_seq, offset))
+                        offset += len(line)
+                        lines.append(line)
+                        events.append(event)
+
+                    f.seek(0, os.SEEK_END)
+                    f.write(b"".join(lines))
+                    f.flush()
+                    self._size = offset
+                    if len(self._index) != indexed:
+                        self._save_checkpoint(f)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+            subscribers = list(self._subscribers.values())
+
+        for event in events:
+            self._notify(subscribers, event)
+        return [event["seq"] for event in events]
+
+    def _notify(self, subscribers, event: Dict[str, Any]):
+
+        for callback, entities in subscribers:
+            if entities is not None and event["entity"] not in entities:
+                continue
+            # Ошибка подписчика не должна отменять уже сохраненное изменение
+            try:
+                callback(event)
+            except Exception as e:
+                warnings.warn(f"Подписчик ленты изменений завершился с ошибкой: {e}")
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None],
+                  entities: Optional[Iterable[str]] = None) -> int:
+        """Подписывает callback на новые события; возвращает токен для отписки"""
+
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._subscribers[token] = (callback, frozenset(entities) if entities else None)
+            return token
+
+    def unsubscribe(self, token: int) -> bool:
+
+        with self._lock:
+            return self._subscribers.pop(token, None) is not None
+
+    def _start_offset(self, after_seq: int) -> int:
+
+        position = bisect.bisect_right(self._index, (after_seq + 1, float("inf"))) - 1
+        return self._index[position][1] if position >= 0 else 0
+
+    def read(self, after_seq: int = 0, limit: Optional[int] = None,
+             entities: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """События с номером больше after_seq в порядке записи"""
+
+        entities = frozenset(entities) if entities else None
+        events = []
+
+        with self._lock:
+            with open(self.log_file, "a+b") as f:
+                self._ensure_loaded(f)
+                if after_seq >= self._last_seq:
+                    return events
+                end = self._size
+                f.seek(self._start_offset(after_seq))
+                while f.tell() < end and (limit is None or len(events) < limit):
+                    event = json.loads(f.readline())
+                    if event["seq"] <= after_seq:
+                        continue
+                    if entities is None or event["entity"] in entities:
+                        events.append(event)
+        return events
+
+    def follow(self, after_seq: int = 0, entities: Optional[Iterable[str]] = None,
+               poll_interval: float = FOLLOW_POLL_SECONDS,
+               stop: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+        """Бесконечно отдает новые события, в том числе записанные другими процессами"""
+
+        while stop is None or not stop.is_set():
+            events = self.read(after_seq, limit=self.index_interval, entities=None)
+            for event in events:
+                after_seq = event["seq"]
+                if not entities or event["entity"] in entities:
+                    yield event
+            if not events:
+                time.sleep(poll_interval)
@@ -1,14 +1,33 @@
-from typing import Tuple
+import time
+from typing import Tuple, List, Optional
 from models.borrower import Borrower
 from models.report import AnalysisResult, CreditReport
 from models.enums import CreditStatus
 from .data_controller import DataController
+from .analysis_cache import AnalysisCache, shared_analysis_cache
+from .scoring_rules import ScoringRules, get_scoring_rules, DEFAULT_RULES_FILE, RULES_CHECK_INTERVAL
 
 
 class CreditController:
 
-    def __init__(self, data_controller: DataController):
+    def __init__(self, data_controller: DataController, rules_file: str = DEFAULT_RULES_FILE,
+                 analysis_cache: Optional[AnalysisCache] = None):
         self.data_controller = data_controller
+        self.rules_file = rules_file
+        self.analysis_cache = analysis_cache or shared_analysis_cache
+        self._rules: Optional[ScoringRules] = None
+        self._rules_checked_at = float("-inf")
+
+    @property
+    def rules(self) -> ScoringRules:
+
+        # Правила читаются из конфигурации и перекомпилируются при изменении файла;
+        # проверка файла выполняется не чаще раза в RULES_CHECK_INTERVAL секунд
+        now = time.monotonic()
+        if now - self._rules_checked_at >= RULES_CHECK_INTERVAL:
+            self._rules = get_scoring_rules(self.rules_file)
+            self._rules_checked_at = now
+        return self._rules
 
     def analyze_borrower(self, borrower: Borrower) -> Tuple[AnalysisResult, bool, str]:
 
@@ -25,124 +44,108 @@ class CreditController:
                 credit_attractiveness="Нулевая",
                 risk_level="Критический",
                 recommendations=["Заемщик находится в черном списке банка"],
-                score=0
+                score=0,
+                rules_version=self.rules.version
             ), True, blacklist_reason
 
-        disposable_income = borrower.income - borrower.expenses
+        rules = self.rules
+        self.analysis_cache.validate(rules)
 
-        if borrower.income > 0:
-            debt_ratio = (borrower.existing_loans / borrower.income) * 100
-            if debt_ratio > 50:
-                debt_score = 20
-            elif debt_ratio > 30:
-                debt_score = 40
-            elif debt_ratio > 15:
-                debt_score = 70
-            else:
-                debt_score = 100
-        else:
-            debt_score = 0
+        key = AnalysisCache.fingerprint(borrower, False, rules.version, self.data_controller.blacklist_version)
+        result = self.analysis_cache.get(key)
 
-        history_score = borrower.credit_history_score
+        if result is None:
+            result = rules.analyze(
+                borrower.income, borrower.expenses, borrower.credit_history_score,
+                borrower.existing_loans, borrower.employment_years
+            )
+            self.analysis_cache.put(key, result)
 
-        if borrower.employment_years >= 5:
-            employment_score = 100
-        elif borrower.employment_years >= 3:
-            employment_score = 80
-        elif borrower.employment_years >= 1:
-            employment_score = 60
-        else:
-            employment_score = 30
-
-        if disposable_income > 50000:
-            income_score = 100
-        elif disposable_income > 30000:
-            income_score = 80
-        elif disposable_income > 15000:
-            income_score = 60
-        elif disposable_income > 0:
-            income_score = 40
-        else:
-            income_score = 0
-
-        savings_ratio = disposable_income / borrower.income if borrower.income > 0 else 0
-        if savings_ratio > 0.3:
-            savings_score = 100
-        elif savings_ratio > 0.2:
-            savings_score = 80
-        elif savings_ratio > 0.1:
-            savings_score = 60
-        else:
-            savings_score = 30
-
-        total_score = int(
-            debt_score * 0.3 +
-            history_score * 0.25 +
-            employment_score * 0.2 +
-            income_score * 0.15 +
-            savings_score * 0.1
-        )
+        return result, False, ""
 
-        base_amount = disposable_income * 12 * 0.3  # 30% годового располагаемого дохода
-        score_factor = total_score / 100
+    def analyze_borrowers(self, borrowers: List[Borrower]) -> List[Tuple[AnalysisResult, bool, str]]:
 
-        history_factor = borrower.credit_history_score / 100
+        rules = self.rules
+        self.analysis_cache.validate(rules)
 
-        employment_factor = min(1, borrower.employment_years / 5)
+        results: List = [None] * len(borrowers)
+        scored = []
+        keys = {}
 
-        final_max_loan = base_amount * score_factor * history_factor * employment_factor
+        for i, borrower in enumerate(borrowers):
+            if self.data_controller.check_blacklist(borrower.full_name):
+                results[i] = self.analyze_borrower(borrower)
+                continue
 
-        if total_score >= 80:
-            attractiveness = "Высокая"
-            risk = "Низкий"
-        elif total_score >= 60:
-            attractiveness = "Средняя"
-            risk = "Средний"
-        elif total_score >= 40:
-            attractiveness = "Низкая"
-            risk = "Высокий"
-        else:
-            attractiveness = "Очень низкая"
-            risk = "Критический"
-
-        recommendations = []
-
-        if total_score < 80:
-            if debt_score < 60:
-                recommendations.append("Уменьшите текущую задолженность")
-            if history_score < 70:
-                recommendations.append("Улучшите кредитную историю (своевременно оплачивайте счета)")
-            if employment_score < 80:
-                recommendations.append("Увеличьте стаж работы на текущем месте")
-            if income_score < 70:
-                recommendations.append("Увеличьте располагаемый доход")
-            if savings_score < 60:
-                recommendations.append("Создайте финансовую подушку безопасности")
-
-        if borrower.credit_history_score < 50:
-            recommendations.append(
-                "Рассмотрите возможность получения небольшого кредита и его своевременного погашения")
-
-        if borrower.employment_years < 1:
-            recommendations.append("Стабильная занятость более 1 года повысит шансы на одобрение")
-
-        if len(recommendations) == 0:
-            recommendations.append("Ваши финансовые показатели находятся на хорошем уровне")
-
-        result = AnalysisResult(
-            max_loan_amount=round(final_max_loan, 2),
-            credit_attractiveness=attractiveness,
-            risk_level=risk,
-            recommendations=recommendations,
-            score=total_score
+            key = AnalysisCache.fingerprint(borrower, False, rules.version, self.data_controller.blacklist_version)
+            cached = self.analysis_cache.get(key)
+            if cached is not None:
+                results[i] = (cached, False, "")
+            else:
+                keys[i] = key
+                scored.append(i)
+
+        if not scored:
+            return results
+
+        # Все заемщики пакета, которых нет в кэше, считаются одним векторным проходом
+        batch = [borrowers[i] for i in scored]
+        evaluated = rules.evaluate_arrays(
+            [b.income for b in batch],
+            [b.expenses for b in batch],
+            [b.credit_history_score for b in batch],
+            [b.existing_loans for b in batch],
+            [b.employment_years for b in batch]
         )
 
-        return result, False, ""
+        debt, _, employment, income, savings = (factor.tolist() for factor in evaluated["factors"])
+        total_scores = evaluated["total_score"].tolist()
+        max_loans = evaluated["max_loan"].tolist()
+        band_indexes = evaluated["band_index"].tolist()
+        build_result = rules.build_result
+
+        for row, (i, borrower) in enumerate(zip(scored, batch)):
+            result = build_result(
+                debt[row], borrower.credit_history_score, employment[row], income[row], savings[row],
+                total_scores[row], max_loans[row], band_indexes[row],
+                borrower.credit_history_score, borrower.employment_years
+            )
+            self.analysis_cache.put(keys[i], result)
+            results[i] = (result, False, "")
+
+        return results
+
+    def _submission_identity(self, borrower: Borrower) -> Tuple:
+
+        return borrower.passport_series, borrower.passport_number, borrower.created_by
+
+    def submission_key(self, borrower: Borrower) -> Tuple:
+        """Ключ повторной отправки: те же данные заемщика и тот же паспорт от того же автора"""
+
+        blacklisted = self.data_controller.check_blacklist(borrower.full_name)
+        key = AnalysisCache.fingerprint(borrower, blacklisted, self.rules.version, self.data_controller.blacklist_version)
+        return key, self._submission_identity(borrower)
+
+    def find_recent_duplicate(self, borrower: Borrower) -> Optional[CreditReport]:
+
+        # Тот же заемщик с теми же данными, отправленный недавно, не должен порождать новый отчет
+        self.analysis_cache.validate(self.rules)
+
+        key, identity = self.submission_key(borrower)
+        report_id = self.analysis_cache.find_submission(key, identity)
+
+        if report_id is None:
+            return None
+        return self.data_controller.get_report_by_id(report_id)
+
+    def cache_stats(self) -> dict:
+
+        return self.analysis_cache.stats()
 
     def create_credit_report(self, borrower: Borrower, analysis_result: AnalysisResult,
                              user_id: str, user_name: str) -> CreditReport:
 
-        if analysis_result.score >= 60:
+        if analysis_result.score >= self.rules.approval_min_score:
             status = CreditStatus.PENDING
         else:
             status = CreditStatus.REJECTED
@@ -157,4 +160,30 @@ class CreditController:
 
         report.status = status
 
-        return report
\ No newline at end of file
+        return report
+
+    def save_analysis(self, borrower: Borrower, analysis_result: AnalysisResult,
+                      is_blacklisted: bool, blacklist_reason: str,
+                      user_id: str, user_name: str) -> CreditReport:
+
+        if is_blacklisted:
+            borrower.blacklisted = True
+            borrower.blacklist_reason = blacklist_reason
+
+        # Повторный анализ того же человека привязывается к уже сохраненному заемщику
+        stored_borrower = self.data_controller.upsert_borrower(borrower)
+
+        report = self.create_credit_report(stored_borrower, analysis_result, user_id, user_name)
+
+        if is_blacklisted:
+            report.status = CreditStatus.REJECTED
+            report.blacklist_check = True
+            report.blacklist_found = True
+
+        self.data_controller.add_report(report)
+
+        key = AnalysisCache.fingerprint(borrower, is_blacklisted, analysis_result.rules_version,
+                                       self.data_controller.blacklist_version)
+        self.analysis_cache.record_submission(key, self._submission_identity(borrower), report.id)
+
+        return report
@@ -1,30 +1,274 @@
 import json
 import os
-from typing import List, Optional, Dict, Any
+import threading
+from dataclasses import replace
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple, Callable, Set
 from models.user import User
 from models.borrower import Borrower
 from models.report import CreditReport
+from models.enums import CreditStatus
+from .report_storage import ReportStorage
+from .report_archive import ReportArchive
+from .report_history import ReportHistory
+from .report_distributions import ReportDistributions
+from .change_feed import ChangeFeed
+from .report_snapshot import ReportSnapshot, Segment
+from .report_query import ReportQuery, QueryResult, ColumnStore
+from .report_index import SearchIndexRegistry
+from .partitions import partition_id, partition_set, normalize_department
+from .report_aggregates import empty_aggregates, merge_aggregates
+from .startup_profiler import profiler
+
+# Через сколько дней одобренные и отклоненные отчеты переносятся в архив
+ARCHIVE_AFTER_DAYS = 180
+
+# Поля заемщика, которые обновляются при повторном анализе того же человека
+BORROWER_UPDATE_FIELDS = (
+    "full_name", "birth_date", "income", "expenses", "credit_history_score", "existing_loans",
+    "employment_years", "employer_name", "position", "address", "phone", "email",
+    "blacklisted", "blacklist_reason"
+)
+
+
+def passport_key(borrower: Borrower) -> Optional[Tuple[str, str]]:
+
+    series = (borrower.passport_series or "").replace(" ", "")
+    number = (borrower.passport_number or "").replace(" ", "")
+    if not series or not number:
+        return None
+    return series, number
+
+
+def resolve_path(root: Any, path: str) -> Any:
+    """Атрибут по пути вида "archive.aggregates"; закрытые имена недоступны"""
+
+    value = root
+    for name in path.split("."):
+        if not name or name.startswith("_"):
+            raise AttributeError(f"Недоступный атрибут: {path}")
+        value = getattr(value, name)
+    return value
+
+
+class Pipeline:
+    """Пакет обращений к DataController; у сервера данных уходит одним обменом по сокету.
+
+        pipeline = data_controller.pipeline()
+        pipeline.get_all_reports()
+        pipeline.get("archive.aggregates")
+        reports, aggregates = pipeline.execute()
+    """
+
+    def __init__(self, executor: Callable[[List[Tuple[str, str, tuple, dict]]], List[Any]]):
+        self._executor = executor
+        self._requests: List[Tuple[str, str, tuple, dict]] = []
+
+    def get(self, path: str) -> "Pipeline":
+
+        self._requests.append(("get", path, (), {}))
+        return self
+
+    def call(self, path: str, *args, **kwargs) -> "Pipeline":
+
+        self._requests.append(("call", path, args, kwargs))
+        return self
+
+    def __getattr__(self, name: str):
+
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+
+    def execute(self) -> List[Any]:
+
+        requests, self._requests = self._requests, []
+        return self._executor(requests) if requests else []
 
 
 class DataController:
 
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data", archive_after_days: Optional[int] = ARCHIVE_AFTER_DAYS,
+                 departments: Optional[Iterable[Optional[str]]] = None):
         self.data_dir = data_dir
         self.users_file = os.path.join(data_dir, "users.json")
+        # Файл заемщиков до разделения по отделам; переносится в разделы при первой загрузке
         self.borrowers_file = os.path.join(data_dir, "borrowers.json")
+        self.borrowers_dir = os.path.join(data_dir, "borrowers")
+        # Число заемщиков каждого раздела: статистика не читает файлы заемщиков
+        self.borrowers_manifest_file = os.path.join(self.borrowers_dir, "manifest.json")
         self.reports_file = os.path.join(data_dir, "reports.json")
 
         os.makedirs(data_dir, exist_ok=True)
 
-        self.users = self._load_users()
-        self.borrowers = self._load_borrowers()
-        self.reports = self._load_reports()
+        # Записи могут приходить из нескольких потоков (например, из API)
+        self._lock = threading.RLock()
+
+        self.archive_after_days = archive_after_days
+
+        # Загрузка поэтапная: для входа в систему нужны только пользователи,
+        # остальные данные загружаются при первом обращении или заранее через preload()
+        with profiler.stage("data.users"):
+            self.users = self._load_users()
+
+        self._loaded = False
+        self._loader_thread: Optional[int] = None
+
+        self._report_storage: Optional[ReportStorage] = None
+        self._archive: Optional[ReportArchive] = None
+        self._report_history: Optional[ReportHistory] = None
+        self._changes: Optional[ChangeFeed] = None
+
+        # Отделы, чьи отчеты и заемщики загружает этот экземпляр; None - все отделы
+        self.departments = self._normalize_scope(departments)
+
+        # Заемщики загружаются отдельно от отчетов, только для разделов области.
+        # Список не меняется на месте: запись подменяет его новым, читатели дочитывают прежний
+        self._borrowers: List[Borrower] = []
+        self._borrower_partitions: Set[str] = set()
+        self._borrowers_loaded = False
+        self._borrower_counts: Optional[Dict[str, int]] = None
+
+        # Сегменты отчетов подгружаются по мере необходимости. Читатели берут текущий срез
+        # без блокировки, запись под блокировкой публикует новую версию после сохранения на диск
+        self._snapshot = ReportSnapshot()
+        # Колонки полей загруженных сегментов для выражений фильтра
+        self._columns = ColumnStore()
+        # Индексы поиска открытых отчетов, общие для всех ReportController этого экземпляра
+        self.search_indexes = SearchIndexRegistry(self)
 
         self.blacklist = [
             "Иванов Иван Иванович",
             "Петров Петр Петрович",
             "Сидоров Сидор Сидорович"
         ]
+        # Увеличивается при каждом изменении черного списка, чтобы кэши могли сброситься
+        self.blacklist_version = 0
+
+    def _ensure_loaded(self):
+
+        # Поток, который сейчас загружает данные, обращается к ним без ожидания
+        if self._loaded or self._loader_thread == threading.get_ident():
+            return
+
+        # Общая блокировка с записями: загрузка и запись не могут ждать друг друга по кругу
+        with self._lock:
+            if self._loaded:
+                return
+            self._loader_thread = threading.get_ident()
+            try:
+                with profiler.stage("data.reports"):
+                    self._report_storage = ReportStorage(os.path.join(self.data_dir, "reports"),
+                                                         legacy_file=self.reports_file,
+                                                         department_of=self._report_department)
+                    self._archive = ReportArchive(os.path.join(self.data_dir, "archive"))
+                    if not self._archive.has_departments:
+                        self._archive.build_departments(self._report_department)
+                    self._report_history = ReportHistory(os.path.join(self.data_dir, "history"))
+                    # Лента изменений для внешних потребителей и кэшей внутри процесса
+                    self._changes = ChangeFeed(os.path.join(self.data_dir, "changes"))
+
+                if self.archive_after_days is not None:
+                    with profiler.stage("data.archive"):
+                        self.archive_finalized_reports(self.archive_after_days)
+
+                self._loaded = True
+            finally:
+                self._loader_thread = None
+
+    def _ensure_borrowers(self):
+
+        if self._borrowers_loaded:
+            return
+        self._ensure_loaded()
+        with self._lock:
+            if self._borrowers_loaded:
+                return
+            with profiler.stage("data.borrowers"):
+                self._migrate_legacy_borrowers()
+                partitions = partition_set(self.departments)
+                if partitions is None:
+                    partitions = self._stored_borrower_partitions()
+                self._borrowers = []
+                self._borrower_partitions = set()
+                self._rebuild_borrower_indexes()
+                self._load_borrower_partitions(partitions)
+                self._borrowers_loaded = True
+
+    def preload(self, borrowers: bool = True) -> threading.Thread:
+        """Загружает отчеты и (если borrowers) заемщиков области в фоне, пока пользователь входит в систему"""
+
+        def load():
+            self._ensure_loaded()
+            if borrowers:
+                self._ensure_borrowers()
+
+        thread = threading.Thread(target=load, name="data-preload", daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def _normalize_scope(departments: Optional[Iterable[Optional[str]]]) -> Optional[List[Optional[str]]]:
+
+        if departments is None:
+            return None
+        return sorted(set(normalize_department(d) for d in departments), key=lambda d: d or "")
+
+    def set_scope(self, departments: Optional[Iterable[Optional[str]]]):
+        """Ограничивает загрузку отчетов и заемщиков разделами отделов departments; None - все отделы"""
+
+        departments = self._normalize_scope(departments)
+        with self._lock:
+            if departments == self.departments:
+                return
+            self.departments = departments
+            # Загруженные сегменты и заемщики прежней области больше не нужны
+            self._snapshot = ReportSnapshot(self._snapshot.version + 1)
+            self._borrowers = []
+            self._borrower_partitions = set()
+            self._borrowers_loaded = False
+
+    def _user_department(self, user_id: Optional[str]) -> Optional[str]:
+
+        # Неактивные пользователи тоже учитываются: их записи остаются в разделе отдела
+        for user in self.users:
+            if user.id == user_id:
+                return normalize_department(user.department)
+        return None
+
+    def _report_department(self, report: CreditReport) -> Optional[str]:
+
+        return self._user_department(report.created_by)
+
+    @property
+    def report_storage(self) -> ReportStorage:
+
+        self._ensure_loaded()
+        return self._report_storage
+
+    @property
+    def archive(self) -> ReportArchive:
+
+        self._ensure_loaded()
+        return self._archive
+
+    @property
+    def report_history(self) -> ReportHistory:
+
+        self._ensure_loaded()
+        return self._report_history
+
+    @property
+    def changes(self) -> ChangeFeed:
+
+        self._ensure_loaded()
+        return self._changes
+
+    @property
+    def borrowers(self) -> List[Borrower]:
+
+        self._ensure_borrowers()
+        return self._borrowers
 
     def _load_users(self) -> List[User]:
 
@@ -37,42 +281,190 @@ class DataController:
                 pass
         return []
 
-    def _load_borrowers(self) -> List[Borrower]:
+    def _borrowers_partition_file(self, partition: str) -> str:
+        return os.path.join(self.borrowers_dir, f"{partition}.json")
+
+    def _stored_borrower_partitions(self) -> Set[str]:
+
+        if not os.path.isdir(self.borrowers_dir):
+            return set()
+        return {name[:-len(".json")] for name in os.listdir(self.borrowers_dir)
+                if name.endswith(".json") and name != os.path.basename(self.borrowers_manifest_file)}
+
+    @staticmethod
+    def _read_borrowers(path: str) -> List[Borrower]:
 
-        if os.path.exists(self.borrowers_file):
+        if os.path.exists(path):
             try:
-                with open(self.borrowers_file, 'r', encoding='utf-8') as f:
+                with open(path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     return [Borrower.from_dict(borrower_data) for borrower_data in data]
             except (json.JSONDecodeError, FileNotFoundError):
                 pass
         return []
 
-    def _load_reports(self) -> List[CreditReport]:
+    def _write_borrowers(self, partition: str, borrowers: List[Borrower]):
 
-        if os.path.exists(self.reports_file):
+        os.makedirs(self.borrowers_dir, exist_ok=True)
+        path = self._borrowers_partition_file(partition)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump([borrower.to_dict() for borrower in borrowers], f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+        counts = dict(self._load_borrower_counts())
+        counts[partition] = len(borrowers)
+        self._save_borrower_counts(counts)
+
+    def _load_borrower_counts(self) -> Dict[str, int]:
+
+        if self._borrower_counts is None:
             try:
-                with open(self.reports_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    return [CreditReport.from_dict(report_data) for report_data in data]
-            except (json.JSONDecodeError, FileNotFoundError):
-                pass
-        return []
+                with open(self.borrowers_manifest_file, 'r', encoding='utf-8') as f:
+                    self._borrower_counts = json.load(f)["counts"]
+            except (json.JSONDecodeError, FileNotFoundError, KeyError):
+                self._borrower_counts = {}
+        return self._borrower_counts
+
+    def _save_borrower_counts(self, counts: Dict[str, int]):
+
+        os.makedirs(self.borrowers_dir, exist_ok=True)
+        tmp_path = f"{self.borrowers_manifest_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": 1, "counts": counts}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.borrowers_manifest_file)
+        # Словарь подменяется целиком: читатели без блокировки видят прежний или новый
+        self._borrower_counts = counts
+
+    def borrower_counts(self) -> Dict[str, int]:
+        """Число заемщиков по разделам из манифеста; разделы без записи в манифесте считаются один раз"""
+
+        counts = self._load_borrower_counts()
+        if self._stored_borrower_partitions() - set(counts) or os.path.exists(self.borrowers_file):
+            with self._lock:
+                self._migrate_legacy_borrowers()
+                counts = dict(self._load_borrower_counts())
+                for partition in self._stored_borrower_partitions() - set(counts):
+                    counts[partition] = len(self._read_borrowers(self._borrowers_partition_file(partition)))
+                self._save_borrower_counts(counts)
+        return counts
+
+    def _migrate_legacy_borrowers(self):
+
+        # Общий файл раскладывается по разделам отделов авторов записей
+        if not os.path.exists(self.borrowers_file):
+            return
+        by_partition: Dict[str, List[Borrower]] = {}
+        for borrower in self._read_borrowers(self.borrowers_file):
+            if borrower.department is None:
+                borrower.department = self._user_department(borrower.created_by)
+            by_partition.setdefault(partition_id(borrower.department), []).append(borrower)
+
+        for partition, borrowers in by_partition.items():
+            existing = self._read_borrowers(self._borrowers_partition_file(partition))
+            known = {b.id for b in existing}
+            self._write_borrowers(partition, existing + [b for b in borrowers if b.id not in known])
+        os.replace(self.borrowers_file, f"{self.borrowers_file}.bak")
+
+    def _load_borrower_partitions(self, partitions: Iterable[str]) -> List[Borrower]:
+
+        loaded = []
+        for partition in sorted(set(partitions) - self._borrower_partitions):
+            loaded.extend(self._read_borrowers(self._borrowers_partition_file(partition)))
+            self._borrower_partitions.add(partition)
+        self._borrowers = self._borrowers + loaded
+        for borrower in loaded:
+            self._borrowers_by_id[borrower.id] = borrower
+            key = passport_key(borrower)
+            if key is not None:
+                self._borrowers_by_passport.setdefault(key, borrower)
+        return loaded
+
+    def _rebuild_borrower_indexes(self):
+
+        # Хэш-индексы по id и паспорту вместо линейного поиска по списку заемщиков;
+        # при дублях в старых данных индекс паспорта указывает на первую запись
+        self._borrowers_by_id: Dict[str, Borrower] = {b.id: b for b in self._borrowers}
+        self._borrowers_by_passport: Dict[Tuple[str, str], Borrower] = {}
+        for borrower in self._borrowers:
+            key = passport_key(borrower)
+            if key is not None:
+                self._borrowers_by_passport.setdefault(key, borrower)
+
+    @property
+    def reports(self) -> Segment:
+
+        return self._ensure_segments(self.report_storage.segment_keys(self.departments)).reports
+
+    def snapshot(self) -> ReportSnapshot:
+        """Неизменяемый срез отчетов области: несколько выборок из одного среза согласованы между собой"""
+
+        return self._ensure_segments(self.report_storage.segment_keys(self.departments))
+
+    def _ensure_segments(self, keys: Iterable[str]) -> ReportSnapshot:
+        """Текущий срез, в котором загружены сегменты keys"""
+
+        snapshot = self._snapshot
+        missing = [key for key in keys if key not in snapshot.segments]
+        if not missing:
+            return snapshot
+
+        # Файлы читаются без блокировки; сегмент, который успела загрузить или изменить запись,
+        # берется из нового среза, а прочитанная копия отбрасывается
+        loaded = {key: tuple(self.report_storage.load_segment(key)) for key in missing}
+        with self._lock:
+            snapshot = self._snapshot
+            loaded = {key: segment for key, segment in loaded.items() if key not in snapshot.segments}
+            if loaded:
+                snapshot = self._publish(loaded)
+            return snapshot
+
+    def _publish(self, changes: Dict[str, Segment]) -> ReportSnapshot:
+
+        # Вызывается под блокировкой после записи на диск: замена ссылки атомарна для читателей
+        self._snapshot = self._snapshot.with_segments(changes)
+        return self._snapshot
+
+    @staticmethod
+    def _change_data(record) -> Dict[str, Any]:
+
+        data = record.to_dict()
+        # Пароли в ленту не попадают
+        data.pop("password", None)
+        return data
+
+    def _emit(self, entity: str, op: str, record):
+
+        self.changes.append(entity, op, record.id, self._change_data(record))
+
+    def pipeline(self) -> Pipeline:
+
+        return Pipeline(self._execute_pipeline)
+
+    def _execute_pipeline(self, requests: List[Tuple[str, str, tuple, dict]]) -> List[Any]:
+
+        results = []
+        for kind, path, args, kwargs in requests:
+            value = resolve_path(self, path)
+            results.append(value(*args, **kwargs) if kind == "call" else value)
+        return results
 
     def _save_users(self):
 
         with open(self.users_file, 'w', encoding='utf-8') as f:
             json.dump([user.to_dict() for user in self.users], f, ensure_ascii=False, indent=2)
 
-    def _save_borrowers(self):
-
-        with open(self.borrowers_file, 'w', encoding='utf-8') as f:
-            json.dump([borrower.to_dict() for borrower in self.borrowers], f, ensure_ascii=False, indent=2)
+    def _save_borrowers(self, partitions: Optional[Iterable[str]] = None):
 
-    def _save_reports(self):
-
-        with open(self.reports_file, 'w', encoding='utf-8') as f:
-            json.dump([report.to_dict() for report in self.reports], f, ensure_ascii=False, indent=2)
+        # Перезаписываются только затронутые разделы
+        partitions = self._borrower_partitions if partitions is None else set(partitions)
+        by_partition: Dict[str, List[Borrower]] = {partition: [] for partition in partitions}
+        for borrower in self._borrowers:
+            target = by_partition.get(partition_id(borrower.department))
+            if target is not None:
+                target.append(borrower)
+        for partition, borrowers in by_partition.items():
+            self._write_borrowers(partition, borrowers)
 
 
     def get_user_by_username(self, username: str) -> Optional[User]:
@@ -91,34 +483,120 @@ class DataController:
 
     def add_user(self, user: User) -> bool:
 
-        if self.get_user_by_username(user.username):
-            return False
+        with self._lock:
+            if self.get_user_by_username(user.username):
+                return False
 
-        self.users.append(user)
-        self._save_users()
-        return True
+            self.users.append(user)
+            self._save_users()
+            self._emit("user", "add", user)
+            return True
 
     def update_user(self, user: User) -> bool:
 
-        for i, existing_user in enumerate(self.users):
-            if existing_user.id == user.id:
-                self.users[i] = user
-                self._save_users()
-                return True
-        return False
+        with self._lock:
+            for i, existing_user in enumerate(self.users):
+                if existing_user.id == user.id:
+                    self.users[i] = user
+                    self._save_users()
+                    self._emit("user", "update", user)
+                    return True
+            return False
 
     def add_borrower(self, borrower: Borrower) -> str:
 
-        self.borrowers.append(borrower)
-        self._save_borrowers()
-        return borrower.id
+        return self.upsert_borrower(borrower).id
+
+    def upsert_borrower(self, borrower: Borrower) -> Borrower:
+
+        # Заемщик с тем же паспортом обновляется, а не добавляется повторно
+        self._ensure_borrowers()
+        with self._lock:
+            if borrower.department is None:
+                borrower.department = self._user_department(borrower.created_by)
+            # Раздел вне области подгружается перед записью, чтобы не затереть его файл
+            self._load_borrower_partitions([partition_id(borrower.department)])
+
+            key = passport_key(borrower)
+            existing = self._borrowers_by_passport.get(key) if key is not None else None
+
+            if existing is None:
+                self._borrowers = self._borrowers + [borrower]
+                self._borrowers_by_id[borrower.id] = borrower
+                if key is not None:
+                    self._borrowers_by_passport[key] = borrower
+                self._save_borrowers([partition_id(borrower.department)])
+                self._emit("borrower", "add", borrower)
+                return borrower
+
+            # Обновляется копия, чтобы читатели прежнего списка не увидели запись наполовину
+            updated = replace(existing, **{name: getattr(borrower, name) for name in BORROWER_UPDATE_FIELDS})
+            self._borrowers = [updated if b is existing else b for b in self._borrowers]
+            self._borrowers_by_id[updated.id] = updated
+            self._borrowers_by_passport[key] = updated
+            self._save_borrowers([partition_id(updated.department)])
+            self._emit("borrower", "update", updated)
+            return updated
 
     def get_borrower_by_id(self, borrower_id: str) -> Optional[Borrower]:
 
+        self._ensure_borrowers()
+        return self._borrowers_by_id.get(borrower_id)
+
+    def get_borrower_by_passport(self, passport_series: str, passport_number: str) -> Optional[Borrower]:
+
+        self._ensure_borrowers()
+        return self._borrowers_by_passport.get(
+            (passport_series.replace(" ", ""), passport_number.replace(" ", "")))
+
+    def replace_borrowers(self, borrowers: List[Borrower]):
+
+        self._ensure_borrowers()
+        with self._lock:
+            for borrower in borrowers:
+                if borrower.department is None:
+                    borrower.department = self._user_department(borrower.created_by)
+
+            # Записи разделов вне области, которых нет в списке, сохраняются как были
+            missing = {partition_id(b.department) for b in borrowers} - self._borrower_partitions
+            if missing:
+                ids = {b.id for b in borrowers}
+                borrowers = borrowers + [b for b in self._load_borrower_partitions(missing) if b.id not in ids]
+
+            previous = {b.id: b.to_dict() for b in self._borrowers}
+            self._borrowers = borrowers
+            self._rebuild_borrower_indexes()
+            self._save_borrowers()
+
+            changes = []
+            for borrower in borrowers:
+                data = borrower.to_dict()
+                old_data = previous.pop(borrower.id, None)
+                if old_data != data:
+                    changes.append(("borrower", "add" if old_data is None else "update", borrower.id, data))
+            changes.extend(("borrower", "delete", borrower_id, None) for borrower_id in previous)
+            if changes:
+                self.changes.append_many(changes)
+
+    def search_borrowers(self, full_name: str = "", passport_series: str = "", passport_number: str = "",
+                         departments: Optional[Iterable[Optional[str]]] = None) -> List[Borrower]:
+        """Заемщики разделов отделов departments (None - область контроллера) по части ФИО
+        или, если ФИО не задано, по серии и номеру паспорта"""
+
+        # Сервер данных держит заемщиков всех отделов, поэтому область передается с запросом
+        partitions = partition_set(self._scope(departments))
+        query = full_name.lower()
+        found = []
         for borrower in self.borrowers:
-            if borrower.id == borrower_id:
-                return borrower
-        return None
+            if partitions is not None and partition_id(borrower.department) not in partitions:
+                continue
+            if query:
+                if query in borrower.full_name.lower():
+                    found.append(borrower)
+            elif (passport_series and passport_number and borrower.passport_series == passport_series
+                  and borrower.passport_number == passport_number):
+                found.append(borrower)
+        return found
 
     def get_borrowers_by_creator(self, user_id: str) -> List[Borrower]:
 
@@ -126,53 +604,303 @@ class DataController:
 
     def add_report(self, report: CreditReport) -> str:
 
-        self.reports.append(report)
-        self._save_reports()
-        return report.id
-
-    def get_report_by_id(self, report_id: str) -> Optional[CreditReport]:
-
-        for report in self.reports:
+        with self._lock:
+            if report.department is None:
+                report.department = self._report_department(report)
+            key = ReportStorage.segment_key(report.created_at, report.department)
+            segment = self._ensure_segments([key]).segments[key] + (report,)
+
+            self.report_storage.save_segment(key, list(segment))
+            self._publish({key: segment})
+            self._emit("report", "add", report)
+            return report.id
+
+    def get_report_by_id(self, report_id: str, created_at: Optional[datetime] = None) -> Optional[CreditReport]:
+
+        # Дата создания определяет месяц, и сегменты других месяцев можно не читать
+        if created_at is not None:
+            keys = self.report_storage.segments_for_month(created_at, self.departments)
+            reports = self._ensure_segments(keys).select(keys)
+        else:
+            # Сегмент находится по индексам id, остальные сегменты не читаются
+            with self._lock:
+                key = self.report_storage.locate(report_id, self.departments)
+            reports = self._ensure_segments([key]).select([key]) if key is not None else ()
+
+        for report in reports:
             if report.id == report_id:
                 return report
+
+        # Отчета нет среди оперативных: он мог уйти в архив, где его находит индекс id архива
+        with self._lock:
+            report = self.archive.get_report_by_id(report_id)
+        partitions = partition_set(self.departments)
+        if report is not None and (partitions is None or partition_id(report.department) in partitions):
+            return report
         return None
 
+    def count_reports(self) -> int:
+
+        return self.report_storage.total_count(self.departments)
+
+    def get_reports_since(self, start_date: datetime) -> List[CreditReport]:
+
+        keys = self.report_storage.segments_since(start_date, self.departments)
+        return [r for r in self._ensure_segments(keys).select(keys) if r.created_at >= start_date]
+
+    def get_reports_by_status(self, status: CreditStatus) -> List[CreditReport]:
+
+        # Манифест хранит счетчики статусов, поэтому сегменты без нужного статуса не читаются
+        keys = self.report_storage.segments_with_status(status.value, self.departments)
+        return [r for r in self._ensure_segments(keys).select(keys) if r.status == status]
+
     def get_reports_by_creator(self, user_id: str) -> List[CreditReport]:
 
         return [r for r in self.reports if r.created_by == user_id]
 
-    def get_all_reports(self) -> List[CreditReport]:
+    def query_reports(self, expression: str, departments: Optional[Iterable[Optional[str]]] = None) -> QueryResult:
+        """Отчеты области, подходящие под выражение фильтра, с планом выполнения.
+
+        departments по умолчанию - область этого экземпляра.
+        """
+
+        query = ReportQuery.parse(expression)
+        # Индексы id сегментов при первом обращении могут дописать контрольные суммы в манифест
+        with self._lock:
+            keys, explain = query.plan(self.report_storage, self._scope(departments))
+
+        snapshot = self._ensure_segments(keys)
+        self._columns.retain(snapshot.segments)
+        reports, evaluation = query.evaluate([(key, snapshot.segments[key]) for key in keys],
+                                             self._columns, self.get_borrower_by_id)
+        return QueryResult(reports, explain + evaluation, sum(len(snapshot.segments[key]) for key in keys))
 
+    def get_recent_reports(self, limit: int, departments: Optional[Iterable[Optional[str]]] = None) -> List[CreditReport]:
+        """limit самых новых отчетов области: сегменты читаются от новых к старым, пока в следующем
+        не может оказаться отчета новее уже собранных"""
+
+        segments = self.report_storage.manifest["segments"]
+        keys = sorted(self.report_storage.segment_keys(self._scope(departments)),
+                      key=lambda key: segments[key]["max_created_at"], reverse=True)
+
+        newest: List[CreditReport] = []
+        for key in keys:
+            if len(newest) >= limit and segments[key]["max_created_at"] < newest[-1].created_at.isoformat():
+                break
+            newest = sorted(newest + list(self._ensure_segments([key]).segments[key]),
+                            key=lambda r: r.created_at, reverse=True)[:limit]
+        return newest
+
+    def get_all_reports(self) -> Segment:
+
+        # Кортеж из среза: его можно обходить сколько угодно долго, записи его не меняют
         return self.reports
 
+    def iter_reports(self, include_archive: bool = False) -> Iterator[CreditReport]:
+
+        # Для выгрузок: незагруженные сегменты читаются по одному и не остаются в памяти
+        if include_archive:
+            partitions = partition_set(self.departments)
+            for report in self.archive.iter_reports():
+                if partitions is None or partition_id(report.department) in partitions:
+                    yield report
+
+        snapshot = self._snapshot
+        for key in self.report_storage.segment_keys(self.departments):
+            segment = snapshot.segments.get(key)
+            yield from segment if segment is not None else self.report_storage.load_segment(key)
+
     def update_report(self, report: CreditReport) -> bool:
 
-        for i, existing_report in enumerate(self.reports):
-            if existing_report.id == report.id:
-                self.reports[i] = report
-                self._save_reports()
-                return True
-        return False
+        with self._lock:
+            key = ReportStorage.segment_key(report.created_at, report.department)
+            segment = self._ensure_segments([key]).segments[key]
+
+            for i, existing_report in enumerate(segment):
+                if existing_report.id == report.id:
+                    segment = segment[:i] + (report,) + segment[i + 1:]
+                    self.report_storage.save_segment(key, list(segment))
+                    self._publish({key: segment})
+                    self._emit("report", "update", report)
+
+                    # Историю можно записать, только если отчет изменяли в копии, а не на месте
+                    if existing_report is not report:
+                        self.report_history.record(existing_report.to_dict(), report.to_dict(),
+                                                   report.modified_by, report.modified_by_name,
+                                                   report.modified_at)
+                    return True
+            return False
+
+    def update_reports(self, reports: List[CreditReport], author_id: Optional[str] = None,
+                       author_name: Optional[str] = None) -> int:
+
+        # Все затронутые сегменты записываются одним пакетом через журнал хранилища
+        with self._lock:
+            updates_by_key: Dict[str, Dict[str, CreditReport]] = {}
+            for report in reports:
+                key = ReportStorage.segment_key(report.created_at, report.department)
+                updates_by_key.setdefault(key, {})[report.id] = report
+            snapshot = self._ensure_segments(updates_by_key.keys())
+
+            replaced: List[CreditReport] = []
+            history = []
+            changed_segments: Dict[str, Segment] = {}
+            for key, updates in updates_by_key.items():
+                segment = list(snapshot.segments[key])
+                changed = False
+                for i, existing_report in enumerate(segment):
+                    report = updates.get(existing_report.id)
+                    if report is not None:
+                        segment[i] = report
+                        replaced.append(report)
+                        changed = True
+                        if existing_report is not report:
+                            history.append((existing_report.to_dict(), report.to_dict()))
+                if changed:
+                    changed_segments[key] = tuple(segment)
+
+            if not replaced:
+                return 0
+
+            # Все сегменты пакета появляются у читателей одной версией
+            self.report_storage.save_segments({key: list(segment) for key, segment in changed_segments.items()})
+            self._publish(changed_segments)
+            self.changes.append_many(("report", "update", report.id, report.to_dict())
+                                     for report in replaced)
+
+            if author_id is not None:
+                self.report_history.record_many(history, author_id, author_name)
+            else:
+                for before, after in history:
+                    self.report_history.record(before, after, after["modified_by"], after["modified_by_name"])
+            return len(replaced)
+
+    def get_reports_by_borrower(self, borrower_id: str, include_archive: bool = False,
+                                departments: Optional[Iterable[Optional[str]]] = None) -> List[CreditReport]:
+
+        scope = self._scope(departments)
+        keys = self.report_storage.segment_keys(scope)
+        reports = [r for r in self._ensure_segments(keys).select(keys) if r.borrower_id == borrower_id]
+        if include_archive:
+            partitions = partition_set(scope)
+            archived = [r for r in self.archive.get_reports_by_borrower(borrower_id)
+                        if partitions is None or partition_id(r.department) in partitions]
+            reports = archived + reports
+        return reports
+
+    def archive_finalized_reports(self, max_age_days: int) -> int:
+
+        with self._lock:
+            cutoff = datetime.now() - timedelta(days=max_age_days)
+            finalized = (CreditStatus.APPROVED, CreditStatus.REJECTED)
+
+            # Отчет не может быть изменен раньше, чем создан, поэтому сегменты
+            # новее границы архивации можно не открывать
+            candidate_keys = [
+                key for key in self.report_storage.segments_before(cutoff, self.departments)
+                if any(self.report_storage.manifest["segments"][key]["status_counts"].get(status.value, 0)
+                       for status in finalized)
+            ]
+
+            archived_total = 0
+            for key in candidate_keys:
+                segment = self._ensure_segments([key]).segments[key]
+
+                to_archive = [r for r in segment
+                              if r.status in finalized and (r.modified_at or r.created_at) < cutoff]
+                if not to_archive:
+                    continue
+
+                # Архив записывается первым и пропускает уже перенесенные отчеты: если процесс упадет
+                # до перезаписи оперативного сегмента, повтор просто удалит их из сегмента
+                self.archive.add_reports(to_archive)
+
+                archived_ids = {r.id for r in to_archive}
+                segment = tuple(r for r in segment if r.id not in archived_ids)
+                self.report_storage.save_segment(key, list(segment))
+                self._publish({key: segment})
+                self.changes.append_many(("report", "archive", report.id, None) for report in to_archive)
+                archived_total += len(to_archive)
+
+            return archived_total
 
     def check_blacklist(self, full_name: str) -> bool:
 
         return full_name in self.blacklist
 
-    def get_statistics(self) -> Dict[str, Any]:
+    def add_to_blacklist(self, full_name: str) -> bool:
 
-        from models.enums import CreditStatus
+        with self._lock:
+            if full_name in self.blacklist:
+                return False
+            self.blacklist.append(full_name)
+            self.blacklist_version += 1
+            return True
 
-        total_reports = len(self.reports)
-        status_counts = {
-            status.value: len([r for r in self.reports if r.status == status])
-            for status in CreditStatus
-        }
+    def remove_from_blacklist(self, full_name: str) -> bool:
+
+        with self._lock:
+            if full_name not in self.blacklist:
+                return False
+            self.blacklist.remove(full_name)
+            self.blacklist_version += 1
+            return True
+
+    def _scope(self, departments: Optional[Iterable[Optional[str]]]) -> Optional[List[Optional[str]]]:
+
+        return self.departments if departments is None else self._normalize_scope(departments)
+
+    def get_distributions(self, departments: Optional[Iterable[Optional[str]]] = None) -> ReportDistributions:
+        """Скетчи и гистограммы балла и суммы: оперативные сегменты вместе с архивом.
+
+        departments по умолчанию - область этого экземпляра.
+        """
+
+        # Без блокировки: хранилище и архив подменяют кэши и агрегаты целиком при записи
+        departments = self._scope(departments)
+        distributions = ReportDistributions()
+        distributions.merge(self.report_storage.distributions(departments))
+        distributions.merge(self.archive.distributions_for(departments))
+        return distributions
+
+    def get_aggregates(self, departments: Optional[Iterable[Optional[str]]] = None) -> Dict[str, Any]:
+        """Счетчики и суммы оперативных сегментов и архива из манифестов, без чтения отчетов"""
+
+        departments = self._scope(departments)
+        aggregates = self.report_storage.aggregate(departments)
+        return merge_aggregates(aggregates, self.archive.aggregates_for(departments))
+
+    def get_department_statistics(self) -> Dict[Optional[str], Dict[str, Any]]:
+        """Агрегаты каждого отделения для головного офиса: строки отчетов не загружаются"""
+
+        result: Dict[Optional[str], Dict[str, Any]] = {}
+        for source in (self.report_storage.department_aggregates(), self.archive.department_aggregates()):
+            for department, aggregates in source.items():
+                merge_aggregates(result.setdefault(department, empty_aggregates()), aggregates)
+        return result
+
+    def get_statistics(self, departments: Optional[Iterable[Optional[str]]] = None) -> Dict[str, Any]:
+
+        # Агрегаты оперативных сегментов и архива берутся из манифестов без чтения отчетов
+        departments = self._scope(departments)
+        aggregates = self.get_aggregates(departments)
+        archived = self.archive.aggregates_for(departments)
+
+        total_reports = aggregates["total"]
+        status_counts = {status.value: aggregates["status_counts"].get(status.value, 0)
+                         for status in CreditStatus}
+
+        partitions = partition_set(departments)
+        # Заемщики считаются по манифесту разделов, файлы заемщиков не читаются
+        total_borrowers = sum(count for partition, count in self.borrower_counts().items()
+                              if partitions is None or partition in partitions)
 
         return {
             "total_users": len(self.users),
-            "total_borrowers": len(self.borrowers),
+            "total_borrowers": total_borrowers,
             "total_reports": total_reports,
+            "archived_reports": archived["total"],
             "status_counts": status_counts,
-            "avg_credit_score": sum(r.score for r in self.reports) / total_reports if total_reports > 0 else 0,
-            "avg_loan_amount": sum(r.max_loan_amount for r in self.reports) / total_reports if total_reports > 0 else 0
-        }
\ No newline at end of file
+            "avg_credit_score": aggregates["score_sum"] / total_reports if total_reports > 0 else 0,
+            "avg_loan_amount": aggregates["loan_sum"] / total_reports if total_reports > 0 else 0
+        }
@@ -0,0 +1,336 @@
+import inspect
+import os
+import pickle
+import socket
+import socketserver
+import struct
+import threading
+import types
+from typing import List, Dict, Any, Optional, Tuple
+from .data_controller import DataController, Pipeline, resolve_path
+from .change_feed import ChangeFeed
+from .report_archive import ReportArchive
+from .report_history import ReportHistory
+from .report_storage import ReportStorage
+from .report_index import SearchIndexRegistry
+
+# Если переменная задана, приложение и API работают через сервер данных на этом сокете
+SOCKET_ENV = "CREDIT_DATA_SERVER_SOCKET"
+POOL_SIZE = int(os.environ.get("CREDIT_DATA_SERVER_POOL_SIZE", "4"))
+CLIENT_TIMEOUT_SECONDS = 60.0
+
+# Сколько запросов конвейера отправляется до чтения ответов: ограничивает объем
+# неподтвержденных данных, чтобы клиент и сервер не заблокировали друг друга на записи
+PIPELINE_WINDOW = 64
+
+# Кадр: длина тела, номер запроса, тип запроса (или статус ответа); тело - pickle
+HEADER = struct.Struct("!IIB")
+KIND_CALL = 0
+KIND_GET = 1
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# Компоненты DataController, к которым клиент обращается как к вложенным объектам
+COMPONENTS = {
+    "archive": ReportArchive,
+    "report_history": ReportHistory,
+    "report_storage": ReportStorage
+}
+
+
+class DataServerError(ConnectionError):
+    pass
+
+
+class _DataRequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+
+        reader = self.request.makefile("rb")
+        try:
+            while True:
+                header = reader.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return
+                length, request_id, kind = HEADER.unpack(header)
+                status, body = self.server.dispatch(kind, reader.read(length))
+                self.request.sendall(HEADER.pack(len(body), request_id, status) + body)
+        except (ConnectionError, BrokenPipeError):
+            return
+        finally:
+            reader.close()
+
+
+class DataServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Локальный сервер данных: один DataController в памяти для нескольких процессов приложения.
+
+    Тела кадров - pickle, поэтому сокет доступен только владельцу процесса.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, data_controller: DataController, socket_path: str):
+        self.data_controller = data_controller
+        self.socket_path = socket_path
+
+        if os.path.exists(socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                # Сокет остался от завершившегося сервера
+                os.unlink(socket_path)
+            else:
+                raise RuntimeError(f"Сервер данных уже запущен: {socket_path}")
+            finally:
+                probe.close()
+
+        super().__init__(socket_path, _DataRequestHandler)
+
+    def server_bind(self):
+
+        # Права задаются маской в момент bind: после chmod сокет успел бы побыть доступным всем.
+        # Маска общая для процесса, но сервер создается до запуска обрабатывающих потоков
+        previous = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(previous)
+
+    def dispatch(self, kind: int, body: bytes) -> Tuple[int, bytes]:
+
+        try:
+            request = pickle.loads(body)
+            if kind == KIND_GET:
+                value = resolve_path(self.data_controller, request)
+            else:
+                path, args, kwargs = request
+                value = resolve_path(self.data_controller, path)(*args, **kwargs)
+                # Генераторы (например, iter_reports) передаются списком
+                if isinstance(value, types.GeneratorType):
+                    value = list(value)
+            return STATUS_OK, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            try:
+                return STATUS_ERROR, pickle.dumps(e, pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                return STATUS_ERROR, pickle.dumps(RuntimeError(f"{type(e).__name__}: {e}"))
+
+    def server_close(self):
+
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class _Connection:
+
+    def __init__(self, socket_path: str):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(CLIENT_TIMEOUT_SECONDS)
+        self.sock.connect(socket_path)
+        self.reader = self.sock.makefile("rb")
+        self._next_id = 0
+
+    def _read_exact(self, size: int) -> bytes:
+
+        data = self.reader.read(size)
+        if len(data) < size:
+            raise DataServerError("Сервер данных закрыл соединение")
+        return data
+
+    def request_many(self, requests: List[Tuple[int, bytes]]) -> List[Tuple[int, bytes]]:
+
+        responses = []
+        for start in range(0, len(requests), PIPELINE_WINDOW):
+            window = requests[start:start + PIPELINE_WINDOW]
+
+            frames = []
+            request_ids = []
+            for kind, body in window:
+                self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+                request_ids.append(self._next_id)
+                frames.append(HEADER.pack(len(body), self._next_id, kind))
+                frames.append(body)
+            self.sock.sendall(b"".join(frames))
+
+            for request_id in request_ids:
+                length, response_id, status = HEADER.unpack(self._read_exact(HEADER.size))
+                body = self._read_exact(length)
+                if response_id != request_id:
+                    raise DataServerError("Нарушен порядок ответов сервера данных")
+                responses.append((status, body))
+        return responses
+
+    def close(self):
+
+        self.reader.close()
+        self.sock.close()
+
+
+class DataClientPool:
+    """Пул соединений с сервером данных, общий для всех сессий процесса"""
+
+    def __init__(self, socket_path: str, size: int = POOL_SIZE):
+        self.socket_path = socket_path
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: List[_Connection] = []
+        self._lock = threading.Lock()
+
+    def execute(self, requests: List[Tuple[int, bytes]]) -> List[Tuple[int, bytes]]:
+
+        with self._slots:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            try:
+                if connection is None:
+                    connection = _Connection(self.socket_path)
+                responses = connection.request_many(requests)
+            except OSError as e:
+                # Повторять запрос нельзя: сервер мог уже выполнить запись
+                if connection is not None:
+                    connection.close()
+                raise DataServerError(f"Сервер данных недоступен: {e}") from e
+
+            with self._lock:
+                self._idle.append(connection)
+            return responses
+
+    def close(self):
+
+        with self._lock:
+            for connection in self._idle:
+                connection.close()
+            self._idle.clear()
+
+
+_pools: Dict[str, DataClientPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(socket_path: str) -> DataClientPool:
+
+    with _pools_lock:
+        if socket_path not in _pools:
+            _pools[socket_path] = DataClientPool(socket_path)
+        return _pools[socket_path]
+
+
+def _is_method(cls: type, name: str) -> bool:
+
+    value = inspect.getattr_static(cls, name, None)
+    return isinstance(value, (types.FunctionType, staticmethod, classmethod))
+
+
+class _RemoteComponent:
+
+    def __init__(self, client: "RemoteDataController", prefix: str, cls: type):
+        self._client = client
+        self._prefix = prefix
+        self._cls = cls
+
+    def __getattr__(self, name: str):
+
+        if name.startswith("_"):
+            raise AttributeError(name)
+        path = f"{self._prefix}.{name}"
+        if _is_method(self._cls, name):
+            return lambda *args, **kwargs: self._client._call(path, *args, **kwargs)
+        return self._client._get(path)
+
+
+class RemoteDataController:
+    """Тонкий клиент сервера данных с интерфейсом DataController"""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self._pool = get_pool(socket_path)
+        self._data_dir: Optional[str] = None
+        self._changes: Optional[ChangeFeed] = None
+        # Индексы строятся в процессе клиента: они подписаны на его ленту изменений
+        self.search_indexes = SearchIndexRegistry(self)
+
+    def _execute_pipeline(self, requests: List[Tuple[str, str, tuple, dict]]) -> List[Any]:
+
+        encoded = []
+        for kind, path, args, kwargs in requests:
+            if kind == "get":
+                encoded.append((KIND_GET, pickle.dumps(path, pickle.HIGHEST_PROTOCOL)))
+            else:
+                encoded.append((KIND_CALL, pickle.dumps((path, args, kwargs), pickle.HIGHEST_PROTOCOL)))
+
+        results = []
+        error = None
+        for status, body in self._pool.execute(encoded):
+            try:
+                value = pickle.loads(body)
+            except Exception as e:
+                value, status = RuntimeError(f"Не удалось разобрать ответ сервера данных: {e}"), STATUS_ERROR
+            if status == STATUS_ERROR and error is None:
+                error = value
+            results.append(value)
+
+        # Ответы прочитаны целиком, поэтому соединение можно вернуть в пул и затем поднять ошибку
+        if error is not None:
+            raise error
+        return results
+
+    def pipeline(self) -> Pipeline:
+
+        return Pipeline(self._execute_pipeline)
+
+    def _call(self, path: str, *args, **kwargs) -> Any:
+
+        return self._execute_pipeline([("call", path, args, kwargs)])[0]
+
+    def _get(self, path: str) -> Any:
+
+        return self._execute_pipeline([("get", path, (), {})])[0]
+
+    @property
+    def data_dir(self) -> str:
+
+        if self._data_dir is None:
+            self._data_dir = self._get("data_dir")
+        return self._data_dir
+
+    @property
+    def changes(self) -> ChangeFeed:
+
+        # Лента читается из файла напрямую; подписчики получают только события этого процесса
+        if self._changes is None:
+            self._changes = ChangeFeed(os.path.join(self.data_dir, "changes"))
+        return self._changes
+
+    def preload(self, borrowers: bool = True):
+
+        # Данные уже загружены в процессе сервера
+        return None
+
+    def set_scope(self, departments):
+
+        # Сервер держит разделы всех отделов; доступ ограничивается фильтрами ReportController
+        return None
+
+    def iter_reports(self, include_archive: bool = False):
+
+        return iter(self._call("iter_reports", include_archive))
+
+    def __getattr__(self, name: str):
+
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in COMPONENTS:
+            return _RemoteComponent(self, name, COMPONENTS[name])
+        if _is_method(DataController, name):
+            return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+        return self._get(name)
+
+
+def open_data_controller(data_dir: Optional[str] = None):
+    """DataController процесса или клиент сервера данных, если задан CREDIT_DATA_SERVER_SOCKET"""
+
+    socket_path = os.environ.get(SOCKET_ENV)
+    if socket_path:
+        return RemoteDataController(socket_path)
+    return DataController(data_dir or os.environ.get("CREDIT_DATA_DIR", "data"))
@@ -0,0 +1,111 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, Any, Optional, List, Tuple
+
+# Файл производной структуры: префикс, заголовок JSON и выровненные массивы numpy.
+# Заголовок хранит контрольную сумму тела и метаданные, по которым владелец проверяет,
+# что снимок соответствует текущей версии данных
+MAGIC = b"CRDS"
+FORMAT_VERSION = 1
+PREFIX = struct.Struct("!4sHI")
+ALIGNMENT = 8
+
+
+class DerivedSnapshot:
+    """Прочитанный снимок: метаданные и массивы поверх отображенного в память файла"""
+
+    def __init__(self, meta: Dict[str, Any], arrays: Dict[str, Any]):
+        self.meta = meta
+        self.arrays = arrays
+
+
+def write_snapshot(path: str, meta: Dict[str, Any], arrays: Dict[str, Any]):
+
+    import numpy as np
+
+    layout = []
+    chunks = []
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        padding = (-offset) % ALIGNMENT
+        chunks.append(b"\0" * padding)
+        offset += padding
+        layout.append({"name": name, "dtype": array.dtype.str, "shape": list(array.shape), "offset": offset})
+        data = array.tobytes()
+        chunks.append(data)
+        offset += len(data)
+    body = b"".join(chunks)
+
+    header = json.dumps({"meta": meta, "arrays": layout, "size": len(body), "checksum": zlib.crc32(body)},
+                        ensure_ascii=False).encode("utf-8")
+    # Тело начинается с выровненного смещения, чтобы массивы читались из отображения без копирования
+    header += b" " * ((-(PREFIX.size + len(header))) % ALIGNMENT)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Снимки пишут несколько процессов и потоков: у каждого свой временный файл
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.write(body)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> Optional[DerivedSnapshot]:
+    """Снимок из файла или None, если файла нет, формат другой или контрольная сумма не сходится"""
+
+    import numpy as np
+
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        magic, version, header_length = PREFIX.unpack_from(mapped, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            return None
+        header = json.loads(mapped[PREFIX.size:PREFIX.size + header_length])
+        start = PREFIX.size + header_length
+        if start + header["size"] > len(mapped):
+            return None
+        with memoryview(mapped)[start:start + header["size"]] as body:
+            if zlib.crc32(body) != header["checksum"]:
+                return None
+
+        arrays = {}
+        for item in header["arrays"]:
+            dtype = np.dtype(item["dtype"])
+            count = int(np.prod(item["shape"], dtype=np.int64))
+            arrays[item["name"]] = np.frombuffer(mapped, dtype=dtype, count=count,
+                                                 offset=start + item["offset"]).reshape(item["shape"])
+        return DerivedSnapshot(header["meta"], arrays)
+    except (struct.error, ValueError, KeyError, TypeError):
+        return None
+
+
+def pack_strings(values: List[str]) -> Tuple[Any, Any]:
+    """Строки одним блоком UTF-8 и смещениями концов строк"""
+
+    import numpy as np
+
+    encoded = [value.encode("utf-8") for value in values]
+    ends = np.cumsum([len(value) for value in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), ends
+
+
+def unpack_strings(blob, ends) -> List[str]:
+
+    data = blob.tobytes()
+    result = []
+    start = 0
+    for end in ends.tolist():
+        result.append(data[start:end].decode("utf-8"))
+        start = end
+    return result
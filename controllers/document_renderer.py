@@ -0,0 +1,236 @@
+import hashlib
+import html
+import importlib.util
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from string import Template
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from models.borrower import Borrower
+from models.report import CreditReport
+
+DEFAULT_TEMPLATE_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "templates", "credit_report.html")
+
+DOCUMENT_FORMATS = ("html", "pdf")
+
+# Отчетов в одном задании для процесса и минимальный пакет, ради которого стоит поднимать пул
+RENDER_CHUNK_SIZE = 50
+MIN_POOL_BATCH = 200
+
+# PDF формируется через weasyprint, если он установлен
+PDF_AVAILABLE = importlib.util.find_spec("weasyprint") is not None
+
+# Шаблон компилируется один раз на процесс: в пуле - в инициализаторе воркера
+_worker_template: Optional[Template] = None
+
+
+def _init_worker(template_source: str):
+
+    global _worker_template
+    _worker_template = Template(template_source)
+
+
+def _money(value) -> str:
+    return f"{value:,.2f} ₽".replace(",", " ")
+
+
+def _document_context(report: Dict[str, Any], borrower: Optional[Dict[str, Any]]) -> Dict[str, str]:
+
+    borrower = borrower or {}
+    e = lambda value: html.escape(str(value)) if value not in (None, "") else "—"
+
+    created_at = datetime.fromisoformat(report["created_at"])
+    modified = "—"
+    if report.get("modified_at"):
+        modified = (f"{datetime.fromisoformat(report['modified_at']).strftime('%d.%m.%Y %H:%M')}, "
+                    f"{e(report.get('modified_by_name'))}")
+
+    recommendations = report.get("recommendations") or []
+
+    return {
+        "report_id": e(report["id"]),
+        "report_short_id": e(report["id"][:8]),
+        "created_at": created_at.strftime("%d.%m.%Y %H:%M"),
+        "borrower_name": e(report["borrower_name"]),
+        "passport": e(f"{borrower.get('passport_series', '')} {borrower.get('passport_number', '')}".strip()),
+        "birth_date": (datetime.fromisoformat(borrower["birth_date"]).strftime("%d.%m.%Y")
+                       if borrower.get("birth_date") else "—"),
+        "employment": e(", ".join(v for v in (borrower.get("employer_name"), borrower.get("position")) if v)),
+        "employment_years": e(borrower.get("employment_years")),
+        "phone": e(borrower.get("phone")),
+        "address": e(borrower.get("address")),
+        "income": _money(borrower["income"]) if "income" in borrower else "—",
+        "expenses": _money(borrower["expenses"]) if "expenses" in borrower else "—",
+        "existing_loans": _money(borrower["existing_loans"]) if "existing_loans" in borrower else "—",
+        "credit_history_score": e(borrower.get("credit_history_score")),
+        "status": e(report["status"]),
+        "score": e(report["score"]),
+        "max_loan_amount": _money(report["max_loan_amount"]),
+        "credit_attractiveness": e(report["credit_attractiveness"]),
+        "risk_level": e(report["risk_level"]),
+        "blacklist": "Найден" if report.get("blacklist_found") else "Не найден",
+        "rules_version": e(report.get("rules_version")),
+        "recommendations": "\n".join(f"  <li>{html.escape(r)}</li>" for r in recommendations) or "  <li>—</li>",
+        "modified": modified,
+        "notes": e(report.get("notes")),
+        "created_by_name": e(report["created_by_name"])
+    }
+
+
+def _write_file(path: str, data: bytes):
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _render_chunk(jobs: List[Tuple[Dict[str, Any], Optional[Dict[str, Any]], str, str, Tuple[str, ...]]]) \
+        -> List[Tuple[str, str, Dict[str, str], Optional[str]]]:
+    """Рендерит порцию отчетов в текущем процессе; ошибки возвращаются по каждому отчету"""
+
+    results = []
+    for report, borrower, content_hash, output_dir, formats in jobs:
+        files: Dict[str, str] = {}
+        try:
+            document = _worker_template.substitute(_document_context(report, borrower))
+
+            if "html" in formats:
+                path = os.path.join(output_dir, "html", f"{report['id']}.html")
+                _write_file(path, document.encode("utf-8"))
+                files["html"] = path
+
+            if "pdf" in formats:
+                from weasyprint import HTML
+
+                path = os.path.join(output_dir, "pdf", f"{report['id']}.pdf")
+                _write_file(path, HTML(string=document).write_pdf())
+                files["pdf"] = path
+
+            results.append((report["id"], content_hash, files, None))
+        except Exception as e:
+            results.append((report["id"], content_hash, files, str(e)))
+    return results
+
+
+class DocumentRenderer:
+    """Печатные документы по кредитным отчетам: пакетный рендер в пуле процессов с пропуском неизмененных"""
+
+    def __init__(self, output_dir: str, template_file: str = DEFAULT_TEMPLATE_FILE,
+                 max_workers: Optional[int] = None, chunk_size: int = RENDER_CHUNK_SIZE):
+        self.output_dir = output_dir
+        self.manifest_file = os.path.join(output_dir, "manifest.json")
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+
+        with open(template_file, "r", encoding="utf-8") as f:
+            self.template_source = f.read()
+        self.template_hash = hashlib.sha256(self.template_source.encode("utf-8")).hexdigest()
+
+        for document_format in DOCUMENT_FORMATS:
+            os.makedirs(os.path.join(output_dir, document_format), exist_ok=True)
+
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Any]:
+
+        if os.path.exists(self.manifest_file):
+            try:
+                with open(self.manifest_file, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                pass
+        return {"documents": {}}
+
+    def _save_manifest(self):
+
+        _write_file(self.manifest_file,
+                    json.dumps(self.manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    def content_hash(self, report_data: Dict[str, Any], borrower_data: Optional[Dict[str, Any]]) -> str:
+
+        # В хэш входят шаблон и все данные документа: совпадение означает идентичный результат
+        payload = json.dumps([self.template_hash, report_data, borrower_data],
+                             ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _is_current(self, report_id: str, content_hash: str, formats: Tuple[str, ...]) -> bool:
+
+        entry = self.manifest["documents"].get(report_id)
+        if not entry or entry["hash"] != content_hash:
+            return False
+        return all(document_format in entry["files"] and os.path.exists(entry["files"][document_format])
+                   for document_format in formats)
+
+    def render_reports(self, pairs: Iterable[Tuple[CreditReport, Optional[Borrower]]],
+                       formats: Tuple[str, ...] = ("html",)) -> Dict[str, Any]:
+
+        formats = tuple(formats)
+        unknown = [f for f in formats if f not in DOCUMENT_FORMATS]
+        if unknown:
+            raise ValueError(f"Неизвестный формат документа: {', '.join(unknown)}")
+        if "pdf" in formats and not PDF_AVAILABLE:
+            raise RuntimeError("Для PDF требуется пакет weasyprint")
+
+        started = time.perf_counter()
+        jobs = []
+        skipped = 0
+
+        for report, borrower in pairs:
+            report_data = report.to_dict()
+            borrower_data = borrower.to_dict() if borrower else None
+            content_hash = self.content_hash(report_data, borrower_data)
+
+            if self._is_current(report.id, content_hash, formats):
+                skipped += 1
+                continue
+            jobs.append((report_data, borrower_data, content_hash, self.output_dir, formats))
+
+        chunks = [jobs[i:i + self.chunk_size] for i in range(0, len(jobs), self.chunk_size)]
+
+        # Небольшие пакеты дешевле отрисовать на месте, чем запускать процессы;
+        # с одним процессом пул тоже ничего не дает
+        workers = self.max_workers or os.cpu_count() or 1
+        if len(jobs) < MIN_POOL_BATCH or workers == 1:
+            _init_worker(self.template_source)
+            results = [result for chunk in chunks for result in _render_chunk(chunk)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(self.template_source,)) as pool:
+                results = [result for chunk_results in pool.map(_render_chunk, chunks)
+                           for result in chunk_results]
+
+        errors = {}
+        for report_id, content_hash, files, error in results:
+            if error:
+                errors[report_id] = error
+                continue
+            previous = self.manifest["documents"].get(report_id)
+            if previous and previous["hash"] == content_hash:
+                files = {**previous["files"], **files}
+            self.manifest["documents"][report_id] = {
+                "hash": content_hash,
+                "files": files,
+                "rendered_at": datetime.now().isoformat()
+            }
+
+        self._save_manifest()
+
+        return {
+            "rendered": len(results) - len(errors),
+            "skipped": skipped,
+            "failed": len(errors),
+            "errors": errors,
+            "elapsed": round(time.perf_counter() - started, 3)
+        }
+
+    def render_report(self, report: CreditReport, borrower: Optional[Borrower],
+                      document_format: str = "html") -> Optional[str]:
+
+        result = self.render_reports([(report, borrower)], formats=(document_format,))
+        if result["failed"]:
+            raise RuntimeError(result["errors"][report.id])
+        return self.manifest["documents"][report.id]["files"].get(document_format)
@@ -0,0 +1,354 @@
+import csv
+import io
+import math
+import os
+import re
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from typing import Iterable, Iterator, List, Tuple, Callable, Any, Optional
+from xml.sax.saxutils import escape
+from models.borrower import Borrower
+from models.report import CreditReport
+from models.enums import CreditStatus
+
+# Сколько строк накапливается в буфере перед отдачей очередной порции
+EXPORT_CHUNK_ROWS = 500
+
+EXPORT_FORMATS = ("csv", "xlsx")
+
+# Кнопка скачивания Streamlit держит файл в памяти сессии целиком, поэтому выгрузки из интерфейса
+# ограничены по размеру; большие выгружаются скриптом scripts/export_reports.py прямо в файл
+EXPORT_UI_MAX_MB = float(os.environ.get("CREDIT_EXPORT_UI_MAX_MB", "50"))
+
+# Каталог подготовленных выгрузок и срок, после которого брошенный файл удаляется
+EXPORT_TEMP_DIR = os.environ.get("CREDIT_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "credit_exports"))
+EXPORT_FILE_TTL_SECONDS = 3600
+
+# С этих символов Excel начинает формулу: такие строки в CSV выводятся как текст
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+MIME_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+}
+
+Column = Tuple[str, Callable[[Any], Any]]
+
+REPORT_COLUMNS: List[Column] = [
+    ("ID", lambda r: r.id),
+    ("Заемщик", lambda r: r.borrower_name),
+    ("Макс. сумма", lambda r: r.max_loan_amount),
+    ("Привлекательность", lambda r: r.credit_attractiveness),
+    ("Риск", lambda r: r.risk_level),
+    ("Статус", lambda r: r.status.value),
+    ("Балл", lambda r: r.score),
+    ("Создан", lambda r: r.created_at.strftime("%d.%m.%Y %H:%M")),
+    ("Автор", lambda r: r.created_by_name),
+    ("Изменен", lambda r: r.modified_at.strftime("%d.%m.%Y %H:%M") if r.modified_at else ""),
+    ("Изменил", lambda r: r.modified_by_name or ""),
+    ("Черный список", lambda r: "Да" if r.blacklist_found else "Нет"),
+    ("Примечания", lambda r: r.notes or ""),
+    ("Версия правил", lambda r: r.rules_version or "")
+]
+
+BORROWER_COLUMNS: List[Column] = [
+    ("ID", lambda b: b.id),
+    ("ФИО", lambda b: b.full_name),
+    ("Серия паспорта", lambda b: b.passport_series),
+    ("Номер паспорта", lambda b: b.passport_number),
+    ("Дата рождения", lambda b: b.birth_date.strftime("%d.%m.%Y")),
+    ("Доход", lambda b: b.income),
+    ("Расходы", lambda b: b.expenses),
+    ("Кредитная история", lambda b: b.credit_history_score),
+    ("Существующие кредиты", lambda b: b.existing_loans),
+    ("Стаж", lambda b: b.employment_years),
+    ("Работодатель", lambda b: b.employer_name),
+    ("Должность", lambda b: b.position),
+    ("Телефон", lambda b: b.phone),
+    ("Email", lambda b: b.email or ""),
+    ("Черный список", lambda b: "Да" if b.blacklisted else "Нет"),
+    ("Создан", lambda b: b.created_at.strftime("%d.%m.%Y %H:%M"))
+]
+
+# Управляющие символы недопустимы в XML и ломают файл Excel
+_XML_INVALID_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetData>'
+)
+_XLSX_SHEET_END = '</sheetData></worksheet>'
+
+
+class ExportTooLarge(ValueError):
+    """Выгрузка превысила допустимый размер файла"""
+
+
+class _ChunkSink(io.RawIOBase):
+    """Поток без перемотки: zipfile пишет в него, а генератор забирает накопленные байты"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ExportController:
+    """Потоковая выгрузка отчетов и заемщиков в CSV и XLSX порциями по chunk_rows строк.
+
+    Память формирования выгрузки ограничена порцией. Отдача файла через st.download_button
+    этого ограничения не дает: Streamlit читает файл целиком, поэтому в интерфейсе размер
+    ограничен EXPORT_UI_MAX_MB.
+    """
+
+    def __init__(self, chunk_rows: int = EXPORT_CHUNK_ROWS):
+        self.chunk_rows = chunk_rows
+
+    @staticmethod
+    def rows(items: Iterable, columns: List[Column]) -> Iterator[List[Any]]:
+
+        for item in items:
+            yield [getter(item) for _, getter in columns]
+
+    @staticmethod
+    def _csv_cell(value):
+
+        if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+            return "'" + value
+        return value
+
+    def stream_csv(self, header: List[str], rows: Iterable[List[Any]]) -> Iterator[bytes]:
+
+        buffer = io.StringIO()
+        # BOM и разделитель ";" нужны, чтобы Excel сразу открыл файл с кириллицей по колонкам
+        buffer.write("\ufeff")
+        writer = csv.writer(buffer, delimiter=";")
+        writer.writerow(header)
+
+        csv_cell = self._csv_cell
+        pending = 0
+        for row in rows:
+            writer.writerow([csv_cell(value) for value in row])
+            pending += 1
+            if pending >= self.chunk_rows:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+
+        yield buffer.getvalue().encode("utf-8")
+
+    @staticmethod
+    def _xlsx_cell(value) -> str:
+
+        if isinstance(value, bool):
+            value = "Да" if value else "Нет"
+        if isinstance(value, float) and not math.isfinite(value):
+            # NaN и бесконечность недопустимы в числовой ячейке: Excel считает такой файл поврежденным
+            return "<c/>"
+        if isinstance(value, (int, float)):
+            return f"<c><v>{value!r}</v></c>"
+        text = escape(_XML_INVALID_CHARS.sub("", str(value)))
+        return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+    def stream_xlsx(self, header: List[str], rows: Iterable[List[Any]],
+                    sheet_name: str = "Выгрузка") -> Iterator[bytes]:
+
+        sink = _ChunkSink()
+
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES)
+            archive.writestr("_rels/.rels", _XLSX_ROOT_RELS)
+            archive.writestr("xl/workbook.xml", _XLSX_WORKBOOK.format(sheet_name=escape(sheet_name)))
+            archive.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS)
+            archive.writestr("xl/styles.xml", _XLSX_STYLES)
+
+            # Лист пишется потоком: размер заранее неизвестен, поэтому включается zip64
+            with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+                header_cells = "".join(
+                    f'<c t="inlineStr" s="1"><is><t>{escape(name)}</t></is></c>' for name in header)
+                sheet.write(f"{_XLSX_SHEET_START}<row>{header_cells}</row>".encode("utf-8"))
+
+                parts = []
+                for row in rows:
+                    parts.append("<row>" + "".join(self._xlsx_cell(value) for value in row) + "</row>")
+                    if len(parts) >= self.chunk_rows:
+                        sheet.write("".join(parts).encode("utf-8"))
+                        parts = []
+                        yield sink.drain()
+
+                parts.append(_XLSX_SHEET_END)
+                sheet.write("".join(parts).encode("utf-8"))
+
+        yield sink.drain()
+
+    def stream(self, items: Iterable, columns: List[Column], export_format: str) -> Iterator[bytes]:
+
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Неизвестный формат выгрузки: {export_format}")
+
+        header = [name for name, _ in columns]
+        rows = self.rows(items, columns)
+        if export_format == "csv":
+            return self.stream_csv(header, rows)
+        return self.stream_xlsx(header, rows)
+
+    def stream_reports(self, reports: Iterable[CreditReport], export_format: str) -> Iterator[bytes]:
+
+        return self.stream(reports, REPORT_COLUMNS, export_format)
+
+    def stream_borrowers(self, borrowers: Iterable[Borrower], export_format: str) -> Iterator[bytes]:
+
+        return self.stream(borrowers, BORROWER_COLUMNS, export_format)
+
+    @staticmethod
+    def write_to_file(chunks: Iterable[bytes], path: str, max_bytes: Optional[int] = None) -> int:
+
+        written = 0
+        with open(path, "wb") as f:
+            for chunk in chunks:
+                written += len(chunk)
+                if max_bytes is not None and written > max_bytes:
+                    raise ExportTooLarge(f"Выгрузка больше {max_bytes / (1 << 20):.0f} МБ")
+                f.write(chunk)
+        return written
+
+    def export_to_temp_file(self, chunks: Iterable[bytes], export_format: str,
+                            temp_dir: str = EXPORT_TEMP_DIR, max_bytes: Optional[int] = None) -> str:
+
+        os.makedirs(temp_dir, exist_ok=True)
+        self.cleanup_temp_files(temp_dir)
+        fd, path = tempfile.mkstemp(prefix="export_", suffix=f".{export_format}", dir=temp_dir)
+        os.close(fd)
+        try:
+            self.write_to_file(chunks, path, max_bytes)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path
+
+    @staticmethod
+    def remove_temp_file(path: Optional[str]):
+
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def cleanup_temp_files(temp_dir: str = EXPORT_TEMP_DIR,
+                           max_age: float = EXPORT_FILE_TTL_SECONDS) -> int:
+        """Удаляет выгрузки, которые так и не скачали: сессия могла закрыться до нажатия кнопки"""
+
+        if not os.path.isdir(temp_dir):
+            return 0
+
+        removed = 0
+        deadline = time.time() - max_age
+        for name in os.listdir(temp_dir):
+            path = os.path.join(temp_dir, name)
+            try:
+                if name.startswith("export_") and os.path.getmtime(path) < deadline:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                # Файл уже удалила другая сессия
+                continue
+        return removed
+
+    @staticmethod
+    def file_name(prefix: str, export_format: str) -> str:
+
+        return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M')}.{export_format}"
+
+
+def filter_reports(reports: Iterable[CreditReport],
+                   statuses: Optional[List[CreditStatus]] = None,
+                   since: Optional[datetime] = None,
+                   until: Optional[datetime] = None,
+                   created_by: Optional[str] = None) -> Iterator[CreditReport]:
+    """Ленивый фильтр: отчеты проверяются по одному, без промежуточных списков"""
+
+    for report in reports:
+        if statuses and report.status not in statuses:
+            continue
+        if since and report.created_at < since:
+            continue
+        if until and report.created_at >= until:
+            continue
+        if created_by and report.created_by != created_by:
+            continue
+        yield report
@@ -0,0 +1,115 @@
+from typing import Dict, Any, Optional, Sequence
+from models.borrower import Borrower
+from .credit_controller import CreditController
+
+# Сетка кредитных продуктов по умолчанию; переопределяется разделом loan_products правил скоринга
+DEFAULT_TERMS_MONTHS = (12, 24, 36, 60, 84)
+DEFAULT_ANNUAL_RATES = (0.12, 0.16, 0.20, 0.24, 0.28)
+# Предельная долговая нагрузка: доля дохода, которую могут занимать все платежи по кредитам
+DEFAULT_MAX_DTI = 0.5
+
+
+def annuity_factor(annual_rates, terms_months):
+    """Доля суммы кредита, которую составляет ежемесячный аннуитетный платеж; массивы транслируются"""
+
+    import numpy as np
+
+    monthly_rate = np.asarray(annual_rates, dtype=float) / 12
+    months = np.asarray(terms_months, dtype=float)
+    safe_rate = np.where(monthly_rate > 0, monthly_rate, 1.0)
+    factor = safe_rate / (1 - (1 + safe_rate) ** -months)
+    # Без процентов платеж - равные доли суммы
+    return np.where(monthly_rate > 0, factor, 1 / months)
+
+
+class LoanCalculator:
+    """Кредитный калькулятор по сетке срок x ставка: аннуитетный платеж, долговая нагрузка (DTI)
+    после нового кредита и предельная сумма при ограничении нагрузки.
+
+    Существующие кредиты заемщика считаются ежемесячными платежами, как в факторе долговой нагрузки скоринга.
+    """
+
+    def __init__(self, credit_controller: CreditController):
+        self.credit_controller = credit_controller
+
+    def settings(self) -> Dict[str, Any]:
+
+        products = self.credit_controller.rules.loan_products
+        return {
+            "terms_months": tuple(int(months) for months in products.get("terms_months", DEFAULT_TERMS_MONTHS)),
+            "annual_rates": tuple(float(rate) for rate in products.get("annual_rates", DEFAULT_ANNUAL_RATES)),
+            "max_dti": float(products.get("max_dti", DEFAULT_MAX_DTI))
+        }
+
+    def calculate_batch(self, borrowers: Sequence[Borrower], principals: Optional[Sequence[float]] = None,
+                        terms_months: Optional[Sequence[int]] = None,
+                        annual_rates: Optional[Sequence[float]] = None,
+                        max_dti: Optional[float] = None) -> Dict[str, Any]:
+        """Сетка для пакета заемщиков одним векторным проходом: оси borrower x term x rate.
+
+        principals - запрошенные суммы (например, максимальные суммы из анализа); без них
+        считается только предельная сумма.
+        """
+
+        import numpy as np
+
+        settings = self.settings()
+        terms = np.asarray(terms_months if terms_months is not None else settings["terms_months"], dtype=int)
+        rates = np.asarray(annual_rates if annual_rates is not None else settings["annual_rates"], dtype=float)
+        max_dti = settings["max_dti"] if max_dti is None else float(max_dti)
+
+        # Сетка приходит из конфигурации правил: ошибка в ней не должна превращаться в inf и nan в таблице
+        if terms.size == 0 or rates.size == 0:
+            raise ValueError("Сетка сроков и ставок не должна быть пустой")
+        if (terms <= 0).any():
+            raise ValueError("Срок кредита должен быть положительным")
+        if not np.isfinite(rates).all() or (rates < 0).any():
+            raise ValueError("Ставка должна быть неотрицательным числом")
+        if not np.isfinite(max_dti) or max_dti <= 0:
+            raise ValueError("Предельная долговая нагрузка должна быть положительной")
+
+        income = np.array([b.income for b in borrowers], dtype=float)[:, None, None]
+        existing = np.array([b.existing_loans for b in borrowers], dtype=float)[:, None, None]
+        has_income = income > 0
+        safe_income = np.where(has_income, income, 1.0)
+
+        factor = annuity_factor(rates[None, :], terms[:, None])[None, :, :]
+
+        # Предельная сумма: платеж, который остается до ограничения нагрузки, пересчитанный в сумму кредита
+        payment_room = np.maximum(0.0, max_dti * income - existing)
+        result = {
+            "terms_months": terms,
+            "annual_rates": rates,
+            "max_dti": max_dti,
+            "current_dti": np.where(has_income, existing / safe_income, np.inf)[:, 0, 0],
+            "max_principal": np.round(payment_room / factor, 2)
+        }
+
+        if principals is not None:
+            principal = np.asarray(principals, dtype=float)[:, None, None]
+            if principal.shape[0] != income.shape[0]:
+                raise ValueError("Число сумм не совпадает с числом заемщиков")
+            if not np.isfinite(principal).all() or (principal < 0).any():
+                raise ValueError("Сумма кредита должна быть неотрицательным числом")
+            payment = principal * factor
+            dti = np.where(has_income, (existing + payment) / safe_income, np.inf)
+            result.update({
+                "principal": principal[:, 0, 0],
+                "payment": np.round(payment, 2),
+                "total_paid": np.round(payment * terms[None, :, None], 2),
+                "dti": dti,
+                "within_cap": dti <= max_dti
+            })
+        return result
+
+    def calculate(self, borrower: Borrower, principal: Optional[float] = None,
+                  terms_months: Optional[Sequence[int]] = None,
+                  annual_rates: Optional[Sequence[float]] = None,
+                  max_dti: Optional[float] = None) -> Dict[str, Any]:
+        """Сетка одного заемщика: массивы term x rate"""
+
+        grid = self.calculate_batch([borrower], None if principal is None else [principal],
+                                    terms_months, annual_rates, max_dti)
+        return {key: value[0] if key in ("current_dti", "max_principal", "principal", "payment",
+                                         "total_paid", "dti", "within_cap") else value
+                for key, value in grid.items()}
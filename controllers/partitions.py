@@ -0,0 +1,43 @@
+import hashlib
+import os
+from typing import List, Optional, Iterable, Set
+from models.user import User
+from models.enums import UserRole
+
+# Руководитель этого отдела видит данные всех отделений
+HEAD_OFFICE_DEPARTMENT = os.environ.get("CREDIT_HEAD_OFFICE_DEPARTMENT", "Головной офис")
+
+# Раздел для записей без отдела
+COMMON_PARTITION = "common"
+
+
+def normalize_department(department: Optional[str]) -> Optional[str]:
+
+    department = (department or "").strip()
+    return department or None
+
+
+def partition_id(department: Optional[str]) -> str:
+    """Имя раздела отдела в путях файлов: название отдела - произвольный текст"""
+
+    department = normalize_department(department)
+    if department is None:
+        return COMMON_PARTITION
+    return "dept-" + hashlib.sha1(department.encode("utf-8")).hexdigest()[:12]
+
+
+def partition_set(departments: Optional[Iterable[Optional[str]]]) -> Optional[Set[str]]:
+    """Разделы отделов; None - все разделы"""
+
+    if departments is None:
+        return None
+    return {partition_id(department) for department in departments}
+
+
+def user_departments(user: User) -> Optional[List[Optional[str]]]:
+    """Отделы, данные которых нужны пользователю; None - все отделы (головной офис)"""
+
+    department = normalize_department(user.department)
+    if user.role == UserRole.BANK_MANAGER and department == HEAD_OFFICE_DEPARTMENT:
+        return None
+    return [department]
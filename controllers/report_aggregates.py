@@ -0,0 +1,52 @@
+from typing import Dict, Any
+from models.report import CreditReport
+from models.enums import CreditStatus
+
+CREATOR_FIELDS = ("total", "approved", "rejected", "total_amount")
+
+
+def empty_aggregates() -> Dict[str, Any]:
+
+    return {
+        "total": 0,
+        "status_counts": {},
+        "attractiveness_counts": {},
+        "score_sum": 0,
+        "loan_sum": 0.0,
+        "by_creator": {}
+    }
+
+
+def fold_report(aggregates: Dict[str, Any], report: CreditReport):
+
+    aggregates["total"] += 1
+    aggregates["status_counts"][report.status.value] = \
+        aggregates["status_counts"].get(report.status.value, 0) + 1
+    aggregates["attractiveness_counts"][report.credit_attractiveness] = \
+        aggregates["attractiveness_counts"].get(report.credit_attractiveness, 0) + 1
+    aggregates["score_sum"] += report.score
+    aggregates["loan_sum"] += report.max_loan_amount
+
+    creator = aggregates["by_creator"].setdefault(report.created_by, {field: 0 for field in CREATOR_FIELDS})
+    creator["total"] += 1
+    creator["total_amount"] += report.max_loan_amount
+    if report.status == CreditStatus.APPROVED:
+        creator["approved"] += 1
+    elif report.status == CreditStatus.REJECTED:
+        creator["rejected"] += 1
+
+
+def merge_aggregates(target: Dict[str, Any], source: Dict[str, Any]) -> Dict[str, Any]:
+    """Складывает агрегаты source в target: счетчики суммируются по ключам"""
+
+    target["total"] += source["total"]
+    for field in ("status_counts", "attractiveness_counts"):
+        for key, count in source[field].items():
+            target[field][key] = target[field].get(key, 0) + count
+    target["score_sum"] += source["score_sum"]
+    target["loan_sum"] += source["loan_sum"]
+    for user_id, stats in source["by_creator"].items():
+        creator = target["by_creator"].setdefault(user_id, {field: 0 for field in CREATOR_FIELDS})
+        for field in CREATOR_FIELDS:
+            creator[field] += stats[field]
+    return target
@@ -0,0 +1,355 @@
+import copy
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import List, Dict, Any, Iterator, Optional, Iterable, Callable
+from models.report import CreditReport
+from .derived_store import write_snapshot, read_snapshot
+from .partitions import partition_set, partition_id, normalize_department
+from .report_aggregates import empty_aggregates, fold_report, merge_aggregates
+from .report_distributions import ReportDistributions
+
+
+class ReportArchive:
+    """Архив завершенных отчетов: сжатые помесячные сегменты только для чтения"""
+
+    MANIFEST_VERSION = 1
+    COLUMNS = [
+        "id", "borrower_id", "borrower_name", "max_loan_amount", "credit_attractiveness",
+        "risk_level", "status", "created_by", "created_by_name", "created_at",
+        "modified_at", "modified_by", "modified_by_name", "recommendations",
+        "blacklist_check", "blacklist_found", "score", "notes", "rules_version", "factor_scores",
+        "department"
+    ]
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        self.manifest_file = os.path.join(root_dir, "manifest.json")
+
+        os.makedirs(root_dir, exist_ok=True)
+
+        self.manifest = self._load_manifest()
+        self._segment_cache: Dict[str, List[CreditReport]] = {}
+        self._segment_ids: Dict[str, Any] = {}
+        self._distributions: Optional[ReportDistributions] = None
+        self._department_distributions: Dict[str, ReportDistributions] = {}
+
+    @staticmethod
+    def segment_key(created_at: datetime) -> str:
+        return created_at.strftime("%Y-%m")
+
+    def _segment_file(self, key: str) -> str:
+        return os.path.join(self.root_dir, f"{key}.json.gz")
+
+    def _ids_file(self, key: str) -> str:
+        return os.path.join(self.root_dir, f"{key}.ids")
+
+    def _load_manifest(self) -> Dict[str, Any]:
+
+        if os.path.exists(self.manifest_file):
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                pass
+        return {
+            "version": self.MANIFEST_VERSION,
+            "segments": {},
+            "borrowers": {},
+            "aggregates": empty_aggregates(),
+            "departments": {}
+        }
+
+    def _save_manifest(self):
+
+        tmp_path = f"{self.manifest_file}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_file)
+
+    @property
+    def aggregates(self) -> Dict[str, Any]:
+        return self.manifest["aggregates"]
+
+    def count(self) -> int:
+        return self.aggregates["total"]
+
+    @property
+    def distributions(self) -> ReportDistributions:
+
+        if self._distributions is None:
+            if "distributions" in self.manifest:
+                self._distributions = ReportDistributions.from_dict(self.manifest["distributions"])
+            else:
+                # Архив создан до появления скетчей: распределения строятся один раз по всем сегментам
+                self._distributions = ReportDistributions.from_reports(self.iter_reports())
+                self.manifest["distributions"] = self._distributions.to_dict()
+                self._save_manifest()
+        return self._distributions
+
+    @property
+    def has_departments(self) -> bool:
+        return "departments" in self.manifest
+
+    def build_departments(self, department_of: Callable[[CreditReport], Optional[str]]):
+        """Проставляет отдел отчетам архива, созданного до разделения по отделам, и строит агрегаты отделов"""
+
+        departments: Dict[str, Dict[str, Any]] = {}
+        distributions: Dict[str, ReportDistributions] = {}
+        for key in sorted(self.manifest["segments"]):
+            reports = self._read_segment(key)
+            for report in reports:
+                if report.department is None:
+                    report.department = normalize_department(department_of(report))
+                department_key = report.department or ""
+                fold_report(departments.setdefault(department_key, {"aggregates": empty_aggregates()})["aggregates"],
+                            report)
+                distributions.setdefault(department_key, ReportDistributions()).add(report)
+            self._write_segment(key, reports)
+            self._segment_cache.pop(key, None)
+
+        for department_key, entry in departments.items():
+            entry["distributions"] = distributions[department_key].to_dict()
+        self.manifest["departments"] = departments
+        self._department_distributions = distributions
+        self._save_manifest()
+
+    def _departments(self, departments: Optional[Iterable[Optional[str]]]) -> List[str]:
+
+        partitions = partition_set(departments)
+        return [key for key in self.manifest.get("departments", {})
+                if partitions is None or partition_id(key or None) in partitions]
+
+    def aggregates_for(self, departments: Optional[Iterable[Optional[str]]] = None) -> Dict[str, Any]:
+        """Агрегаты архива по отделам departments; None - по всему архиву"""
+
+        if departments is None:
+            return self.aggregates
+        aggregates = empty_aggregates()
+        for key in self._departments(departments):
+            merge_aggregates(aggregates, self.manifest["departments"][key]["aggregates"])
+        return aggregates
+
+    def department_aggregates(self) -> Dict[Optional[str], Dict[str, Any]]:
+
+        return {key or None: entry["aggregates"] for key, entry in self.manifest.get("departments", {}).items()}
+
+    def _department_distribution(self, key: str) -> ReportDistributions:
+
+        if key not in self._department_distributions:
+            self._department_distributions[key] = ReportDistributions.from_dict(
+                self.manifest["departments"][key]["distributions"])
+        return self._department_distributions[key]
+
+    def distributions_for(self, departments: Optional[Iterable[Optional[str]]] = None) -> ReportDistributions:
+
+        if departments is None:
+            return self.distributions
+        merged = ReportDistributions()
+        for key in self._departments(departments):
+            merged.merge(self._department_distribution(key))
+        return merged
+
+    def load_segment(self, key: str) -> List[CreditReport]:
+
+        if key in self._segment_cache:
+            return self._segment_cache[key]
+
+        reports = self._read_segment(key)
+        self._segment_cache[key] = reports
+        return reports
+
+    def _read_segment(self, key: str) -> List[CreditReport]:
+
+        path = self._segment_file(key)
+        if not os.path.exists(path):
+            return []
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        columns = data["columns"]
+        # Отчеты дописываются в конец сегмента, а манифест сохраняется последним: строки сверх числа
+        # в манифесте остались от записи, прерванной сбоем, и в архив не попали
+        count = self.manifest["segments"].get(key, {}).get("count", 0)
+        return [CreditReport.from_dict(dict(zip(columns, row))) for row in data["rows"][:count]]
+
+    def iter_reports(self) -> Iterator[CreditReport]:
+
+        # Сегменты читаются по одному и не попадают в кэш
+        for key in sorted(self.manifest["segments"]):
+            cached = self._segment_cache.get(key)
+            yield from cached if cached is not None else self._read_segment(key)
+
+    def _write_segment(self, key: str, reports: List[CreditReport]):
+
+        rows = []
+        for report in reports:
+            report_data = report.to_dict()
+            rows.append([report_data[column] for column in self.COLUMNS])
+
+        path = self._segment_file(key)
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump({"columns": self.COLUMNS, "rows": rows}, f,
+                      ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+        self._segment_cache[key] = reports
+
+    def add_reports(self, reports: List[CreditReport]) -> int:
+        """Дописывает отчеты в архив; отчеты, которые уже есть в архиве, пропускаются.
+        Возвращает число добавленных отчетов"""
+
+        if not self.has_departments:
+            self.build_departments(lambda report: None)
+
+        # Агрегаты и скетчи собираются в копиях и подменяются целиком: читатели без блокировки
+        # видят либо прежнее, либо новое состояние архива
+        distributions = ReportDistributions.from_dict(self.distributions.to_dict())
+        aggregates = copy.deepcopy(self.aggregates)
+        departments = {key: {"aggregates": copy.deepcopy(entry["aggregates"])}
+                       for key, entry in self.manifest["departments"].items()}
+        department_distributions: Dict[str, ReportDistributions] = {}
+        segments = dict(self.manifest["segments"])
+
+        by_segment: Dict[str, List[CreditReport]] = {}
+        for report in reports:
+            by_segment.setdefault(self.segment_key(report.created_at), []).append(report)
+
+        added = 0
+        for key in list(by_segment):
+            # Повтор переноса после сбоя между записью архива и оперативного сегмента
+            # не должен второй раз добавить отчеты и учесть их в агрегатах
+            archived_ids = {report.id for report in self.load_segment(key)}
+            segment_reports = []
+            for report in by_segment[key]:
+                if report.id not in archived_ids:
+                    archived_ids.add(report.id)
+                    segment_reports.append(report)
+            if not segment_reports:
+                del by_segment[key]
+                continue
+            by_segment[key] = segment_reports
+            added += len(segment_reports)
+
+        if not added:
+            return 0
+
+        for key, segment_reports in by_segment.items():
+            self._write_segment(key, self.load_segment(key) + segment_reports)
+            self._write_segment_ids(key, self._segment_cache[key])
+            segments[key] = {
+                "file": os.path.basename(self._segment_file(key)),
+                "count": len(self._segment_cache[key])
+            }
+
+            for report in segment_reports:
+                borrower_segments = self.manifest["borrowers"].setdefault(report.borrower_id, [])
+                if key not in borrower_segments:
+                    borrower_segments.append(key)
+                fold_report(aggregates, report)
+                distributions.add(report)
+
+                department_key = report.department or ""
+                fold_report(departments.setdefault(department_key, {"aggregates": empty_aggregates()})["aggregates"],
+                            report)
+                if department_key not in department_distributions:
+                    department_distributions[department_key] = (
+                        ReportDistributions.from_dict(self._department_distribution(department_key).to_dict())
+                        if department_key in self.manifest["departments"] else ReportDistributions())
+                department_distributions[department_key].add(report)
+
+        for department_key, entry in departments.items():
+            if department_key in department_distributions:
+                entry["distributions"] = department_distributions[department_key].to_dict()
+            else:
+                entry["distributions"] = self.manifest["departments"][department_key]["distributions"]
+
+        self.manifest = dict(self.manifest, segments=segments, aggregates=aggregates, departments=departments,
+                             distributions=distributions.to_dict())
+        self._distributions = distributions
+        self._department_distributions = {**self._department_distributions, **department_distributions}
+        self._save_manifest()
+        return added
+
+    def reassign_borrowers(self, borrower_ids: Dict[str, str]) -> int:
+
+        # Перезаписываются только сегменты, где по индексу встречаются объединяемые заемщики
+        keys = sorted({key for old_id in borrower_ids
+                       for key in self.manifest["borrowers"].get(old_id, [])})
+
+        updated = 0
+        for key in keys:
+            reports = self.load_segment(key)
+            for report in reports:
+                if report.borrower_id in borrower_ids:
+                    report.borrower_id = borrower_ids[report.borrower_id]
+                    updated += 1
+            self._write_segment(key, reports)
+
+        for old_id, new_id in borrower_ids.items():
+            old_segments = self.manifest["borrowers"].pop(old_id, [])
+            if old_segments:
+                new_segments = self.manifest["borrowers"].setdefault(new_id, [])
+                new_segments.extend(key for key in old_segments if key not in new_segments)
+
+        self._save_manifest()
+        return updated
+
+    def _write_segment_ids(self, key: str, reports: List[CreditReport]):
+
+        import numpy as np
+
+        ids = np.array(sorted(report.id.encode("utf-8") for report in reports), dtype=bytes)
+        # Состав сегмента архива меняет только дописывание отчетов, поэтому индекс сверяется по их числу
+        write_snapshot(self._ids_file(key), {"segment_count": len(reports)}, {"ids": ids})
+        self._segment_ids[key] = ids
+
+    def _load_segment_ids(self, key: str):
+
+        count = self.manifest["segments"][key]["count"]
+        ids = self._segment_ids.get(key)
+        if ids is not None and len(ids) == count:
+            return ids
+
+        snapshot = read_snapshot(self._ids_file(key))
+        if snapshot is not None and snapshot.meta.get("segment_count") == count:
+            self._segment_ids[key] = snapshot.arrays["ids"]
+        else:
+            # Архив записан до появления индексов id: индекс строится по сегменту один раз
+            self._write_segment_ids(key, self._read_segment(key))
+        return self._segment_ids[key]
+
+    def locate(self, report_id: str) -> Optional[str]:
+        """Ключ сегмента архива с отчетом report_id по индексам id без чтения сегментов"""
+
+        import numpy as np
+
+        needle = report_id.encode("utf-8")
+        for key in sorted(self.manifest["segments"], reverse=True):
+            ids = self._load_segment_ids(key)
+            if not len(ids) or len(needle) > ids.dtype.itemsize:
+                continue
+            position = int(np.searchsorted(ids, needle))
+            if position < len(ids) and ids[position] == needle:
+                return key
+        return None
+
+    def get_report_by_id(self, report_id: str) -> Optional[CreditReport]:
+
+        key = self.locate(report_id)
+        if key is None:
+            return None
+        for report in self.load_segment(key):
+            if report.id == report_id:
+                return report
+        return None
+
+    def get_reports_by_borrower(self, borrower_id: str) -> List[CreditReport]:
+
+        # Индекс заемщиков в манифесте позволяет открыть только нужные сегменты
+        reports = []
+        for key in self.manifest["borrowers"].get(borrower_id, []):
+            reports.extend(r for r in self.load_segment(key) if r.borrower_id == borrower_id)
+        return reports
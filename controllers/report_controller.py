@@ -1,26 +1,86 @@
-from typing import List, Optional
+from dataclasses import replace
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Iterable, Tuple
 from models.report import CreditReport
 from models.enums import CreditStatus
 from .data_controller import DataController
+from .partitions import partition_id, partition_set
+from .report_aggregates import CREATOR_FIELDS
+from .report_index import SEARCH_LIMIT
+from .report_query import QueryResult
+from .scoring_rules import FACTOR_NAMES
+
+FACTOR_GROUPINGS = ("created_by", "status", "month")
+
+# Интервалы распределений баллов факторов: 0-9, 10-19, ..., 90-99 и 100
+FACTOR_HISTOGRAM_BINS = 11
+
+# Переходы статусов, доступные руководителю при массовых действиях
+ALLOWED_TRANSITIONS = {
+    CreditStatus.IN_PROGRESS: {CreditStatus.PENDING},
+    CreditStatus.PENDING: {CreditStatus.APPROVED, CreditStatus.REJECTED, CreditStatus.NEEDS_CORRECTION},
+    CreditStatus.NEEDS_CORRECTION: {CreditStatus.PENDING, CreditStatus.APPROVED, CreditStatus.REJECTED},
+    CreditStatus.APPROVED: {CreditStatus.NEEDS_CORRECTION},
+    CreditStatus.REJECTED: {CreditStatus.NEEDS_CORRECTION}
+}
+
+# Отправка сотруднику: одобренный отчет сохраняет статус, отчет на исправлении возвращается на рассмотрение
+SEND_TRANSITIONS = {
+    CreditStatus.APPROVED: CreditStatus.APPROVED,
+    CreditStatus.NEEDS_CORRECTION: CreditStatus.PENDING
+}
 
 
 class ReportController:
 
-    def __init__(self, data_controller: DataController):
+    def __init__(self, data_controller: DataController, departments: Optional[Iterable[Optional[str]]] = None):
         self.data_controller = data_controller
+        # Отделы, отчеты которых доступны пользователю; None - все отделы (головной офис).
+        # Сервер данных хранит все разделы, поэтому отчеты фильтруются и здесь
+        self.departments = list(departments) if departments is not None else None
+        self._partitions = partition_set(self.departments)
+
+    def _in_scope(self, reports: List[CreditReport]) -> List[CreditReport]:
+
+        if self._partitions is None:
+            return reports
+        return [r for r in reports if partition_id(r.department) in self._partitions]
+
+    def get_reports_for_user(self, user_id: str, user_role: str,
+                             since: Optional[datetime] = None) -> List[CreditReport]:
 
-    def get_reports_for_user(self, user_id: str, user_role: str) -> List[CreditReport]:
+        if since is not None:
+            reports = self._in_scope(self.data_controller.get_reports_since(since))
+            if user_role == "Сотрудник кредитного отдела":
+                return [r for r in reports if r.created_by == user_id]
+            return reports
 
         if user_role == "Сотрудник кредитного отдела":
 
             return self.data_controller.get_reports_by_creator(user_id)
         else:
 
-            return self.data_controller.get_all_reports()
+            return self._in_scope(self.data_controller.get_all_reports())
 
-    def get_report_by_id(self, report_id: str) -> Optional[CreditReport]:
+    def get_report_by_id(self, report_id: str, created_at: Optional[datetime] = None) -> Optional[CreditReport]:
 
-        return self.data_controller.get_report_by_id(report_id)
+        report = self.data_controller.get_report_by_id(report_id, created_at)
+        return report if report is not None and self._in_scope([report]) else None
+
+    def search_open_reports(self, query: str = "", statuses: Optional[Iterable[CreditStatus]] = None,
+                            sort: str = "age", descending: bool = False,
+                            limit: int = SEARCH_LIMIT) -> Tuple[List[Dict[str, Any]], int]:
+
+        # Индекс общий для ReportController с той же областью и строится при первом поиске
+        index = self.data_controller.search_indexes.get(self.departments)
+        return index.search(query, statuses, sort, descending, limit)
+
+    def query_reports(self, expression: str) -> QueryResult:
+        """Отчеты, подходящие под выражение фильтра (см. report_query), и план выполнения"""
+
+        result = self.data_controller.query_reports(expression, self.departments)
+        result.reports = self._in_scope(result.reports)
+        return result
 
     def update_report_status(self, report_id: str, status: CreditStatus,
                              modified_by: str, modified_by_name: str,
@@ -30,6 +90,9 @@ class ReportController:
         if not report:
             return False
 
+        # Изменения вносятся в копию, чтобы в историю попала разница с прежней версией
+        report = replace(report)
+
         from datetime import datetime
         report.status = status
         report.modified_at = datetime.now()
@@ -50,6 +113,9 @@ class ReportController:
         if not report:
             return False
 
+        # Изменения вносятся в копию, чтобы в историю попала разница с прежней версией
+        report = replace(report)
+
         from datetime import datetime
         report.max_loan_amount = max_loan_amount
         report.credit_attractiveness = credit_attractiveness
@@ -66,32 +132,202 @@ class ReportController:
 
         return self.data_controller.update_report(report)
 
+    def _select_reports(self, source_statuses: Iterable[CreditStatus], report_ids: Optional[Iterable[str]],
+                        since: Optional[datetime], created_by: Optional[str]) -> Tuple[List[CreditReport], List[str]]:
+        """Отчеты для массового действия: выбранные строки или все, подходящие под фильтр"""
+
+        pipeline = self.data_controller.pipeline()
+        for status in source_statuses:
+            pipeline.get_reports_by_status(status)
+        candidates = self._in_scope([report for reports in pipeline.execute() for report in reports])
+
+        if since is not None:
+            candidates = [r for r in candidates if r.created_at >= since]
+        if created_by is not None:
+            candidates = [r for r in candidates if r.created_by == created_by]
+        if report_ids is None:
+            return candidates, []
+
+        wanted = list(dict.fromkeys(report_ids))
+        by_id = {r.id: r for r in candidates}
+        # Отчеты, которых нет среди кандидатов, уже сменили статус или не проходят фильтр
+        return [by_id[i] for i in wanted if i in by_id], [i for i in wanted if i not in by_id]
+
+    def _commit_transitions(self, reports: List[CreditReport], targets: Dict[str, CreditStatus],
+                            modified_by: str, modified_by_name: str, notes: Optional[str]) -> int:
+
+        modified_at = datetime.now()
+        updated = []
+        for report in reports:
+            # Копия нужна, чтобы в историю попала разница с прежней версией
+            report = replace(report, status=targets[report.id], modified_at=modified_at,
+                             modified_by=modified_by, modified_by_name=modified_by_name)
+            if notes:
+                report.notes = notes
+            updated.append(report)
+
+        if not updated:
+            return 0
+        # Все отчеты сохраняются одной пакетной записью
+        return self.data_controller.update_reports(updated, modified_by, modified_by_name)
+
+    def bulk_update_status(self, status: CreditStatus, modified_by: str, modified_by_name: str,
+                           report_ids: Optional[Iterable[str]] = None, notes: Optional[str] = None,
+                           statuses: Optional[Iterable[CreditStatus]] = None, since: Optional[datetime] = None,
+                           created_by: Optional[str] = None) -> Tuple[int, List[str]]:
+        """Переводит отчеты в статус status; без report_ids - все отчеты, подходящие под фильтр.
+
+        Возвращает число обновленных отчетов и id пропущенных.
+        """
+
+        source_statuses = [s for s, targets in ALLOWED_TRANSITIONS.items() if status in targets]
+        if statuses is not None:
+            statuses = set(statuses)
+            source_statuses = [s for s in source_statuses if s in statuses]
+
+        reports, skipped = self._select_reports(source_statuses, report_ids, since, created_by)
+        updated = self._commit_transitions(reports, {r.id: status for r in reports},
+                                           modified_by, modified_by_name, notes)
+        return updated, skipped
+
+    def send_reports(self, modified_by: str, modified_by_name: str,
+                     report_ids: Optional[Iterable[str]] = None,
+                     since: Optional[datetime] = None) -> Tuple[int, List[str]]:
+
+        reports, skipped = self._select_reports(SEND_TRANSITIONS.keys(), report_ids, since, None)
+        updated = self._commit_transitions(reports, {r.id: SEND_TRANSITIONS[r.status] for r in reports},
+                                           modified_by, modified_by_name, None)
+        return updated, skipped
+
     def get_reports_by_status(self, status: CreditStatus) -> List[CreditReport]:
 
-        all_reports = self.data_controller.get_all_reports()
-        return [r for r in all_reports if r.status == status]
+        return self._in_scope(self.data_controller.get_reports_by_status(status))
 
     def get_reports_statistics(self) -> dict:
 
-        all_reports = self.data_controller.get_all_reports()
+        # Оперативные отчеты и архив учитываются через агрегаты манифестов, строки не читаются
+        aggregates = self.data_controller.get_aggregates(self.departments)
 
-        if not all_reports:
+        total = aggregates["total"]
+        if total == 0:
             return {}
 
-        status_stats = {}
-        for status in CreditStatus:
-            count = len([r for r in all_reports if r.status == status])
-            status_stats[status.value] = count
+        status_stats = {status.value: aggregates["status_counts"].get(status.value, 0) for status in CreditStatus}
+        avg_score = aggregates["score_sum"] / total
+        avg_loan = aggregates["loan_sum"] / total
 
-        avg_score = sum(r.score for r in all_reports) / len(all_reports)
-        avg_loan = sum(r.max_loan_amount for r in all_reports) / len(all_reports)
+        def attractiveness_count(value: str) -> int:
+            return aggregates["attractiveness_counts"].get(value, 0)
 
         return {
-            "total": len(all_reports),
+            "total": total,
             "by_status": status_stats,
             "avg_score": round(avg_score, 1),
             "avg_loan": round(avg_loan, 2),
-            "high_attractiveness": len([r for r in all_reports if r.credit_attractiveness == "Высокая"]),
-            "medium_attractiveness": len([r for r in all_reports if r.credit_attractiveness == "Средняя"]),
-            "low_attractiveness": len([r for r in all_reports if r.credit_attractiveness == "Низкая"]),
-        }
\ No newline at end of file
+            "high_attractiveness": attractiveness_count("Высокая"),
+            "medium_attractiveness": attractiveness_count("Средняя"),
+            "low_attractiveness": attractiveness_count("Низкая"),
+        }
+
+    def get_employee_statistics(self) -> List[Dict[str, Any]]:
+        """Число отчетов, одобренных, отклоненных и сумма кредитов по каждому сотруднику"""
+
+        # Счетчики по сотрудникам хранятся в манифестах сегментов и архива
+        aggregates = self.data_controller.get_aggregates(self.departments)
+
+        user_stats = []
+        for user_id, stats in aggregates["by_creator"].items():
+            user = self.data_controller.get_user_by_id(user_id)
+            entry = {"user_id": user_id, "name": user.full_name if user else "Неизвестный"}
+            entry.update({field: stats[field] for field in CREATOR_FIELDS})
+            user_stats.append(entry)
+        return user_stats
+
+    def get_department_statistics(self) -> List[Dict[str, Any]]:
+        """Сводка по отделениям из агрегатов разделов; доступна головному офису"""
+
+        rows = []
+        for department, aggregates in self.data_controller.get_department_statistics().items():
+            if self._partitions is not None and partition_id(department) not in self._partitions:
+                continue
+            total = aggregates["total"]
+            rows.append({
+                "department": department,
+                "total": total,
+                "by_status": aggregates["status_counts"],
+                "avg_score": round(aggregates["score_sum"] / total, 1) if total else 0,
+                "total_amount": aggregates["loan_sum"]
+            })
+        return sorted(rows, key=lambda row: -row["total"])
+
+    def get_factor_statistics(self, group_by: str = "created_by", since: Optional[datetime] = None,
+                              include_archive: bool = False) -> Dict[str, Any]:
+        """Средние и распределения баллов факторов по сотрудникам, статусам или месяцам.
+
+        Читаются сохраненные в отчетах баллы факторов, без повторного скоринга.
+        """
+
+        if group_by not in FACTOR_GROUPINGS:
+            raise ValueError(f"Неизвестная группировка: {group_by}")
+
+        import numpy as np
+
+        if since is not None:
+            reports = self.data_controller.get_reports_since(since)
+        else:
+            reports = self.data_controller.get_all_reports()
+        if include_archive:
+            archived = self.data_controller.archive.iter_reports()
+            reports = list(reports) + [r for r in archived if since is None or r.created_at >= since]
+        reports = self._in_scope(reports)
+
+        with_factors = [r for r in reports if r.factor_scores is not None]
+        result = {"factors": list(FACTOR_NAMES), "total": len(with_factors),
+                  "missing": len(reports) - len(with_factors), "groups": []}
+        if not with_factors:
+            return result
+
+        # Баллы всех отчетов - одна матрица uint8 (отчет x фактор), собранная из байтов без разбора
+        scores = np.frombuffer(b"".join(r.factor_scores for r in with_factors), dtype=np.uint8)
+        scores = scores.reshape(len(with_factors), len(FACTOR_NAMES)).astype(np.int64)
+
+        if group_by == "created_by":
+            keys = [r.created_by for r in with_factors]
+        elif group_by == "status":
+            keys = [r.status.value for r in with_factors]
+        else:
+            keys = [r.created_at.strftime("%Y-%m") for r in with_factors]
+        group_keys, group_index = np.unique(np.array(keys, dtype=object), return_inverse=True)
+        group_count = len(group_keys)
+
+        counts = np.bincount(group_index, minlength=group_count)
+        sums = np.zeros((group_count, len(FACTOR_NAMES)), dtype=np.int64)
+        np.add.at(sums, group_index, scores)
+
+        # Распределение: число отчетов группы в каждом интервале по каждому фактору
+        bins = np.minimum(scores // 10, FACTOR_HISTOGRAM_BINS - 1)
+        histograms = np.zeros((group_count, len(FACTOR_NAMES), FACTOR_HISTOGRAM_BINS), dtype=np.int64)
+        np.add.at(histograms, (group_index[:, None], np.arange(len(FACTOR_NAMES))[None, :], bins), 1)
+
+        names = {}
+        if group_by == "created_by":
+            names = {r.created_by: r.created_by_name for r in with_factors}
+
+        for i, key in enumerate(group_keys.tolist()):
+            result["groups"].append({
+                "key": key,
+                "name": names.get(key, key),
+                "count": int(counts[i]),
+                "mean": (sums[i] / counts[i]).round(1).tolist(),
+                "histogram": histograms[i].tolist()
+            })
+        result["overall_mean"] = (scores.sum(axis=0) / len(with_factors)).round(1).tolist()
+        return result
+
+    def get_report_timeline(self, report_id: str) -> List[Dict[str, Any]]:
+
+        return self.data_controller.report_history.timeline(report_id)
+
+    def get_report_version(self, report_id: str, version: int) -> Optional[CreditReport]:
+
+        return self.data_controller.report_history.get_version(report_id, version)
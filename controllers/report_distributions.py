@@ -0,0 +1,256 @@
+import math
+from bisect import bisect_right
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+from models.report import CreditReport
+
+# Точность скетча: ошибка ранга порядка 1.7 / SKETCH_K, размер - около 3 * SKETCH_K значений
+SKETCH_K = 200
+
+METRICS = ("score", "max_loan_amount")
+
+# Границы фиксированных интервалов гистограмм; последний интервал открыт справа
+HISTOGRAM_EDGES = {
+    "score": [0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100],
+    "max_loan_amount": [0, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_000_000, 5_000_000, 10_000_000]
+}
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+class KLLSketch:
+    """Скетч квантилей KLL: значения хранятся уровнями, на уровне h каждое значение весит 2**h.
+
+    Переполненный уровень сортируется, и половина значений через одно переходит на уровень выше.
+    Скетчи сегментов объединяются с той же оценкой ошибки, поэтому общие распределения собираются из частей.
+    """
+
+    def __init__(self, k: int = SKETCH_K):
+        self.k = k
+        self.levels: List[List[float]] = [[]]
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        # Чередование четных и нечетных позиций вместо случайного выбора делает скетч воспроизводимым
+        self._offset = 0
+
+    def _capacity(self, level: int) -> int:
+
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compact(self, level: int):
+
+        if level + 1 == len(self.levels):
+            self.levels.append([])
+        values = sorted(self.levels[level])
+        # При нечетном числе значений одно остается на уровне, чтобы суммарный вес сохранился
+        rest = [values.pop()] if len(values) % 2 else []
+        self.levels[level + 1].extend(values[self._offset::2])
+        self.levels[level] = rest
+        self._offset ^= 1
+
+    def _compress(self):
+
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) >= self._capacity(level):
+                self._compact(level)
+            level += 1
+
+    def update(self, value: float):
+
+        value = float(value)
+        self.levels[0].append(value)
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def merge(self, other: "KLLSketch"):
+
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, values in enumerate(other.levels):
+            self.levels[level].extend(values)
+        self.count += other.count
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+
+    def _weighted(self) -> List[Tuple[float, int]]:
+
+        return sorted((value, 1 << level) for level, values in enumerate(self.levels) for value in values)
+
+    def quantiles(self, fractions: Iterable[float]) -> List[Optional[float]]:
+
+        if self.count == 0:
+            return [None for _ in fractions]
+
+        weighted = self._weighted()
+        total = sum(weight for _, weight in weighted)
+        cumulative = []
+        running = 0
+        for _, weight in weighted:
+            running += weight
+            cumulative.append(running)
+
+        result = []
+        for fraction in fractions:
+            if fraction <= 0:
+                result.append(self.min)
+            elif fraction >= 1:
+                result.append(self.max)
+            else:
+                position = min(bisect_right(cumulative, fraction * total), len(weighted) - 1)
+                result.append(weighted[position][0])
+        return result
+
+    def rank(self, value: float) -> float:
+        """Доля значений, не превышающих value"""
+
+        if self.count == 0:
+            return 0.0
+        total = 0
+        below = 0
+        for level, values in enumerate(self.levels):
+            weight = 1 << level
+            total += weight * len(values)
+            below += weight * sum(1 for v in values if v <= value)
+        return below / total
+
+    def to_dict(self) -> Dict[str, Any]:
+
+        return {"k": self.k, "count": self.count, "min": self.min, "max": self.max,
+                "offset": self._offset, "levels": self.levels}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "KLLSketch":
+
+        sketch = cls(data["k"])
+        sketch.count = data["count"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        sketch._offset = data["offset"]
+        sketch.levels = [list(values) for values in data["levels"]] or [[]]
+        return sketch
+
+
+class MetricDistribution:
+    """Скетч квантилей и гистограмма с фиксированными интервалами для одного показателя"""
+
+    def __init__(self, metric: str):
+        self.metric = metric
+        self.edges = HISTOGRAM_EDGES[metric]
+        self.sketch = KLLSketch()
+        self.histogram = [0] * len(self.edges)
+
+    def update(self, value: float):
+
+        self.sketch.update(value)
+        # Значения правее последней границы попадают в открытый интервал, левее первой - в первый
+        self.histogram[max(bisect_right(self.edges, value) - 1, 0)] += 1
+
+    def merge(self, other: "MetricDistribution"):
+
+        self.sketch.merge(other.sketch)
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+
+    @property
+    def count(self) -> int:
+        return self.sketch.count
+
+    def percentiles(self, percentiles: Iterable[int] = PERCENTILES) -> Dict[int, Optional[float]]:
+
+        percentiles = list(percentiles)
+        return dict(zip(percentiles, self.sketch.quantiles(p / 100 for p in percentiles)))
+
+    def percentile_rank(self, value: float) -> float:
+        """Процент значений портфеля, не превышающих value"""
+
+        return self.sketch.rank(value) * 100
+
+    def to_dict(self) -> Dict[str, Any]:
+
+        return {"sketch": self.sketch.to_dict(), "histogram": self.histogram}
+
+    @classmethod
+    def from_dict(cls, metric: str, data: Dict[str, Any]) -> "MetricDistribution":
+
+        distribution = cls(metric)
+        distribution.sketch = KLLSketch.from_dict(data["sketch"])
+        distribution.histogram = list(data["histogram"])
+        return distribution
+
+
+class ReportDistributions:
+    """Распределения балла и суммы кредита по всему портфелю, по статусам и по сотрудникам"""
+
+    GROUPS = ("by_status", "by_creator")
+
+    def __init__(self):
+        self.overall = self._empty()
+        self.groups: Dict[str, Dict[str, Dict[str, MetricDistribution]]] = {group: {} for group in self.GROUPS}
+
+    @staticmethod
+    def _empty() -> Dict[str, MetricDistribution]:
+        return {metric: MetricDistribution(metric) for metric in METRICS}
+
+    @classmethod
+    def from_reports(cls, reports: Iterable[CreditReport]) -> "ReportDistributions":
+
+        distributions = cls()
+        for report in reports:
+            distributions.add(report)
+        return distributions
+
+    def add(self, report: CreditReport):
+
+        keys = {"by_status": report.status.value, "by_creator": report.created_by}
+        targets = [self.overall] + [self.groups[group].setdefault(key, self._empty())
+                                    for group, key in keys.items()]
+        for target in targets:
+            for metric in METRICS:
+                target[metric].update(getattr(report, metric))
+
+    def merge(self, other: "ReportDistributions"):
+
+        for metric in METRICS:
+            self.overall[metric].merge(other.overall[metric])
+        for group in self.GROUPS:
+            for key, metrics in other.groups[group].items():
+                target = self.groups[group].setdefault(key, self._empty())
+                for metric in METRICS:
+                    target[metric].merge(metrics[metric])
+
+    def get(self, metric: str, group: Optional[str] = None, key: Optional[str] = None) -> MetricDistribution:
+        """Распределение показателя по портфелю или по одному статусу либо сотруднику"""
+
+        if group is None:
+            return self.overall[metric]
+        metrics = self.groups[group].get(key)
+        return metrics[metric] if metrics is not None else MetricDistribution(metric)
+
+    def to_dict(self) -> Dict[str, Any]:
+
+        def dump(metrics):
+            return {metric: distribution.to_dict() for metric, distribution in metrics.items()}
+
+        return {
+            "overall": dump(self.overall),
+            **{group: {key: dump(metrics) for key, metrics in self.groups[group].items()}
+               for group in self.GROUPS}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ReportDistributions":
+
+        def load(metrics):
+            return {metric: MetricDistribution.from_dict(metric, metrics[metric]) for metric in METRICS}
+
+        distributions = cls()
+        distributions.overall = load(data["overall"])
+        for group in cls.GROUPS:
+            distributions.groups[group] = {key: load(metrics) for key, metrics in data.get(group, {}).items()}
+        return distributions
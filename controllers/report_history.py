@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from models.report import CreditReport
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Каждая CHECKPOINT_INTERVAL-я версия хранится целиком, поэтому для восстановления
+# любой версии достаточно прочитать не больше CHECKPOINT_INTERVAL записей
+CHECKPOINT_INTERVAL = 10
+
+# Поля об авторе изменения хранятся в самой записи истории, а не в дельте
+META_FIELDS = ("modified_at", "modified_by", "modified_by_name")
+
+
+class ReportHistory:
+    """Журнал изменений отчетов: дельты по полям с периодическими полными снимками"""
+
+    def __init__(self, root_dir: str, checkpoint_interval: int = CHECKPOINT_INTERVAL):
+        self.root_dir = root_dir
+        self.log_file = os.path.join(root_dir, "history.jsonl")
+        self.checkpoint_interval = checkpoint_interval
+
+        os.makedirs(root_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # report_id -> смещения записей в файле по номерам версий и размер проиндексированной части файла;
+        # строятся при первом обращении
+        self._index: Optional[Dict[str, List[int]]] = None
+        self._size = 0
+
+    def _ensure_index(self) -> Dict[str, List[int]]:
+        """Дочитывает в индекс полные строки, дописанные после прошлого чтения, в том числе другими процессами.
+
+        Недописанная последняя строка не индексируется и не обрезается: ее, возможно, еще пишет другой процесс.
+        """
+
+        if self._index is None:
+            self._index = {}
+            self._size = 0
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) != self._size:
+            with open(self.log_file, "rb") as f:
+                f.seek(self._size)
+                offset = self._size
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self._index.setdefault(json.loads(line)["report_id"], []).append(offset)
+                    offset += len(line)
+            self._size = offset
+        return self._index
+
+    def _append(self, f, entry: Dict[str, Any]):
+
+        line = json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n"
+        self._index.setdefault(entry["report_id"], []).append(self._size)
+        f.write(line)
+        self._size += len(line)
+
+    def _read(self, f, offset: int) -> Dict[str, Any]:
+
+        f.seek(offset)
+        return json.loads(f.readline())
+
+    @staticmethod
+    def _state(report_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in report_data.items() if k not in META_FIELDS}
+
+    def record(self, before: Dict[str, Any], after: Dict[str, Any],
+               author_id: Optional[str], author_name: Optional[str],
+               at: Optional[datetime] = None) -> Optional[int]:
+        """Добавляет версию отчета; возвращает ее номер или None, если значения не изменились"""
+
+        return self.record_many([(before, after)], author_id, author_name, at)[0]
+
+    def record_many(self, changes: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+                    author_id: Optional[str], author_name: Optional[str],
+                    at: Optional[datetime] = None) -> List[Optional[int]]:
+
+        at = (at or datetime.now()).isoformat()
+
+        with self._lock, open(self.log_file, "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                self._ensure_index()
+                # Под блокировкой файл никто не дописывает: хвост без перевода строки остался от сбоя
+                if os.fstat(f.fileno()).st_size > self._size:
+                    f.truncate(self._size)
+                versions = self._record(f, changes, author_id, author_name, at)
+                f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+        return versions
+
+    def _record(self, f, changes: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+                author_id: Optional[str], author_name: Optional[str], at: str) -> List[Optional[int]]:
+
+        versions: List[Optional[int]] = []
+        for before, after in changes:
+            old_state, new_state = self._state(before), self._state(after)
+            delta = {k: v for k, v in new_state.items() if old_state.get(k) != v}
+            if not delta:
+                versions.append(None)
+                continue
+
+            report_id = after["id"]
+            if report_id not in self._index:
+                # Первое изменение: исходное состояние сохраняется как версия 0
+                self._append(f, {
+                    "report_id": report_id, "version": 0,
+                    "at": before.get("modified_at") or before["created_at"],
+                    "by": before.get("modified_by") or before["created_by"],
+                    "by_name": before.get("modified_by_name") or before["created_by_name"],
+                    "state": dict(before)
+                })
+
+            version = len(self._index[report_id])
+            entry = {"report_id": report_id, "version": version, "at": at,
+                     "by": author_id, "by_name": author_name, "delta": delta}
+            if version % self.checkpoint_interval == 0:
+                entry["state"] = new_state
+            self._append(f, entry)
+            versions.append(version)
+
+        return versions
+
+    def version_count(self, report_id: str) -> int:
+
+        with self._lock:
+            return len(self._ensure_index().get(report_id, []))
+
+    def get_version(self, report_id: str, version: int) -> Optional[CreditReport]:
+
+        with self._lock:
+            offsets = self._ensure_index().get(report_id, [])
+            if not 0 <= version < len(offsets):
+                return None
+
+            # Ближайший снимок не раньше нужной версии, дальше - не больше checkpoint_interval дельт
+            checkpoint = version - version % self.checkpoint_interval
+            with open(self.log_file, "rb") as f:
+                entry = self._read(f, offsets[checkpoint])
+                state = dict(entry["state"])
+                for offset in offsets[checkpoint + 1:version + 1]:
+                    entry = self._read(f, offset)
+                    state.update(entry["delta"])
+
+        # Версия 0 хранит исходный отчет целиком, для остальных автор берется из записи версии
+        if version > 0:
+            state["modified_at"] = entry["at"]
+            state["modified_by"] = entry["by"]
+            state["modified_by_name"] = entry["by_name"]
+        return CreditReport.from_dict(state)
+
+    def timeline(self, report_id: str) -> List[Dict[str, Any]]:
+        """Все версии отчета с изменениями в виде {поле: (было, стало)}"""
+
+        with self._lock:
+            offsets = self._ensure_index().get(report_id, [])
+            if not offsets:
+                return []
+            with open(self.log_file, "rb") as f:
+                entries = [self._read(f, offset) for offset in offsets]
+
+        timeline = []
+        state: Dict[str, Any] = {}
+        for entry in entries:
+            if entry["version"] == 0:
+                state = dict(entry["state"])
+                changes = {}
+            else:
+                changes = {k: (state.get(k), v) for k, v in entry["delta"].items()}
+                state.update(entry["delta"])
+
+            timeline.append({
+                "version": entry["version"],
+                "at": datetime.fromisoformat(entry["at"]),
+                "by": entry["by"],
+                "by_name": entry["by_name"],
+                "changes": changes
+            })
+        return timeline
@@ -0,0 +1,317 @@
+import hashlib
+import heapq
+import json
+import os
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import List, Dict, Any, Optional, Iterable, Set, Tuple
+from models.enums import CreditStatus
+from .partitions import partition_id, partition_set
+from .derived_store import read_snapshot, write_snapshot, pack_strings, unpack_strings
+
+# Отчеты, которые руководитель может изменить
+OPEN_STATUSES = (CreditStatus.PENDING, CreditStatus.NEEDS_CORRECTION)
+
+SORT_KEYS = ("age", "amount")
+SEARCH_LIMIT = 50
+
+# Снимок индекса пересохраняется, когда после прошлого сохранения применено столько событий ленты
+SNAPSHOT_EVERY_EVENTS = 500
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _normalize(text: str) -> str:
+    return text.lower().replace("ё", "е")
+
+
+class ReportSearchIndex:
+    """Индекс отчетов с выбранными статусами: поиск по префиксу id и ФИО заемщика,
+    первые k результатов по дате или сумме.
+
+    Поддерживается по ленте изменений: события своего процесса приходят через подписку,
+    записи других процессов дочитываются из ленты перед поиском. Индекс сохраняется в снимок
+    с номером последнего примененного события; при запуске снимок проверяется по ленте
+    и дочитывается с этого номера вместо построения по отчетам.
+    """
+
+    def __init__(self, data_controller, statuses: Iterable[CreditStatus] = OPEN_STATUSES,
+                 departments: Optional[Iterable[Optional[str]]] = None):
+        self.data_controller = data_controller
+        self.statuses = tuple(statuses)
+        self._status_values = {status.value for status in self.statuses}
+        # Разделы отделов, отчеты которых попадают в индекс; None - все
+        self._partitions = partition_set(departments)
+
+        self._lock = threading.RLock()
+        # id -> (created_at, max_loan_amount, status, borrower_name, created_by_name)
+        self._entries: Dict[str, Tuple[datetime, float, str, str, str]] = {}
+        self._by_age: Dict[str, List[Tuple[datetime, str]]] = {value: [] for value in self._status_values}
+        self._by_amount: Dict[str, List[Tuple[float, str]]] = {value: [] for value in self._status_values}
+        self._ids: List[str] = []
+        # Отсортированные пары (слово ФИО, id) для поиска по префиксу слова
+        self._tokens: List[Tuple[str, str]] = []
+        # Номер события, на котором сохранен снимок индекса
+        self._saved_seq = 0
+
+        # Снимок свой для каждого набора статусов и разделов
+        partitions = sorted(self._partitions) if self._partitions is not None else None
+        scope = hashlib.sha1(json.dumps([sorted(self._status_values), partitions]).encode("utf-8")).hexdigest()
+        self.snapshot_file = os.path.join(data_controller.data_dir, "indexes", f"open_reports-{scope[:12]}.idx")
+
+        changes = data_controller.changes
+        if not self._load_snapshot():
+            # Номер берется до чтения отчетов: события, записанные во время построения, применятся повторно
+            self._seq = changes.last_seq
+            for status in self.statuses:
+                for report in data_controller.get_reports_by_status(status):
+                    if not self._in_scope(report.department):
+                        continue
+                    self._add(report.id, report.created_at, report.max_loan_amount, report.status.value,
+                              report.borrower_name, report.created_by_name)
+            self._save_snapshot()
+
+        self._subscription = changes.subscribe(self._on_change)
+        self._catch_up()
+
+    def close(self):
+
+        self.data_controller.changes.unsubscribe(self._subscription)
+        with self._lock:
+            if self._seq != self._saved_seq:
+                self._save_snapshot()
+
+    def _marker(self, seq: int) -> Optional[List[str]]:
+        """Время и id события seq: по ним снимок сверяется с лентой"""
+
+        if seq == 0:
+            return None
+        events = self.data_controller.changes.read(seq - 1, limit=1)
+        if not events or events[0]["seq"] != seq:
+            return None
+        return [events[0]["at"], events[0]["id"]]
+
+    def _load_snapshot(self) -> bool:
+
+        snapshot = read_snapshot(self.snapshot_file)
+        if snapshot is None:
+            return False
+        seq = snapshot.meta.get("seq", -1)
+        # Лента могла быть пересоздана или обрезана: тогда событие с номером снимка другое
+        if not 0 <= seq <= self.data_controller.changes.last_seq or self._marker(seq) != snapshot.meta.get("marker"):
+            return False
+
+        arrays = snapshot.arrays
+        ids = [value.decode("utf-8") for value in arrays["ids"].tolist()]
+        created_at = [_EPOCH + timedelta(microseconds=value) for value in arrays["created_at"].tolist()]
+        amounts = arrays["amounts"].tolist()
+        status_values = snapshot.meta["statuses"]
+        statuses = [status_values[code] for code in arrays["statuses"].tolist()]
+        borrower_names = unpack_strings(arrays["borrower_names"], arrays["borrower_name_ends"])
+        creator_names = unpack_strings(arrays["creator_names"], arrays["creator_name_ends"])
+
+        # Списки строятся сортировкой целиком, а не вставкой по одному
+        self._entries = dict(zip(ids, zip(created_at, amounts, statuses, borrower_names, creator_names)))
+        for report_id, (created, amount, status, borrower_name, _) in self._entries.items():
+            self._by_age[status].append((created, report_id))
+            self._by_amount[status].append((amount, report_id))
+            self._tokens.extend((token, report_id) for token in set(_normalize(borrower_name).split()))
+        for values in list(self._by_age.values()) + list(self._by_amount.values()):
+            values.sort()
+        self._tokens.sort()
+        self._ids = sorted(ids)
+
+        self._seq = self._saved_seq = seq
+        return True
+
+    def _save_snapshot(self):
+
+        import numpy as np
+
+        status_values = sorted(self._status_values)
+        codes = {value: code for code, value in enumerate(status_values)}
+        entries = list(self._entries.items())
+        borrower_names, borrower_name_ends = pack_strings([entry[3] for _, entry in entries])
+        creator_names, creator_name_ends = pack_strings([entry[4] for _, entry in entries])
+        arrays = {
+            "ids": np.array([report_id.encode("utf-8") for report_id, _ in entries], dtype=bytes),
+            "created_at": np.array([(entry[0] - _EPOCH) // timedelta(microseconds=1) for _, entry in entries],
+                                   dtype=np.int64),
+            "amounts": np.array([entry[1] for _, entry in entries], dtype=np.float64),
+            "statuses": np.array([codes[entry[2]] for _, entry in entries], dtype=np.uint8),
+            "borrower_names": borrower_names,
+            "borrower_name_ends": borrower_name_ends,
+            "creator_names": creator_names,
+            "creator_name_ends": creator_name_ends
+        }
+        write_snapshot(self.snapshot_file, {"seq": self._seq, "marker": self._marker(self._seq), "statuses": status_values}, arrays)
+        self._saved_seq = self._seq
+
+    def _add(self, report_id: str, created_at: datetime, amount: float, status: str,
+             borrower_name: str, created_by_name: str):
+
+        self._entries[report_id] = (created_at, amount, status, borrower_name, created_by_name)
+        insort(self._by_age[status], (created_at, report_id))
+        insort(self._by_amount[status], (amount, report_id))
+        insort(self._ids, report_id)
+        for token in set(_normalize(borrower_name).split()):
+            insort(self._tokens, (token, report_id))
+
+    @staticmethod
+    def _discard(values: list, item):
+
+        position = bisect_left(values, item)
+        if position < len(values) and values[position] == item:
+            del values[position]
+
+    def _remove(self, report_id: str):
+
+        entry = self._entries.pop(report_id, None)
+        if entry is None:
+            return
+        created_at, amount, status, borrower_name, _ = entry
+        self._discard(self._by_age[status], (created_at, report_id))
+        self._discard(self._by_amount[status], (amount, report_id))
+        self._discard(self._ids, report_id)
+        for token in set(_normalize(borrower_name).split()):
+            self._discard(self._tokens, (token, report_id))
+
+    def _in_scope(self, department: Optional[str]) -> bool:
+
+        return self._partitions is None or partition_id(department) in self._partitions
+
+    def _apply(self, event: Dict[str, Any]):
+
+        if event["entity"] != "report":
+            return
+        self._remove(event["id"])
+        data = event["data"]
+        if (event["op"] in ("add", "update") and data["status"] in self._status_values
+                and self._in_scope(data.get("department"))):
+            self._add(data["id"], datetime.fromisoformat(data["created_at"]), data["max_loan_amount"],
+                      data["status"], data["borrower_name"], data["created_by_name"])
+
+    def _on_change(self, event: Dict[str, Any]):
+
+        with self._lock:
+            if event["seq"] == self._seq + 1:
+                self._apply(event)
+                self._seq = event["seq"]
+            # Иначе между событиями писал другой процесс: пропуск дочитается при следующем поиске
+
+    def _catch_up(self):
+
+        with self._lock:
+            for event in self.data_controller.changes.read(self._seq):
+                self._apply(event)
+                self._seq = event["seq"]
+            if self._seq - self._saved_seq >= SNAPSHOT_EVERY_EVENTS:
+                self._save_snapshot()
+
+    def _prefix_range(self, values: list, prefix: str, key) -> Iterable:
+
+        position = bisect_left(values, key(prefix))
+        while position < len(values):
+            value = values[position]
+            text = value[0] if isinstance(value, tuple) else value
+            if not text.startswith(prefix):
+                break
+            yield value
+            position += 1
+
+    def _matches(self, query: str) -> Set[str]:
+
+        terms = _normalize(query).split()
+
+        # Запрос целиком может быть началом id отчета
+        matches = set(self._prefix_range(self._ids, query.strip().lower(), lambda prefix: prefix))
+
+        name_matches: Optional[Set[str]] = None
+        for term in terms:
+            term_ids = {report_id for _, report_id in self._prefix_range(self._tokens, term, lambda p: (p,))}
+            name_matches = term_ids if name_matches is None else name_matches & term_ids
+            if not name_matches:
+                break
+        return matches | (name_matches or set())
+
+    def _result(self, report_id: str) -> Dict[str, Any]:
+
+        created_at, amount, status, borrower_name, created_by_name = self._entries[report_id]
+        return {
+            "id": report_id,
+            "created_at": created_at,
+            "max_loan_amount": amount,
+            "status": CreditStatus(status),
+            "borrower_name": borrower_name,
+            "created_by_name": created_by_name
+        }
+
+    def count(self, statuses: Optional[Iterable[CreditStatus]] = None) -> int:
+
+        self._catch_up()
+        with self._lock:
+            return sum(len(self._by_age[status.value]) for status in (statuses or self.statuses)
+                       if status.value in self._status_values)
+
+    def search(self, query: str = "", statuses: Optional[Iterable[CreditStatus]] = None,
+               sort: str = "age", descending: bool = False,
+               limit: int = SEARCH_LIMIT) -> Tuple[List[Dict[str, Any]], int]:
+        """Первые limit подходящих отчетов и общее число совпадений"""
+
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Неизвестная сортировка: {sort}")
+
+        self._catch_up()
+        with self._lock:
+            status_values = [status.value for status in (self.statuses if statuses is None else statuses)
+                             if status.value in self._status_values]
+            by_key = self._by_age if sort == "age" else self._by_amount
+
+            if not query.strip():
+                # Без запроса достаточно слить уже отсортированные списки статусов
+                lists = [by_key[value] for value in status_values]
+                ordered = (heapq.merge(*(reversed(values) for values in lists), reverse=True) if descending
+                           else heapq.merge(*lists))
+                top = [report_id for _, report_id in islice(ordered, limit)]
+                return [self._result(report_id) for report_id in top], sum(len(values) for values in lists)
+
+            allowed = set(status_values)
+            matches = [report_id for report_id in self._matches(query)
+                       if self._entries[report_id][2] in allowed]
+            position = 0 if sort == "age" else 1
+            select = heapq.nlargest if descending else heapq.nsmallest
+            top = select(limit, matches, key=lambda report_id: (self._entries[report_id][position], report_id))
+            return [self._result(report_id) for report_id in top], len(matches)
+
+
+class SearchIndexRegistry:
+    """Индексы открытых отчетов контроллера данных по областям отделов.
+
+    ReportController каждой сессии берет общий индекс своей области, а не строит свой:
+    иначе каждый индекс подписывался бы на ленту изменений и оставался в памяти после сессии.
+    """
+
+    def __init__(self, data_controller):
+        self.data_controller = data_controller
+        self._indexes: Dict[Optional[Tuple[str, ...]], ReportSearchIndex] = {}
+        self._lock = threading.Lock()
+
+    def get(self, departments: Optional[Iterable[Optional[str]]] = None) -> ReportSearchIndex:
+
+        partitions = partition_set(departments)
+        key = tuple(sorted(partitions)) if partitions is not None else None
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index = self._indexes[key] = ReportSearchIndex(self.data_controller, departments=departments)
+            return index
+
+    def close(self):
+
+        with self._lock:
+            indexes = list(self._indexes.values())
+            self._indexes.clear()
+        for index in indexes:
+            index.close()
@@ -0,0 +1,626 @@
+import operator
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple, Callable, Set, Mapping, Iterable
+from models.enums import CreditStatus
+from models.report import CreditReport
+from .report_snapshot import Segment
+
+# Поля выражений фильтра: имя -> (тип, значение из записи).
+# Поля заемщика берутся по borrower_id отчета
+REPORT_FIELDS: Dict[str, Tuple[str, Callable]] = {
+    "id": ("text", lambda r: r.id),
+    "borrower_id": ("text", lambda r: r.borrower_id),
+    "borrower_name": ("text", lambda r: r.borrower_name),
+    "max_loan_amount": ("number", lambda r: r.max_loan_amount),
+    "score": ("number", lambda r: r.score),
+    "status": ("status", lambda r: r.status),
+    "credit_attractiveness": ("text", lambda r: r.credit_attractiveness),
+    "risk_level": ("text", lambda r: r.risk_level),
+    "created_by": ("text", lambda r: r.created_by),
+    "created_by_name": ("text", lambda r: r.created_by_name),
+    "created_at": ("datetime", lambda r: r.created_at),
+    "modified_at": ("datetime", lambda r: r.modified_at),
+    "modified_by_name": ("text", lambda r: r.modified_by_name),
+    "department": ("text", lambda r: r.department),
+    "blacklist_found": ("bool", lambda r: r.blacklist_found),
+    "rules_version": ("text", lambda r: r.rules_version)
+}
+
+BORROWER_FIELDS: Dict[str, Tuple[str, Callable]] = {
+    "borrower.income": ("number", lambda b: b.income),
+    "borrower.expenses": ("number", lambda b: b.expenses),
+    "borrower.credit_history_score": ("number", lambda b: b.credit_history_score),
+    "borrower.existing_loans": ("number", lambda b: b.existing_loans),
+    "borrower.employment_years": ("number", lambda b: b.employment_years),
+    "borrower.employer_name": ("text", lambda b: b.employer_name),
+    "borrower.position": ("text", lambda b: b.position),
+    "borrower.address": ("text", lambda b: b.address),
+    "borrower.birth_date": ("datetime", lambda b: b.birth_date),
+    "borrower.blacklisted": ("bool", lambda b: b.blacklisted)
+}
+
+FIELDS = {**REPORT_FIELDS, **BORROWER_FIELDS}
+
+FIELD_ALIASES = {
+    "loan": "max_loan_amount",
+    "amount": "max_loan_amount",
+    "сумма": "max_loan_amount",
+    "балл": "score",
+    "статус": "status",
+    "attractiveness": "credit_attractiveness",
+    "привлекательность": "credit_attractiveness",
+    "risk": "risk_level",
+    "риск": "risk_level",
+    "author": "created_by_name",
+    "автор": "created_by_name",
+    "created": "created_at",
+    "создан": "created_at",
+    "borrower": "borrower_name",
+    "заемщик": "borrower_name",
+    "отдел": "department",
+    "доход": "borrower.income",
+    "расходы": "borrower.expenses",
+    "стаж": "borrower.employment_years"
+}
+
+KEYWORDS = {
+    "and": "and", "и": "and",
+    "or": "or", "или": "or",
+    "not": "not", "не": "not",
+    "between": "between", "между": "between",
+    "in": "in", "в": "in",
+    "contains": "contains", "содержит": "contains",
+    "within": "within", "за": "within",
+    "true": "true", "да": "true",
+    "false": "false", "нет": "false"
+}
+
+NUMBER_SUFFIXES = {"k": 1e3, "к": 1e3, "тыс": 1e3, "m": 1e6, "м": 1e6, "млн": 1e6}
+
+TOKEN_PATTERN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<date>\d{4}-\d{2}-\d{2}(?:[T\ ]\d{2}:\d{2}(?::\d{2})?)?(?!\w)|\d{2}\.\d{2}\.\d{4}(?!\w))
+  | (?P<duration>\d+(?:d|д)(?!\w))
+  | (?P<number>-?\d+(?:\.\d+)?(?:млн|тыс|k|к|m|м)?(?!\w))
+  | (?P<op><=|>=|!=|<>|==|=|<|>)
+  | (?P<punct>[(),])
+  | (?P<name>[^\W\d][\w.]*)
+""", re.VERBOSE | re.IGNORECASE)
+
+OPERATORS = {"=": operator.eq, "!=": operator.ne, "<": operator.lt,
+             "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+ORDERED_KINDS = ("number", "datetime")
+
+
+class QueryError(ValueError):
+    """Ошибка в выражении фильтра; сообщение показывается пользователю"""
+
+
+def _normalize(text: str) -> str:
+    return text.lower().replace("ё", "е")
+
+
+def _format(value) -> str:
+
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M") if value.time() != datetime.min.time() else value.strftime("%Y-%m-%d")
+    if isinstance(value, str):
+        return f"'{value}'"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+
+def literal(value) -> str:
+    """Значение в виде литерала выражения: для сборки условий из полей формы"""
+
+    if isinstance(value, CreditStatus):
+        value = value.value
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%dT%H:%M:%S")
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def build_column(kind: str, values: List[Any]):
+    """Колонка numpy для значений поля: строки нормализуются для сравнения без учета регистра"""
+
+    import numpy as np
+
+    if kind == "number":
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    if kind == "datetime":
+        return np.array(values, dtype="datetime64[us]")
+    if kind == "bool":
+        return np.array([bool(value) for value in values], dtype=bool)
+    if kind == "status":
+        return np.array([value.value for value in values], dtype=str)
+    return np.array([_normalize(value or "") for value in values], dtype=str)
+
+
+class Condition:
+    """Узел выражения: маска отчетов по колонкам полей"""
+
+    def fields(self) -> Set[str]:
+        raise NotImplementedError
+
+    def mask(self, columns: Dict[str, Any]):
+        raise NotImplementedError
+
+
+class Compare(Condition):
+
+    def __init__(self, field: str, op: str, value):
+        self.field = field
+        self.op = op
+        self.value = value
+
+    def fields(self) -> Set[str]:
+        return {self.field}
+
+    def mask(self, columns: Dict[str, Any]):
+
+        import numpy as np
+
+        value = np.datetime64(self.value, "us") if isinstance(self.value, datetime) else self.value
+        column = columns[self.field]
+        result = OPERATORS[self.op](column, value)
+        # Отсутствующее значение (NaN, NaT) не проходит ни одно сравнение, в том числе !=
+        if self.op == "!=" and column.dtype.kind in "fM":
+            result &= ~(np.isnan(column) if column.dtype.kind == "f" else np.isnat(column))
+        return result
+
+    def __str__(self) -> str:
+        return f"{self.field} {self.op} {_format(self.value)}"
+
+
+class Member(Condition):
+
+    def __init__(self, field: str, values: List[Any]):
+        self.field = field
+        self.values = values
+
+    def fields(self) -> Set[str]:
+        return {self.field}
+
+    def mask(self, columns: Dict[str, Any]):
+
+        import numpy as np
+
+        values = [np.datetime64(value, "us") if isinstance(value, datetime) else value for value in self.values]
+        return np.isin(columns[self.field], values)
+
+    def __str__(self) -> str:
+        return f"{self.field} in ({', '.join(_format(value) for value in self.values)})"
+
+
+class Contains(Condition):
+
+    def __init__(self, field: str, text: str):
+        self.field = field
+        self.text = text
+
+    def fields(self) -> Set[str]:
+        return {self.field}
+
+    def mask(self, columns: Dict[str, Any]):
+
+        import numpy as np
+
+        return np.char.find(columns[self.field], self.text) >= 0
+
+    def __str__(self) -> str:
+        return f"{self.field} contains {_format(self.text)}"
+
+
+class Not(Condition):
+
+    def __init__(self, item: Condition):
+        self.item = item
+
+    def fields(self) -> Set[str]:
+        return self.item.fields()
+
+    def mask(self, columns: Dict[str, Any]):
+        return ~self.item.mask(columns)
+
+    def __str__(self) -> str:
+        return f"not ({self.item})"
+
+
+class And(Condition):
+
+    def __init__(self, items: List[Condition]):
+        self.items = items
+
+    def fields(self) -> Set[str]:
+        return set().union(*(item.fields() for item in self.items))
+
+    def mask(self, columns: Dict[str, Any]):
+
+        result = self.items[0].mask(columns)
+        for item in self.items[1:]:
+            result &= item.mask(columns)
+        return result
+
+    def __str__(self) -> str:
+        return " and ".join(f"({item})" if isinstance(item, Or) else str(item) for item in self.items)
+
+
+class Or(Condition):
+
+    def __init__(self, items: List[Condition]):
+        self.items = items
+
+    def fields(self) -> Set[str]:
+        return set().union(*(item.fields() for item in self.items))
+
+    def mask(self, columns: Dict[str, Any]):
+
+        result = self.items[0].mask(columns)
+        for item in self.items[1:]:
+            result |= item.mask(columns)
+        return result
+
+    def __str__(self) -> str:
+        return " or ".join(str(item) for item in self.items)
+
+
+class _Parser:
+    """Разбор выражения рекурсивным спуском: or < and < not < сравнение"""
+
+    def __init__(self, text: str, now: datetime):
+        self.text = text
+        self.now = now
+        self.tokens = self._tokenize(text)
+        self.position = 0
+
+    def _tokenize(self, text: str) -> List[Tuple[str, str, int]]:
+
+        tokens = []
+        offset = 0
+        while offset < len(text):
+            match = TOKEN_PATTERN.match(text, offset)
+            if match is None:
+                raise QueryError(f"Непонятный символ в позиции {offset + 1}: {text[offset]!r}")
+            kind = match.lastgroup
+            value = match.group()
+            if kind == "name" and value.lower() in KEYWORDS:
+                kind, value = "keyword", KEYWORDS[value.lower()]
+            if kind != "space":
+                tokens.append((kind, value, offset))
+            offset = match.end()
+        return tokens
+
+    def _peek(self, kind: Optional[str] = None, value: Optional[str] = None) -> bool:
+
+        if self.position >= len(self.tokens):
+            return False
+        token_kind, token_value, _ = self.tokens[self.position]
+        return (kind is None or token_kind == kind) and (value is None or token_value == value)
+
+    def _next(self) -> Tuple[str, str, int]:
+
+        if self.position >= len(self.tokens):
+            raise QueryError("Выражение оборвано")
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def _expect(self, kind: str, value: str):
+
+        token_kind, token_value, offset = self._next()
+        if token_kind != kind or token_value != value:
+            raise QueryError(f"Ожидается «{value}» в позиции {offset + 1}, найдено «{token_value}»")
+
+    def parse(self) -> Condition:
+
+        if not self.tokens:
+            raise QueryError("Пустое выражение")
+        condition = self._disjunction()
+        if self.position < len(self.tokens):
+            _, value, offset = self.tokens[self.position]
+            raise QueryError(f"Лишнее «{value}» в позиции {offset + 1}")
+        return condition
+
+    def _disjunction(self) -> Condition:
+
+        items = [self._conjunction()]
+        while self._peek("keyword", "or"):
+            self._next()
+            items.append(self._conjunction())
+        return items[0] if len(items) == 1 else Or(items)
+
+    def _conjunction(self) -> Condition:
+
+        items = [self._negation()]
+        while self._peek("keyword", "and"):
+            self._next()
+            items.append(self._negation())
+        # Вложенные and раскрываются, чтобы условия верхнего уровня были видны при отборе сегментов
+        flat = []
+        for item in items:
+            flat.extend(item.items if isinstance(item, And) else [item])
+        return flat[0] if len(flat) == 1 else And(flat)
+
+    def _negation(self) -> Condition:
+
+        if self._peek("keyword", "not"):
+            self._next()
+            return Not(self._negation())
+        if self._peek("punct", "("):
+            self._next()
+            condition = self._disjunction()
+            self._expect("punct", ")")
+            return condition
+        return self._comparison()
+
+    def _field(self) -> str:
+
+        kind, value, offset = self._next()
+        if kind != "name":
+            raise QueryError(f"Ожидается поле в позиции {offset + 1}, найдено «{value}»")
+        name = FIELD_ALIASES.get(value.lower(), value.lower())
+        if name not in FIELDS:
+            raise QueryError(f"Неизвестное поле «{value}». Доступны: {', '.join(FIELDS)}")
+        return name
+
+    def _literal(self) -> Tuple[str, Any]:
+
+        kind, value, offset = self._next()
+        if kind == "string":
+            return "text", re.sub(r"\\(.)", r"\1", value[1:-1])
+        if kind == "number":
+            number = re.match(r"-?\d+(?:\.\d+)?", value).group()
+            return "number", float(number) * NUMBER_SUFFIXES.get(value[len(number):].lower(), 1)
+        if kind == "date":
+            if "." in value:
+                return "datetime", datetime.strptime(value, "%d.%m.%Y")
+            return "datetime", datetime.fromisoformat(value.replace(" ", "T"))
+        if kind == "keyword" and value in ("true", "false"):
+            return "bool", value == "true"
+        if kind == "name":
+            return "text", value
+        if kind == "duration":
+            raise QueryError(f"Срок {value} используется только с within/за (позиция {offset + 1})")
+        raise QueryError(f"Ожидается значение в позиции {offset + 1}, найдено «{value}»")
+
+    def _coerce(self, field: str, literal_kind: str, value) -> Any:
+
+        kind = FIELDS[field][0]
+        if kind == "number" and literal_kind == "number":
+            return value
+        if kind == "datetime" and literal_kind == "datetime":
+            return value
+        if kind == "bool" and literal_kind == "bool":
+            return value
+        if kind == "text" and literal_kind in ("text", "number"):
+            return _normalize(_format(value) if literal_kind == "number" else value)
+        if kind == "status" and literal_kind == "text":
+            for status in CreditStatus:
+                if _normalize(value) in (_normalize(status.value), status.name.lower()):
+                    return status.value
+            raise QueryError(f"Неизвестный статус «{value}». Доступны: "
+                             f"{', '.join(status.value for status in CreditStatus)}")
+        raise QueryError(f"Поле {field} нельзя сравнить со значением {_format(value)}")
+
+    def _value(self, field: str):
+
+        return self._coerce(field, *self._literal())
+
+    def _comparison(self) -> Condition:
+
+        field = self._field()
+        kind = FIELDS[field][0]
+
+        # Логическое поле без сравнения: blacklist_found
+        if kind == "bool" and not (self._peek("op") or self._peek("keyword", "in") or self._peek("keyword", "not")):
+            return Compare(field, "=", True)
+
+        negate = False
+        if self._peek("keyword", "not"):
+            self._next()
+            negate = True
+
+        token_kind, token_value, offset = self._next()
+        if token_kind == "op" and not negate:
+            op = {"==": "=", "<>": "!="}.get(token_value, token_value)
+            if op not in ("=", "!=") and kind not in ORDERED_KINDS:
+                raise QueryError(f"Поле {field} поддерживает только = и !=")
+            literal_kind, value = self._literal()
+            value = self._coerce(field, literal_kind, value)
+            if kind == "datetime" and op in ("=", "!=") and value.time() == datetime.min.time():
+                # Дата без времени означает весь день
+                day = And([Compare(field, ">=", value), Compare(field, "<", value + timedelta(days=1))])
+                return day if op == "=" else Not(day)
+            return Compare(field, op, value)
+
+        if token_kind == "keyword" and token_value == "between":
+            if kind not in ORDERED_KINDS:
+                raise QueryError(f"between применяется к числам и датам, а не к полю {field}")
+            low = self._value(field)
+            self._expect("keyword", "and")
+            high = self._value(field)
+            condition = And([Compare(field, ">=", low), Compare(field, "<=", high)])
+        elif token_kind == "keyword" and token_value == "in":
+            self._expect("punct", "(")
+            values = [self._value(field)]
+            while self._peek("punct", ","):
+                self._next()
+                values.append(self._value(field))
+            self._expect("punct", ")")
+            condition = Member(field, values)
+        elif token_kind == "keyword" and token_value == "contains":
+            if kind != "text":
+                raise QueryError(f"contains применяется к текстовым полям, а не к полю {field}")
+            condition = Contains(field, self._value(field))
+        elif token_kind == "keyword" and token_value == "within":
+            if kind != "datetime":
+                raise QueryError(f"within применяется к датам, а не к полю {field}")
+            duration_kind, duration, duration_offset = self._next()
+            if duration_kind != "duration":
+                raise QueryError(f"Ожидается срок вида 45d в позиции {duration_offset + 1}")
+            condition = Compare(field, ">=", self.now - timedelta(days=int(duration[:-1])))
+        else:
+            raise QueryError(f"Ожидается сравнение в позиции {offset + 1}, найдено «{token_value}»")
+        return Not(condition) if negate else condition
+
+
+class QueryResult:
+    """Отчеты, подходящие под выражение, и план выполнения"""
+
+    def __init__(self, reports: List[CreditReport], explain: List[str], scanned: int):
+        self.reports = reports
+        self.explain = explain
+        self.scanned = scanned
+
+
+class ColumnStore:
+    """Колоночное представление загруженных сегментов отчетов.
+
+    Колонки поля строятся при первом запросе и живут, пока сегмент в срезе не заменен:
+    сегменты неизменяемы, поэтому совпадение объекта сегмента означает актуальность колонок.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._segments: Dict[str, Tuple[Segment, Dict[str, Any]]] = {}
+
+    def columns(self, segments: List[Tuple[str, Segment]], names: Iterable[str]) -> Tuple[Dict[str, Any], int]:
+        """Колонки полей names по всем сегментам и число построенных заново колонок сегментов"""
+
+        import numpy as np
+
+        names = list(names)
+        parts: Dict[str, List[Any]] = {name: [] for name in names}
+        built = 0
+        with self._lock:
+            for key, segment in segments:
+                cached = self._segments.get(key)
+                if cached is None or cached[0] is not segment:
+                    cached = self._segments[key] = (segment, {})
+                for name in names:
+                    column = cached[1].get(name)
+                    if column is None:
+                        kind, getter = REPORT_FIELDS[name]
+                        column = cached[1][name] = build_column(kind, [getter(report) for report in segment])
+                        built += 1
+                    parts[name].append(column)
+        return {name: np.concatenate(columns) for name, columns in parts.items()}, built
+
+    def retain(self, segments: Mapping[str, Segment]):
+        """Отбрасывает колонки сегментов, замененных или выгруженных из среза"""
+
+        with self._lock:
+            for key in [key for key, (segment, _) in self._segments.items() if segments.get(key) is not segment]:
+                del self._segments[key]
+
+
+class ReportQuery:
+    """Разобранное выражение фильтра отчетов.
+
+    Условия верхнего уровня по дате создания, статусу, автору, отделу и id сужают набор сегментов
+    по манифесту хранилища и индексам id; остальное проверяется векторно по колонкам сегментов.
+    """
+
+    def __init__(self, text: str, condition: Condition):
+        self.text = text
+        self.condition = condition
+
+    @classmethod
+    def parse(cls, text: str, now: Optional[datetime] = None) -> "ReportQuery":
+
+        return cls(text, _Parser(text, now or datetime.now()).parse())
+
+    def __str__(self) -> str:
+        return str(self.condition)
+
+    def conjuncts(self) -> List[Condition]:
+
+        return self.condition.items if isinstance(self.condition, And) else [self.condition]
+
+    @staticmethod
+    def _index_keys(condition: Condition, storage, departments) -> Optional[Tuple[str, Set[str]]]:
+        """Сегменты, в которых могут быть отчеты под условием, и название использованного индекса"""
+
+        if isinstance(condition, Compare):
+            field, op, value = condition.field, condition.op, condition.value
+            if field == "created_at" and op in (">", ">="):
+                return "даты сегментов в манифесте", set(storage.segments_since(value, departments))
+            if field == "created_at" and op in ("<", "<="):
+                end = value + timedelta(microseconds=1) if op == "<=" else value
+                return "даты сегментов в манифесте", set(storage.segments_before(end, departments))
+            values = [value] if op == "=" else None
+        elif isinstance(condition, Member):
+            field, values = condition.field, condition.values
+        else:
+            return None
+        if values is None:
+            return None
+
+        if field == "status":
+            return "счетчики статусов в манифесте", {key for value in values
+                                                     for key in storage.segments_with_status(value, departments)}
+        if field == "created_by":
+            return "счетчики авторов в манифесте", {key for value in values
+                                                    for key in storage.segments_with_creator(value, departments)}
+        if field == "department":
+            # Отделы сравниваются без учета регистра, поэтому разделы берутся по именам из манифеста
+            wanted = set(values)
+            return "разделы отделов", set(storage.segments_of_departments(
+                [department for department in storage.department_aggregates()
+                 if department is not None and _normalize(department) in wanted], departments))
+        if field == "id":
+            located = {storage.locate(value, departments) for value in values}
+            return "индекс id сегментов", {key for key in located if key is not None}
+        return None
+
+    def plan(self, storage, departments=None) -> Tuple[List[str], List[str]]:
+        """Ключи сегментов, которые нужно просмотреть, и строки плана"""
+
+        keys = storage.segment_keys(departments)
+        explain = [f"Выражение: {self}", f"Сегменты области: {len(keys)}"]
+        for condition in self.conjuncts():
+            selected = self._index_keys(condition, storage, departments)
+            if selected is None:
+                continue
+            index_name, allowed = selected
+            before = len(keys)
+            keys = [key for key in keys if key in allowed]
+            explain.append(f"{condition}: {index_name} -> {len(keys)} из {before} сегментов")
+        return keys, explain
+
+    def evaluate(self, segments: List[Tuple[str, Segment]], columns: ColumnStore,
+                 borrower_of: Callable[[str], Any]) -> Tuple[List[CreditReport], List[str]]:
+        """Отчеты сегментов, подходящие под выражение, и строки плана"""
+
+        import numpy as np
+
+        reports = [report for _, segment in segments for report in segment]
+        explain = [f"Просмотр: {len(segments)} сегментов, {len(reports)} отчетов"]
+        if not reports:
+            return [], explain
+
+        fields = self.condition.fields()
+        report_fields = sorted(field for field in fields if field in REPORT_FIELDS)
+        data, built = columns.columns(segments, report_fields)
+        explain.append(f"Колонки: {', '.join(report_fields) or '-'} "
+                       f"(построено {built}, из кэша {len(segments) * len(report_fields) - built})")
+
+        borrower_fields = sorted(field for field in fields if field in BORROWER_FIELDS)
+        if borrower_fields:
+            borrowers = [borrower_of(report.borrower_id) for report in reports]
+            for field in borrower_fields:
+                kind, getter = BORROWER_FIELDS[field]
+                data[field] = build_column(kind, [getter(b) if b is not None else None for b in borrowers])
+            explain.append(f"Поля заемщика по borrower_id: {', '.join(borrower_fields)}")
+
+        rows = np.flatnonzero(self.condition.mask(data))
+        explain.append(f"Векторный предикат: {len(rows)} из {len(reports)}")
+        return [reports[i] for i in rows.tolist()], explain
@@ -0,0 +1,51 @@
+from typing import Dict, Tuple, Mapping, Optional, Iterable
+from models.report import CreditReport
+
+Segment = Tuple[CreditReport, ...]
+
+
+class ReportSnapshot:
+    """Неизменяемый срез загруженных сегментов отчетов на момент фиксации записи.
+
+    Сегменты - кортежи. Новая версия копирует только словарь ссылок на сегменты и заменяет
+    измененные, остальные сегменты разделяются между версиями. Читатель берет текущий срез
+    без блокировки и работает с ним сколько угодно долго: писатели публикуют новые версии рядом.
+    """
+
+    __slots__ = ("version", "segments", "_reports")
+
+    def __init__(self, version: int = 0, segments: Optional[Mapping[str, Segment]] = None):
+        self.version = version
+        self.segments: Mapping[str, Segment] = dict(segments or {})
+        self._reports: Optional[Segment] = None
+
+    def with_segments(self, changes: Mapping[str, Segment]) -> "ReportSnapshot":
+        """Следующая версия, в которой сегменты changes заменены"""
+
+        segments = dict(self.segments)
+        for key, reports in changes.items():
+            segments[key] = reports
+        return ReportSnapshot(self.version + 1, segments)
+
+    @property
+    def reports(self) -> Segment:
+        """Все отчеты среза; собираются один раз на версию"""
+
+        if self._reports is None:
+            self._reports = tuple(report for segment in self.segments.values() for report in segment)
+        return self._reports
+
+    def select(self, keys: Iterable[str]) -> Segment:
+
+        return tuple(report for key in keys for report in self.segments.get(key, ()))
+
+    def __getstate__(self) -> Dict:
+
+        # Клиенту сервера данных передаются только сегменты, собранный список строится заново
+        return {"version": self.version, "segments": self.segments}
+
+    def __setstate__(self, state: Dict):
+
+        self.version = state["version"]
+        self.segments = state["segments"]
+        self._reports = None
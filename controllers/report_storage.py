@@ -0,0 +1,388 @@
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterable, Callable, FrozenSet
+from models.report import CreditReport
+from .partitions import partition_id, partition_set, normalize_department
+from .report_aggregates import empty_aggregates, fold_report, merge_aggregates
+from .derived_store import read_snapshot, write_snapshot
+from .report_distributions import ReportDistributions
+
+Departments = Optional[Iterable[Optional[str]]]
+
+
+class ReportStorage:
+    """Хранилище отчетов: разделы по отделам, внутри раздела - помесячные сегменты по created_at.
+
+    Ключ сегмента - "<раздел>/<YYYY-MM>". Методы выборки принимают departments:
+    None - все разделы, иначе только разделы перечисленных отделов.
+    """
+
+    MANIFEST_VERSION = 3
+
+    def __init__(self, root_dir: str, legacy_file: Optional[str] = None,
+                 department_of: Optional[Callable[[CreditReport], Optional[str]]] = None):
+        self.root_dir = root_dir
+        # Отдел отчета, сохраненного до разделения по отделам (например, по автору)
+        self.department_of = department_of
+        self.manifest_file = os.path.join(root_dir, "manifest.json")
+        self.journal_file = os.path.join(root_dir, "journal.json")
+
+        os.makedirs(root_dir, exist_ok=True)
+
+        self.manifest = self._load_manifest()
+
+        # Распределения сегментов и их объединение; объединение сбрасывается при записи сегмента
+        self._segment_distributions: Dict[str, ReportDistributions] = {}
+        self._distributions: Dict[Optional[FrozenSet[str]], ReportDistributions] = {}
+        # Отсортированные id сегментов (массивы numpy поверх файлов .ids) для поиска отчета по id
+        self._segment_ids: Dict[str, Any] = {}
+
+        # Незавершенная пакетная запись доигрывается из журнала
+        if os.path.exists(self.journal_file):
+            self._replay_journal()
+
+        if self.manifest.get("version", 1) < self.MANIFEST_VERSION:
+            self._upgrade_manifest()
+
+        if legacy_file and os.path.exists(legacy_file):
+            self._migrate_legacy(legacy_file)
+
+    @staticmethod
+    def segment_key(created_at: datetime, department: Optional[str] = None) -> str:
+        return f"{partition_id(department)}/{created_at.strftime('%Y-%m')}"
+
+    @staticmethod
+    def partition_of(key: str) -> Optional[str]:
+        """Раздел сегмента; None - сегмент сохранен до разделения по отделам"""
+
+        return key.split("/", 1)[0] if "/" in key else None
+
+    def _segment_file(self, key: str) -> str:
+        return os.path.join(self.root_dir, f"{key}.json")
+
+    def _distributions_file(self, key: str) -> str:
+        return os.path.join(self.root_dir, f"{key}.dist.json")
+
+    def _ids_file(self, key: str) -> str:
+        return os.path.join(self.root_dir, f"{key}.ids")
+
+    def _load_manifest(self) -> Dict[str, Any]:
+
+        if os.path.exists(self.manifest_file):
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                pass
+        return {"version": self.MANIFEST_VERSION, "segments": {}}
+
+    def _save_manifest(self):
+
+        self._write_json(self.manifest_file, self.manifest)
+
+    def _write_json(self, path: str, data) -> int:
+        """Записывает data и возвращает контрольную сумму записанного файла"""
+
+        payload = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+        # Запись через временный файл, чтобы сбой не оставил сегмент наполовину записанным
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        return zlib.crc32(payload)
+
+    def _department(self, report: CreditReport) -> Optional[str]:
+
+        if report.department is None and self.department_of is not None:
+            report.department = normalize_department(self.department_of(report))
+        return report.department
+
+    def _upgrade_manifest(self):
+
+        # Пересохранение сегментов заполняет поля, появившиеся в новой версии манифеста;
+        # сегменты без раздела раскладываются по разделам отделов одной пакетной записью
+        segments: Dict[str, List[CreditReport]] = {}
+        for key in self.segment_keys():
+            reports = self.load_segment(key)
+            if self.partition_of(key) is not None:
+                segments.setdefault(key, []).extend(reports)
+                continue
+            segments[key] = []
+            for report in reports:
+                new_key = self.segment_key(report.created_at, self._department(report))
+                segments.setdefault(new_key, []).append(report)
+
+        self.manifest["version"] = self.MANIFEST_VERSION
+        self.save_segments(segments)
+
+    def _migrate_legacy(self, legacy_file: str):
+
+        try:
+            with open(legacy_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return
+
+        segments: Dict[str, List[CreditReport]] = {}
+        for report_data in data:
+            report = CreditReport.from_dict(report_data)
+            segments.setdefault(self.segment_key(report.created_at, self._department(report)), []).append(report)
+
+        for key, reports in segments.items():
+            self.save_segment(key, self.load_segment(key) + reports)
+
+        os.replace(legacy_file, f"{legacy_file}.bak")
+
+    def _keys(self, segments: Dict[str, Any], departments: Departments) -> List[str]:
+
+        partitions = partition_set(departments)
+        return sorted(key for key in segments if partitions is None or self.partition_of(key) in partitions)
+
+    # Запись подменяет словарь сегментов манифеста новым, поэтому выборки берут его один раз
+    # и обходят без блокировки
+
+    def segment_keys(self, departments: Departments = None) -> List[str]:
+
+        return self._keys(self.manifest["segments"], departments)
+
+    def segments_since(self, start_date: datetime, departments: Departments = None) -> List[str]:
+
+        start = start_date.isoformat()
+        segments = self.manifest["segments"]
+        return [key for key in self._keys(segments, departments) if segments[key]["max_created_at"] >= start]
+
+    def segments_with_status(self, status_value: str, departments: Departments = None) -> List[str]:
+
+        segments = self.manifest["segments"]
+        return [key for key in self._keys(segments, departments)
+                if segments[key]["status_counts"].get(status_value, 0) > 0]
+
+    def segments_with_creator(self, user_id: str, departments: Departments = None) -> List[str]:
+
+        segments = self.manifest["segments"]
+        return [key for key in self._keys(segments, departments) if user_id in segments[key].get("by_creator", {})]
+
+    def segments_of_departments(self, names: Iterable[Optional[str]], departments: Departments = None) -> List[str]:
+
+        partitions = partition_set(names)
+        return [key for key in self.segment_keys(departments) if self.partition_of(key) in partitions]
+
+    def segments_for_month(self, created_at: datetime, departments: Departments = None) -> List[str]:
+
+        month = created_at.strftime("%Y-%m")
+        return [key for key in self.segment_keys(departments) if key.endswith(f"/{month}")]
+
+    def total_count(self, departments: Departments = None) -> int:
+
+        segments = self.manifest["segments"]
+        return sum(segments[key]["count"] for key in self._keys(segments, departments))
+
+    def segments_before(self, end_date: datetime, departments: Departments = None) -> List[str]:
+
+        end = end_date.isoformat()
+        segments = self.manifest["segments"]
+        return [key for key in self._keys(segments, departments) if segments[key]["min_created_at"] < end]
+
+    @staticmethod
+    def _segment_aggregates(segment: Dict[str, Any]) -> Dict[str, Any]:
+
+        return {
+            "total": segment["count"],
+            "status_counts": segment["status_counts"],
+            "attractiveness_counts": segment.get("attractiveness_counts", {}),
+            "score_sum": segment.get("score_sum", 0),
+            "loan_sum": segment.get("loan_sum", 0.0),
+            "by_creator": segment.get("by_creator", {})
+        }
+
+    def aggregate(self, departments: Departments = None) -> Dict[str, Any]:
+        """Счетчики и суммы по сегментам из манифеста, без чтения отчетов"""
+
+        aggregates = empty_aggregates()
+        segments = self.manifest["segments"]
+        for key in self._keys(segments, departments):
+            merge_aggregates(aggregates, self._segment_aggregates(segments[key]))
+        return aggregates
+
+    def department_aggregates(self) -> Dict[Optional[str], Dict[str, Any]]:
+        """Агрегаты каждого отдела из манифеста: сводка по отделениям без чтения отчетов"""
+
+        result: Dict[Optional[str], Dict[str, Any]] = {}
+        for segment in self.manifest["segments"].values():
+            merge_aggregates(result.setdefault(segment.get("department"), empty_aggregates()),
+                             self._segment_aggregates(segment))
+        return result
+
+    def _load_segment_distributions(self, key: str) -> ReportDistributions:
+
+        if key not in self._segment_distributions:
+            path = self._distributions_file(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._segment_distributions[key] = ReportDistributions.from_dict(json.load(f))
+            except (json.JSONDecodeError, FileNotFoundError, KeyError):
+                distributions = ReportDistributions.from_reports(self.load_segment(key))
+                self._write_json(path, distributions.to_dict())
+                self._segment_distributions[key] = distributions
+        return self._segment_distributions[key]
+
+    def distributions(self, departments: Departments = None) -> ReportDistributions:
+        """Распределения балла и суммы по сегментам разделов, собранные из скетчей сегментов"""
+
+        partitions = partition_set(departments)
+        cache_key = frozenset(partitions) if partitions is not None else None
+        # Запись заменяет кэш новым словарем: объединение по старым сегментам попадет в старый
+        cache = self._distributions
+        if cache_key not in cache:
+            merged = ReportDistributions()
+            for key in self.segment_keys(departments):
+                merged.merge(self._load_segment_distributions(key))
+            cache[cache_key] = merged
+        return cache[cache_key]
+
+    def _write_segment_ids(self, key: str, reports: List[CreditReport], checksum: int):
+
+        import numpy as np
+
+        ids = np.array(sorted(report.id.encode("utf-8") for report in reports), dtype=bytes)
+        # Индекс привязан к контрольной сумме файла сегмента: после перезаписи сегмента он устаревает
+        write_snapshot(self._ids_file(key), {"segment_checksum": checksum}, {"ids": ids})
+        self._segment_ids[key] = ids
+
+    def _load_segment_ids(self, key: str):
+
+        ids = self._segment_ids.get(key)
+        if ids is not None:
+            return ids
+
+        checksum = self.manifest["segments"].get(key, {}).get("checksum")
+        snapshot = read_snapshot(self._ids_file(key))
+        if checksum is not None and snapshot is not None and snapshot.meta.get("segment_checksum") == checksum:
+            self._segment_ids[key] = snapshot.arrays["ids"]
+            return self._segment_ids[key]
+
+        # Индекса нет или он устарел (сегмент записан до появления индексов): строится по файлу сегмента
+        try:
+            with open(self._segment_file(key), 'rb') as f:
+                payload = f.read()
+            reports = [CreditReport.from_dict(report_data) for report_data in json.loads(payload)]
+        except (json.JSONDecodeError, FileNotFoundError):
+            return None
+        checksum = zlib.crc32(payload)
+        self._write_segment_ids(key, reports, checksum)
+
+        segments = self.manifest["segments"]
+        if key in segments and segments[key].get("checksum") != checksum:
+            segments = dict(segments)
+            segments[key] = dict(segments[key], checksum=checksum)
+            self.manifest["segments"] = segments
+            self._save_manifest()
+        return self._segment_ids[key]
+
+    def locate(self, report_id: str, departments: Departments = None) -> Optional[str]:
+        """Ключ сегмента, содержащего отчет report_id, по индексам id без чтения сегментов"""
+
+        import numpy as np
+
+        needle = report_id.encode("utf-8")
+        for key in self.segment_keys(departments):
+            ids = self._load_segment_ids(key)
+            if ids is None or not len(ids) or len(needle) > ids.dtype.itemsize:
+                continue
+            position = int(np.searchsorted(ids, needle))
+            if position < len(ids) and ids[position] == needle:
+                return key
+        return None
+
+    def load_segment(self, key: str) -> List[CreditReport]:
+
+        path = self._segment_file(key)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                    return [CreditReport.from_dict(report_data) for report_data in data]
+            except (json.JSONDecodeError, FileNotFoundError):
+                pass
+        return []
+
+    def save_segment(self, key: str, reports: List[CreditReport]):
+
+        self._store_segment(key, reports)
+        self._save_manifest()
+
+    def save_segments(self, segments: Dict[str, List[CreditReport]]):
+        """Пакетная запись нескольких сегментов: либо применяется целиком, либо доигрывается после сбоя"""
+
+        journal = {key: [report.to_dict() for report in reports] for key, reports in segments.items()}
+        self._write_json(self.journal_file, journal)
+
+        for key, reports in segments.items():
+            self._store_segment(key, reports)
+        self._save_manifest()
+
+        os.remove(self.journal_file)
+
+    def _replay_journal(self):
+
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                journal = json.load(f)
+        except json.JSONDecodeError:
+            # Журнал не дописан - значит, ни один сегмент еще не перезаписывался
+            os.remove(self.journal_file)
+            return
+
+        self.save_segments({key: [CreditReport.from_dict(report_data) for report_data in data]
+                            for key, data in journal.items()})
+
+    def _store_segment(self, key: str, reports: List[CreditReport]):
+
+        # Копия словаря сегментов: читатели без блокировки дообходят прежний
+        segments = dict(self.manifest["segments"])
+
+        if not reports:
+            for path in (self._segment_file(key), self._distributions_file(key), self._ids_file(key)):
+                if os.path.exists(path):
+                    os.remove(path)
+            segments.pop(key, None)
+            self._segment_distributions.pop(key, None)
+            self._segment_ids.pop(key, None)
+            self._publish_segments(segments)
+            return
+
+        checksum = self._write_json(self._segment_file(key), [report.to_dict() for report in reports])
+        self._write_segment_ids(key, reports, checksum)
+
+        # Скетчи сегмента пересчитываются при каждой записи: сегмент и так читается целиком
+        distributions = ReportDistributions.from_reports(reports)
+        self._write_json(self._distributions_file(key), distributions.to_dict())
+        self._segment_distributions[key] = distributions
+
+        aggregates = empty_aggregates()
+        for report in reports:
+            fold_report(aggregates, report)
+
+        segments[key] = {
+            "file": os.path.relpath(self._segment_file(key), self.root_dir),
+            "department": reports[0].department,
+            "checksum": checksum,
+            "count": len(reports),
+            "min_created_at": min(r.created_at for r in reports).isoformat(),
+            "max_created_at": max(r.created_at for r in reports).isoformat(),
+            "status_counts": aggregates["status_counts"],
+            "attractiveness_counts": aggregates["attractiveness_counts"],
+            "score_sum": aggregates["score_sum"],
+            "loan_sum": aggregates["loan_sum"],
+            "by_creator": aggregates["by_creator"]
+        }
+        self._publish_segments(segments)
+
+    def _publish_segments(self, segments: Dict[str, Any]):
+
+        self.manifest["segments"] = segments
+        # Кэш объединенных распределений сбрасывается после публикации новых сегментов
+        self._distributions = {}
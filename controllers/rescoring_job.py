@@ -0,0 +1,349 @@
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import replace
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from models.report import CreditReport, AnalysisResult
+from .data_controller import DataController
+from .credit_controller import CreditController
+from .analysis_cache import AnalysisCache
+from .scoring_rules import DEFAULT_RULES_FILE
+
+# Размер порции пересчета и пауза между порциями, чтобы не мешать онлайн-пользователям
+RESCORING_CHUNK_SIZE = 200
+RESCORING_THROTTLE_SECONDS = 0.05
+
+# Поля отчета, которые пересчитываются по текущим правилам
+RESCORED_FIELDS = ("score", "max_loan_amount", "credit_attractiveness", "risk_level",
+                   "recommendations", "blacklist_found")
+
+
+class RescoringJob:
+    """Пересчет сохраненных отчетов после изменения правил скоринга или черного списка.
+
+    Отчет не хранит входные данные, по которым он был рассчитан, а запись заемщика после повторной
+    подачи заявки содержит данные последней заявки. Поэтому пересчитывается только последний отчет
+    заемщика; более ранние отчеты по нему остаются с прежними значениями.
+
+    Контрольная точка общая для всех сессий, чтобы прерванный пересчет продолжил любой руководитель,
+    но работать с ней может только задание, захватившее файл блокировки.
+    """
+
+    def __init__(self, data_controller: DataController, rules_file: str = DEFAULT_RULES_FILE,
+                 chunk_size: int = RESCORING_CHUNK_SIZE,
+                 throttle_seconds: float = RESCORING_THROTTLE_SECONDS,
+                 apply: bool = True, work_dir: Optional[str] = None):
+        self.data_controller = data_controller
+        # Собственный кэш, чтобы пересчет не вытеснял результаты онлайн-анализа
+        self.credit_controller = CreditController(data_controller, rules_file,
+                                                  analysis_cache=AnalysisCache(max_size=chunk_size))
+        self.chunk_size = chunk_size
+        self.throttle_seconds = throttle_seconds
+        self.apply = apply
+
+        self.work_dir = work_dir or os.path.join(data_controller.data_dir, "rescoring")
+        # Первая строка - параметры пересчета, далее по строке на обработанную порцию
+        self.checkpoint_file = os.path.join(self.work_dir, "checkpoint.jsonl")
+        self.lock_file = os.path.join(self.work_dir, "rescoring.lock")
+        self.job_id = str(uuid.uuid4())
+        os.makedirs(self.work_dir, exist_ok=True)
+
+        self._thread: Optional[threading.Thread] = None
+        self._cancel = threading.Event()
+        self._progress_lock = threading.Lock()
+        self._progress: Dict[str, Any] = {
+            "state": "idle",
+            "total": 0,
+            "processed": 0,
+            "changed": 0,
+            "skipped": 0,
+            "started_at": None,
+            "finished_at": None,
+            "diff_file": None,
+            "error": None
+        }
+
+    def _token(self) -> Dict[str, Any]:
+
+        return {
+            "rules_version": self.credit_controller.rules.version,
+            "blacklist": sorted(self.data_controller.blacklist),
+            "apply": self.apply
+        }
+
+    def is_affected(self, report: CreditReport) -> bool:
+
+        # Отчеты без разбивки по факторам (созданные до ее появления) тоже пересчитываются, кроме черного списка
+        return (report.rules_version != self.credit_controller.rules.version or
+                report.blacklist_found != self.data_controller.check_blacklist(report.borrower_name) or
+                (report.factor_scores is None and not report.blacklist_found))
+
+    def find_affected(self) -> List[CreditReport]:
+
+        reports = self.data_controller.get_all_reports()
+        # Ранние отчеты заемщика рассчитаны по данным прежних заявок, которых больше нет
+        latest: Dict[str, CreditReport] = {}
+        for report in reports:
+            current = latest.get(report.borrower_id)
+            if current is None or report.created_at >= current.created_at:
+                latest[report.borrower_id] = report
+        return [r for r in reports if latest[r.borrower_id] is r and self.is_affected(r)]
+
+    def count_affected(self) -> int:
+
+        return len(self.find_affected())
+
+    def has_checkpoint(self) -> bool:
+
+        return os.path.exists(self.checkpoint_file)
+
+    def lock_owner(self) -> Optional[Dict[str, Any]]:
+        """Задание, которое держит блокировку пересчета; None, если блокировки нет или ее процесс завершился"""
+
+        try:
+            with open(self.lock_file, 'r', encoding='utf-8') as f:
+                owner = json.load(f)
+            os.kill(owner["pid"], 0)
+        except ProcessLookupError:
+            return None
+        except (json.JSONDecodeError, FileNotFoundError, KeyError, TypeError):
+            return None
+        except PermissionError:
+            pass
+        return owner
+
+    def is_locked_by_other(self) -> bool:
+
+        owner = self.lock_owner()
+        return owner is not None and owner["job_id"] != self.job_id
+
+    def _acquire_lock(self) -> bool:
+
+        for _ in range(2):
+            try:
+                fd = os.open(self.lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self.lock_owner() is not None:
+                    return False
+                # Блокировка осталась от упавшего процесса
+                try:
+                    os.remove(self.lock_file)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"job_id": self.job_id, "pid": os.getpid(),
+                           "started_at": datetime.now().isoformat()}, f)
+            return True
+        return False
+
+    def _release_lock(self):
+
+        owner = self.lock_owner()
+        if owner is not None and owner["job_id"] == self.job_id:
+            os.remove(self.lock_file)
+
+    def progress(self) -> Dict[str, Any]:
+
+        with self._progress_lock:
+            return dict(self._progress)
+
+    def _update_progress(self, **values):
+
+        with self._progress_lock:
+            self._progress.update(values)
+
+    def is_running(self) -> bool:
+
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+
+        if self.is_running() or not self._acquire_lock():
+            return False
+
+        self._cancel.clear()
+        self._thread = threading.Thread(target=self._run_safely, name="rescoring-job", daemon=True)
+        self._thread.start()
+        return True
+
+    def cancel(self):
+
+        self._cancel.set()
+
+    def _run_safely(self):
+
+        try:
+            self._run()
+        except Exception as e:
+            self._update_progress(state="failed", error=str(e), finished_at=datetime.now())
+        finally:
+            self._release_lock()
+
+    def _read_checkpoint(self) -> List[Dict[str, Any]]:
+
+        entries = []
+        try:
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # Недописанная при сбое строка: порция будет пересчитана заново
+                        break
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _load_checkpoint(self, token: Dict[str, Any]) -> Dict[str, Any]:
+        """Счетчики и обработанные отчеты контрольной точки; без нее или при другом token - пустые"""
+
+        entries = self._read_checkpoint()
+        # Контрольная точка подходит, только если правила и черный список с тех пор не менялись
+        if not entries or entries[0].get("token") != token:
+            with open(self.checkpoint_file, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({"token": token}, ensure_ascii=False) + "\n")
+            entries = entries[:0]
+        else:
+            entries = entries[1:]
+
+        return {
+            "processed_ids": {report_id for entry in entries for report_id in entry["processed_ids"]},
+            "changed": sum(1 for entry in entries for change in entry["changes"] if change["changed_fields"]),
+            "skipped": sum(entry["skipped"] for entry in entries)
+        }
+
+    def _append_checkpoint(self, entry: Dict[str, Any]):
+
+        with open(self.checkpoint_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _checkpoint_changes(self) -> List[Dict[str, Any]]:
+
+        return [change for entry in self._read_checkpoint()[1:] for change in entry["changes"]]
+
+    def _write_json(self, path: str, data):
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _diff(report: CreditReport, result: AnalysisResult, blacklisted: bool) -> Dict[str, Any]:
+
+        new_values = {
+            "score": result.score,
+            "max_loan_amount": result.max_loan_amount,
+            "credit_attractiveness": result.credit_attractiveness,
+            "risk_level": result.risk_level,
+            "recommendations": result.recommendations,
+            "blacklist_found": blacklisted
+        }
+        changed_fields = [name for name in RESCORED_FIELDS if getattr(report, name) != new_values[name]]
+
+        return {
+            "report_id": report.id,
+            "borrower_name": report.borrower_name,
+            "status": report.status.value,
+            "old": {name: getattr(report, name) for name in changed_fields},
+            "new": new_values,
+            "changed_fields": changed_fields,
+            "rules_version": result.rules_version,
+            "factor_scores": result.factor_scores.hex() if result.factor_scores is not None else None
+        }
+
+    def run(self) -> Dict[str, Any]:
+
+        if not self._acquire_lock():
+            raise RuntimeError("Пересчет уже выполняется в другой сессии")
+        try:
+            return self._run()
+        finally:
+            self._release_lock()
+
+    def _run(self) -> Dict[str, Any]:
+
+        token = self._token()
+        checkpoint = self._load_checkpoint(token)
+        processed_ids = checkpoint["processed_ids"]
+        processed, changed, skipped = len(processed_ids), checkpoint["changed"], checkpoint["skipped"]
+
+        affected = [r for r in self.find_affected() if r.id not in processed_ids]
+        borrowers = {b.id: b for b in self.data_controller.borrowers}
+
+        self._update_progress(
+            state="running", error=None, diff_file=None,
+            total=processed + len(affected), processed=processed, changed=changed,
+            skipped=skipped, started_at=datetime.now(), finished_at=None
+        )
+
+        for start in range(0, len(affected), self.chunk_size):
+            if self._cancel.is_set():
+                self._update_progress(state="cancelled", finished_at=datetime.now())
+                return self.progress()
+
+            chunk = affected[start:start + self.chunk_size]
+            scorable = [(r, borrowers[r.borrower_id]) for r in chunk if r.borrower_id in borrowers]
+
+            # Копии заемщиков: анализ помечает их флагом черного списка
+            results = self.credit_controller.analyze_borrowers([replace(b) for _, b in scorable])
+            changes = [self._diff(report, result, blacklisted)
+                       for (report, _), (result, blacklisted, _) in zip(scorable, results)]
+
+            # В контрольную точку дописывается только новая порция, счетчики ведутся нарастающим итогом
+            self._append_checkpoint({"processed_ids": [r.id for r in chunk], "changes": changes,
+                                     "skipped": len(chunk) - len(scorable)})
+            processed += len(chunk)
+            changed += sum(1 for change in changes if change["changed_fields"])
+            skipped += len(chunk) - len(scorable)
+
+            self._update_progress(processed=processed, changed=changed, skipped=skipped)
+            time.sleep(self.throttle_seconds)
+
+        all_changes = self._checkpoint_changes()
+        diff_file = os.path.join(self.work_dir, f"diff_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        self._write_json(diff_file, {
+            "created_at": datetime.now().isoformat(),
+            "rules_version": token["rules_version"],
+            "applied": self.apply,
+            "skipped": skipped,
+            "changes": [change for change in all_changes if change["changed_fields"]]
+        })
+
+        if self.apply:
+            self._commit(all_changes)
+
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+        self._update_progress(state="completed", diff_file=diff_file, finished_at=datetime.now())
+        return self.progress()
+
+    def _commit(self, changes: List[Dict[str, Any]]):
+
+        # Значения накладываются на актуальные отчеты: статус и примечания,
+        # измененные за время пересчета, сохраняются
+        current = {r.id: r for r in self.data_controller.get_all_reports()}
+
+        updated = []
+        for change in changes:
+            report = current.get(change["report_id"])
+            if report is None:
+                continue
+            factor_scores = change.get("factor_scores")
+            updated.append(replace(report, rules_version=change["rules_version"],
+                                   blacklist_check=report.blacklist_check or change["new"]["blacklist_found"],
+                                   factor_scores=bytes.fromhex(factor_scores) if factor_scores else None,
+                                   **change["new"]))
+
+        self.data_controller.update_reports(updated, author_id="system", author_name="Пересчет портфеля")
+
+    def load_diff(self, diff_file: str) -> Dict[str, Any]:
+
+        with open(diff_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
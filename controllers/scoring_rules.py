@@ -0,0 +1,269 @@
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from typing import List, Tuple, Dict, Any
+from models.report import AnalysisResult
+
+DEFAULT_RULES_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "scoring_rules.json")
+
+FACTOR_NAMES = ("debt", "history", "employment", "income", "savings")
+
+FACTOR_LABELS = {
+    "debt": "Долговая нагрузка",
+    "history": "Кредитная история",
+    "employment": "Стаж",
+    "income": "Располагаемый доход",
+    "savings": "Сбережения"
+}
+
+FACTOR_RECOMMENDATIONS = {
+    "debt": "Уменьшите текущую задолженность",
+    "history": "Улучшите кредитную историю (своевременно оплачивайте счета)",
+    "employment": "Увеличьте стаж работы на текущем месте",
+    "income": "Увеличьте располагаемый доход",
+    "savings": "Создайте финансовую подушку безопасности"
+}
+LOW_HISTORY_RECOMMENDATION = \
+    "Рассмотрите возможность получения небольшого кредита и его своевременного погашения"
+SHORT_EMPLOYMENT_RECOMMENDATION = "Стабильная занятость более 1 года повысит шансы на одобрение"
+NO_RECOMMENDATIONS = "Ваши финансовые показатели находятся на хорошем уровне"
+
+
+def pack_factor_scores(*scores) -> bytes:
+    """Баллы факторов 0-100 в компактной форме: по одному байту на фактор"""
+
+    return bytes(min(max(int(round(score)), 0), 255) for score in scores)
+
+
+class ThresholdTable:
+    """Ступенчатая шкала: пороги по возрастанию и значение для каждого интервала"""
+
+    __slots__ = ("thresholds", "values", "side", "_find")
+
+    def __init__(self, thresholds: List[float], values: List, compare: str):
+        if compare not in ("gt", "ge"):
+            raise ValueError(f"Неизвестный тип сравнения: {compare}")
+        if len(values) != len(thresholds) + 1:
+            raise ValueError("Значений должно быть на одно больше, чем порогов")
+        if list(thresholds) != sorted(thresholds):
+            raise ValueError("Пороги должны идти по возрастанию")
+
+        self.thresholds = tuple(thresholds)
+        self.values = tuple(values)
+        # "gt": значение выбирается по числу порогов строго меньше x, "ge" - меньше или равных x
+        self.side = "left" if compare == "gt" else "right"
+        self._find = bisect_left if compare == "gt" else bisect_right
+
+    def lookup(self, x):
+        return self.values[self._find(self.thresholds, x)]
+
+    def lookup_array(self, xs):
+        import numpy as np
+        return np.asarray(self.values)[np.searchsorted(self.thresholds, xs, side=self.side)]
+
+
+class ScoringRules:
+    """Скомпилированные правила скоринга из конфигурационного файла"""
+
+    def __init__(self, config: Dict[str, Any]):
+        factors = config["factors"]
+
+        self.version = str(config["version"])
+        self.debt_table = self._table(factors["debt_ratio"], "scores")
+        self.no_income_debt_score = factors["debt_ratio"].get("no_income_score", 0)
+        self.employment_table = self._table(factors["employment_years"], "scores")
+        self.income_table = self._table(factors["disposable_income"], "scores")
+        self.savings_table = self._table(factors["savings_ratio"], "scores")
+
+        self.weights: Tuple[float, ...] = tuple(float(config["weights"][name]) for name in FACTOR_NAMES)
+
+        bands = config["bands"]
+        self.band_table = ThresholdTable(
+            bands["thresholds"],
+            list(zip(bands["attractiveness"], bands["risk"])),
+            bands["compare"]
+        )
+
+        # Балл, с которого начинается лучшая категория привлекательности
+        self.top_band_score = self.band_table.thresholds[-1]
+
+        loan = config["loan"]
+        self.loan_income_share = float(loan["disposable_income_share"])
+        self.loan_months = int(loan["months"])
+        self.full_employment_years = float(loan["full_employment_years"])
+
+        self.approval_min_score = int(config["approval_min_score"])
+
+        # Сетка сроков и ставок кредитного калькулятора и предельная долговая нагрузка
+        self.loan_products: Dict[str, Any] = dict(config.get("loan_products", {}))
+
+        recommendations = config["recommendations"]
+        self.recommendation_factor_below = {name: recommendations["factor_below"][name]
+                                            for name in FACTOR_NAMES}
+        self.recommendation_history_below = recommendations["credit_history_score_below"]
+        self.recommendation_employment_below = recommendations["employment_years_below"]
+
+        self._band_index_table = ThresholdTable(
+            self.band_table.thresholds, list(range(len(self.band_table.values))), bands["compare"])
+
+        self.analyze, self.build_result = self._compile()
+
+    @staticmethod
+    def _branch_source(variable: str, target: str, table: ThresholdTable, indent: str) -> List[str]:
+
+        operator = ">" if table.side == "left" else ">="
+        lines = []
+        for i in reversed(range(len(table.thresholds))):
+            keyword = "if" if i == len(table.thresholds) - 1 else "elif"
+            lines.append(f"{indent}{keyword} {variable} {operator} {table.thresholds[i]!r}:")
+            lines.append(f"{indent}    {target} = {table.values[i + 1]!r}")
+        lines.append(f"{indent}else:")
+        lines.append(f"{indent}    {target} = {table.values[0]!r}")
+        return lines
+
+    def _result_source(self, indent: str) -> List[str]:
+
+        below = self.recommendation_factor_below
+        lines = [
+            f"{indent}recommendations = []",
+            f"{indent}if total_score < {self.top_band_score!r}:",
+        ]
+        for name in FACTOR_NAMES:
+            lines.append(f"{indent}    if {name}_score < {below[name]!r}:")
+            lines.append(f"{indent}        recommendations.append({FACTOR_RECOMMENDATIONS[name]!r})")
+        lines += [
+            f"{indent}if credit_history_score < {self.recommendation_history_below!r}:",
+            f"{indent}    recommendations.append({LOW_HISTORY_RECOMMENDATION!r})",
+            f"{indent}if employment_years < {self.recommendation_employment_below!r}:",
+            f"{indent}    recommendations.append({SHORT_EMPLOYMENT_RECOMMENDATION!r})",
+            f"{indent}if not recommendations:",
+            f"{indent}    recommendations.append({NO_RECOMMENDATIONS!r})",
+            f"{indent}attractiveness, risk = BANDS[band_index]",
+            f"{indent}return AnalysisResult(round(max_loan, 2), attractiveness, risk, "
+            f"recommendations, total_score, {self.version!r}, "
+            f"pack_factor_scores({', '.join(f'{name}_score' for name in FACTOR_NAMES)}))",
+        ]
+        return lines
+
+    def _compile(self):
+        """Компилирует правила в функции Python с порогами и весами, подставленными как константы"""
+
+        w_debt, w_history, w_employment, w_income, w_savings = self.weights
+
+        analyze_lines = [
+            "def analyze(income, expenses, credit_history_score, existing_loans, employment_years):",
+            "    disposable_income = income - expenses",
+            "    if income > 0:",
+            "        debt_ratio = (existing_loans / income) * 100",
+            *self._branch_source("debt_ratio", "debt_score", self.debt_table, "        "),
+            "        savings_ratio = disposable_income / income",
+            "    else:",
+            f"        debt_score = {self.no_income_debt_score!r}",
+            "        savings_ratio = 0",
+            "    history_score = credit_history_score",
+            *self._branch_source("employment_years", "employment_score", self.employment_table, "    "),
+            *self._branch_source("disposable_income", "income_score", self.income_table, "    "),
+            *self._branch_source("savings_ratio", "savings_score", self.savings_table, "    "),
+            # Порядок суммирования совпадает с векторным путем, поэтому результаты идентичны
+            f"    total_score = int(debt_score * {w_debt!r} + history_score * {w_history!r} + "
+            f"employment_score * {w_employment!r} + income_score * {w_income!r} + "
+            f"savings_score * {w_savings!r})",
+            f"    max_loan = (disposable_income * {self.loan_months!r} * {self.loan_income_share!r} * "
+            f"(total_score / 100) * (credit_history_score / 100) * "
+            f"min(1, employment_years / {self.full_employment_years!r}))",
+            *self._branch_source("total_score", "band_index", self._band_index_table, "    "),
+            *self._result_source("    "),
+        ]
+
+        # Для пакетного пути баллы считаются векторно, а здесь только собирается результат
+        build_lines = [
+            "def build_result(debt_score, history_score, employment_score, income_score, savings_score,",
+            "                 total_score, max_loan, band_index, credit_history_score, employment_years):",
+            *self._result_source("    "),
+        ]
+
+        namespace: Dict[str, Any] = {"AnalysisResult": AnalysisResult, "BANDS": self.band_table.values,
+                                     "pack_factor_scores": pack_factor_scores}
+        source = "\n".join(analyze_lines + [""] + build_lines)
+        exec(compile(source, f"<scoring rules {self.version}>", "exec"), namespace)
+        return namespace["analyze"], namespace["build_result"]
+
+    @staticmethod
+    def _table(spec: Dict[str, Any], values_key: str) -> ThresholdTable:
+        return ThresholdTable(spec["thresholds"], spec[values_key], spec["compare"])
+
+    @classmethod
+    def from_file(cls, path: str) -> "ScoringRules":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def band(self, total_score: int) -> Tuple[str, str]:
+        return self.band_table.lookup(total_score)
+
+    def evaluate_arrays(self, income, expenses, credit_history_score,
+                        existing_loans, employment_years) -> Dict[str, Any]:
+        """Векторный расчет тех же правил для массивов входных данных"""
+
+        import numpy as np
+
+        income = np.asarray(income, dtype=float)
+        expenses = np.asarray(expenses, dtype=float)
+        history = np.asarray(credit_history_score, dtype=float)
+        existing_loans = np.asarray(existing_loans, dtype=float)
+        employment_years = np.asarray(employment_years, dtype=float)
+
+        disposable_income = income - expenses
+        has_income = income > 0
+        safe_income = np.where(has_income, income, 1.0)
+
+        debt_score = np.where(has_income,
+                              self.debt_table.lookup_array((existing_loans / safe_income) * 100),
+                              self.no_income_debt_score)
+        savings_ratio = np.where(has_income, disposable_income / safe_income, 0.0)
+
+        factors = (
+            debt_score,
+            history,
+            self.employment_table.lookup_array(employment_years),
+            self.income_table.lookup_array(disposable_income),
+            self.savings_table.lookup_array(savings_ratio)
+        )
+
+        w_debt, w_history, w_employment, w_income, w_savings = self.weights
+        total_score = (factors[0] * w_debt + factors[1] * w_history + factors[2] * w_employment +
+                       factors[3] * w_income + factors[4] * w_savings).astype(int)
+
+        base_amount = disposable_income * self.loan_months * self.loan_income_share
+        max_loan = (base_amount * (total_score / 100) * (history / 100) *
+                    np.minimum(1, employment_years / self.full_employment_years))
+
+        return {
+            "factors": factors,
+            "total_score": total_score,
+            "max_loan": max_loan,
+            "band_index": np.searchsorted(self.band_table.thresholds, total_score,
+                                          side=self.band_table.side)
+        }
+
+
+# Как часто проверять, не изменился ли файл правил (секунды)
+RULES_CHECK_INTERVAL = 1.0
+
+_rules_cache: Dict[str, Tuple[float, ScoringRules]] = {}
+_rules_lock = threading.Lock()
+
+
+def get_scoring_rules(path: str = DEFAULT_RULES_FILE) -> ScoringRules:
+    """Возвращает скомпилированные правила; файл перечитывается только после изменения"""
+
+    with _rules_lock:
+        mtime = os.path.getmtime(path)
+        cached = _rules_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        rules = ScoringRules.from_file(path)
+        _rules_cache[path] = (mtime, rules)
+        return rules
@@ -0,0 +1,72 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+# Если переменная задана, после первой отрисовки отчет о запуске выводится в stderr
+STARTUP_REPORT_ENV = "CREDIT_STARTUP_REPORT"
+REPORT_MARKER = "CREDIT_STARTUP_REPORT "
+
+# Бюджет времени от импорта app.py до отрисовки страницы входа
+STARTUP_BUDGET_MS = float(os.environ.get("CREDIT_STARTUP_BUDGET_MS", "1500"))
+
+
+class StartupProfiler:
+    """Время этапов запуска процесса приложения: импорты, загрузка данных и первая отрисовка"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+        self.first_render_ms: Optional[float] = None
+        self.first_page: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _elapsed_ms(self, since: Optional[float] = None) -> float:
+        return round((time.perf_counter() - (since or self.started)) * 1000, 1)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Замеряет этап; повторные выполнения (например, при rerun Streamlit) не записываются"""
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                if not any(stage["stage"] == name for stage in self.stages):
+                    self.stages.append({
+                        "stage": name,
+                        "thread": threading.current_thread().name,
+                        "start_ms": round((started - self.started) * 1000, 1),
+                        "ms": self._elapsed_ms(started)
+                    })
+
+    def mark_first_render(self, page: str):
+
+        with self._lock:
+            if self.first_render_ms is not None:
+                return
+            self.first_render_ms = self._elapsed_ms()
+            self.first_page = page
+
+        if os.environ.get(STARTUP_REPORT_ENV):
+            sys.stderr.write(REPORT_MARKER + json.dumps(self.report(), ensure_ascii=False) + "\n")
+            sys.stderr.flush()
+
+    def report(self) -> Dict[str, Any]:
+
+        with self._lock:
+            return {
+                "first_render_ms": self.first_render_ms,
+                "first_page": self.first_page,
+                "budget_ms": STARTUP_BUDGET_MS,
+                "over_budget": self.first_render_ms is not None and self.first_render_ms > STARTUP_BUDGET_MS,
+                "stages": sorted(self.stages, key=lambda stage: stage["start_ms"])
+            }
+
+
+# Один профиль на процесс: модули Streamlit переиспользуются между сессиями
+profiler = StartupProfiler()
@@ -0,0 +1,118 @@
+from typing import Dict, Any, Optional, Sequence
+from models.borrower import Borrower
+from .credit_controller import CreditController
+
+# Шаги сетки по умолчанию: относительные изменения дохода, расходов и кредитов и прибавка стажа
+DEFAULT_INCOME_CHANGES = (-0.3, -0.2, -0.1, 0.0, 0.1, 0.2, 0.3, 0.5, 1.0)
+DEFAULT_EXPENSE_CHANGES = (-0.5, -0.3, -0.2, -0.1, 0.0, 0.1, 0.2, 0.3)
+DEFAULT_LOAN_CHANGES = (-1.0, -0.75, -0.5, -0.25, 0.0, 0.25)
+DEFAULT_EMPLOYMENT_CHANGES = (0, 1, 2, 3, 5)
+
+# Число точек поиска минимального изменения по каждому параметру
+SEARCH_POINTS = 2001
+
+
+class WhatIfController:
+    """Анализ чувствительности: пересчет скоринга по сетке изменений без сохранения"""
+
+    def __init__(self, credit_controller: CreditController):
+        self.credit_controller = credit_controller
+
+    def explore(self, borrower: Borrower,
+                income_changes: Sequence[float] = DEFAULT_INCOME_CHANGES,
+                expense_changes: Sequence[float] = DEFAULT_EXPENSE_CHANGES,
+                loan_changes: Sequence[float] = DEFAULT_LOAN_CHANGES,
+                employment_changes: Sequence[int] = DEFAULT_EMPLOYMENT_CHANGES) -> Dict[str, Any]:
+
+        import numpy as np
+
+        rules = self.credit_controller.rules
+
+        incomes = np.maximum(0.0, borrower.income * (1 + np.asarray(income_changes, dtype=float)))
+        expenses = np.maximum(0.0, borrower.expenses * (1 + np.asarray(expense_changes, dtype=float)))
+        loans = np.maximum(0.0, borrower.existing_loans * (1 + np.asarray(loan_changes, dtype=float)))
+        years = np.maximum(0, borrower.employment_years + np.asarray(employment_changes, dtype=int))
+
+        # Вся сетка считается одним векторным проходом: оси income x expenses x loans x years
+        income_grid, expense_grid, loan_grid, years_grid = np.meshgrid(
+            incomes, expenses, loans, years, indexing="ij")
+
+        evaluated = rules.evaluate_arrays(
+            income_grid, expense_grid,
+            np.full(income_grid.shape, borrower.credit_history_score),
+            loan_grid, years_grid
+        )
+
+        return {
+            "rules_version": rules.version,
+            "income": incomes,
+            "expenses": expenses,
+            "existing_loans": loans,
+            "employment_years": years,
+            "score": evaluated["total_score"],
+            "max_loan": np.round(evaluated["max_loan"], 2),
+            "band_index": evaluated["band_index"],
+            "bands": rules.band_table.values
+        }
+
+    def minimal_changes(self, borrower: Borrower) -> Dict[str, Any]:
+
+        import numpy as np
+
+        rules = self.credit_controller.rules
+        current = rules.analyze(borrower.income, borrower.expenses, borrower.credit_history_score,
+                                borrower.existing_loans, borrower.employment_years)
+
+        bands = rules.band_table.values
+        current_band = bands.index((current.credit_attractiveness, current.risk_level))
+
+        result: Dict[str, Any] = {
+            "score": current.score,
+            "band": bands[current_band],
+            "target_band": None,
+            "changes": {}
+        }
+
+        if current_band == len(bands) - 1:
+            return result
+
+        target_band = current_band + 1
+        result["target_band"] = bands[target_band]
+        result["target_score"] = rules.band_table.thresholds[current_band]
+
+        # Для каждого параметра остальные остаются прежними; изменения перебираются от меньшего к большему
+        candidates = {
+            "income": np.linspace(borrower.income, borrower.income * 3 + 100000, SEARCH_POINTS),
+            "expenses": np.linspace(borrower.expenses, 0, SEARCH_POINTS),
+            "existing_loans": np.linspace(borrower.existing_loans, 0, SEARCH_POINTS),
+            "employment_years": np.arange(borrower.employment_years, borrower.employment_years + 31)
+        }
+
+        for name, values in candidates.items():
+            inputs = {
+                "income": np.full(values.shape, borrower.income, dtype=float),
+                "expenses": np.full(values.shape, borrower.expenses, dtype=float),
+                "existing_loans": np.full(values.shape, borrower.existing_loans, dtype=float),
+                "employment_years": np.full(values.shape, borrower.employment_years, dtype=float),
+            }
+            inputs[name] = values.astype(float)
+
+            evaluated = rules.evaluate_arrays(
+                inputs["income"], inputs["expenses"],
+                np.full(values.shape, borrower.credit_history_score),
+                inputs["existing_loans"], inputs["employment_years"]
+            )
+
+            reached = np.nonzero(evaluated["band_index"] >= target_band)[0]
+            result["changes"][name] = self._change(values, reached, getattr(borrower, name))
+
+        return result
+
+    @staticmethod
+    def _change(values, reached, baseline) -> Optional[Dict[str, float]]:
+
+        if len(reached) == 0:
+            return None
+
+        value = float(values[reached[0]])
+        return {"value": round(value, 2), "delta": round(value - baseline, 2)}
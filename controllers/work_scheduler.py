@@ -0,0 +1,209 @@
+import itertools
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Callable, Hashable, List, Tuple
+
+# Приоритеты: меньшее значение выполняется раньше
+PRIORITY_WRITE = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_ANALYTICS = 2
+
+SCHEDULER_WORKERS = int(os.environ.get("CREDIT_SCHEDULER_WORKERS", "2"))
+
+# Сколько вычислений одной операции выполняется одновременно во всем процессе
+OPERATION_LIMITS = {
+    "analytics": 1,
+    "all_reports": 2
+}
+DEFAULT_OPERATION_LIMIT = 1
+
+RESULT_CACHE_SIZE = 256
+
+# Результат старше этого срока пересчитывается, даже если данные не менялись
+# (например, фильтр "Неделя" сдвигается вместе с текущим временем)
+RESULT_MAX_AGE_SECONDS = 300
+
+IDLE_POLL_SECONDS = 0.5
+
+
+class _Task:
+
+    def __init__(self, operation: str, key: Hashable, version: Any, compute: Callable[[], Any], priority: int):
+        self.operation = operation
+        self.key = key
+        self.version = version
+        self.compute = compute
+        self.priority = priority
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class _Entry:
+
+    def __init__(self, version: Any, value: Any):
+        self.version = version
+        self.value = value
+        self.computed_at = time.time()
+
+
+class WorkScheduler:
+    """Очередь тяжелых вычислений страниц с приоритетами, лимитами по операциям и кэшем результатов.
+
+    Пока выполняется запись или интерактивное действие (foreground), аналитика не запускается.
+    Устаревший результат отдается сразу, а пересчет ставится в очередь (stale-while-revalidate).
+    """
+
+    def __init__(self, workers: int = SCHEDULER_WORKERS, limits: Optional[Dict[str, int]] = None,
+                 cache_size: int = RESULT_CACHE_SIZE, max_age: float = RESULT_MAX_AGE_SECONDS):
+        self.workers = workers
+        self.limits = dict(OPERATION_LIMITS if limits is None else limits)
+        self.cache_size = cache_size
+        self.max_age = max_age
+
+        self._cond = threading.Condition()
+        self._queue: List[Tuple[int, int, _Task]] = []
+        self._order = itertools.count()
+        self._pending: Dict[Tuple[str, Hashable], _Task] = {}
+        self._running: Dict[str, int] = {}
+        self._foreground = 0
+        self._cache: "OrderedDict[Tuple[str, Hashable], _Entry]" = OrderedDict()
+        self._threads: List[threading.Thread] = []
+
+    def _ensure_workers(self):
+
+        if not self._threads:
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"work-scheduler-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    @contextmanager
+    def foreground(self):
+        """Запись или интерактивное действие: новые задачи аналитики ждут его завершения"""
+
+        with self._cond:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._foreground -= 1
+                self._cond.notify_all()
+
+    def _next_task(self) -> Optional[_Task]:
+
+        # Очередь короткая, поэтому на каждом шаге просто сортируется по приоритету и порядку постановки
+        for item in sorted(self._queue, key=lambda queued: queued[:2]):
+            priority, _, task = item
+            if priority >= PRIORITY_ANALYTICS and self._foreground:
+                return None
+            if self._running.get(task.operation, 0) < self.limits.get(task.operation, DEFAULT_OPERATION_LIMIT):
+                self._queue.remove(item)
+                return task
+        return None
+
+    def _work(self):
+
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None:
+                    self._cond.wait(IDLE_POLL_SECONDS)
+                    task = self._next_task()
+                self._running[task.operation] = self._running.get(task.operation, 0) + 1
+
+            try:
+                value = task.compute()
+            except Exception as e:
+                task.error = e
+                warnings.warn(f"Вычисление {task.operation} завершилось с ошибкой: {e}")
+
+            with self._cond:
+                self._running[task.operation] -= 1
+                cache_key = (task.operation, task.key)
+                if task.error is None:
+                    self._cache[cache_key] = _Entry(task.version, value)
+                    self._cache.move_to_end(cache_key)
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+                if self._pending.get(cache_key) is task:
+                    del self._pending[cache_key]
+                self._cond.notify_all()
+            task.done.set()
+
+    def _submit(self, operation: str, key: Hashable, version: Any,
+                compute: Callable[[], Any], priority: int) -> _Task:
+
+        cache_key = (operation, key)
+        task = self._pending.get(cache_key)
+        if task is None:
+            task = _Task(operation, key, version, compute, priority)
+            self._pending[cache_key] = task
+            self._queue.append((priority, next(self._order), task))
+            self._ensure_workers()
+            self._cond.notify_all()
+        return task
+
+    def _queue_position(self, task: _Task) -> int:
+
+        with self._cond:
+            for position, (_, _, queued) in enumerate(sorted(self._queue, key=lambda item: item[:2])):
+                if queued is task:
+                    return position + 1
+        return 0
+
+    @staticmethod
+    def _result(state: str, entry: Optional[_Entry] = None, queued: int = 0) -> Dict[str, Any]:
+
+        return {
+            "state": state,
+            "value": entry.value if entry else None,
+            "computed_at": entry.computed_at if entry else None,
+            "queued": queued
+        }
+
+    def get(self, operation: str, key: Hashable, version: Any, compute: Callable[[], Any],
+            priority: int = PRIORITY_ANALYTICS, wait: float = 0.0) -> Dict[str, Any]:
+        """Результат вычисления для версии данных version.
+
+        state: "fresh" - актуальный результат, "stale" - прежний результат, пересчет уже в очереди,
+        "computing" - результата еще нет за wait секунд; queued - место в очереди.
+        """
+
+        cache_key = (operation, key)
+        with self._cond:
+            entry = self._cache.get(cache_key)
+            if entry is not None:
+                self._cache.move_to_end(cache_key)
+                if entry.version == version and time.time() - entry.computed_at < self.max_age:
+                    return self._result("fresh", entry)
+            task = self._submit(operation, key, version, compute, priority)
+
+        if entry is not None:
+            return self._result("stale", entry)
+
+        if task.done.wait(wait):
+            if task.error is not None:
+                raise task.error
+            with self._cond:
+                entry = self._cache.get(cache_key)
+            if entry is not None:
+                return self._result("fresh", entry)
+        return self._result("computing", queued=self._queue_position(task))
+
+    def stats(self) -> Dict[str, Any]:
+
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "running": {operation: count for operation, count in self._running.items() if count},
+                "foreground": self._foreground,
+                "cached": len(self._cache)
+            }
+
+
+shared_scheduler = WorkScheduler()
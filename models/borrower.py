@@ -26,6 +26,8 @@ class Borrower:
     blacklist_reason: Optional[str] = None
     created_at: datetime = field(default_factory=datetime.now)
     created_by: Optional[str] = None
+    # Отдел сотрудника, который завел заемщика: определяет файл раздела
+    department: Optional[str] = None
 
     @classmethod
     def create_new(cls, full_name: str, passport_number: str, passport_series: str,
@@ -74,7 +76,8 @@ class Borrower:
             "blacklisted": self.blacklisted,
             "blacklist_reason": self.blacklist_reason,
             "created_at": self.created_at.isoformat(),
-            "created_by": self.created_by
+            "created_by": self.created_by,
+            "department": self.department
         }
 
     @classmethod
@@ -99,5 +102,6 @@ class Borrower:
             blacklisted=data.get("blacklisted", False),
             blacklist_reason=data.get("blacklist_reason"),
             created_at=datetime.fromisoformat(data["created_at"]),
-            created_by=data.get("created_by")
+            created_by=data.get("created_by"),
+            department=data.get("department")
         )
\ No newline at end of file
@@ -13,6 +13,9 @@ class AnalysisResult:
     risk_level: str
     recommendations: List[str]
     score: int
+    rules_version: Optional[str] = None
+    # Баллы факторов скоринга по байту на фактор, в порядке FACTOR_NAMES из правил скоринга
+    factor_scores: Optional[bytes] = None
 
     def to_dict(self):
         return {
@@ -20,7 +23,9 @@ class AnalysisResult:
             "credit_attractiveness": self.credit_attractiveness,
             "risk_level": self.risk_level,
             "recommendations": self.recommendations,
-            "score": self.score
+            "score": self.score,
+            "rules_version": self.rules_version,
+            "factor_scores": self.factor_scores.hex() if self.factor_scores is not None else None
         }
 
 
@@ -44,6 +49,10 @@ class CreditReport:
     blacklist_found: bool = False
     score: int = 0
     notes: Optional[str] = None
+    rules_version: Optional[str] = None
+    factor_scores: Optional[bytes] = None
+    # Отдел автора: определяет раздел хранилища, в котором лежит отчет
+    department: Optional[str] = None
 
     @classmethod
     def create_new(cls, borrower_id: str, borrower_name: str,
@@ -60,7 +69,9 @@ class CreditReport:
             created_by=created_by,
             created_by_name=created_by_name,
             recommendations=analysis_result.recommendations,
-            score=analysis_result.score
+            score=analysis_result.score,
+            rules_version=analysis_result.rules_version,
+            factor_scores=analysis_result.factor_scores
         )
 
     def to_dict(self):
@@ -83,7 +94,10 @@ class CreditReport:
             "blacklist_check": self.blacklist_check,
             "blacklist_found": self.blacklist_found,
             "score": self.score,
-            "notes": self.notes
+            "notes": self.notes,
+            "rules_version": self.rules_version,
+            "factor_scores": self.factor_scores.hex() if self.factor_scores is not None else None,
+            "department": self.department
         }
 
     @classmethod
@@ -111,5 +125,8 @@ class CreditReport:
             blacklist_check=data.get("blacklist_check", False),
             blacklist_found=data.get("blacklist_found", False),
             score=data.get("score", 0),
-            notes=data.get("notes")
+            notes=data.get("notes"),
+            rules_version=data.get("rules_version"),
+            factor_scores=bytes.fromhex(data["factor_scores"]) if data.get("factor_scores") else None,
+            department=data.get("department")
         )
\ No newline at end of file
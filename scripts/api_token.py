@@ -0,0 +1,37 @@
+"""Выпуск и отзыв токенов доступа к HTTP API скоринга.
+
+Запуск из корня проекта:
+    python -m scripts.api_token issue --username officer
+    python -m scripts.api_token revoke --username officer
+"""
+import argparse
+import os
+import sys
+from api.tokens import ApiTokens, TOKENS_FILE_NAME
+from controllers.data_controller import DataController
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Токены доступа к HTTP API скоринга")
+    parser.add_argument("action", choices=("issue", "revoke"))
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--data-dir", default=os.environ.get("CREDIT_DATA_DIR", "data"))
+    args = parser.parse_args()
+
+    data_controller = DataController(args.data_dir, archive_after_days=None)
+    user = data_controller.get_user_by_username(args.username)
+    if not user:
+        print(f"Пользователь {args.username} не найден", file=sys.stderr)
+        sys.exit(1)
+
+    tokens = ApiTokens(os.path.join(args.data_dir, TOKENS_FILE_NAME))
+    if args.action == "issue":
+        # Токен выводится один раз: в файле хранится только его хэш
+        print(tokens.issue(user.id))
+    else:
+        print(f"Отозвано токенов: {tokens.revoke_user(user.id)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
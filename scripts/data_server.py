@@ -0,0 +1,50 @@
+"""Локальный сервер данных для нескольких процессов приложения.
+
+Запуск из корня проекта:
+    python -m scripts.data_server --socket /tmp/credit_data.sock
+
+Процессы Streamlit и API подключаются к нему, если задана переменная окружения
+CREDIT_DATA_SERVER_SOCKET с тем же путем.
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+from controllers.data_controller import DataController
+from controllers.data_server import DataServer, SOCKET_ENV
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Сервер данных DataController на Unix-сокете")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--socket", default=os.environ.get(SOCKET_ENV),
+                        help=f"Путь к сокету; по умолчанию - из {SOCKET_ENV}")
+    args = parser.parse_args()
+
+    if not args.socket:
+        parser.error(f"Укажите --socket или переменную окружения {SOCKET_ENV}")
+
+    data_controller = DataController(args.data_dir)
+    # Клиенты не должны ждать загрузки данных при первом запросе
+    data_controller.preload().join()
+    try:
+        server = DataServer(data_controller, args.socket)
+    except RuntimeError as e:
+        parser.error(str(e))
+
+    # shutdown нельзя вызывать из потока serve_forever, поэтому сигнал обрабатывается в отдельном потоке
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+
+    print(f"Сервер данных запущен: {args.socket}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Объединение заемщиков-дублей с одинаковым паспортом.
+
+Запуск из корня проекта:
+    python -m scripts.dedup_borrowers --dry-run
+"""
+import argparse
+import sys
+from controllers.data_controller import DataController
+from controllers.borrower_dedup import BorrowerDeduplicator
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Объединение дублей заемщиков по паспорту")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет объединено")
+    args = parser.parse_args()
+
+    data_controller = DataController(args.data_dir, archive_after_days=None)
+    result = BorrowerDeduplicator(data_controller).run(dry_run=args.dry_run)
+
+    print(f"Групп дублей: {result['duplicate_groups']}, "
+          f"объединено записей: {result['merged_borrowers']}, "
+          f"перепривязано отчетов: {result['reports_updated']}", file=sys.stderr)
+    if result["archived_reports_updated"] is not None:
+        print(f"Перепривязано архивных отчетов: {result['archived_reports_updated']}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
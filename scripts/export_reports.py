@@ -0,0 +1,63 @@
+"""Выгрузка отчетов или заемщиков в CSV/XLSX.
+
+Запуск из корня проекта:
+    python -m scripts.export_reports --format xlsx --status Одобрен --output approved.xlsx
+"""
+import argparse
+import sys
+from datetime import datetime
+from controllers.data_controller import DataController
+from controllers.export_controller import (
+    ExportController, EXPORT_FORMATS, EXPORT_CHUNK_ROWS, filter_reports
+)
+from models.enums import CreditStatus
+
+
+def parse_date(value: str) -> datetime:
+
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Ожидается дата в формате ГГГГ-ММ-ДД: {value}")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Потоковая выгрузка отчетов и заемщиков")
+    parser.add_argument("--kind", choices=("reports", "borrowers"), default="reports")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--output", help="Файл результата; по умолчанию - имя с датой выгрузки")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--status", action="append", choices=[s.value for s in CreditStatus],
+                        help="Статус отчета; можно указать несколько раз")
+    parser.add_argument("--since", type=parse_date, help="Отчеты, созданные начиная с даты")
+    parser.add_argument("--until", type=parse_date, help="Отчеты, созданные до даты")
+    parser.add_argument("--created-by", help="ID сотрудника, создавшего отчет")
+    parser.add_argument("--include-archive", action="store_true", help="Включить архивные отчеты")
+    parser.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    # Архивация при открытии данных не нужна: выгрузка только читает
+    data_controller = DataController(args.data_dir, archive_after_days=None)
+    exporter = ExportController(chunk_rows=args.chunk_rows)
+
+    if args.kind == "reports":
+        reports = filter_reports(
+            data_controller.iter_reports(include_archive=args.include_archive),
+            statuses=[CreditStatus(value) for value in args.status] if args.status else None,
+            since=args.since,
+            until=args.until,
+            created_by=args.created_by
+        )
+        chunks = exporter.stream_reports(reports, args.format)
+    else:
+        chunks = exporter.stream_borrowers(data_controller.borrowers, args.format)
+
+    output = args.output or exporter.file_name(args.kind, args.format)
+    written = exporter.write_to_file(chunks, output)
+
+    print(f"Выгрузка сохранена: {output} ({written / 1024:.1f} КБ)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from typing import List, Tuple
+
+
+def make_borrower(rng: random.Random) -> dict:
+
+    income = rng.randrange(10000, 250000, 1000)
+    return {
+        "full_name": f"Тестовый Заемщик {rng.randrange(1_000_000)}",
+        "passport_series": f"{rng.randrange(10000):04d}",
+        "passport_number": f"{rng.randrange(1_000_000):06d}",
+        "birth_date": "1985-06-15",
+        "income": income,
+        "expenses": rng.randrange(0, income, 1000),
+        "credit_history_score": rng.randrange(0, 101),
+        "existing_loans": rng.randrange(0, income, 1000),
+        "employment_years": rng.randrange(0, 20),
+        "employer_name": "ООО Ромашка",
+        "position": "Инженер",
+        "address": "г. Москва",
+        "phone": "+70000000000"
+    }
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class HttpConnection:
+    """Минимальный HTTP/1.1 клиент с keep-alive поверх asyncio"""
+
+    def __init__(self, host: str, port: int, token: str = ""):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method: str, path: str, payload=None) -> Tuple[int, bytes]:
+
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+        head = (f"{method} {path} HTTP/1.1\r\n"
+                f"Host: {self.host}\r\n"
+                f"Authorization: Bearer {self.token}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n").encode("ascii")
+        self.writer.write(head + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        status = int(status_line.split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value.strip())
+        return status, await self.reader.readexactly(length)
+
+    async def close(self):
+
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+
+async def worker(args, deadline: float, latencies: dict, errors: list, seed: int):
+
+    rng = random.Random(seed)
+    connection = HttpConnection(args.host, args.port, args.token)
+
+    try:
+        while time.perf_counter() < deadline:
+            roll = rng.random()
+            if roll < args.batch_share:
+                name = "score_batch"
+                method, path = "POST", "/score/batch"
+                payload = {"borrowers": [make_borrower(rng) for _ in range(args.batch_size)]}
+            elif roll < args.batch_share + args.stats_share:
+                name = "statistics"
+                method, path, payload = "GET", "/statistics", None
+            else:
+                name = "score"
+                method, path = "POST", "/score"
+                payload = {"borrower": make_borrower(rng)}
+                if args.persist:
+                    payload["persist"] = True
+
+            started = time.perf_counter()
+            try:
+                status, _ = await connection.request(method, path, payload)
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+                errors.append(f"{name}: {e}")
+                await connection.close()
+                connection = HttpConnection(args.host, args.port, args.token)
+                continue
+
+            latencies.setdefault(name, []).append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append(f"{name}: HTTP {status}")
+    finally:
+        await connection.close()
+
+
+async def run(args):
+
+    latencies: dict = {}
+    errors: list = []
+    started = time.perf_counter()
+    deadline = started + args.duration
+
+    await asyncio.gather(*(worker(args, deadline, latencies, errors, seed)
+                           for seed in range(args.concurrency)))
+
+    elapsed = time.perf_counter() - started
+    total = sum(len(values) for values in latencies.values())
+
+    print(f"Длительность: {elapsed:.1f} с, параллельных соединений: {args.concurrency}")
+    print(f"Запросов: {total}, ошибок: {len(errors)}, RPS: {total / elapsed:.1f}")
+    print(f"{'endpoint':<14}{'count':>8}{'p50, мс':>10}{'p90, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    for name, values in sorted(latencies.items()):
+        values.sort()
+        print(f"{name:<14}{len(values):>8}"
+              f"{percentile(values, 0.5) * 1000:>10.1f}"
+              f"{percentile(values, 0.9) * 1000:>10.1f}"
+              f"{percentile(values, 0.99) * 1000:>10.1f}"
+              f"{values[-1] * 1000:>10.1f}")
+
+    for error in errors[:10]:
+        print(f"  ошибка: {error}")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Нагрузочный тест HTTP API скоринга")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="секунды")
+    parser.add_argument("--batch-share", type=float, default=0.1)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--stats-share", type=float, default=0.05)
+    parser.add_argument("--token", default=os.environ.get("CREDIT_API_TOKEN", ""),
+                        help="токен доступа (python -m scripts.api_token issue --username ...)")
+    parser.add_argument("--persist", action="store_true",
+                        help="одиночные запросы сохраняют отчеты от имени владельца токена")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""Нагрузочный тест интерфейса: N одновременных сессий app.py через streamlit.testing.
+
+Каждый сценарий выполняется в отдельном процессе на своей копии сгенерированных данных,
+поэтому пиковый RSS относится к сценарию целиком.
+
+AppTest на время прогона подменяет глобальный Runtime Streamlit, поэтому прогоны сессий
+выполняются по очереди. Это близко к одному рабочему процессу Streamlit, где перезапуски
+скриптов упираются в GIL: время перезапуска - это время выполнения, а время действия
+включает ожидание в очереди.
+
+Запуск из корня проекта:
+    python -m scripts.load_test_app --sessions 8 --reports 20000 --duration 30
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Dict, Any
+from api.payloads import borrower_from_payload
+from controllers.credit_controller import CreditController
+from controllers.data_controller import DataController
+from controllers.partitions import HEAD_OFFICE_DEPARTMENT
+from controllers.report_storage import ReportStorage
+from models.enums import CreditStatus, UserRole
+from models.user import User
+from scripts.load_test_api import make_borrower, percentile
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+LOAD_PASSWORD = "load123"
+MANAGER_USERNAME = "manager"
+
+# Доля сессий сотрудников кредитного отдела в сценарии; остальные - руководители
+SCENARIOS = {
+    "officers": 1.0,
+    "managers": 0.0,
+    "mixed": 0.8
+}
+
+# Пауза пользователя между действиями, секунды (случайно в пределах 0.5-1.5 от значения)
+THINK_TIME_SECONDS = 1.0
+
+OFFICER_ACTIONS = {"submit_borrower": 0.4, "my_reports": 0.4, "dashboard": 0.2}
+MANAGER_ACTIONS = {"all_reports_filter": 0.5, "analytics": 0.3, "dashboard": 0.2}
+
+# Итоговые статусы для сгенерированных отчетов, которые прошли порог одобрения
+REVIEWED_STATUSES = [CreditStatus.PENDING, CreditStatus.APPROVED,
+                     CreditStatus.NEEDS_CORRECTION, CreditStatus.REJECTED]
+REVIEWED_WEIGHTS = [0.3, 0.5, 0.1, 0.1]
+
+# Сообщения st.error, означающие сбой страницы. app.main() перехватывает исключения и выводит
+# их через st.error; остальные st.error - это оформление результата (статус «Отклонен», черный список)
+FAILURE_ERROR_PREFIXES = ("Произошла ошибка", "Ошибка", "❌ Ошибка", "Заполните", "Отчет не найден")
+
+
+def generate_dataset(data_dir: str, officers: int, borrowers: int, reports: int,
+                     months: int, seed: int):
+
+    rng = random.Random(seed)
+    data_controller = DataController(data_dir, archive_after_days=None)
+
+    officer_users = [
+        User.create_new(f"officer{i}", LOAD_PASSWORD, UserRole.CREDIT_OFFICER, f"Сотрудник {i}",
+                        f"officer{i}@example.com", department=f"Отделение {i % 5 + 1}")
+        for i in range(officers)
+    ]
+    for user in officer_users + [User.create_new(MANAGER_USERNAME, LOAD_PASSWORD, UserRole.BANK_MANAGER,
+                                                 "Руководитель", "manager@example.com",
+                                                 department=HEAD_OFFICE_DEPARTMENT)]:
+        data_controller.add_user(user)
+
+    borrower_list = [borrower_from_payload(make_borrower(rng), created_by=rng.choice(officer_users).id)
+                     for _ in range(borrowers)]
+    data_controller.replace_borrowers(borrower_list)
+
+    # Оценки считаются одним векторизованным проходом, отчеты получают случайные даты и статусы
+    credit_controller = CreditController(data_controller)
+    results = credit_controller.analyze_borrowers(borrower_list)
+
+    now = datetime.now()
+    segments: Dict[str, list] = {}
+    for _ in range(reports):
+        index = rng.randrange(len(borrower_list))
+        officer = rng.choice(officer_users)
+        report = credit_controller.create_credit_report(borrower_list[index], results[index][0],
+                                                        officer.id, officer.full_name)
+        report.created_at = now - timedelta(days=rng.random() * months * 30)
+        if report.status == CreditStatus.PENDING:
+            report.status = rng.choices(REVIEWED_STATUSES, REVIEWED_WEIGHTS)[0]
+        report.department = officer.department
+        segments.setdefault(ReportStorage.segment_key(report.created_at, report.department), []).append(report)
+
+    for segment in segments.values():
+        segment.sort(key=lambda r: r.created_at)
+    data_controller.report_storage.save_segments(segments)
+
+
+# Прогоны AppTest в одном процессе не могут идти параллельно
+_app_test_lock = threading.Lock()
+
+
+class PageError(RuntimeError):
+    """Страница показала сообщение о сбое через st.error"""
+
+
+class AppSession:
+    """Одна пользовательская сессия: свой AppTest и своя случайная последовательность действий"""
+
+    def __init__(self, username: str, is_officer: bool, rng: random.Random, timeout: float,
+                 think_time: float, timings: Dict[str, List[float]], reruns: List[float],
+                 waits: List[float], errors: List[str], page_errors: List[str], lock: threading.Lock):
+        self.username = username
+        self.is_officer = is_officer
+        self.rng = rng
+        self.timeout = timeout
+        self.think_time = think_time
+        self.timings = timings
+        self.reruns = reruns
+        self.waits = waits
+        self.errors = errors
+        self.page_errors = page_errors
+        self.lock = lock
+        self.at = None
+
+    def _rerun(self) -> float:
+        """Возвращает время отклика: ожидание очереди плюс выполнение перезапуска"""
+
+        started = time.perf_counter()
+        with _app_test_lock:
+            run_started = time.perf_counter()
+            self.at.run()
+            finished = time.perf_counter()
+        with self.lock:
+            self.reruns.append(finished - run_started)
+            self.waits.append(run_started - started)
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].value)
+        failures = [str(error.value) for error in self.at.error
+                    if str(error.value).startswith(FAILURE_ERROR_PREFIXES)]
+        if failures:
+            raise PageError("; ".join(failures))
+        return finished - started
+
+    def _record(self, action: str, elapsed: float):
+
+        with self.lock:
+            self.timings.setdefault(action, []).append(elapsed)
+
+    def _click_menu(self, page: str) -> float:
+
+        self.at.button(key=f"menu_{page}").click()
+        return self._rerun()
+
+    def login(self):
+
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(APP_FILE, default_timeout=self.timeout)
+        elapsed = self._rerun()
+        self._record("open", elapsed)
+
+        self.at.text_input(key="login_username").input(self.username)
+        self.at.text_input(key="login_password").input(LOAD_PASSWORD)
+        self.at.selectbox(key="login_role").select(
+            UserRole.CREDIT_OFFICER.value if self.is_officer else UserRole.BANK_MANAGER.value)
+        next(b for b in self.at.button if b.label == "Войти").click()
+        self._record("login", self._rerun())
+
+    def submit_borrower(self) -> float:
+
+        elapsed = self._click_menu("enter_data")
+        payload = make_borrower(self.rng)
+
+        text_inputs = {widget.label: widget for widget in self.at.text_input}
+        text_inputs["ФИО*"].input(payload["full_name"])
+        text_inputs["Серия паспорта*"].input(payload["passport_series"])
+        text_inputs["Номер паспорта*"].input(payload["passport_number"])
+        text_inputs["Телефон*"].input(payload["phone"])
+        text_inputs["Название работодателя*"].input(payload["employer_name"])
+        text_inputs["Должность*"].input(payload["position"])
+        self.at.text_area[0].input(payload["address"])
+
+        number_inputs = {widget.label: widget for widget in self.at.number_input}
+        number_inputs["Ежемесячный доход (руб)*"].set_value(float(payload["income"]))
+        # Форма считает нулевые расходы незаполненным полем
+        number_inputs["Ежемесячные расходы (руб)*"].set_value(float(payload["expenses"] or 1000))
+        number_inputs["Стаж работы (лет)*"].set_value(payload["employment_years"])
+
+        next(b for b in self.at.button if b.label.startswith("Провести")).click()
+        return elapsed + self._rerun()
+
+    def my_reports(self) -> float:
+        return self._click_menu("my_reports")
+
+    def dashboard(self) -> float:
+        return self._click_menu("dashboard")
+
+    def analytics(self) -> float:
+        return self._click_menu("analytics")
+
+    def all_reports_filter(self) -> float:
+
+        elapsed = self._click_menu("all_reports")
+        statuses = next((w for w in self.at.multiselect if w.label == "Статус"), None)
+        if statuses is None:
+            return elapsed
+
+        statuses.set_value(self.rng.sample(list(statuses.options), self.rng.randint(1, len(statuses.options))))
+        elapsed += self._rerun()
+
+        period = next(w for w in self.at.selectbox if w.label == "Период")
+        period.select(self.rng.choice(list(period.options)))
+        return elapsed + self._rerun()
+
+    def run(self, deadline: float):
+
+        actions = OFFICER_ACTIONS if self.is_officer else MANAGER_ACTIONS
+        names, weights = list(actions), list(actions.values())
+
+        while time.perf_counter() < deadline:
+            action = "login"
+            try:
+                if self.at is None:
+                    self.login()
+                    continue
+                time.sleep(self.think_time * self.rng.uniform(0.5, 1.5))
+                action = self.rng.choices(names, weights)[0]
+                self._record(action, getattr(self, action)())
+            except Exception as e:
+                with self.lock:
+                    self.errors.append(f"{self.username}/{action}: {e}")
+                    if isinstance(e, PageError):
+                        self.page_errors.append(self.errors[-1])
+                # После ошибки сессия начинается заново, как после перезагрузки страницы
+                self.at = None
+
+
+def run_scenario(name: str, args) -> Dict[str, Any]:
+
+    work_dir = tempfile.mkdtemp(prefix="credit_load_")
+    data_dir = os.path.join(work_dir, "data")
+    shutil.copytree(args.data_dir, data_dir)
+    os.environ["CREDIT_DATA_DIR"] = data_dir
+
+    with open(os.path.join(data_dir, "users.json"), "r", encoding="utf-8") as f:
+        officers = [u["username"] for u in json.load(f) if u["role"] == UserRole.CREDIT_OFFICER.value]
+
+    timings: Dict[str, List[float]] = {}
+    reruns: List[float] = []
+    waits: List[float] = []
+    errors: List[str] = []
+    page_errors: List[str] = []
+    lock = threading.Lock()
+
+    officer_sessions = round(args.sessions * SCENARIOS[name])
+    sessions = [
+        AppSession(officers[i % len(officers)] if i < officer_sessions else MANAGER_USERNAME,
+                   i < officer_sessions, random.Random(args.seed + i), args.timeout,
+                   args.think_time, timings, reruns, waits, errors, page_errors, lock)
+        for i in range(args.sessions)
+    ]
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    threads = [threading.Thread(target=session.run, args=(deadline,)) for session in sessions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    def summary(values: List[float]) -> Dict[str, float]:
+        values = sorted(values)
+        return {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 0.5) * 1000, 1),
+            "p90_ms": round(percentile(values, 0.9) * 1000, 1),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+            "max_ms": round(values[-1] * 1000, 1) if values else 0.0
+        }
+
+    actions_count = sum(len(values) for action, values in timings.items() if action not in ("open", "login"))
+    return {
+        "scenario": name,
+        "sessions": args.sessions,
+        "elapsed_s": round(elapsed, 1),
+        "reruns": summary(reruns),
+        "queue_wait": summary(waits),
+        "reruns_per_s": round(len(reruns) / elapsed, 2),
+        "actions_per_s": round(actions_count / elapsed, 2),
+        "actions": {action: summary(values) for action, values in sorted(timings.items())},
+        # ru_maxrss в Linux - в килобайтах
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "errors": errors[:20],
+        "error_count": len(errors),
+        # Из них - сообщения st.error на странице, а не необработанные исключения
+        "page_error_count": len(page_errors)
+    }
+
+
+def print_result(result: Dict[str, Any]):
+
+    print(f"\nСценарий {result['scenario']}: сессий {result['sessions']}, {result['elapsed_s']} с, "
+          f"пиковый RSS {result['peak_rss_mb']} МБ")
+    print(f"Перезапусков: {result['reruns']['count']} ({result['reruns_per_s']}/с), "
+          f"действий: {result['actions_per_s']}/с, ошибок: {result['error_count']} "
+          f"(сообщений st.error: {result['page_error_count']})")
+    print(f"{'действие':<20}{'count':>8}{'p50, мс':>10}{'p90, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    rows = [("rerun", result["reruns"]), ("queue_wait", result["queue_wait"])] + list(result["actions"].items())
+    for action, stats in rows:
+        print(f"{action:<20}{stats['count']:>8}{stats['p50_ms']:>10.1f}{stats['p90_ms']:>10.1f}"
+              f"{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+    for error in result["errors"][:5]:
+        print(f"  ошибка: {error}")
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Нагрузочный тест интерфейса Streamlit")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="Сценарий; можно указать несколько раз, по умолчанию - все")
+    parser.add_argument("--sessions", type=int, default=8, help="Одновременных сессий")
+    parser.add_argument("--duration", type=float, default=30.0, help="Длительность сценария, секунды")
+    parser.add_argument("--think-time", type=float, default=THINK_TIME_SECONDS,
+                        help="Пауза пользователя между действиями, секунды")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Таймаут одного перезапуска, секунды")
+    parser.add_argument("--data-dir", help="Готовый набор данных; по умолчанию генерируется новый")
+    parser.add_argument("--officers", type=int, default=20)
+    parser.add_argument("--borrowers", type=int, default=5000)
+    parser.add_argument("--reports", type=int, default=20000)
+    parser.add_argument("--months", type=int, default=12, help="За сколько месяцев распределить отчеты")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Вывести результаты в JSON")
+    parser.add_argument("--run-scenario", choices=list(SCENARIOS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        print(json.dumps(run_scenario(args.run_scenario, args), ensure_ascii=False))
+        return
+
+    generated_dir = None
+    if not args.data_dir:
+        generated_dir = tempfile.mkdtemp(prefix="credit_dataset_")
+        args.data_dir = generated_dir
+        started = time.perf_counter()
+        generate_dataset(args.data_dir, args.officers, args.borrowers, args.reports, args.months, args.seed)
+        print(f"Сгенерировано отчетов: {args.reports}, заемщиков: {args.borrowers} "
+              f"за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+    results = []
+    try:
+        for name in args.scenario or list(SCENARIOS):
+            command = [sys.executable, "-m", "scripts.load_test_app", "--run-scenario", name,
+                       "--data-dir", args.data_dir, "--sessions", str(args.sessions),
+                       "--duration", str(args.duration), "--timeout", str(args.timeout),
+                       "--think-time", str(args.think_time),
+                       "--seed", str(args.seed)]
+            completed = subprocess.run(command, capture_output=True, text=True)
+            if completed.returncode != 0:
+                sys.stderr.write(completed.stderr[-4000:])
+                sys.exit(f"Сценарий {name} завершился с ошибкой")
+
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            results.append(result)
+            if not args.json:
+                print_result(result)
+    finally:
+        if generated_dir:
+            shutil.rmtree(generated_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Пакетный рендер печатных документов по кредитным отчетам.
+
+Запуск из корня проекта:
+    python -m scripts.render_documents --include-archive --format html --format pdf
+"""
+import argparse
+import os
+import sys
+from controllers.data_controller import DataController
+from controllers.document_renderer import DocumentRenderer, DOCUMENT_FORMATS, RENDER_CHUNK_SIZE
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Рендер документов по кредитным отчетам")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--output-dir", help="Каталог документов; по умолчанию data/documents")
+    parser.add_argument("--format", action="append", choices=DOCUMENT_FORMATS,
+                        help="Формат документа; можно указать несколько раз (по умолчанию html)")
+    parser.add_argument("--include-archive", action="store_true", help="Включить архивные отчеты")
+    parser.add_argument("--workers", type=int, help="Число процессов; по умолчанию по числу ядер")
+    parser.add_argument("--chunk-size", type=int, default=RENDER_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    data_controller = DataController(args.data_dir, archive_after_days=None)
+    renderer = DocumentRenderer(args.output_dir or os.path.join(args.data_dir, "documents"),
+                                max_workers=args.workers, chunk_size=args.chunk_size)
+
+    borrowers = {b.id: b for b in data_controller.borrowers}
+    pairs = ((report, borrowers.get(report.borrower_id))
+             for report in data_controller.iter_reports(include_archive=args.include_archive))
+
+    try:
+        result = renderer.render_reports(pairs, formats=tuple(args.format or ("html",)))
+    except RuntimeError as e:
+        parser.error(str(e))
+
+    print(f"Сформировано: {result['rendered']}, без изменений: {result['skipped']}, "
+          f"ошибок: {result['failed']}, время: {result['elapsed']} с", file=sys.stderr)
+    for report_id, error in result["errors"].items():
+        print(f"  {report_id}: {error}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Отчет о холодном запуске приложения: импорты, этапы загрузки и время до страницы входа.
+
+Приложение запускается в отдельном процессе через streamlit.testing с -X importtime;
+учитываются только импорты, выполненные самим app.py (Streamlit к этому моменту уже загружен,
+как и в рабочем процессе). Код возврата 1, если страница входа не уложилась в бюджет.
+
+Запуск из корня проекта:
+    python -m scripts.startup_report --budget-ms 1000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import List, Dict, Any, Tuple
+from controllers.startup_profiler import STARTUP_REPORT_ENV, REPORT_MARKER, STARTUP_BUDGET_MS
+
+APP_BEGIN_MARKER = "CREDIT_STARTUP_APP_BEGIN"
+
+# Пакеты приложения; время сторонних библиотек учитывается в импортах, которые их подтянули
+APP_PACKAGES = ("app", "api", "controllers", "models", "views")
+
+CHILD_CODE = f"""
+import sys
+from streamlit.testing.v1 import AppTest
+app_test = AppTest.from_file("app.py", default_timeout=120)
+sys.stderr.write("{APP_BEGIN_MARKER}\\n")
+sys.stderr.flush()
+app_test.run()
+"""
+
+
+def parse_output(stderr: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+
+    imports = []
+    report = {}
+    app_started = False
+
+    for line in stderr.splitlines():
+        if line == APP_BEGIN_MARKER:
+            app_started = True
+        elif line.startswith(REPORT_MARKER):
+            report = json.loads(line[len(REPORT_MARKER):])
+        elif app_started and line.startswith("import time:") and "|" in line:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            if not self_us.strip().isdigit():
+                continue
+            imports.append({
+                "module": name.strip(),
+                # Отступ в выводе importtime - глубина вложенного импорта
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000
+            })
+    return imports, report
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Время холодного запуска страницы входа")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15, help="Сколько самых долгих импортов показать")
+    parser.add_argument("--json", action="store_true", help="Вывести отчет в JSON")
+    args = parser.parse_args()
+
+    env = dict(os.environ, **{STARTUP_REPORT_ENV: "1", "CREDIT_STARTUP_BUDGET_MS": str(args.budget_ms)})
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD_CODE],
+                            env=env, capture_output=True, text=True)
+    imports, report = parse_output(result.stderr)
+
+    if result.returncode != 0 or not report:
+        sys.stderr.write(result.stderr[-4000:])
+        sys.exit("Не удалось получить отчет о запуске приложения")
+
+    # Импорты верхнего уровня, выполненные app.py и модулями, загруженными лениво при первой отрисовке;
+    # внутренние ленивые импорты самого Streamlit не учитываются
+    top_level = sorted((item for item in imports
+                        if item["depth"] == 0 and item["module"].split(".")[0] in APP_PACKAGES),
+                       key=lambda item: item["cumulative_ms"], reverse=True)
+    report["imports_ms"] = round(sum(item["cumulative_ms"] for item in top_level), 1)
+    report["top_imports"] = top_level[:args.top]
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"Импорты приложения: {report['imports_ms']:.1f} мс")
+        for item in report["top_imports"]:
+            print(f"  {item['module']:<50} {item['cumulative_ms']:>9.1f} мс")
+
+        print("Этапы запуска:")
+        for stage in report["stages"]:
+            print(f"  {stage['stage']:<30} {stage['start_ms']:>9.1f} мс от старта  "
+                  f"{stage['ms']:>9.1f} мс  [{stage['thread']}]")
+
+        print(f"Первая отрисовка ({report['first_page']}): {report['first_render_ms']:.1f} мс, "
+              f"бюджет {report['budget_ms']:.0f} мс")
+
+    if report["over_budget"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Чтение ленты изменений данных в формате JSON Lines.
+
+Запуск из корня проекта:
+    python -m scripts.tail_changes --offset-file dwh.offset --entity report --follow
+"""
+import argparse
+import json
+import os
+import sys
+from controllers.change_feed import ChangeFeed, ENTITIES, FOLLOW_POLL_SECONDS
+
+
+def read_offset(path: str) -> int:
+
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    return 0
+
+
+def save_offset(path: str, seq: int):
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(str(seq))
+    os.replace(tmp_path, path)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Лента изменений пользователей, заемщиков и отчетов")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--from-seq", type=int, help="Вывести события с номером больше указанного")
+    parser.add_argument("--offset-file", help="Файл с номером последнего обработанного события; "
+                                              "обновляется после каждого вывода")
+    parser.add_argument("--entity", action="append", choices=ENTITIES,
+                        help="Тип записей; можно указать несколько раз")
+    parser.add_argument("--follow", action="store_true", help="Ждать новые события")
+    parser.add_argument("--poll-interval", type=float, default=FOLLOW_POLL_SECONDS)
+    args = parser.parse_args()
+
+    feed = ChangeFeed(os.path.join(args.data_dir, "changes"))
+    after_seq = args.from_seq if args.from_seq is not None else read_offset(args.offset_file)
+
+    if args.follow:
+        events = feed.follow(after_seq, entities=args.entity, poll_interval=args.poll_interval)
+    else:
+        events = feed.read(after_seq, entities=args.entity)
+
+    try:
+        for event in events:
+            sys.stdout.write(json.dumps(event, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+            if args.offset_file:
+                save_offset(args.offset_file, event["seq"])
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
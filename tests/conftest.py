@@ -0,0 +1,50 @@
+import os
+import sys
+import uuid
+from datetime import datetime
+from typing import Optional
+
+import pytest
+
+# Тесты запускаются из корня репозитория без установки пакета
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.enums import CreditStatus  # noqa: E402
+from models.report import CreditReport  # noqa: E402
+
+
+def make_report(created_at: datetime, status: CreditStatus = CreditStatus.PENDING,
+                department: Optional[str] = None, borrower_id: Optional[str] = None,
+                borrower_name: str = "Иванов Иван Иванович", score: int = 70,
+                max_loan_amount: float = 500000.0, created_by: str = "officer-1", **fields) -> CreditReport:
+
+    return CreditReport(
+        id=str(uuid.uuid4()),
+        borrower_id=borrower_id or str(uuid.uuid4()),
+        borrower_name=borrower_name,
+        max_loan_amount=max_loan_amount,
+        credit_attractiveness="Средняя",
+        risk_level="Средний",
+        status=status,
+        created_by=created_by,
+        created_by_name="Сотрудник",
+        created_at=created_at,
+        score=score,
+        department=department,
+        **fields
+    )
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+
+    return str(tmp_path / "data")
+
+
+@pytest.fixture
+def data_controller(data_dir):
+
+    from controllers.data_controller import DataController
+
+    # Без автоматической архивации: тесты архивируют отчеты явно
+    return DataController(data_dir, archive_after_days=None)
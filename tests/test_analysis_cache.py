@@ -0,0 +1,55 @@
+import random
+
+from api.payloads import borrower_from_payload
+from controllers.analysis_cache import AnalysisCache
+from controllers.credit_controller import CreditController
+from controllers.data_controller import DataController
+from scripts.load_test_api import make_borrower
+
+
+def _borrower(seed: int = 1):
+
+    return borrower_from_payload(make_borrower(random.Random(seed)), "officer-1")
+
+
+def test_cache_hits_return_independent_copies(data_controller):
+
+    controller = CreditController(data_controller, analysis_cache=AnalysisCache())
+    first, _, _ = controller.analyze_borrower(_borrower())
+    first.recommendations.append("правка вызывающего")
+    first.score = -1
+
+    second, _, _ = controller.analyze_borrower(_borrower())
+    third, _, _ = controller.analyze_borrower(_borrower())
+    assert controller.cache_stats()["hits"] == 2
+    assert second.score != -1 and "правка вызывающего" not in second.recommendations
+    assert second is not third and second.recommendations is not third.recommendations
+    assert second == third
+
+
+def test_sessions_with_different_blacklist_versions_share_cache(data_dir):
+
+    cache = AnalysisCache()
+    session_a = CreditController(DataController(data_dir, archive_after_days=None), analysis_cache=cache)
+    session_b = CreditController(DataController(data_dir, archive_after_days=None), analysis_cache=cache)
+    session_b.data_controller.add_to_blacklist("Некто Посторонний")
+
+    for _ in range(3):
+        session_a.analyze_borrower(_borrower())
+        session_b.analyze_borrower(_borrower())
+
+    stats = cache.stats()
+    assert stats["invalidations"] == 0
+    assert (stats["misses"], stats["hits"]) == (2, 4)
+
+
+def test_blacklist_change_separates_submissions(data_controller):
+
+    controller = CreditController(data_controller, analysis_cache=AnalysisCache())
+    borrower = _borrower()
+    result, blacklisted, reason = controller.analyze_borrower(borrower)
+    report = controller.save_analysis(borrower, result, blacklisted, reason, "officer-1", "Сотрудник")
+
+    assert controller.find_recent_duplicate(_borrower()).id == report.id
+    data_controller.add_to_blacklist("Некто Посторонний")
+    assert controller.find_recent_duplicate(_borrower()) is None
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+from api.payloads import ApiError, borrower_from_payload
+from api.server import LazyApp, ScoringAPI
+from models.enums import UserRole
+from models.user import User
+from scripts.load_test_api import make_borrower
+from conftest import make_report
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _call(app, method: str, path: str, body=None, token=None, raw_body=None):
+
+    messages = []
+    if raw_body is None:
+        raw_body = json.dumps(body).encode("utf-8") if body is not None else b""
+    headers = [(b"authorization", f"Bearer {token}".encode("ascii"))] if token else []
+
+    async def receive():
+        return {"type": "http.request", "body": raw_body}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app({"type": "http", "method": method, "path": path, "headers": headers}, receive, send))
+    return messages[0]["status"], json.loads(messages[1]["body"])
+
+
+def _user(data_controller, username: str, role: UserRole, department: str) -> User:
+
+    user = User.create_new(username, "secret", role, username, f"{username}@example.com", department=department)
+    data_controller.add_user(user)
+    return user
+
+
+@pytest.fixture
+def api(data_controller):
+
+    return ScoringAPI(data_controller)
+
+
+def test_import_does_not_touch_data_dir(tmp_path):
+
+    # Импорт выполняется в пустом каталоге: data/ там появиться не должно
+    subprocess.run([sys.executable, "-c", "import api.server, scripts.load_test_app"],
+                   cwd=str(tmp_path), env=dict(os.environ, PYTHONPATH=ROOT_DIR), check=True)
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_batch_scores_and_saves_repeated_submission_once(data_controller, api):
+
+    user = _user(data_controller, "officer", UserRole.CREDIT_OFFICER, "Отделение 1")
+    token = api.tokens.issue(user.id)
+    app = LazyApp(lambda: api)
+
+    rng = random.Random(1)
+    first, second = make_borrower(rng), make_borrower(rng)
+    status, payload = _call(app, "POST", "/score/batch",
+                            {"borrowers": [first, second, first], "persist": True}, token)
+
+    assert status == 200
+    results = payload["results"]
+    assert "report_id" in results[0] and "report_id" in results[1]
+    assert results[2]["duplicate_of"] == results[0]["report_id"]
+    assert results[2]["score"] == results[0]["score"]
+    assert len(data_controller.get_all_reports()) == 2
+    assert {r.created_by for r in data_controller.get_all_reports()} == {user.id}
+
+
+def test_requests_need_valid_token(data_controller, api):
+
+    user = _user(data_controller, "officer", UserRole.CREDIT_OFFICER, "Отделение 1")
+    borrower = make_borrower(random.Random(2))
+
+    assert _call(api, "GET", "/health")[0] == 200
+    for method, path, body in [("POST", "/score", {"borrower": borrower}), ("GET", "/statistics", None),
+                               ("POST", "/reports/query", {"query": "балл > 0"}), ("GET", "/reports/r-1", None)]:
+        assert _call(api, method, path, body)[0] == 401
+        assert _call(api, method, path, body, token="forged")[0] == 401
+
+    token = api.tokens.issue(user.id)
+    assert _call(api, "POST", "/score", {"borrower": borrower}, token)[0] == 200
+
+    # Заблокированный пользователь и отозванный токен больше не проходят
+    user.is_active = False
+    data_controller.update_user(user)
+    assert _call(api, "POST", "/score", {"borrower": borrower}, token)[0] == 401
+    user.is_active = True
+    data_controller.update_user(user)
+    api.tokens.revoke_user(user.id)
+    assert _call(api, "POST", "/score", {"borrower": borrower}, token)[0] == 401
+
+
+def test_persisting_as_another_user_is_rejected(data_controller, api):
+
+    caller = _user(data_controller, "officer", UserRole.CREDIT_OFFICER, "Отделение 1")
+    other = _user(data_controller, "other", UserRole.CREDIT_OFFICER, "Отделение 2")
+    token = api.tokens.issue(caller.id)
+
+    status, payload = _call(api, "POST", "/score",
+                            {"borrower": make_borrower(random.Random(3)), "persist": True, "user_id": other.id}, token)
+    assert status == 403
+    assert data_controller.get_all_reports() == ()
+
+
+def test_reports_and_statistics_follow_caller_departments(data_controller, api):
+
+    branch = _user(data_controller, "branch", UserRole.BANK_MANAGER, "Отделение 1")
+    other = _user(data_controller, "other", UserRole.BANK_MANAGER, "Отделение 2")
+    own = make_report(datetime.now(), department="Отделение 1", created_by=branch.id)
+    foreign = make_report(datetime.now(), department="Отделение 2", created_by=other.id, score=10)
+    data_controller.add_report(own)
+    data_controller.add_report(foreign)
+    token = api.tokens.issue(branch.id)
+
+    assert _call(api, "GET", f"/reports/{own.id}", token=token)[0] == 200
+    assert _call(api, "GET", f"/reports/{foreign.id}", token=token)[0] == 404
+
+    status, payload = _call(api, "POST", "/reports/query", {"query": "балл >= 0"}, token)
+    assert status == 200 and [r["id"] for r in payload["reports"]] == [own.id]
+
+    status, payload = _call(api, "GET", "/statistics", token=token)
+    assert status == 200
+    assert payload["system"]["total_reports"] == 1
+    assert payload["reports"]["total"] == 1
+
+
+@pytest.mark.parametrize("raw_body", [b"[]", b"1", b'"text"', b"null", b"{not json", b"\xff"])
+def test_body_must_be_json_object(data_controller, api, raw_body):
+
+    token = api.tokens.issue(_user(data_controller, "officer", UserRole.CREDIT_OFFICER, "Отделение 1").id)
+    status, payload = _call(api, "POST", "/score", token=token, raw_body=raw_body)
+    assert status == 400 and "error" in payload
+
+
+@pytest.mark.parametrize("field, value", [
+    ("credit_history_score", 101), ("credit_history_score", -1), ("income", -1), ("expenses", -0.5),
+    ("existing_loans", -100), ("employment_years", -2), ("income", float("inf")), ("income", "abc")
+])
+def test_out_of_range_borrower_fields_are_rejected(field, value):
+
+    payload = make_borrower(random.Random(4))
+    payload[field] = value
+    with pytest.raises(ApiError) as error:
+        borrower_from_payload(payload)
+    assert error.value.status == 400
+
+
+def test_borrowers_item_must_be_object(data_controller, api):
+
+    token = api.tokens.issue(_user(data_controller, "officer", UserRole.CREDIT_OFFICER, "Отделение 1").id)
+    assert _call(api, "POST", "/score", {"borrower": [1, 2]}, token)[0] == 400
+    assert _call(api, "POST", "/score/batch", {"borrowers": [make_borrower(random.Random(5)), 7]}, token)[0] == 400
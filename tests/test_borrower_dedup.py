@@ -0,0 +1,121 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from api.payloads import borrower_from_payload
+from controllers.analysis_cache import AnalysisCache
+from controllers.borrower_dedup import BorrowerDeduplicator
+from controllers.credit_controller import CreditController
+from controllers.data_controller import DataController
+from models.borrower import Borrower
+from models.enums import CreditStatus
+from scripts.load_test_api import make_borrower
+from conftest import make_report
+
+
+def _borrower(series: str, number: str, income: float = 90000.0, days_ago: int = 0) -> Borrower:
+
+    borrower = Borrower.create_new("Сидоров Сидор", number, series, datetime(1975, 3, 3), income, 30000.0,
+                                   70, 0.0, 5, "ООО Ромашка", "инженер", "Москва", "+7 900 000-00-03")
+    borrower.created_at = datetime.now() - timedelta(days=days_ago)
+    borrower.department = "Отделение 1"
+    return borrower
+
+
+def test_upsert_updates_borrower_with_same_passport(data_controller, data_dir):
+
+    first = data_controller.upsert_borrower(_borrower("4513", "400001"))
+    # Пробелы в серии и номере не делают паспорт другим
+    second = data_controller.upsert_borrower(_borrower("45 13", "400 001", income=150000.0))
+
+    assert second.id == first.id and second.income == 150000.0
+    assert len(data_controller.borrowers) == 1
+    reopened = DataController(data_dir, archive_after_days=None)
+    assert reopened.get_borrower_by_passport("4513", "400001").income == 150000.0
+
+    # Без паспорта заемщиков не с чем сопоставить: каждый добавляется отдельно
+    data_controller.upsert_borrower(_borrower("", "400002"))
+    data_controller.upsert_borrower(_borrower("", "400002"))
+    assert len(data_controller.borrowers) == 3
+
+
+def test_repeated_application_links_reports_to_one_borrower(data_controller):
+
+    controller = CreditController(data_controller, analysis_cache=AnalysisCache())
+    payload = make_borrower(random.Random(11))
+    for _ in range(2):
+        borrower = borrower_from_payload(payload, "officer-1")
+        result, blacklisted, reason = controller.analyze_borrower(borrower)
+        controller.save_analysis(borrower, result, blacklisted, reason, "officer-1", "Сотрудник")
+
+    assert len(data_controller.borrowers) == 1
+    assert {r.borrower_id for r in data_controller.get_all_reports()} == {data_controller.borrowers[0].id}
+
+
+def _legacy_duplicates(data_controller):
+
+    # Дубли из данных, сохраненных до поиска по паспорту
+    oldest = _borrower("4514", "500001", income=50000.0, days_ago=30)
+    middle = _borrower("4514", "500001", income=60000.0, days_ago=20)
+    middle.blacklisted, middle.blacklist_reason = True, "Мошенничество"
+    newest = _borrower("45 14", "500001", income=70000.0, days_ago=10)
+    single = _borrower("4514", "500002")
+    data_controller.replace_borrowers([oldest, middle, newest, single])
+
+    archived = make_report(datetime.now() - timedelta(days=400), CreditStatus.APPROVED, borrower_id=middle.id)
+    hot = make_report(datetime.now(), borrower_id=newest.id)
+    data_controller.add_report(archived)
+    data_controller.add_report(hot)
+    assert data_controller.archive_finalized_reports(180) == 1
+    return oldest, middle, newest, single, archived, hot
+
+
+def test_dry_run_reports_plan_without_changes(data_controller):
+
+    oldest, middle, newest, single, archived, hot = _legacy_duplicates(data_controller)
+    result = BorrowerDeduplicator(data_controller).run(dry_run=True)
+
+    assert result == {"duplicate_groups": 1, "merged_borrowers": 2, "reports_updated": 1,
+                      "archived_reports_updated": None}
+    assert len(data_controller.borrowers) == 4
+    assert data_controller.get_report_by_id(hot.id).borrower_id == newest.id
+
+
+def test_merge_keeps_earliest_id_and_latest_data(data_controller, data_dir):
+
+    oldest, middle, newest, single, archived, hot = _legacy_duplicates(data_controller)
+    result = BorrowerDeduplicator(data_controller).run()
+
+    assert result == {"duplicate_groups": 1, "merged_borrowers": 2, "reports_updated": 1,
+                      "archived_reports_updated": 1}
+    reopened = DataController(data_dir, archive_after_days=None)
+    assert sorted(b.id for b in reopened.borrowers) == sorted([oldest.id, single.id])
+    merged = reopened.get_borrower_by_id(oldest.id)
+    assert merged.income == 70000.0 and merged.blacklisted and merged.blacklist_reason == "Мошенничество"
+    assert {r.id for r in reopened.get_reports_by_borrower(oldest.id, include_archive=True)} == {archived.id, hot.id}
+
+    assert BorrowerDeduplicator(reopened).run()["merged_borrowers"] == 0
+
+
+def test_interrupted_merge_is_completed_by_rerun(data_controller, data_dir, monkeypatch):
+
+    oldest, middle, newest, single, archived, hot = _legacy_duplicates(data_controller)
+
+    def crash(borrowers):
+        raise OSError("сбой записи")
+
+    # Отчеты уже перенесены, а записи дублей удалить не удалось
+    monkeypatch.setattr(data_controller, "replace_borrowers", crash)
+    with pytest.raises(OSError):
+        BorrowerDeduplicator(data_controller).run()
+    monkeypatch.undo()
+
+    reopened = DataController(data_dir, archive_after_days=None)
+    assert len(reopened.borrowers) == 4
+    assert reopened.get_report_by_id(hot.id).borrower_id == oldest.id
+
+    result = BorrowerDeduplicator(reopened).run()
+    assert result["merged_borrowers"] == 2 and result["reports_updated"] == 0
+    assert sorted(b.id for b in reopened.borrowers) == sorted([oldest.id, single.id])
+    assert {r.id for r in reopened.get_reports_by_borrower(oldest.id, include_archive=True)} == {archived.id, hot.id}
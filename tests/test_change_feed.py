@@ -0,0 +1,91 @@
+import json
+import os
+
+from controllers import change_feed
+from controllers.change_feed import ChangeFeed
+
+
+def test_events_are_numbered_and_read_after_seq(tmp_path):
+
+    feed = ChangeFeed(str(tmp_path / "changes"), index_interval=3)
+    feed.append_many(("report", "add", f"r-{i}", {"n": i}) for i in range(10))
+    feed.append("borrower", "update", "b-1")
+
+    reopened = ChangeFeed(str(tmp_path / "changes"), index_interval=3)
+    assert reopened.last_seq == 11
+    assert [event["id"] for event in reopened.read(after_seq=7, entities=["report"])] == ["r-7", "r-8", "r-9"]
+    assert [event["seq"] for event in reopened.read(after_seq=2, limit=2)] == [3, 4]
+    assert reopened.read(after_seq=11) == []
+
+
+def test_checkpoint_restores_position_without_full_scan(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(change_feed, "CHECKPOINT_MIN_BYTES", 0)
+    root_dir = str(tmp_path / "changes")
+    feed = ChangeFeed(root_dir, index_interval=2)
+    feed.append_many(("report", "add", f"r-{i}", None) for i in range(5))
+    assert os.path.exists(feed.checkpoint_file)
+
+    reopened = ChangeFeed(root_dir, index_interval=2)
+    scanned = []
+    original_scan = reopened._scan
+    monkeypatch.setattr(reopened, "_scan", lambda f, start: (scanned.append(start), original_scan(f, start)))
+    assert reopened.last_seq == 5
+    assert scanned == [os.path.getsize(feed.log_file)]
+
+
+def test_stale_checkpoint_falls_back_to_full_scan(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(change_feed, "CHECKPOINT_MIN_BYTES", 0)
+    root_dir = str(tmp_path / "changes")
+    ChangeFeed(root_dir).append_many(("report", "add", f"r-{i}", None) for i in range(5))
+
+    # Лента перезаписана после контрольной точки: хвост не совпадает с сохраненной суммой
+    log_file = os.path.join(root_dir, "changes.jsonl")
+    with open(log_file, "rb") as f:
+        lines = f.readlines()
+    with open(log_file, "wb") as f:
+        f.writelines(lines[:2] + [lines[2].replace(b"r-2", b"r-X")] + lines[3:])
+
+    reopened = ChangeFeed(root_dir)
+    assert reopened.last_seq == 5
+    assert reopened.read(after_seq=2, limit=1)[0]["id"] == "r-X"
+
+
+def test_torn_last_line_is_dropped_by_next_append(tmp_path):
+
+    root_dir = str(tmp_path / "changes")
+    ChangeFeed(root_dir).append_many(("report", "add", f"r-{i}", None) for i in range(3))
+    log_file = os.path.join(root_dir, "changes.jsonl")
+    with open(log_file, "ab") as f:
+        f.write(b'{"seq": 4, "ent')
+    size = os.path.getsize(log_file)
+
+    reopened = ChangeFeed(root_dir)
+    assert reopened.last_seq == 3
+    assert [event["seq"] for event in reopened.read()] == [1, 2, 3]
+    # Чтение не трогает файл, обрезка выполняется только под блокировкой записи
+    assert os.path.getsize(log_file) == size
+
+    assert reopened.append("report", "add", "r-3") == 4
+    assert [event["seq"] for event in ChangeFeed(root_dir).read()] == [1, 2, 3, 4]
+
+
+def test_reader_waits_for_line_being_written(tmp_path):
+
+    root_dir = str(tmp_path / "changes")
+    reader = ChangeFeed(root_dir)
+    reader.append("report", "add", "r-0")
+
+    # Другой процесс успел записать только начало строки
+    line = json.dumps({"seq": 2, "at": "2025-01-01T00:00:00", "entity": "report",
+                       "op": "add", "id": "r-1", "data": None}).encode("utf-8") + b"\n"
+    log_file = os.path.join(root_dir, "changes.jsonl")
+    with open(log_file, "ab") as f:
+        f.write(line[:20])
+    assert reader.last_seq == 1
+
+    with open(log_file, "ab") as f:
+        f.write(line[20:])
+    assert reader.last_seq == 2
+    assert [event["id"] for event in reader.read(after_seq=1)] == ["r-1"]
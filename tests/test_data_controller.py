@@ -0,0 +1,98 @@
+import os
+import pickle
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+from controllers.data_controller import DataController
+from controllers.report_snapshot import ReportSnapshot
+from models.borrower import Borrower
+from models.enums import CreditStatus
+from conftest import make_report
+
+
+def _borrower(passport_number: str, department: str) -> Borrower:
+
+    borrower = Borrower.create_new("Иванов Иван", passport_number, "4510", datetime(1985, 1, 1), 90000.0, 30000.0,
+                                   70, 0.0, 5, "ООО Ромашка", "инженер", "Москва", "+7 900 000-00-00")
+    borrower.department = department
+    return borrower
+
+
+def test_snapshot_versions_share_unchanged_segments():
+
+    first = make_report(datetime(2025, 1, 1))
+    second = make_report(datetime(2025, 2, 1))
+    snapshot = ReportSnapshot(segments={"a": (first,), "b": (second,)})
+    updated = snapshot.with_segments({"b": (second, make_report(datetime(2025, 2, 2)))})
+
+    assert updated.version == snapshot.version + 1
+    assert updated.segments["a"] is snapshot.segments["a"]
+    assert len(snapshot.reports) == 2 and len(updated.reports) == 3
+    assert updated.select(["b", "missing"]) == updated.segments["b"]
+
+    restored = pickle.loads(pickle.dumps(updated))
+    assert [r.id for r in restored.reports] == [r.id for r in updated.reports]
+
+
+def test_readers_keep_their_snapshot_while_writes_publish(data_controller):
+
+    report = make_report(datetime.now(), CreditStatus.PENDING)
+    data_controller.add_report(report)
+    before = data_controller.snapshot()
+
+    data_controller.update_report(replace(report, status=CreditStatus.APPROVED))
+    data_controller.add_report(make_report(datetime.now()))
+
+    assert [r.status for r in before.reports] == [CreditStatus.PENDING]
+    assert len(data_controller.snapshot().reports) == 2
+    assert data_controller.get_report_by_id(report.id).status == CreditStatus.APPROVED
+
+
+def test_recent_reports_read_only_newest_segments(data_controller, data_dir):
+
+    now = datetime.now()
+    reports = [make_report(now - timedelta(days=31 * month + day)) for month in range(12) for day in range(3)]
+    for report in reports:
+        data_controller.add_report(report)
+
+    reopened = DataController(data_dir, archive_after_days=None)
+    recent = reopened.get_recent_reports(5)
+    expected = sorted(reports, key=lambda r: r.created_at, reverse=True)[:5]
+    assert [r.id for r in recent] == [r.id for r in expected]
+    assert len(reopened._snapshot.segments) < len(reopened.report_storage.segment_keys())
+
+
+def test_borrower_counts_follow_writes_and_rebuild(data_controller, data_dir):
+
+    data_controller.upsert_borrower(_borrower("100001", "Отделение 1"))
+    data_controller.upsert_borrower(_borrower("100002", "Отделение 1"))
+    data_controller.upsert_borrower(_borrower("100003", "Отделение 2"))
+    # Повторная заявка обновляет заемщика, а не добавляет его
+    data_controller.upsert_borrower(_borrower("100001", "Отделение 1"))
+
+    assert DataController(data_dir, archive_after_days=None).get_statistics()["total_borrowers"] == 3
+    scoped = DataController(data_dir, archive_after_days=None, departments=["Отделение 2"])
+    assert scoped.get_statistics()["total_borrowers"] == 1
+
+    os.remove(os.path.join(data_dir, "borrowers", "manifest.json"))
+    assert sum(DataController(data_dir, archive_after_days=None).borrower_counts().values()) == 3
+
+
+def test_borrower_search_respects_requested_departments(data_controller):
+
+    first = data_controller.upsert_borrower(_borrower("100001", "Отделение 1"))
+    data_controller.upsert_borrower(_borrower("100002", "Отделение 2"))
+    data_controller.add_report(make_report(datetime.now(), department="Отделение 1", borrower_id=first.id))
+    data_controller.add_report(make_report(datetime.now(), department="Отделение 2", borrower_id=first.id))
+
+    # Контроллер без своей области, как на сервере данных: область задает запрос
+    assert len(data_controller.search_borrowers(full_name="иванов")) == 2
+    scoped = data_controller.search_borrowers(full_name="иванов", departments=["Отделение 2"])
+    assert [b.passport_number for b in scoped] == ["100002"]
+    assert data_controller.search_borrowers(passport_series="4510", passport_number="100001",
+                                            departments=["Отделение 2"]) == []
+    assert [b.id for b in data_controller.search_borrowers(passport_series="4510", passport_number="100001")] == [first.id]
+
+    reports = data_controller.get_reports_by_borrower(first.id, include_archive=True, departments=["Отделение 1"])
+    assert [r.department for r in reports] == ["Отделение 1"]
+    assert len(data_controller.get_reports_by_borrower(first.id)) == 2
@@ -0,0 +1,56 @@
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+from controllers.data_server import DataServer, RemoteDataController
+
+
+@pytest.fixture
+def server(data_controller, tmp_path):
+
+    previous = os.umask(0)
+    try:
+        server = DataServer(data_controller, str(tmp_path / "data.sock"))
+    finally:
+        restored = os.umask(previous)
+    # Маска процесса после создания сервера прежняя
+    assert restored == 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_socket_is_created_owner_only(server):
+
+    assert stat.S_IMODE(os.stat(server.socket_path).st_mode) == 0o600
+
+
+def test_socket_is_never_bound_with_open_permissions(data_controller, tmp_path, monkeypatch):
+
+    modes = []
+    bind = socket.socket.bind
+
+    def checked_bind(sock, address):
+        bind(sock, address)
+        modes.append(stat.S_IMODE(os.stat(address).st_mode))
+
+    monkeypatch.setattr(socket.socket, "bind", checked_bind)
+    previous = os.umask(0)
+    try:
+        server = DataServer(data_controller, str(tmp_path / "data.sock"))
+    finally:
+        os.umask(previous)
+    server.server_close()
+    assert modes == [0o600]
+
+
+def test_second_server_on_live_socket_is_refused(server, data_controller):
+
+    with pytest.raises(RuntimeError):
+        DataServer(data_controller, server.socket_path)
+    assert RemoteDataController(server.socket_path).get_statistics()["total_reports"] == 0
@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+
+from controllers.derived_store import write_snapshot, read_snapshot, pack_strings, unpack_strings
+
+
+def test_round_trip_keeps_meta_and_arrays(tmp_path):
+
+    path = str(tmp_path / "indexes" / "sample.idx")
+    blob, ends = pack_strings(["первый", "", "third"])
+    write_snapshot(path, {"seq": [10, "abc"]}, {
+        "ids": np.array([b"a", b"bb", b"ccc"]),
+        "matrix": np.arange(6, dtype=np.int64).reshape(2, 3),
+        "blob": blob,
+        "ends": ends
+    })
+
+    snapshot = read_snapshot(path)
+    assert snapshot.meta == {"seq": [10, "abc"]}
+    assert snapshot.arrays["ids"].tolist() == [b"a", b"bb", b"ccc"]
+    assert snapshot.arrays["matrix"].tolist() == [[0, 1, 2], [3, 4, 5]]
+    assert unpack_strings(snapshot.arrays["blob"], snapshot.arrays["ends"]) == ["первый", "", "third"]
+    # Массивы отображены из файла, а не скопированы
+    assert not snapshot.arrays["matrix"].flags.writeable
+
+
+def test_damaged_or_foreign_files_are_rejected(tmp_path):
+
+    path = str(tmp_path / "sample.idx")
+    assert read_snapshot(path) is None
+
+    write_snapshot(path, {}, {"values": np.arange(100, dtype=np.int64)})
+    with open(path, "r+b") as f:
+        f.seek(-8, os.SEEK_END)
+        f.write(b"\x01" * 8)
+    assert read_snapshot(path) is None
+
+    write_snapshot(path, {}, {"values": np.arange(100, dtype=np.int64)})
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 16)
+    assert read_snapshot(path) is None
+
+    with open(path, "wb") as f:
+        f.write(b"not a snapshot at all")
+    assert read_snapshot(path) is None
+
+
+def test_empty_strings_pack():
+
+    blob, ends = pack_strings([])
+    assert unpack_strings(blob, ends) == []
@@ -0,0 +1,102 @@
+import csv
+import io
+import os
+import time
+import zipfile
+from datetime import datetime
+
+import pytest
+
+from controllers.export_controller import ExportController, ExportTooLarge, REPORT_COLUMNS
+from conftest import make_report
+
+
+def _read_csv(chunks) -> list:
+
+    text = b"".join(chunks).decode("utf-8")
+    assert text.startswith("\ufeff")
+    return list(csv.reader(io.StringIO(text[1:]), delimiter=";"))
+
+
+def test_csv_round_trip_in_chunks():
+
+    reports = [make_report(datetime(2025, 1, 1, 10, i), score=i, notes=f"заметка {i}") for i in range(7)]
+    chunks = list(ExportController(chunk_rows=3).stream_reports(reports, "csv"))
+    rows = _read_csv(chunks)
+
+    assert len(chunks) == 3
+    assert rows[0] == [name for name, _ in REPORT_COLUMNS]
+    assert [row[0] for row in rows[1:]] == [r.id for r in reports]
+    assert rows[3][6] == "2"
+
+
+def test_csv_cells_cannot_start_formulas():
+
+    header = ["Значение"]
+    values = ["=HYPERLINK(\"http://x\")", "+7 900 000-00-00", "-2+3", "@SUM(A1)", "\tTAB", "обычный текст", -5, 1.5]
+    rows = _read_csv(ExportController().stream_csv(header, [[value] for value in values]))
+
+    assert [row[0] for row in rows[1:]] == [
+        "'=HYPERLINK(\"http://x\")", "'+7 900 000-00-00", "'-2+3", "'@SUM(A1)", "'\tTAB", "обычный текст", "-5", "1.5"]
+
+
+def test_xlsx_is_valid_archive():
+
+    reports = [make_report(datetime(2025, 1, 1), notes="=1+1 <b>\x01")]
+    data = b"".join(ExportController(chunk_rows=1).stream_reports(reports, "xlsx"))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    assert reports[0].id in sheet
+    assert "=1+1 &lt;b&gt;" in sheet
+
+
+def test_xlsx_non_finite_numbers_become_empty_cells():
+
+    rows = [[1.5, float("nan"), float("inf"), float("-inf"), 7]]
+    data = b"".join(ExportController().stream_xlsx(["a", "b", "c", "d", "e"], rows))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    assert "nan" not in sheet and "inf" not in sheet
+    assert "<c><v>1.5</v></c><c/><c/><c/><c><v>7</v></c>" in sheet
+
+
+def test_temp_files_are_removed(tmp_path):
+
+    exporter = ExportController()
+    temp_dir = str(tmp_path / "exports")
+    path = exporter.export_to_temp_file(iter([b"a;b\n"]), "csv", temp_dir)
+    assert os.path.dirname(path) == temp_dir and open(path, "rb").read() == b"a;b\n"
+
+    exporter.remove_temp_file(path)
+    exporter.remove_temp_file(path)
+    assert not os.path.exists(path)
+
+    # Брошенная выгрузка удаляется при подготовке следующей, свежая остается
+    abandoned = exporter.export_to_temp_file(iter([b"old"]), "csv", temp_dir)
+    old = time.time() - 7200
+    os.utime(abandoned, (old, old))
+    fresh = exporter.export_to_temp_file(iter([b"new"]), "xlsx", temp_dir)
+    assert os.listdir(temp_dir) == [os.path.basename(fresh)]
+
+
+def test_failed_export_leaves_no_file(tmp_path):
+
+    def broken_chunks():
+        yield b"partial"
+        raise RuntimeError("сбой чтения")
+
+    temp_dir = str(tmp_path / "exports")
+    with pytest.raises(RuntimeError):
+        ExportController().export_to_temp_file(broken_chunks(), "csv", temp_dir)
+    assert os.listdir(temp_dir) == []
+
+
+def test_export_over_size_limit_is_aborted(tmp_path):
+
+    temp_dir = str(tmp_path / "exports")
+    with pytest.raises(ExportTooLarge):
+        ExportController().export_to_temp_file(iter([b"x" * 600, b"x" * 600]), "csv", temp_dir, max_bytes=1000)
+    assert os.listdir(temp_dir) == []
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from controllers.analysis_cache import AnalysisCache
+from controllers.credit_controller import CreditController
+from controllers.loan_calculator import LoanCalculator, annuity_factor
+from models.borrower import Borrower
+
+
+def _borrower(income: float, existing_loans: float) -> Borrower:
+
+    return Borrower.create_new("Кузнецов Кузьма", "600001", "4515", datetime(1988, 8, 8), income, 40000.0,
+                               70, existing_loans, 4, "ООО Ромашка", "инженер", "Москва", "+7 900 000-00-04")
+
+
+@pytest.fixture
+def calculator(data_controller) -> LoanCalculator:
+
+    return LoanCalculator(CreditController(data_controller, analysis_cache=AnalysisCache()))
+
+
+def test_annuity_payment_matches_formula():
+
+    # 120 000 руб. на 12 месяцев под 12% годовых: известный платеж 10 661,85 руб.
+    assert round(float(annuity_factor(0.12, 12)) * 120000, 2) == 10661.85
+    assert float(annuity_factor(0.0, 24)) == pytest.approx(1 / 24)
+
+
+def test_grid_payments_and_dti_cap(calculator):
+
+    borrower = _borrower(100000, 20000)
+    grid = calculator.calculate(borrower, 600000, terms_months=[12, 60], annual_rates=[0.0, 0.2], max_dti=0.5)
+
+    assert grid["payment"].shape == (2, 2)
+    assert grid["payment"][0, 0] == 50000.0
+    assert grid["current_dti"] == pytest.approx(0.2)
+    assert grid["dti"][0, 0] == pytest.approx(0.7) and not grid["within_cap"][0, 0]
+    assert grid["within_cap"][1, 1]
+    assert grid["total_paid"][1, 1] == pytest.approx(grid["payment"][1, 1] * 60)
+
+    # Предельная сумма дает платеж ровно на границе нагрузки
+    at_cap = calculator.calculate(borrower, grid["max_principal"][1, 1], terms_months=[60], annual_rates=[0.2])
+    assert at_cap["dti"][0, 0] == pytest.approx(0.5, abs=1e-6)
+
+
+def test_batch_matches_single_borrower(calculator):
+
+    borrowers = [_borrower(income, loans) for income, loans in [(80000, 0), (150000, 90000), (50000, 10000)]]
+    principals = [300000, 1000000, 0]
+    batch = calculator.calculate_batch(borrowers, principals)
+
+    for i, (borrower, principal) in enumerate(zip(borrowers, principals)):
+        single = calculator.calculate(borrower, principal)
+        assert np.array_equal(single["payment"], batch["payment"][i])
+        assert np.array_equal(single["max_principal"], batch["max_principal"][i])
+    # Сетка по умолчанию берется из правил скоринга
+    assert list(batch["terms_months"]) == list(calculator.settings()["terms_months"])
+
+
+def test_no_income_and_overloaded_borrowers(calculator):
+
+    no_income = calculator.calculate(_borrower(0, 0), 100000)
+    assert no_income["current_dti"] == np.inf and not no_income["within_cap"].any()
+    assert (no_income["max_principal"] == 0).all()
+
+    overloaded = calculator.calculate(_borrower(100000, 70000))
+    assert (overloaded["max_principal"] == 0).all() and "payment" not in overloaded
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"terms_months": [0, 12]}, {"terms_months": []}, {"annual_rates": [-0.1]},
+    {"annual_rates": [float("nan")]}, {"max_dti": 0}, {"max_dti": float("inf")}, {"principal": -1},
+])
+def test_invalid_inputs_are_rejected(calculator, kwargs):
+
+    with pytest.raises(ValueError):
+        calculator.calculate(_borrower(100000, 0), **kwargs)
+
+
+def test_principals_must_match_borrowers(calculator):
+
+    with pytest.raises(ValueError):
+        calculator.calculate_batch([_borrower(100000, 0)] * 2, [100000])
@@ -0,0 +1,120 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from controllers.data_controller import DataController
+from controllers.report_archive import ReportArchive
+from models.enums import CreditStatus
+from conftest import make_report
+
+
+def _archived_and_live(data_controller):
+
+    old = make_report(datetime.now() - timedelta(days=400), status=CreditStatus.APPROVED)
+    live = make_report(datetime.now(), status=CreditStatus.PENDING)
+    data_controller.add_report(old)
+    data_controller.add_report(live)
+    assert data_controller.archive_finalized_reports(180) == 1
+    return old, live
+
+
+def test_report_by_id_finds_archived_and_live_reports(data_controller, data_dir):
+
+    old, live = _archived_and_live(data_controller)
+
+    # Новый экземпляр: индексы читаются с диска, а не из памяти архивировавшего процесса
+    reopened = DataController(data_dir, archive_after_days=None)
+    assert old.id not in {r.id for r in reopened.get_all_reports()}
+    assert reopened.get_report_by_id(old.id).id == old.id
+    assert reopened.get_report_by_id(live.id).id == live.id
+    assert reopened.get_report_by_id(old.id, old.created_at).id == old.id
+    assert reopened.get_report_by_id("missing") is None
+
+
+def test_archived_report_respects_department_scope(data_controller, data_dir):
+
+    old, _ = _archived_and_live(data_controller)
+
+    other = DataController(data_dir, archive_after_days=None, departments=["Другой отдел"])
+    assert other.get_report_by_id(old.id) is None
+
+
+def test_archive_round_trip_keeps_reports_and_borrower_index(tmp_path):
+
+    archive = ReportArchive(str(tmp_path / "archive"))
+    first = make_report(datetime(2024, 3, 5), status=CreditStatus.APPROVED, borrower_id="b-1")
+    second = make_report(datetime(2024, 3, 20), status=CreditStatus.REJECTED, borrower_id="b-2", score=40)
+    archive.add_reports([first, second])
+    archive.add_reports([make_report(datetime(2024, 4, 1), status=CreditStatus.APPROVED, borrower_id="b-1")])
+
+    reopened = ReportArchive(str(tmp_path / "archive"))
+    assert reopened.count() == 3
+    assert {r.id for r in reopened.iter_reports()} >= {first.id, second.id}
+    assert [r.id for r in reopened.get_reports_by_borrower("b-2")] == [second.id]
+    assert len(reopened.get_reports_by_borrower("b-1")) == 2
+    assert reopened.get_report_by_id(second.id).score == 40
+
+
+def test_archive_rebuilds_missing_id_index(tmp_path):
+
+    archive = ReportArchive(str(tmp_path / "archive"))
+    report = make_report(datetime(2024, 3, 5), status=CreditStatus.APPROVED)
+    archive.add_reports([report])
+
+    # Архив, записанный до появления индексов id
+    os.remove(os.path.join(str(tmp_path / "archive"), "2024-03.ids"))
+    reopened = ReportArchive(str(tmp_path / "archive"))
+    assert reopened.locate(report.id) == "2024-03"
+    assert os.path.exists(os.path.join(str(tmp_path / "archive"), "2024-03.ids"))
+
+
+def test_retry_after_crash_before_hot_rewrite_does_not_double_count(data_controller, data_dir, monkeypatch):
+
+    old = make_report(datetime.now() - timedelta(days=400), status=CreditStatus.APPROVED, department="Отделение 1")
+    data_controller.add_report(old)
+
+    # Сбой после записи архива, до перезаписи оперативного сегмента
+    def crash(*args, **kwargs):
+        raise SystemExit("сбой")
+    monkeypatch.setattr(data_controller.report_storage, "save_segment", crash)
+    with pytest.raises(SystemExit):
+        data_controller.archive_finalized_reports(180)
+    monkeypatch.undo()
+
+    reopened = DataController(data_dir, archive_after_days=None)
+    assert reopened.archive_finalized_reports(180) == 1
+    assert old.id not in {r.id for r in reopened.get_all_reports()}
+
+    archive = ReportArchive(os.path.join(data_dir, "archive"))
+    assert archive.count() == 1
+    assert [r.id for r in archive.iter_reports()] == [old.id]
+    assert archive.aggregates_for(["Отделение 1"])["total"] == 1
+    assert archive.distributions.get("score").count == 1
+
+
+def test_segment_rows_without_manifest_are_ignored_and_readded_once(tmp_path, monkeypatch):
+
+    root_dir = str(tmp_path / "archive")
+    archive = ReportArchive(root_dir)
+    first = make_report(datetime(2024, 3, 5), status=CreditStatus.APPROVED)
+    archive.add_reports([first])
+
+    # Сбой между записью сегмента и манифеста: в файле сегмента лишняя строка
+    second = make_report(datetime(2024, 3, 6), status=CreditStatus.REJECTED)
+    def crash():
+        raise SystemExit("сбой")
+    monkeypatch.setattr(archive, "_save_manifest", crash)
+    with pytest.raises(SystemExit):
+        archive.add_reports([second])
+
+    reopened = ReportArchive(root_dir)
+    assert reopened.count() == 1
+    assert reopened.get_report_by_id(second.id) is None
+    assert [r.id for r in reopened.iter_reports()] == [first.id]
+
+    assert reopened.add_reports([first, second, second]) == 1
+    again = ReportArchive(root_dir)
+    assert again.count() == 2
+    assert [r.id for r in again.load_segment("2024-03")] == [first.id, second.id]
+    assert again.add_reports([second]) == 0
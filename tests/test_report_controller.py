@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from controllers.report_controller import ReportController
+from models.enums import CreditStatus
+from conftest import make_report
+
+
+@pytest.fixture
+def reports(data_controller):
+
+    now = datetime.now()
+    created = {
+        "pending": make_report(now, CreditStatus.PENDING, created_by="officer-1"),
+        "pending_old": make_report(now - timedelta(days=40), CreditStatus.PENDING, created_by="officer-2"),
+        "correction": make_report(now, CreditStatus.NEEDS_CORRECTION, created_by="officer-1"),
+        "approved": make_report(now, CreditStatus.APPROVED, created_by="officer-1"),
+        "in_progress": make_report(now, CreditStatus.IN_PROGRESS, created_by="officer-1"),
+    }
+    for report in created.values():
+        data_controller.add_report(report)
+    return created
+
+
+def _statuses(data_controller) -> dict:
+
+    return {r.id: r.status for r in data_controller.get_all_reports()}
+
+
+def test_selected_reports_are_saved_with_one_write(data_controller, reports, monkeypatch):
+
+    writes = []
+    save_segments = data_controller.report_storage.save_segments
+    monkeypatch.setattr(data_controller.report_storage, "save_segments",
+                        lambda segments: writes.append(sorted(segments)) or save_segments(segments))
+
+    controller = ReportController(data_controller)
+    ids = [reports["pending"].id, reports["pending_old"].id, reports["pending"].id,
+           reports["approved"].id, reports["in_progress"].id, "missing"]
+    updated, skipped = controller.bulk_update_status(CreditStatus.APPROVED, "manager", "Руководитель",
+                                                     report_ids=ids, notes="Одобрено пакетом")
+
+    assert updated == 2
+    # Уже одобренный отчет и недопустимый переход пропускаются, а не перезаписываются
+    assert skipped == [reports["approved"].id, reports["in_progress"].id, "missing"]
+    # Отчеты из разных месяцев сохраняются одной пакетной записью
+    assert len(writes) == 1 and len(writes[0]) == 2
+
+    statuses = _statuses(data_controller)
+    assert statuses[reports["pending"].id] == statuses[reports["pending_old"].id] == CreditStatus.APPROVED
+    assert statuses[reports["in_progress"].id] == CreditStatus.IN_PROGRESS
+    approved = data_controller.get_report_by_id(reports["pending"].id)
+    assert approved.notes == "Одобрено пакетом" and approved.modified_by == "manager"
+
+    timeline = data_controller.report_history.timeline(reports["pending"].id)
+    assert timeline[-1]["changes"]["status"] == (CreditStatus.PENDING.value, CreditStatus.APPROVED.value)
+
+
+def test_filtered_transition_without_ids(data_controller, reports):
+
+    controller = ReportController(data_controller)
+    updated, skipped = controller.bulk_update_status(
+        CreditStatus.REJECTED, "manager", "Руководитель", statuses=[CreditStatus.PENDING],
+        since=datetime.now() - timedelta(days=7), created_by="officer-1")
+
+    assert (updated, skipped) == (1, [])
+    statuses = _statuses(data_controller)
+    assert statuses[reports["pending"].id] == CreditStatus.REJECTED
+    assert statuses[reports["pending_old"].id] == CreditStatus.PENDING
+    assert statuses[reports["correction"].id] == CreditStatus.NEEDS_CORRECTION
+
+
+def test_nothing_to_update_writes_nothing(data_controller, reports, monkeypatch):
+
+    monkeypatch.setattr(data_controller.report_storage, "save_segments",
+                        lambda segments: pytest.fail("запись без изменений"))
+    controller = ReportController(data_controller)
+    assert controller.bulk_update_status(CreditStatus.PENDING, "manager", "Руководитель",
+                                         report_ids=[reports["approved"].id]) == (0, [reports["approved"].id])
+
+
+def test_send_reports_applies_send_transitions(data_controller, reports):
+
+    controller = ReportController(data_controller)
+    ids = [reports["approved"].id, reports["correction"].id, reports["pending"].id]
+    updated, skipped = controller.send_reports("manager", "Руководитель", report_ids=ids)
+
+    assert (updated, skipped) == (2, [reports["pending"].id])
+    statuses = _statuses(data_controller)
+    assert statuses[reports["approved"].id] == CreditStatus.APPROVED
+    assert statuses[reports["correction"].id] == CreditStatus.PENDING
+    assert data_controller.get_report_by_id(reports["approved"].id).modified_by == "manager"
+
+
+def test_bulk_actions_stay_in_caller_departments(data_controller):
+
+    own = make_report(datetime.now(), department="Отделение 1")
+    foreign = make_report(datetime.now(), department="Отделение 2")
+    data_controller.add_report(own)
+    data_controller.add_report(foreign)
+
+    controller = ReportController(data_controller, departments=["Отделение 1"])
+    assert controller.bulk_update_status(CreditStatus.APPROVED, "manager", "Руководитель",
+                                         report_ids=[own.id, foreign.id]) == (1, [foreign.id])
+    assert controller.bulk_update_status(CreditStatus.REJECTED, "manager", "Руководитель") == (0, [])
+    assert data_controller.get_report_by_id(foreign.id).status == CreditStatus.PENDING
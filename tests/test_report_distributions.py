@@ -0,0 +1,86 @@
+import json
+import random
+from datetime import datetime
+
+from controllers.report_distributions import KLLSketch, ReportDistributions
+from models.enums import CreditStatus
+from conftest import make_report
+
+
+def _rank_error(sketch: KLLSketch, values, fractions=(0.1, 0.25, 0.5, 0.75, 0.9)) -> float:
+
+    ordered = sorted(values)
+    errors = []
+    for fraction, estimate in zip(fractions, sketch.quantiles(fractions)):
+        true_rank = sum(1 for value in ordered if value <= estimate) / len(ordered)
+        errors.append(abs(true_rank - fraction))
+    return max(errors)
+
+
+def test_sketch_quantiles_stay_within_rank_error():
+
+    rng = random.Random(7)
+    values = [rng.gauss(60, 15) for _ in range(20000)]
+    sketch = KLLSketch()
+    for value in values:
+        sketch.update(value)
+
+    assert sketch.count == 20000
+    assert sum(len(level) for level in sketch.levels) < 1000
+    assert _rank_error(sketch, values) < 0.02
+    assert sketch.quantiles([0, 1]) == [min(values), max(values)]
+
+
+def test_merged_sketches_match_single_sketch_accuracy():
+
+    rng = random.Random(3)
+    parts = [[rng.uniform(0, 100) for _ in range(5000)] for _ in range(4)]
+    merged = KLLSketch()
+    for part in parts:
+        sketch = KLLSketch()
+        for value in part:
+            sketch.update(value)
+        merged.merge(sketch)
+
+    values = [value for part in parts for value in part]
+    assert merged.count == len(values)
+    assert _rank_error(merged, values) < 0.02
+    assert abs(merged.rank(50) - 0.5) < 0.02
+
+
+def test_sketch_dict_round_trip_is_exact():
+
+    sketch = KLLSketch(k=50)
+    for value in range(1000):
+        sketch.update(value)
+    restored = KLLSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+
+    assert restored.quantiles([0.1, 0.5, 0.9]) == sketch.quantiles([0.1, 0.5, 0.9])
+    # Продолжение после восстановления дает тот же скетч, что и без сохранения
+    for value in range(1000, 1500):
+        sketch.update(value)
+        restored.update(value)
+    assert restored.to_dict() == sketch.to_dict()
+
+
+def test_empty_sketch():
+
+    sketch = KLLSketch()
+    assert sketch.quantiles([0.5]) == [None]
+    assert sketch.rank(10) == 0.0
+
+
+def test_report_distributions_group_and_round_trip():
+
+    reports = [make_report(datetime(2025, 1, 1), CreditStatus.APPROVED, score=score, created_by="u-1")
+               for score in range(50, 100)]
+    reports += [make_report(datetime(2025, 1, 1), CreditStatus.REJECTED, score=score, created_by="u-2")
+                for score in range(0, 30)]
+    distributions = ReportDistributions.from_dict(
+        json.loads(json.dumps(ReportDistributions.from_reports(reports).to_dict())))
+
+    assert distributions.get("score").count == 80
+    assert distributions.get("score", "by_status", "Одобрен").percentiles([50])[50] in (74, 75)
+    assert distributions.get("score", "by_creator", "u-2").sketch.max == 29
+    assert distributions.get("score", "by_creator", "unknown").count == 0
+    assert sum(distributions.get("max_loan_amount").histogram) == 80
@@ -0,0 +1,89 @@
+import os
+from dataclasses import replace
+from datetime import datetime
+
+from controllers.report_history import ReportHistory
+from models.enums import CreditStatus
+from conftest import make_report
+
+
+def _edit_many(history: ReportHistory, report, count: int):
+
+    versions = [report]
+    for i in range(count):
+        edited = replace(versions[-1], score=versions[-1].score + 1, notes=f"правка {i}",
+                         modified_at=datetime(2025, 3, 1, 10, i), modified_by="manager", modified_by_name="Руководитель")
+        history.record(versions[-1].to_dict(), edited.to_dict(), "manager", "Руководитель", edited.modified_at)
+        versions.append(edited)
+    return versions
+
+
+def test_every_version_is_restored_from_deltas_and_checkpoints(tmp_path):
+
+    history = ReportHistory(str(tmp_path / "history"), checkpoint_interval=4)
+    report = make_report(datetime(2025, 3, 1), CreditStatus.PENDING)
+    versions = _edit_many(history, report, 11)
+
+    reopened = ReportHistory(str(tmp_path / "history"), checkpoint_interval=4)
+    assert reopened.version_count(report.id) == 12
+    for number, expected in enumerate(versions):
+        assert reopened.get_version(report.id, number) == expected
+    assert reopened.get_version(report.id, 12) is None
+    assert reopened.get_version("missing", 0) is None
+
+
+def test_unchanged_values_do_not_add_version(tmp_path):
+
+    history = ReportHistory(str(tmp_path / "history"))
+    report = make_report(datetime(2025, 3, 1))
+    touched = replace(report, modified_at=datetime(2025, 3, 2), modified_by="manager")
+
+    assert history.record(report.to_dict(), touched.to_dict(), "manager", "Руководитель") is None
+    assert history.version_count(report.id) == 0
+
+
+def test_timeline_lists_field_changes(tmp_path):
+
+    history = ReportHistory(str(tmp_path / "history"))
+    report = make_report(datetime(2025, 3, 1), CreditStatus.PENDING)
+    approved = replace(report, status=CreditStatus.APPROVED)
+    history.record(report.to_dict(), approved.to_dict(), "manager", "Руководитель", datetime(2025, 3, 5))
+
+    timeline = history.timeline(report.id)
+    assert [entry["version"] for entry in timeline] == [0, 1]
+    assert timeline[0]["by"] == report.created_by
+    assert timeline[1]["changes"] == {"status": ("На рассмотрении", "Одобрен")}
+    assert timeline[1]["at"] == datetime(2025, 3, 5)
+
+
+def test_torn_last_line_is_dropped_by_next_record(tmp_path):
+
+    history = ReportHistory(str(tmp_path / "history"))
+    report = make_report(datetime(2025, 3, 1))
+    _edit_many(history, report, 2)
+    with open(history.log_file, "ab") as f:
+        f.write(b'{"report_id": "')
+    size = os.path.getsize(history.log_file)
+
+    reopened = ReportHistory(str(tmp_path / "history"))
+    assert reopened.version_count(report.id) == 3
+    # Чтение не трогает файл, обрезка выполняется только под блокировкой записи
+    assert os.path.getsize(history.log_file) == size
+    _edit_many(reopened, reopened.get_version(report.id, 2), 1)
+    assert ReportHistory(str(tmp_path / "history")).version_count(report.id) == 4
+
+
+def test_versions_written_by_another_process_are_indexed(tmp_path):
+
+    writer = ReportHistory(str(tmp_path / "history"))
+    reader = ReportHistory(str(tmp_path / "history"))
+    report = make_report(datetime(2025, 3, 1))
+    _edit_many(writer, report, 1)
+    assert reader.version_count(report.id) == 2
+
+    versions = _edit_many(writer, writer.get_version(report.id, 1), 2)
+    assert reader.version_count(report.id) == 4
+    assert reader.get_version(report.id, 3) == versions[-1]
+    # Запись после чужих версий продолжает нумерацию, а не начинает ее заново
+    _edit_many(reader, versions[-1], 1)
+    assert writer.version_count(report.id) == 5
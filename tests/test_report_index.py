@@ -0,0 +1,52 @@
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+from controllers.data_controller import DataController
+from controllers.report_controller import ReportController
+from controllers.report_index import ReportSearchIndex
+from models.enums import CreditStatus
+from conftest import make_report
+
+
+def test_sessions_share_one_index_per_scope(data_controller):
+
+    data_controller.add_report(make_report(datetime.now(), department="Отделение 1", borrower_name="Петров Петр"))
+    subscribers = len(data_controller.changes._subscribers)
+
+    # Каждая сессия создает свой ReportController, но индекс и подписка на ленту остаются одни
+    sessions = [ReportController(data_controller, ["Отделение 1"]) for _ in range(5)]
+    for controller in sessions:
+        assert controller.search_open_reports("петр")[1] == 1
+    head_office = ReportController(data_controller)
+    assert head_office.search_open_reports()[1] == 1
+
+    assert len(data_controller.changes._subscribers) == subscribers + 2
+    assert data_controller.search_indexes.get(["Отделение 1"]) is data_controller.search_indexes.get(["Отделение 1"])
+
+    data_controller.search_indexes.close()
+    assert len(data_controller.changes._subscribers) == subscribers
+
+
+def test_index_follows_writes_and_restarts_from_snapshot(data_controller, data_dir):
+
+    now = datetime.now()
+    older = make_report(now - timedelta(days=2), borrower_name="Сидоров Семен", max_loan_amount=300000.0)
+    newer = make_report(now - timedelta(days=1), borrower_name="Семенов Олег", max_loan_amount=100000.0)
+    data_controller.add_report(older)
+    controller = ReportController(data_controller)
+    assert [r["id"] for r in controller.search_open_reports("сем")[0]] == [older.id]
+
+    data_controller.add_report(newer)
+    assert [r["id"] for r in controller.search_open_reports("сем", sort="amount")[0]] == [newer.id, older.id]
+
+    # Закрытый отчет уходит из индекса открытых
+    data_controller.update_report(replace(older, status=CreditStatus.APPROVED))
+    assert [r["id"] for r in controller.search_open_reports("сем")[0]] == [newer.id]
+    data_controller.search_indexes.close()
+
+    # После перезапуска индекс читается из снимка и дочитывает ленту
+    reopened = DataController(data_dir, archive_after_days=None)
+    reopened.add_report(make_report(now, borrower_name="Семенова Анна"))
+    index = ReportSearchIndex(reopened)
+    assert index.search("семен")[1] == 2
+    assert index.search(newer.id[:8])[0][0]["id"] == newer.id
@@ -0,0 +1,186 @@
+from datetime import datetime
+
+import pytest
+
+from controllers.report_query import ColumnStore, QueryError, ReportQuery, And, Compare, Not, Or, literal
+from controllers.report_storage import ReportStorage
+from models.borrower import Borrower
+from models.enums import CreditStatus
+from conftest import make_report
+
+NOW = datetime(2025, 6, 15, 12, 0)
+
+
+def _borrower(borrower_id: str, income: float) -> Borrower:
+
+    return Borrower(borrower_id, "Иванов Иван", "123456", "4510", datetime(1985, 1, 1), income, 30000.0,
+                    70, 0.0, 5, "ООО Ромашка", "инженер", "Москва", "+7 900 000-00-00")
+
+
+@pytest.fixture
+def reports():
+
+    return [
+        make_report(datetime(2025, 5, 3), CreditStatus.APPROVED, "Отделение 1", "b-1",
+                    borrower_name="Ёлкин Пётр", score=80, max_loan_amount=900000.0),
+        make_report(datetime(2025, 5, 20), CreditStatus.REJECTED, "Отделение 1", "b-2",
+                    borrower_name="Смирнова Анна", score=35, max_loan_amount=0.0),
+        make_report(datetime(2025, 6, 10, 9, 30), CreditStatus.PENDING, "Отделение 2", "b-3",
+                    borrower_name="Кузнецов Олег", score=60, max_loan_amount=400000.0),
+        # Заемщика нет в справочнике: его поля - пропуски
+        make_report(datetime(2025, 6, 14), CreditStatus.PENDING, "Отделение 2", "b-missing",
+                    borrower_name="Орлов Денис", score=55, max_loan_amount=250000.0)
+    ]
+
+
+def _run(text: str, reports) -> list:
+
+    borrowers = {"b-1": _borrower("b-1", 150000.0), "b-2": _borrower("b-2", 20000.0),
+                 "b-3": _borrower("b-3", 90000.0)}
+    query = ReportQuery.parse(text, NOW)
+    found, _ = query.evaluate([("segment", tuple(reports))], ColumnStore(), borrowers.get)
+    return [report.borrower_id for report in found]
+
+
+def test_and_binds_tighter_than_or():
+
+    condition = ReportQuery.parse("score > 50 or score < 10 and status = approved", NOW).condition
+    assert isinstance(condition, Or)
+    assert isinstance(condition.items[1], And)
+    assert str(condition) == "score > 50 or score < 10 and status = 'Одобрен'"
+
+
+def test_parentheses_and_not_override_precedence(reports):
+
+    condition = ReportQuery.parse("(score > 50 or score < 40) and not status = pending", NOW).condition
+    assert isinstance(condition, And)
+    assert isinstance(condition.items[0], Or)
+    assert isinstance(condition.items[1], Not)
+    assert _run("(score > 50 or score < 40) and not status = pending", reports) == ["b-1", "b-2"]
+    assert _run("score > 50 or score < 40 and not status = pending", reports) == ["b-1", "b-2", "b-3", "b-missing"]
+
+
+def test_nested_and_is_flattened_for_planning():
+
+    query = ReportQuery.parse("status = approved and (score > 10 and created_at >= 2025-01-01)", NOW)
+    assert [str(item) for item in query.conjuncts()] == [
+        "status = 'Одобрен'", "score > 10", "created_at >= 2025-01-01"]
+
+
+def test_russian_keywords_aliases_and_suffixes(reports):
+
+    assert _run("сумма >= 400тыс и балл между 50 и 90", reports) == ["b-1", "b-3"]
+    assert _run("сумма >= 0.9млн", reports) == ["b-1"]
+    assert _run("статус в ('Отклонен', 'одобрен')", reports) == ["b-1", "b-2"]
+
+
+def test_string_comparison_ignores_case_and_yo(reports):
+
+    assert _run("borrower_name = 'ЕЛКИН ПЕТР'", reports) == ["b-1"]
+    assert _run("заемщик содержит 'анна'", reports) == ["b-2"]
+    assert _run("department in ('отделение 2')", reports) == ["b-3", "b-missing"]
+    assert _run("status = REJECTED", reports) == ["b-2"]
+
+
+def test_dates_whole_day_and_within(reports):
+
+    assert _run("created_at = 2025-06-10", reports) == ["b-3"]
+    assert _run("created_at = 10.06.2025", reports) == ["b-3"]
+    assert _run("created_at within 7d", reports) == ["b-3", "b-missing"]
+    assert _run("created_at between 2025-05-01 and 2025-05-31", reports) == ["b-1", "b-2"]
+
+
+def test_missing_numbers_match_no_comparison(reports):
+
+    assert _run("borrower.income > 50000", reports) == ["b-1", "b-3"]
+    assert _run("borrower.income <= 50000", reports) == ["b-2"]
+    assert _run("borrower.income != 90000", reports) == ["b-1", "b-2"]
+    # Отрицание - дополнение до всех отчетов, в него пропуски попадают
+    assert _run("not borrower.income > 50000", reports) == ["b-2", "b-missing"]
+
+
+def test_missing_dates_match_no_comparison(reports):
+
+    reports[0].modified_at = datetime(2025, 6, 1)
+    assert _run("modified_at != 2025-06-02T10:00", reports) == ["b-1"]
+    assert _run("modified_at < 2025-07-01", reports) == ["b-1"]
+
+
+def test_bool_field_without_comparison(reports):
+
+    reports[1].blacklist_found = True
+    assert _run("blacklist_found", reports) == ["b-2"]
+    assert _run("not blacklist_found", reports) == ["b-1", "b-3", "b-missing"]
+
+
+@pytest.mark.parametrize("text, message", [
+    ("", "Пустое выражение"),
+    ("score >", "Выражение оборвано"),
+    ("score > > 1", "Ожидается значение в позиции 9"),
+    ("salary > 1", "Неизвестное поле «salary»"),
+    ("status = 'закрыт'", "Неизвестный статус «закрыт»"),
+    ("status > approved", "только = и !="),
+    ("score contains 'a'", "contains применяется к текстовым полям"),
+    ("score > 10 score", "Лишнее «score» в позиции 12"),
+    ("(score > 10", "Выражение оборвано"),
+    ("score > 10 ; drop", "Непонятный символ в позиции 12"),
+    ("score > 30d", "только с within/за"),
+    ("created_at within 7", "Ожидается срок вида 45d"),
+    ("score = 'высокий'", "Поле score нельзя сравнить"),
+])
+def test_bad_queries_raise_query_error(text, message):
+
+    with pytest.raises(QueryError, match=message):
+        ReportQuery.parse(text, NOW)
+
+
+def test_literal_round_trips_through_parser(reports):
+
+    name = "O'Brien \\ Ко"
+    reports[2].borrower_name = name
+    assert _run(f"borrower_name = {literal(name)}", reports) == ["b-3"]
+    assert _run(f"created_at >= {literal(datetime(2025, 6, 10, 9, 30))}", reports) == ["b-3", "b-missing"]
+    assert _run(f"status = {literal(CreditStatus.PENDING)}", reports) == ["b-3", "b-missing"]
+
+
+def test_explain_shows_index_pruning_and_column_cache(tmp_path, reports):
+
+    storage = ReportStorage(str(tmp_path / "reports"))
+    segments = {}
+    for report in reports:
+        segments.setdefault(ReportStorage.segment_key(report.created_at, report.department), []).append(report)
+    storage.save_segments(segments)
+
+    query = ReportQuery.parse("status = approved and score > 10", NOW)
+    keys, explain = query.plan(storage)
+    assert len(keys) == 1
+    assert explain[1] == "Сегменты области: 2"
+    assert explain[2] == "status = 'Одобрен': счетчики статусов в манифесте -> 1 из 2 сегментов"
+
+    columns = ColumnStore()
+    loaded = [(key, tuple(storage.load_segment(key))) for key in keys]
+    found, evaluation = query.evaluate(loaded, columns, lambda borrower_id: None)
+    assert [report.borrower_id for report in found] == ["b-1"]
+    assert evaluation == ["Просмотр: 1 сегментов, 2 отчетов",
+                          "Колонки: score, status (построено 2, из кэша 0)",
+                          "Векторный предикат: 1 из 2"]
+
+    # Тот же объект сегмента - колонки берутся из кэша
+    _, evaluation = query.evaluate(loaded, columns, lambda borrower_id: None)
+    assert evaluation[1] == "Колонки: score, status (построено 0, из кэша 2)"
+
+
+def test_plan_by_id_uses_id_index(tmp_path, reports):
+
+    storage = ReportStorage(str(tmp_path / "reports"))
+    storage.save_segments({ReportStorage.segment_key(r.created_at, r.department): [r] for r in reports[1:3]})
+
+    keys, explain = ReportQuery.parse(f"id = {literal(reports[2].id)}", NOW).plan(storage)
+    assert keys == [ReportStorage.segment_key(reports[2].created_at, reports[2].department)]
+    assert explain[-1].endswith("индекс id сегментов -> 1 из 2 сегментов")
+
+
+def test_compare_str_formats_values():
+
+    assert str(Compare("score", ">=", 10.0)) == "score >= 10"
+    assert str(Compare("created_at", "<", datetime(2025, 1, 2, 3, 4))) == "created_at < 2025-01-02 03:04"
@@ -0,0 +1,146 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from controllers.report_storage import ReportStorage
+from models.enums import CreditStatus
+from conftest import make_report
+
+
+@pytest.fixture
+def root_dir(tmp_path):
+
+    return str(tmp_path / "reports")
+
+
+def _segments(reports):
+
+    segments = {}
+    for report in reports:
+        segments.setdefault(ReportStorage.segment_key(report.created_at, report.department), []).append(report)
+    return segments
+
+
+@pytest.fixture
+def reports():
+
+    return [
+        make_report(datetime(2025, 1, 10), CreditStatus.APPROVED, "Отделение 1", score=80, created_by="u-1"),
+        make_report(datetime(2025, 1, 25), CreditStatus.REJECTED, "Отделение 1", score=30, created_by="u-2"),
+        make_report(datetime(2025, 2, 3), CreditStatus.PENDING, "Отделение 1", score=60, created_by="u-1"),
+        make_report(datetime(2025, 2, 7), CreditStatus.APPROVED, "Отделение 2", score=90, created_by="u-3")
+    ]
+
+
+def test_manifest_round_trip_keeps_segment_summaries(root_dir, reports):
+
+    ReportStorage(root_dir).save_segments(_segments(reports))
+    storage = ReportStorage(root_dir)
+
+    assert len(storage.segment_keys()) == 3
+    assert storage.total_count() == 4
+    assert storage.total_count(["Отделение 2"]) == 1
+
+    aggregates = storage.aggregate()
+    assert aggregates["total"] == 4
+    assert aggregates["score_sum"] == 260
+    assert aggregates["status_counts"] == {"Одобрен": 2, "Отклонен": 1, "На рассмотрении": 1}
+
+    assert storage.segments_since(datetime(2025, 2, 5)) == [ReportStorage.segment_key(datetime(2025, 2, 7),
+                                                                                      "Отделение 2")]
+    assert len(storage.segments_before(datetime(2025, 2, 1))) == 1
+    assert len(storage.segments_with_status(CreditStatus.APPROVED.value)) == 2
+    assert len(storage.segments_with_creator("u-1")) == 2
+    assert storage.department_aggregates()["Отделение 1"]["total"] == 3
+
+    key = ReportStorage.segment_key(datetime(2025, 1, 10), "Отделение 1")
+    assert [r.id for r in storage.load_segment(key)] == [reports[0].id, reports[1].id]
+
+
+def test_empty_segment_removes_files_and_manifest_entry(root_dir, reports):
+
+    storage = ReportStorage(root_dir)
+    storage.save_segments(_segments(reports))
+    key = ReportStorage.segment_key(datetime(2025, 2, 7), "Отделение 2")
+
+    storage.save_segment(key, [])
+    reopened = ReportStorage(root_dir)
+    assert key not in reopened.segment_keys()
+    assert reopened.total_count() == 3
+    assert not os.path.exists(os.path.join(root_dir, f"{key}.json"))
+    assert not os.path.exists(os.path.join(root_dir, f"{key}.ids"))
+
+
+def test_journal_is_replayed_after_crash(root_dir, reports):
+
+    storage = ReportStorage(root_dir)
+    storage.save_segments(_segments(reports[:2]))
+
+    # Сбой после записи журнала: сегменты и манифест еще старые
+    changed = make_report(datetime(2025, 1, 12), CreditStatus.PENDING, "Отделение 1")
+    key = ReportStorage.segment_key(changed.created_at, "Отделение 1")
+    journal = {key: [report.to_dict() for report in reports[:2] + [changed]]}
+    with open(storage.journal_file, "w", encoding="utf-8") as f:
+        json.dump(journal, f, ensure_ascii=False)
+
+    reopened = ReportStorage(root_dir)
+    assert not os.path.exists(reopened.journal_file)
+    assert reopened.total_count() == 3
+    assert reopened.locate(changed.id) == key
+
+
+def test_truncated_journal_is_discarded(root_dir, reports):
+
+    storage = ReportStorage(root_dir)
+    storage.save_segments(_segments(reports[:2]))
+    with open(storage.journal_file, "w", encoding="utf-8") as f:
+        f.write('{"common/2025-01": [{"id": ')
+
+    reopened = ReportStorage(root_dir)
+    assert not os.path.exists(reopened.journal_file)
+    assert reopened.total_count() == 2
+
+
+def test_locate_uses_id_index_and_rebuilds_stale_one(root_dir, reports):
+
+    ReportStorage(root_dir).save_segments(_segments(reports))
+    storage = ReportStorage(root_dir)
+    target = reports[2]
+    key = ReportStorage.segment_key(target.created_at, target.department)
+
+    assert storage.locate(target.id) == key
+    assert storage.locate(target.id, ["Отделение 2"]) is None
+    assert storage.locate("missing") is None
+
+    # Поврежденный индекс не проходит проверку контрольной суммы и строится заново
+    ids_file = os.path.join(root_dir, f"{key}.ids")
+    with open(ids_file, "r+b") as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b"\xff\xff\xff\xff")
+    assert ReportStorage(root_dir).locate(target.id) == key
+
+
+def test_legacy_file_is_split_into_partitions(tmp_path, reports):
+
+    legacy_file = str(tmp_path / "reports.json")
+    with open(legacy_file, "w", encoding="utf-8") as f:
+        json.dump([report.to_dict() for report in reports], f, ensure_ascii=False)
+
+    storage = ReportStorage(str(tmp_path / "reports"), legacy_file=legacy_file)
+    assert storage.total_count() == 4
+    assert len(storage.segment_keys(["Отделение 1"])) == 2
+    assert os.path.exists(f"{legacy_file}.bak")
+
+
+def test_distributions_merge_segment_sketches(root_dir, reports):
+
+    ReportStorage(root_dir).save_segments(_segments(reports))
+    storage = ReportStorage(root_dir)
+
+    overall = storage.distributions().get("score")
+    assert overall.count == 4
+    assert overall.sketch.min == 30 and overall.sketch.max == 90
+    assert storage.distributions(["Отделение 2"]).get("score").count == 1
+    assert storage.distributions().get("score", "by_status", "Одобрен").count == 2
@@ -0,0 +1,140 @@
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+from controllers.rescoring_job import RescoringJob
+from models.borrower import Borrower
+from conftest import make_report
+
+
+def _populate(data_controller, count: int) -> list:
+
+    now = datetime.now()
+    reports = []
+    for i in range(count):
+        borrower = Borrower.create_new(f"Заемщик {i}", f"{300000 + i}", "4512", datetime(1980, 1, 1),
+                                       80000.0 + 1000 * i, 30000.0, 60, 10000.0, 3, "ООО Ромашка",
+                                       "инженер", "Москва", "+7 900 000-00-02")
+        borrower = data_controller.upsert_borrower(borrower)
+        report = make_report(now - timedelta(minutes=i), borrower_id=borrower.id, borrower_name=borrower.full_name,
+                             score=1, rules_version="old")
+        data_controller.add_report(report)
+        reports.append(report)
+    return reports
+
+
+def _job(data_controller, **kwargs) -> RescoringJob:
+
+    return RescoringJob(data_controller, chunk_size=2, throttle_seconds=0, **kwargs)
+
+
+def _cancel_after_chunks(job: RescoringJob, chunks: int):
+
+    append = job._append_checkpoint
+    written = []
+
+    def append_and_cancel(entry):
+        append(entry)
+        written.append(entry)
+        if len(written) == chunks:
+            job.cancel()
+
+    job._append_checkpoint = append_and_cancel
+
+
+def test_interrupted_rescoring_resumes_from_checkpoint(data_controller):
+
+    _populate(data_controller, 5)
+    first = _job(data_controller)
+    assert first.count_affected() == 5
+    _cancel_after_chunks(first, 1)
+
+    progress = first.run()
+    assert progress["state"] == "cancelled" and progress["processed"] == 2
+    assert first.has_checkpoint()
+    # До завершения отчеты не меняются
+    assert {r.rules_version for r in data_controller.get_all_reports()} == {"old"}
+
+    second = _job(data_controller)
+    analyzed = []
+    analyze = second.credit_controller.analyze_borrowers
+    second.credit_controller.analyze_borrowers = lambda borrowers: analyzed.extend(borrowers) or analyze(borrowers)
+
+    progress = second.run()
+    assert progress["state"] == "completed"
+    assert (progress["total"], progress["processed"], progress["changed"]) == (5, 5, 5)
+    # Порция из контрольной точки повторно не считается
+    assert len(analyzed) == 3
+    assert not second.has_checkpoint()
+
+    version = second.credit_controller.rules.version
+    assert {r.rules_version for r in data_controller.get_all_reports()} == {version}
+    assert all(r.score > 1 and r.factor_scores is not None for r in data_controller.get_all_reports())
+    assert len(second.load_diff(progress["diff_file"])["changes"]) == 5
+    assert _job(data_controller).count_affected() == 0
+
+
+def test_torn_checkpoint_line_is_recomputed(data_controller):
+
+    _populate(data_controller, 4)
+    first = _job(data_controller)
+    _cancel_after_chunks(first, 1)
+    first.run()
+    with open(first.checkpoint_file, "a", encoding="utf-8") as f:
+        f.write('{"processed_ids": ["')
+
+    progress = _job(data_controller).run()
+    assert progress["state"] == "completed" and progress["processed"] == 4 and progress["changed"] == 4
+
+
+def test_checkpoint_for_other_blacklist_is_discarded(data_controller):
+
+    reports = _populate(data_controller, 4)
+    first = _job(data_controller)
+    _cancel_after_chunks(first, 1)
+    first.run()
+
+    data_controller.add_to_blacklist(reports[0].borrower_name)
+    progress = _job(data_controller).run()
+    assert progress["state"] == "completed" and progress["processed"] == 4
+
+    blacklisted = data_controller.get_report_by_id(reports[0].id)
+    assert blacklisted.blacklist_found and blacklisted.score == 0
+
+
+def test_dry_run_writes_diff_without_changing_reports(data_controller):
+
+    _populate(data_controller, 3)
+    progress = _job(data_controller, apply=False).run()
+
+    with open(progress["diff_file"], encoding="utf-8") as f:
+        assert len(json.load(f)["changes"]) == 3
+    assert {r.rules_version for r in data_controller.get_all_reports()} == {"old"}
+
+
+def test_lock_held_by_live_job_blocks_and_stale_lock_is_taken_over(data_controller):
+
+    _populate(data_controller, 2)
+    other = _job(data_controller)
+    with open(other.lock_file, "w", encoding="utf-8") as f:
+        json.dump({"job_id": "other-session", "pid": os.getpid(), "started_at": datetime.now().isoformat()}, f)
+
+    job = _job(data_controller)
+    assert job.is_locked_by_other()
+    assert job.start() is False
+    with pytest.raises(RuntimeError):
+        job.run()
+
+    # Процесс, захвативший блокировку, завершился
+    finished = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                              capture_output=True, text=True, check=True)
+    with open(other.lock_file, "w", encoding="utf-8") as f:
+        json.dump({"job_id": "other-session", "pid": int(finished.stdout)}, f)
+
+    assert not job.is_locked_by_other()
+    assert job.run()["state"] == "completed"
+    assert not os.path.exists(job.lock_file)
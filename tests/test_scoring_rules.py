@@ -0,0 +1,125 @@
+import copy
+import json
+import os
+import random
+
+import numpy as np
+import pytest
+
+from controllers.analysis_cache import AnalysisCache
+from controllers.credit_controller import CreditController
+from controllers.scoring_rules import DEFAULT_RULES_FILE, ScoringRules, ThresholdTable, get_scoring_rules
+from api.payloads import borrower_from_payload
+from scripts.load_test_api import make_borrower
+
+
+def _config() -> dict:
+
+    with open(DEFAULT_RULES_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write(path, config: dict, mtime: float):
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    os.utime(path, (mtime, mtime))
+
+
+def test_threshold_comparison_at_boundaries():
+
+    strict = ThresholdTable([15, 30], ["a", "b", "c"], "gt")
+    inclusive = ThresholdTable([15, 30], ["a", "b", "c"], "ge")
+
+    assert [strict.lookup(x) for x in (15, 15.01, 30, 31)] == ["a", "b", "b", "c"]
+    assert [inclusive.lookup(x) for x in (14.99, 15, 30)] == ["a", "b", "c"]
+    assert list(strict.lookup_array([15, 15.01, 30, 31])) == ["a", "b", "b", "c"]
+    assert list(inclusive.lookup_array([14.99, 15, 30])) == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize("thresholds, values, compare", [
+    ([30, 15], [1, 2, 3], "gt"),
+    ([15, 30], [1, 2], "gt"),
+    ([15, 30], [1, 2, 3], "lt"),
+])
+def test_invalid_tables_are_rejected(thresholds, values, compare):
+
+    with pytest.raises(ValueError):
+        ThresholdTable(thresholds, values, compare)
+
+
+def test_invalid_config_is_rejected_on_load(tmp_path):
+
+    config = _config()
+    config["factors"]["employment_years"]["thresholds"] = [5, 3, 1]
+    with pytest.raises(ValueError):
+        ScoringRules(config)
+
+    config = _config()
+    del config["weights"]["savings"]
+    with pytest.raises(KeyError):
+        ScoringRules(config)
+
+
+def test_compiled_and_vectorized_rules_agree():
+
+    rules = ScoringRules(_config())
+    rng = random.Random(7)
+    # Значения на порогах проверяют одинаковое сравнение в обоих путях
+    rows = [(100000, 85000, 50, 15000, 1), (100000, 70000, 80, 30000, 3), (0, 0, 40, 0, 0),
+            (50000, 60000, 10, 0, 0.5)]
+    rows += [(rng.uniform(0, 300000), rng.uniform(0, 200000), rng.randint(0, 100),
+              rng.uniform(0, 150000), rng.uniform(0, 20)) for _ in range(300)]
+
+    evaluated = rules.evaluate_arrays(*map(np.array, zip(*rows)))
+    for i, row in enumerate(rows):
+        result = rules.analyze(*row)
+        assert result.score == int(evaluated["total_score"][i])
+        assert result.max_loan_amount == pytest.approx(round(float(evaluated["max_loan"][i]), 2))
+        assert (result.credit_attractiveness, result.risk_level) == \
+            rules.band_table.values[int(evaluated["band_index"][i])]
+        assert result.rules_version == "2024.1"
+
+
+def test_rules_file_is_recompiled_only_after_change(tmp_path):
+
+    path = str(tmp_path / "rules.json")
+    config = _config()
+    _write(path, config, 1000)
+    first = get_scoring_rules(path)
+    assert get_scoring_rules(path) is first
+
+    changed = copy.deepcopy(config)
+    changed["version"] = "2025.1"
+    changed["weights"] = {"debt": 0, "history": 1, "employment": 0, "income": 0, "savings": 0}
+    _write(path, changed, 2000)
+    second = get_scoring_rules(path)
+    assert second.version == "2025.1"
+    assert second.analyze(100000, 50000, 42, 0, 10).score == 42
+
+    # Файл правил с ошибкой не подменяет уже загруженные правила в кэше
+    broken = copy.deepcopy(changed)
+    broken["bands"]["thresholds"] = [80, 60, 40]
+    _write(path, broken, 3000)
+    with pytest.raises(ValueError):
+        get_scoring_rules(path)
+    _write(path, changed, 2000)
+    assert get_scoring_rules(path) is second
+
+
+def test_single_and_batch_analysis_use_same_rules(data_controller, tmp_path):
+
+    path = str(tmp_path / "rules.json")
+    config = _config()
+    config["version"] = "test-1"
+    _write(path, config, 1000)
+    # Отдельные кэши, чтобы одиночный расчет не брал результат пакетного
+    batch_controller = CreditController(data_controller, rules_file=path, analysis_cache=AnalysisCache())
+    single_controller = CreditController(data_controller, rules_file=path, analysis_cache=AnalysisCache())
+
+    borrowers = [borrower_from_payload(make_borrower(random.Random(seed)), "officer-1") for seed in range(20)]
+    batch = batch_controller.analyze_borrowers(borrowers)
+    for borrower, (result, blacklisted, _) in zip(borrowers, batch):
+        single, _, _ = single_controller.analyze_borrower(borrower)
+        assert not blacklisted
+        assert single == result and single.rules_version == "test-1"
@@ -0,0 +1,80 @@
+from dataclasses import asdict
+from datetime import datetime
+
+import numpy as np
+
+from controllers.analysis_cache import AnalysisCache
+from controllers.credit_controller import CreditController
+from controllers.what_if_controller import WhatIfController
+from models.borrower import Borrower
+
+
+def _borrower(income: float, expenses: float, history: int, loans: float, years: int) -> Borrower:
+
+    return Borrower.create_new("Петров Петр", "200001", "4511", datetime(1990, 5, 5), income, expenses,
+                               history, loans, years, "ООО Ромашка", "инженер", "Москва", "+7 900 000-00-01")
+
+
+def _explorer(data_controller) -> WhatIfController:
+
+    return WhatIfController(CreditController(data_controller, analysis_cache=AnalysisCache()))
+
+
+def test_grid_matches_single_analysis(data_controller):
+
+    explorer = _explorer(data_controller)
+    borrower = _borrower(120000, 60000, 65, 30000, 2)
+    before = asdict(borrower)
+    grid = explorer.explore(borrower, income_changes=(-1.5, 0.0, 0.5), expense_changes=(0.0, -0.5),
+                            loan_changes=(0.0,), employment_changes=(-5, 0, 3))
+
+    assert grid["score"].shape == (3, 2, 1, 3)
+    # Отрицательные значения после изменения обрезаются нулем
+    assert grid["income"][0] == 0 and grid["employment_years"][0] == 0
+
+    rules = explorer.credit_controller.rules
+    for index in np.ndindex(grid["score"].shape):
+        i, e, l, y = index
+        result = rules.analyze(grid["income"][i], grid["expenses"][e], borrower.credit_history_score,
+                               grid["existing_loans"][l], grid["employment_years"][y])
+        assert grid["score"][index] == result.score
+        assert grid["max_loan"][index] == round(result.max_loan_amount, 2)
+        assert grid["bands"][grid["band_index"][index]] == (result.credit_attractiveness, result.risk_level)
+
+    # Анализ чувствительности ничего не меняет в заемщике и не сохраняет отчетов
+    assert asdict(borrower) == before
+    assert data_controller.get_all_reports() == ()
+
+
+def test_minimal_changes_reach_next_band(data_controller):
+
+    explorer = _explorer(data_controller)
+    rules = explorer.credit_controller.rules
+    borrower = _borrower(60000, 45000, 55, 20000, 2)
+    found = explorer.minimal_changes(borrower)
+
+    assert found["target_band"] == rules.band_table.values[rules.band_table.values.index(found["band"]) + 1]
+    assert any(change is not None for change in found["changes"].values())
+    for name, change in found["changes"].items():
+        if change is None:
+            continue
+        inputs = {"income": borrower.income, "expenses": borrower.expenses,
+                  "existing_loans": borrower.existing_loans, "employment_years": borrower.employment_years}
+        inputs[name] = change["value"]
+        result = rules.analyze(inputs["income"], inputs["expenses"], borrower.credit_history_score,
+                               inputs["existing_loans"], inputs["employment_years"])
+        assert result.score >= found["target_score"], name
+        assert change["delta"] == round(change["value"] - getattr(borrower, name), 2)
+
+
+def test_no_changes_in_top_band_and_unreachable_targets(data_controller):
+
+    explorer = _explorer(data_controller)
+    top = explorer.minimal_changes(_borrower(300000, 50000, 100, 0, 10))
+    assert top["target_band"] is None and top["changes"] == {}
+
+    # Без кредитной истории следующая категория недостижима изменением одного параметра
+    weak = explorer.minimal_changes(_borrower(20000, 19000, 0, 0, 0))
+    assert weak["target_band"] is not None
+    assert weak["changes"]["existing_loans"] is None
+    assert weak["changes"]["employment_years"] is None
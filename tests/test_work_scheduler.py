@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from controllers.work_scheduler import PRIORITY_INTERACTIVE, WorkScheduler
+
+WAIT = 5.0
+
+
+def _wait_until(condition):
+
+    deadline = time.time() + WAIT
+    while not condition():
+        assert time.time() < deadline, "условие не выполнилось"
+        time.sleep(0.01)
+
+
+def test_result_is_cached_per_version():
+
+    scheduler = WorkScheduler(workers=1)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert scheduler.get("analytics", "week", 1, compute, wait=WAIT)["state"] == "fresh"
+    result = scheduler.get("analytics", "week", 1, compute)
+    assert (result["state"], result["value"]) == ("fresh", 1)
+    assert len(calls) == 1
+
+
+def test_stale_result_is_served_while_recomputing():
+
+    scheduler = WorkScheduler(workers=1)
+    release = threading.Event()
+    calls = []
+
+    def compute(value):
+        def run():
+            calls.append(value)
+            release.wait(WAIT)
+            return value
+        return run
+
+    release.set()
+    scheduler.get("analytics", "week", 1, compute("old"), wait=WAIT)
+    release.clear()
+
+    # Данные изменились: сразу отдается прежний результат, пересчет ставится в очередь один раз
+    first = scheduler.get("analytics", "week", 2, compute("new"))
+    second = scheduler.get("analytics", "week", 2, compute("duplicate"))
+    assert (first["state"], first["value"]) == ("stale", "old")
+    assert (second["state"], second["value"]) == ("stale", "old")
+
+    release.set()
+    _wait_until(lambda: scheduler.get("analytics", "week", 2, compute("late"))["state"] == "fresh")
+    assert scheduler.get("analytics", "week", 2, compute("late"))["value"] == "new"
+    assert calls == ["old", "new"]
+
+
+def test_expired_result_is_recomputed():
+
+    scheduler = WorkScheduler(workers=1, max_age=0)
+    scheduler.get("analytics", "week", 1, lambda: "first", wait=WAIT)
+    assert scheduler.get("analytics", "week", 1, lambda: "second")["state"] == "stale"
+    _wait_until(lambda: scheduler.stats()["queued"] == 0 and not scheduler.stats()["running"])
+
+
+def test_analytics_waits_for_foreground_work():
+
+    scheduler = WorkScheduler(workers=2)
+    with scheduler.foreground():
+        result = scheduler.get("analytics", "week", 1, lambda: "report", wait=0.2)
+        assert result["state"] == "computing" and result["queued"] == 1
+        # Интерактивные задачи выполняются и во время записи
+        assert scheduler.get("lookup", "id", 1, lambda: "found", priority=PRIORITY_INTERACTIVE,
+                             wait=WAIT)["value"] == "found"
+        assert scheduler.stats()["queued"] == 1
+
+    _wait_until(lambda: scheduler.get("analytics", "week", 1, lambda: "again")["state"] == "fresh")
+
+
+def test_operation_limit_bounds_concurrency():
+
+    scheduler = WorkScheduler(workers=3, limits={"all_reports": 1})
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def compute():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return True
+
+    for page in range(3):
+        scheduler.get("all_reports", page, 1, compute)
+    _wait_until(lambda: all(scheduler.get("all_reports", page, 1, compute)["state"] == "fresh"
+                            for page in range(3)))
+    assert peak[0] == 1
+
+
+def test_failed_computation_is_not_cached():
+
+    scheduler = WorkScheduler(workers=1)
+
+    def broken():
+        raise ValueError("нет данных")
+
+    with pytest.warns(UserWarning), pytest.raises(ValueError):
+        scheduler.get("analytics", "week", 1, broken, wait=WAIT)
+    assert scheduler.stats()["cached"] == 0
+
+    assert scheduler.get("analytics", "week", 1, lambda: "ok", wait=WAIT)["value"] == "ok"
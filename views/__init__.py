@@ -1,7 +1,19 @@
-from .auth_view import AuthView
-from .dashboard_view import DashboardView
-from .credit_officer_view import CreditOfficerView
-from .bank_manager_view import BankManagerView
-from .base_view import BaseView
+import importlib
 
-__all__ = ['AuthView', 'DashboardView', 'CreditOfficerView', 'BankManagerView', 'BaseView']
\ No newline at end of file
+# Представления импортируются при первом обращении: странице входа не нужны pandas
+# и представления ролей
+_MODULES = {
+    'AuthView': '.auth_view',
+    'DashboardView': '.dashboard_view',
+    'CreditOfficerView': '.credit_officer_view',
+    'BankManagerView': '.bank_manager_view',
+    'BaseView': '.base_view'
+}
+
+__all__ = ['AuthView', 'DashboardView', 'CreditOfficerView', 'BankManagerView', 'BaseView']
+
+
+def __getattr__(name):
+    if name in _MODULES:
+        return getattr(importlib.import_module(_MODULES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,10 +1,29 @@
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, timedelta
 from models.enums import CreditStatus
-from controllers.report_controller import ReportController
+from controllers.report_controller import ReportController, SEND_TRANSITIONS
 from controllers.data_controller import DataController
+from controllers.rescoring_job import RescoringJob
+from controllers.export_controller import ExportController
+from controllers.work_scheduler import shared_scheduler
+from controllers.scoring_rules import FACTOR_LABELS
+from controllers.report_query import ReportQuery, QueryError, literal
 from .base_view import BaseView
 
+# Подпись -> (поле сортировки индекса, по убыванию)
+EDIT_SORT_OPTIONS = {
+    "Сначала старые": ("age", False),
+    "Сначала новые": ("age", True),
+    "Сумма по убыванию": ("amount", True),
+    "Сумма по возрастанию": ("amount", False)
+}
+
+BULK_DECISIONS = {
+    "Одобрить": CreditStatus.APPROVED,
+    "Отклонить": CreditStatus.REJECTED,
+    "Вернуть на исправление": CreditStatus.NEEDS_CORRECTION
+}
+
 
 class BankManagerView(BaseView):
 
@@ -40,12 +59,7 @@ class BankManagerView(BaseView):
 
         st.header("Все отчеты системы")
 
-        all_reports = self.report_controller.get_reports_for_user(
-            "",
-            st.session_state.user_role
-        )
-
-        if not all_reports:
+        if self.data_controller.count_reports() == 0:
             st.info("Нет доступных отчетов")
             return
 
@@ -72,34 +86,83 @@ class BankManagerView(BaseView):
                 ["Все", "Сегодня", "Неделя", "Месяц", "Квартал"]
             )
 
-        filtered_reports = all_reports
-
-        if status_filter:
-            filtered_reports = [r for r in filtered_reports
-                                if r.status.value in status_filter]
-
-        if attractiveness_filter:
-            filtered_reports = [r for r in filtered_reports
-                                if r.credit_attractiveness in attractiveness_filter]
-
+        start_date = None
         if date_filter != "Все":
             now = datetime.now()
             if date_filter == "Сегодня":
                 start_date = datetime(now.year, now.month, now.day)
             elif date_filter == "Неделя":
-                start_date = now - datetime.timedelta(days=7)
+                start_date = now - timedelta(days=7)
             elif date_filter == "Месяц":
-                start_date = now - datetime.timedelta(days=30)
+                start_date = now - timedelta(days=30)
             elif date_filter == "Квартал":
-                start_date = now - datetime.timedelta(days=90)
-
-            filtered_reports = [r for r in filtered_reports
-                                if r.created_at >= start_date]
+                start_date = now - timedelta(days=90)
+
+        expression = st.text_input(
+            "Выражение фильтра",
+            key="all_reports_expression",
+            placeholder="score between 55 and 65 and loan > 500k and created_at within 45d",
+            help="Поля отчета (score, max_loan_amount, status, created_by_name, created_at, ...) и заемщика "
+                 "(borrower.income, borrower.employment_years, ...); операторы =, !=, <, >, between, in, "
+                 "contains, within; связки and, or, not и скобки"
+        ).strip()
+
+        if expression:
+            try:
+                ReportQuery.parse(expression)
+            except QueryError as e:
+                st.error(f"Ошибка в выражении: {e}")
+                return
+
+            # Поля формы добавляются к выражению, чтобы все условия отбирали сегменты по индексам
+            conditions = []
+            if status_filter:
+                conditions.append(f"status in ({', '.join(literal(value) for value in status_filter)})")
+            if attractiveness_filter:
+                conditions.append("credit_attractiveness in "
+                                  f"({', '.join(literal(value) for value in attractiveness_filter)})")
+            if start_date is not None:
+                conditions.append(f"created_at >= {literal(start_date)}")
+            combined = " and ".join(conditions + [f"({expression})"])
+
+        def load_reports():
+
+            if expression:
+                result = self.report_controller.query_reports(combined)
+                return result.reports, result.explain
+
+            # Фильтр по дате передается в хранилище, чтобы читать только нужные сегменты
+            reports = self.report_controller.get_reports_for_user("", user_role, since=start_date)
+
+            if status_filter:
+                reports = [r for r in reports if r.status.value in status_filter]
+
+            if attractiveness_filter:
+                reports = [r for r in reports if r.credit_attractiveness in attractiveness_filter]
+
+            return reports, None
+
+        user_role = st.session_state.user_role
+        loaded = self._run_scheduled(
+            "all_reports", (tuple(status_filter), tuple(attractiveness_filter), date_filter, expression), load_reports
+        )
+        if loaded is None:
+            return
+        filtered_reports, explain = loaded
 
         st.write(f"**Найдено отчетов:** {len(filtered_reports)}")
 
+        if explain:
+            with st.expander("План выполнения фильтра"):
+                st.code("\n".join(explain), language=None)
+
         if filtered_reports:
 
+            self._render_export(
+                "all_reports", "reports",
+                lambda export_format: ExportController().stream_reports(filtered_reports, export_format)
+            )
+
             import pandas as pd
 
             report_data = []
@@ -138,23 +201,58 @@ class BankManagerView(BaseView):
 
         st.header("Изменение отчета")
 
-        pending_reports = self.report_controller.get_reports_by_status(CreditStatus.PENDING)
-        correction_reports = self.report_controller.get_reports_by_status(CreditStatus.NEEDS_CORRECTION)
-        available_reports = pending_reports + correction_reports
+        col1, col2, col3 = st.columns([2, 2, 1])
+
+        with col1:
+            query = st.text_input("Поиск по ID или ФИО заемщика", key="edit_report_query")
+
+        with col2:
+            statuses = st.multiselect(
+                "Статус",
+                [CreditStatus.PENDING.value, CreditStatus.NEEDS_CORRECTION.value],
+                default=[CreditStatus.PENDING.value, CreditStatus.NEEDS_CORRECTION.value],
+                key="edit_report_statuses"
+            )
+
+        with col3:
+            sort_option = st.selectbox(
+                "Сортировка",
+                list(EDIT_SORT_OPTIONS.keys()),
+                key="edit_report_sort"
+            )
+
+        # Индекс отдает только первые совпадения, поэтому страница не зависит от размера очереди
+        sort, descending = EDIT_SORT_OPTIONS[sort_option]
+        matches, total = self.report_controller.search_open_reports(
+            query,
+            statuses=[CreditStatus(value) for value in statuses],
+            sort=sort,
+            descending=descending
+        )
 
-        if not available_reports:
-            st.info("Нет отчетов, требующих редактирования")
+        if not matches:
+            if query or len(statuses) < 2:
+                st.info("Отчеты не найдены")
+            else:
+                st.info("Нет отчетов, требующих редактирования")
             return
 
-        report_options = {f"{r.id[:8]} - {r.borrower_name} - {r.created_by_name}": r
-                          for r in available_reports}
+        st.caption(f"Показано {len(matches)} из {total}")
+
+        report_options = {f"{m['id'][:8]} - {m['borrower_name']} - {m['created_by_name']} - "
+                          f"{m['max_loan_amount']:,.0f} ₽": m
+                          for m in matches}
 
         selected_report_key = st.selectbox(
             "Выберите отчет для редактирования",
             options=list(report_options.keys())
         )
 
-        report = report_options[selected_report_key]
+        selected = report_options[selected_report_key]
+        report = self.report_controller.get_report_by_id(selected["id"], selected["created_at"])
+        if report is None:
+            st.error("Отчет не найден")
+            return
 
         with st.form("edit_report_form"):
             st.subheader(f"Редактирование отчета #{report.id[:8]}")
@@ -240,51 +338,159 @@ class BankManagerView(BaseView):
                 else:
                     st.error("❌ Ошибка при обновлении отчета")
 
+        self._render_report_history(report)
+
+    def _render_report_history(self, report):
+
+        timeline = self.report_controller.get_report_timeline(report.id)
+
+        with st.expander(f"🕓 История изменений ({max(len(timeline) - 1, 0)})"):
+            if not timeline:
+                st.info("Отчет еще не изменялся")
+                return
+
+            for entry in reversed(timeline):
+                author = entry["by_name"] or entry["by"] or "—"
+                st.markdown(f"**Версия {entry['version']}** · {entry['at'].strftime('%d.%m.%Y %H:%M')} · {author}")
+                if entry["version"] == 0:
+                    st.caption("Исходная версия отчета")
+                for field, (old_value, new_value) in entry["changes"].items():
+                    st.caption(f"{field}: {old_value if old_value not in (None, '') else '—'} → "
+                               f"{new_value if new_value not in (None, '') else '—'}")
+
+            versions = [str(entry["version"]) for entry in timeline]
+            selected_version = st.selectbox("Показать версию", versions, index=len(versions) - 1,
+                                            key=f"history_version_{report.id}")
+            version_report = self.report_controller.get_report_version(report.id, int(selected_version))
+            if version_report:
+                st.json({
+                    "Статус": version_report.status.value,
+                    "Балл": version_report.score,
+                    "Максимальная сумма": version_report.max_loan_amount,
+                    "Привлекательность": version_report.credit_attractiveness,
+                    "Уровень риска": version_report.risk_level,
+                    "Комментарии": version_report.notes,
+                    "Изменен": (version_report.modified_at.strftime("%d.%m.%Y %H:%M")
+                                if version_report.modified_at else None),
+                    "Кем": version_report.modified_by_name
+                })
+
     def _render_send_report(self):
 
         st.header("Отправка отчета сотруднику")
 
-        ready_statuses = [CreditStatus.APPROVED, CreditStatus.NEEDS_CORRECTION]
-        ready_reports = []
+        # Итог массового действия сохраняется до перезапуска страницы, чтобы таблицы уже показывали новые статусы
+        result = st.session_state.pop("bulk_action_result", None)
+        if result:
+            updated, skipped = result
+            st.success(f"✅ Обновлено отчетов: {updated}")
+            if skipped:
+                st.warning(f"Пропущено отчетов: {skipped} - их статус уже изменился")
 
-        for status in ready_statuses:
-            ready_reports.extend(self.report_controller.get_reports_by_status(status))
+        self._render_bulk_decisions()
+        st.divider()
+        self._render_bulk_send()
 
-        if not ready_reports:
-            st.info("Нет отчетов, готовых к отправке")
+    def _render_report_selection(self, reports, key: str) -> list:
+
+        import pandas as pd
+
+        st.dataframe(pd.DataFrame([{
+            "ID": r.id[:8],
+            "Заемщик": r.borrower_name,
+            "Сумма": f"{r.max_loan_amount:,.0f} ₽",
+            "Привлекательность": r.credit_attractiveness,
+            "Статус": r.status.value,
+            "Автор": r.created_by_name,
+            "Создан": r.created_at.strftime("%d.%m.%Y")
+        } for r in reports]), use_container_width=True, hide_index=True)
+
+        labels = {r.id: f"{r.id[:8]} - {r.borrower_name} - {r.status.value}" for r in reports}
+        return st.multiselect("Выбранные отчеты", list(labels.keys()),
+                              format_func=labels.get, key=f"{key}_selected")
+
+    def _apply_bulk_action(self, action):
+
+        with shared_scheduler.foreground():
+            updated, skipped = action()
+        st.session_state.bulk_action_result = (updated, len(skipped))
+        st.rerun()
+
+    def _render_bulk_decisions(self):
+
+        st.subheader("Решение по отчетам на рассмотрении")
+
+        pending_reports = self.report_controller.get_reports_by_status(CreditStatus.PENDING)
+        if not pending_reports:
+            st.info("Нет отчетов на рассмотрении")
             return
 
-        for report in ready_reports:
-            with st.expander(f"Отчет #{report.id[:8]} - {report.borrower_name} - {report.status.value}"):
-                col1, col2 = st.columns([3, 1])
+        selected = self._render_report_selection(pending_reports, "bulk_decision")
 
-                with col1:
-                    st.write(f"**Заемщик:** {report.borrower_name}")
-                    st.write(f"**Сумма:** {report.max_loan_amount:,.2f} ₽")
-                    st.write(f"**Привлекательность:** {report.credit_attractiveness}")
-                    st.write(f"**Автор:** {report.created_by_name}")
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            action = st.selectbox("Действие", list(BULK_DECISIONS.keys()), key="bulk_decision_action")
+        with col2:
+            notes = st.text_input("Комментарий", key="bulk_decision_notes")
 
-                with col2:
-                    if st.button(f"Отправить", key=f"send_{report.id}"):
+        user = st.session_state.user
+        status = BULK_DECISIONS[action]
 
-                        from datetime import datetime
-                        report.modified_at = datetime.now()
-                        report.modified_by = st.session_state.user.id
-                        report.modified_by_name = st.session_state.user.full_name
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button(f"Применить к выбранным ({len(selected)})", disabled=not selected,
+                         key="bulk_decision_apply_selected"):
+                self._apply_bulk_action(lambda: self.report_controller.bulk_update_status(
+                    status, user.id, user.full_name, report_ids=selected, notes=notes or None,
+                    statuses=[CreditStatus.PENDING]
+                ))
+        with col2:
+            if st.button(f"Применить ко всем на рассмотрении ({len(pending_reports)})",
+                         key="bulk_decision_apply_all"):
+                self._apply_bulk_action(lambda: self.report_controller.bulk_update_status(
+                    status, user.id, user.full_name, notes=notes or None, statuses=[CreditStatus.PENDING]
+                ))
 
-                        if report.status == CreditStatus.NEEDS_CORRECTION:
-                            report.status = CreditStatus.PENDING
+    def _render_bulk_send(self):
 
-                        self.data_controller.update_report(report)
+        st.subheader("Отправка сотрудникам")
 
-                        st.success(f"✅ Отчет #{report.id[:8]} отправлен сотруднику {report.created_by_name}!")
+        ready_reports = []
+        for status in SEND_TRANSITIONS:
+            ready_reports.extend(self.report_controller.get_reports_by_status(status))
+
+        if not ready_reports:
+            st.info("Нет отчетов, готовых к отправке")
+            return
+
+        st.caption("Отчеты на исправлении после отправки возвращаются на рассмотрение")
+        selected = self._render_report_selection(ready_reports, "bulk_send")
+
+        user = st.session_state.user
+
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button(f"Отправить выбранные ({len(selected)})", disabled=not selected, key="bulk_send_apply_selected"):
+                self._apply_bulk_action(lambda: self.report_controller.send_reports(
+                    user.id, user.full_name, report_ids=selected
+                ))
+        with col2:
+            if st.button(f"Отправить все ({len(ready_reports)})", key="bulk_send_apply_all"):
+                self._apply_bulk_action(lambda: self.report_controller.send_reports(user.id, user.full_name))
 
     def _render_analytics(self):
 
         st.header("Аналитика системы")
 
-        stats = self.data_controller.get_statistics()
-        report_stats = self.report_controller.get_reports_statistics()
+        def load_analytics():
+            return (self.report_controller.get_reports_statistics(),
+                    self.report_controller.get_employee_statistics())
+
+        analytics = self._run_scheduled("analytics", None, load_analytics)
+        if analytics is None:
+            self._render_rescoring()
+            return
+        report_stats, employee_stats = analytics
 
         st.subheader("Ключевые показатели")
 
@@ -320,32 +526,9 @@ class BankManagerView(BaseView):
 
         st.subheader("Активность сотрудников")
 
-        user_stats = {}
-        for report in self.data_controller.reports:
-            user_id = report.created_by
-            if user_id not in user_stats:
-                user = self.data_controller.get_user_by_id(user_id)
-                user_name = user.full_name if user else "Неизвестный"
-                user_stats[user_id] = {
-                    "name": user_name,
-                    "total": 0,
-                    "approved": 0,
-                    "rejected": 0,
-                    "avg_score": 0,
-                    "total_amount": 0
-                }
-
-            user_stats[user_id]["total"] += 1
-            user_stats[user_id]["total_amount"] += report.max_loan_amount
-
-            if report.status == CreditStatus.APPROVED:
-                user_stats[user_id]["approved"] += 1
-            elif report.status == CreditStatus.REJECTED:
-                user_stats[user_id]["rejected"] += 1
-
-        if user_stats:
+        if employee_stats:
             stats_data = []
-            for user_id, stats in user_stats.items():
+            for stats in employee_stats:
                 approval_rate = (stats["approved"] / stats["total"] * 100) if stats["total"] > 0 else 0
                 avg_amount = stats["total_amount"] / stats["total"] if stats["total"] > 0 else 0
 
@@ -362,4 +545,175 @@ class BankManagerView(BaseView):
             df = pd.DataFrame(stats_data)
             st.dataframe(df.sort_values("Всего отчетов", ascending=False),
                          use_container_width=True,
-                         hide_index=True)
\ No newline at end of file
+                         hide_index=True)
+
+            header = list(stats_data[0].keys())
+            self._render_export(
+                "employee_stats", "employee_stats",
+                lambda export_format: ExportController().stream(
+                    stats_data, [(name, lambda row, name=name: row[name]) for name in header],
+                    export_format)
+            )
+
+        if self.report_controller.departments is None:
+            self._render_department_statistics()
+
+        self._render_factor_statistics()
+
+        self._render_rescoring()
+
+    def _render_department_statistics(self):
+
+        st.subheader("🏢 Отделения")
+
+        # Сводка собирается из агрегатов разделов, отчеты отделений не загружаются
+        department_stats = self.report_controller.get_department_statistics()
+        if not department_stats:
+            st.info("Нет данных по отделениям")
+            return
+
+        import pandas as pd
+        rows = []
+        for stats in department_stats:
+            approved = stats["by_status"].get(CreditStatus.APPROVED.value, 0)
+            rows.append({
+                "Отделение": stats["department"] or "Без отдела",
+                "Всего отчетов": stats["total"],
+                "Одобрено": approved,
+                "Процент одобрения": f"{(approved / stats['total'] * 100) if stats['total'] else 0:.1f}%",
+                "Средний балл": stats["avg_score"],
+                "Сумма кредитов": f"{stats['total_amount']:,.0f} ₽"
+            })
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+    def _render_factor_statistics(self):
+
+        st.subheader("🧮 Факторы скоринга")
+
+        groupings = {"Сотрудник": "created_by", "Статус": "status", "Месяц": "month"}
+        col1, col2 = st.columns(2)
+        with col1:
+            grouping = st.selectbox("Группировка", list(groupings.keys()), key="factor_group_by")
+        with col2:
+            factor = st.selectbox("Распределение фактора", list(FACTOR_LABELS.keys()),
+                                  format_func=FACTOR_LABELS.get, key="factor_histogram")
+
+        group_by = groupings[grouping]
+        factor_stats = self._run_scheduled(
+            "factor_statistics", group_by,
+            lambda: self.report_controller.get_factor_statistics(group_by)
+        )
+        if factor_stats is None:
+            return
+
+        if not factor_stats["groups"]:
+            st.info("Нет отчетов с разбивкой балла по факторам")
+            return
+        if factor_stats["missing"]:
+            st.caption(f"Без разбивки по факторам: {factor_stats['missing']} отчетов - "
+                       f"ее добавит пересчет портфеля")
+
+        import pandas as pd
+
+        labels = [FACTOR_LABELS[name] for name in factor_stats["factors"]]
+        means = pd.DataFrame([
+            {grouping: group["name"], "Отчетов": group["count"], **dict(zip(labels, group["mean"]))}
+            for group in factor_stats["groups"]
+        ])
+        st.dataframe(means, use_container_width=True, hide_index=True)
+
+        factor_index = factor_stats["factors"].index(factor)
+        histogram = pd.DataFrame(
+            {group["name"]: group["histogram"][factor_index] for group in factor_stats["groups"]},
+            index=pd.Index(range(0, 110, 10), name="Балл от")
+        )
+        st.bar_chart(histogram)
+
+    def _render_rescoring(self):
+
+        st.subheader("🔄 Пересчет портфеля")
+        st.caption("Пересчитываются только отчеты, сделанные по другой версии правил скоринга, "
+                   "с устаревшей проверкой черного списка или без разбивки балла по факторам. "
+                   "По каждому заемщику пересчитывается последний отчет: данные прежних заявок не сохраняются")
+
+        job = st.session_state.get("rescoring_job")
+
+        if job is None or not job.is_running():
+            apply_changes = st.checkbox("Записать новые значения в отчеты", value=True,
+                                        help="Без этого флажка формируется только отчет о расхождениях")
+            if job is None or job.apply != apply_changes:
+                job = RescoringJob(self.data_controller, apply=apply_changes)
+                st.session_state.rescoring_job = job
+
+            # Подсчет проходит по всем отчетам, поэтому выполняется планировщиком, как другие тяжелые виджеты
+            rules_version = job.credit_controller.rules.version
+            blacklist = tuple(sorted(self.data_controller.blacklist))
+            affected_count = self._run_scheduled("rescoring_affected", (rules_version, blacklist),
+                                                 job.count_affected)
+            if affected_count is None:
+                return
+            st.write(f"Отчетов для пересчета: **{affected_count}**")
+
+            locked = job.is_locked_by_other()
+            if locked:
+                st.info("Пересчет уже выполняется в другой сессии")
+            elif job.has_checkpoint():
+                st.info("Найдена контрольная точка прерванного пересчета - он продолжится с нее")
+
+            if st.button("Запустить пересчет",
+                         disabled=locked or (affected_count == 0 and not job.has_checkpoint())):
+                if not job.start():
+                    st.warning("Пересчет уже выполняется в другой сессии")
+                else:
+                    st.rerun()
+
+        progress = job.progress()
+
+        if progress["state"] == "running":
+            total = progress["total"] or 1
+            st.progress(progress["processed"] / total,
+                        text=f"Обработано {progress['processed']} из {progress['total']}, "
+                             f"изменилось {progress['changed']}")
+
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Обновить прогресс"):
+                    st.rerun()
+            with col2:
+                if st.button("Остановить пересчет"):
+                    job.cancel()
+                    st.rerun()
+
+        elif progress["state"] == "cancelled":
+            st.warning(f"Пересчет остановлен: обработано {progress['processed']} из {progress['total']}. "
+                       f"При следующем запуске он продолжится с контрольной точки")
+
+        elif progress["state"] == "failed":
+            st.error(f"Ошибка пересчета: {progress['error']}")
+
+        elif progress["state"] == "completed":
+            if job.apply:
+                st.success(f"✅ Пересчет завершен: изменилось отчетов - {progress['changed']}")
+            else:
+                st.success(f"✅ Отчет о расхождениях сформирован: {progress['changed']} отчетов")
+            if progress["skipped"]:
+                st.warning(f"Пропущено отчетов без данных заемщика: {progress['skipped']}")
+
+            changes = job.load_diff(progress["diff_file"])["changes"]
+            if changes:
+                import pandas as pd
+
+                diff_data = [{
+                    "ID": change["report_id"][:8],
+                    "Заемщик": change["borrower_name"],
+                    "Статус": change["status"],
+                    "Балл": f"{change['old'].get('score', change['new']['score'])} → {change['new']['score']}",
+                    "Макс. сумма": f"{change['old'].get('max_loan_amount', change['new']['max_loan_amount']):,.0f} → "
+                                   f"{change['new']['max_loan_amount']:,.0f} ₽",
+                    "Риск": f"{change['old'].get('risk_level', change['new']['risk_level'])} → "
+                            f"{change['new']['risk_level']}",
+                    "Черный список": "Да" if change["new"]["blacklist_found"] else "Нет"
+                } for change in changes]
+
+                st.dataframe(pd.DataFrame(diff_data), use_container_width=True, hide_index=True)
+            st.caption(f"Файл отчета: {progress['diff_file']}")
\ No newline at end of file
@@ -1,5 +1,15 @@
+import os
 import streamlit as st
 from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Callable, Hashable, Iterator, Optional
+from controllers.export_controller import (
+    ExportController, ExportTooLarge, EXPORT_FORMATS, EXPORT_UI_MAX_MB, MIME_TYPES
+)
+from controllers.work_scheduler import shared_scheduler, PRIORITY_ANALYTICS
+
+# Сколько страница ждет результат тяжелого вычисления, прежде чем предложить обновить ее позже
+SCHEDULED_WAIT_SECONDS = 15
 
 
 class BaseView(ABC):
@@ -12,4 +22,74 @@ class BaseView(ABC):
 
     @abstractmethod
     def render(self):
-        pass
\ No newline at end of file
+        pass
+
+    def _run_scheduled(self, operation: str, key: Hashable, compute: Callable[[], Any],
+                       priority: int = PRIORITY_ANALYTICS) -> Optional[Any]:
+        """Тяжелое вычисление через общий планировщик; None, если результат еще не готов"""
+
+        # Версия данных - номер последнего события ленты изменений
+        version = self.data_controller.changes.last_seq
+        # Кэш планировщика общий для сессий процесса: результаты разных отделов не смешиваются
+        departments = self.report_controller.departments
+        key = (tuple(departments) if departments is not None else None, key)
+        result = shared_scheduler.get(operation, key, version, compute, priority)
+
+        if result["state"] == "computing":
+            queued = f", место в очереди: {result['queued']}" if result["queued"] else ""
+            with st.spinner(f"Вычисляется…{queued}"):
+                result = shared_scheduler.get(operation, key, version, compute, priority,
+                                              wait=SCHEDULED_WAIT_SECONDS)
+
+        if result["state"] == "computing":
+            st.info("⏳ Вычисление еще выполняется - обновите страницу чуть позже")
+            st.button("Обновить", key=f"{operation}_refresh")
+            return None
+
+        if result["state"] == "stale":
+            computed_at = datetime.fromtimestamp(result["computed_at"]).strftime("%H:%M:%S")
+            st.caption(f"Показаны данные на {computed_at}, идет пересчет")
+
+        return result["value"]
+
+    def _render_export(self, key: str, file_prefix: str, make_chunks: Callable[[str], Iterator[bytes]]):
+
+        col1, col2, col3 = st.columns([1, 1, 2])
+
+        with col1:
+            export_format = st.selectbox("Формат выгрузки", EXPORT_FORMATS,
+                                         format_func=str.upper, key=f"{key}_format")
+
+        state_key = f"{key}_export_file"
+        exporter = ExportController()
+
+        with col2:
+            # Файл собирается потоком на диск только по запросу, а не при каждой перерисовке
+            if st.button("Подготовить выгрузку", key=f"{key}_prepare"):
+                previous = st.session_state.pop(state_key, None)
+                if previous:
+                    exporter.remove_temp_file(previous[0])
+
+                # Кнопка скачивания отдает файл из памяти, поэтому размер выгрузки из интерфейса ограничен
+                try:
+                    path = exporter.export_to_temp_file(make_chunks(export_format), export_format,
+                                                        max_bytes=int(EXPORT_UI_MAX_MB * (1 << 20)))
+                except ExportTooLarge as e:
+                    st.warning(f"{e}: сузьте фильтр или выгрузите данные скриптом "
+                               f"python -m scripts.export_reports")
+                else:
+                    st.session_state[state_key] = (path, export_format)
+
+        prepared = st.session_state.get(state_key)
+        if prepared and os.path.exists(prepared[0]):
+            path, prepared_format = prepared
+            with col3:
+                with open(path, "rb") as f:
+                    downloaded = st.download_button(f"⬇️ Скачать {prepared_format.upper()}", f,
+                                                    file_name=exporter.file_name(file_prefix, prepared_format),
+                                                    mime=MIME_TYPES[prepared_format],
+                                                    key=f"{key}_download")
+            # Кнопка уже передала содержимое файла браузеру: после скачивания файл на диске не нужен
+            if downloaded:
+                exporter.remove_temp_file(path)
+                st.session_state.pop(state_key, None)
\ No newline at end of file
@@ -1,8 +1,16 @@
+import os
 import streamlit as st
 from datetime import datetime
+from typing import Optional
 from controllers.credit_controller import CreditController
 from controllers.report_controller import ReportController
 from controllers.data_controller import DataController
+from controllers.what_if_controller import WhatIfController
+from controllers.loan_calculator import LoanCalculator
+from controllers.export_controller import ExportController
+from controllers.document_renderer import DocumentRenderer
+from controllers.work_scheduler import shared_scheduler
+from controllers.scoring_rules import FACTOR_NAMES, FACTOR_LABELS
 from models.borrower import Borrower
 from models.enums import CreditStatus
 from .base_view import BaseView
@@ -16,16 +24,19 @@ class CreditOfficerView(BaseView):
         self.data_controller = data_controller
         self.credit_controller = credit_controller
         self.report_controller = report_controller
+        self.what_if_controller = WhatIfController(credit_controller)
+        self.loan_calculator = LoanCalculator(credit_controller)
 
     def render(self):
 
         st.title("👤 Панель сотрудника кредитного отдела")
 
-        tab1, tab2, tab3, tab4 = st.tabs([
+        tab1, tab2, tab3, tab4, tab5 = st.tabs([
             "📝 Ввод данных заемщика",
             "📋 Мои отчеты",
             "❌ Отказы",
-            "🔍 Поиск заемщиков"
+            "🔍 Поиск заемщиков",
+            "🧪 Что если"
         ])
 
         with tab1:
@@ -40,6 +51,9 @@ class CreditOfficerView(BaseView):
         with tab4:
             self._render_search_borrowers()
 
+        with tab5:
+            self._render_what_if()
+
     def _render_borrower_input(self):
 
         st.header("Ввод данных заемщика")
@@ -137,47 +151,43 @@ class CreditOfficerView(BaseView):
                         created_by=st.session_state.user.id
                     )
 
-                    with st.spinner("Проводим анализ кредитоспособности..."):
+                    duplicate = self.credit_controller.find_recent_duplicate(borrower)
+                    if duplicate:
+                        st.warning(f"⚠️ Эти данные заемщика уже отправлялись недавно. "
+                                   f"Новый отчет не создан, см. отчет #{duplicate.id[:8]}")
+                        self._display_report_details(duplicate)
+                        return
+
+                    # Запись отчета идет впереди очереди аналитики других сессий
+                    with st.spinner("Проводим анализ кредитоспособности..."), shared_scheduler.foreground():
                         analysis_result, is_blacklisted, blacklist_reason = \
                             self.credit_controller.analyze_borrower(borrower)
 
-                        if is_blacklisted:
-                            st.error(f"❌ {blacklist_reason}")
-                            borrower.blacklisted = True
-                            borrower.blacklist_reason = blacklist_reason
-
-                            report = self.credit_controller.create_credit_report(
-                                borrower, analysis_result,
-                                st.session_state.user.id,
-                                st.session_state.user.full_name
-                            )
-                            report.status = CreditStatus.REJECTED
-                            report.blacklist_check = True
-                            report.blacklist_found = True
-
-                            self.data_controller.add_borrower(borrower)
-                            self.data_controller.add_report(report)
-
-                            self._display_analysis_result(analysis_result, is_blacklisted)
-                            return
+                        # Данные последнего заемщика подставляются в режим "Что если"
+                        st.session_state.what_if_borrower = borrower
 
-                        report = self.credit_controller.create_credit_report(
+                        report = self.credit_controller.save_analysis(
                             borrower, analysis_result,
+                            is_blacklisted, blacklist_reason,
                             st.session_state.user.id,
                             st.session_state.user.full_name
                         )
 
-                        borrower_id = self.data_controller.add_borrower(borrower)
-                        report_id = self.data_controller.add_report(report)
+                        if is_blacklisted:
+                            st.error(f"❌ {blacklist_reason}")
+                            self._display_analysis_result(analysis_result, is_blacklisted, borrower)
+                            return
+
+                        borrower_id = report.borrower_id
 
                         st.success(f"✅ Анализ завершен! ID заемщика: {borrower_id[:8]}")
 
-                        self._display_analysis_result(analysis_result, is_blacklisted)
+                        self._display_analysis_result(analysis_result, is_blacklisted, borrower)
 
                 except Exception as e:
                     st.error(f"Ошибка при создании заемщика: {str(e)}")
 
-    def _display_analysis_result(self, result, is_blacklisted: bool):
+    def _display_analysis_result(self, result, is_blacklisted: bool, borrower: Optional[Borrower] = None):
 
         st.subheader("Результат анализа кредитоспособности")
 
@@ -202,11 +212,60 @@ class CreditOfficerView(BaseView):
         with col3:
             st.metric("Уровень риска", result.risk_level)
 
+        distributions = self.data_controller.get_distributions(self.report_controller.departments)
+        if distributions.get("score").count > 0:
+            score_rank = distributions.get("score").percentile_rank(result.score)
+            loan_rank = distributions.get("max_loan_amount").percentile_rank(result.max_loan_amount)
+            st.caption(f"Балл {result.score} не ниже, чем у {score_rank:.0f}% отчетов портфеля; "
+                       f"сумма кредита не ниже, чем у {loan_rank:.0f}%")
+
+        if result.factor_scores is not None:
+            st.caption(" · ".join(f"{FACTOR_LABELS[name]}: {score}"
+                                  for name, score in zip(FACTOR_NAMES, result.factor_scores)))
+
+        if borrower is not None:
+            self._display_loan_products(borrower, result.max_loan_amount)
+
         if result.recommendations:
             st.subheader("Рекомендации для улучшения кредитоспособности")
             for i, rec in enumerate(result.recommendations, 1):
                 st.write(f"{i}. {rec}")
 
+    def _display_loan_products(self, borrower: Borrower, max_loan_amount: float):
+
+        import pandas as pd
+
+        st.subheader("Кредитные продукты")
+
+        try:
+            grid = self.loan_calculator.calculate(borrower, max_loan_amount if max_loan_amount > 0 else None)
+        except ValueError as e:
+            # Ошибка в сетке продуктов правил не должна скрывать результат анализа
+            st.warning(f"Кредитный калькулятор недоступен: {e}")
+            return
+        index = [f"{months} мес." for months in grid["terms_months"]]
+        columns = [f"{rate:.0%}" for rate in grid["annual_rates"]]
+
+        current_dti = f"{grid['current_dti']:.0%} дохода" if borrower.income > 0 else "дохода нет"
+        st.caption(f"Текущая долговая нагрузка: {current_dti}; "
+                   f"допустимая с новым кредитом: до {grid['max_dti']:.0%}")
+
+        if "payment" in grid:
+            # Платеж и нагрузка за сумму из анализа; ⚠️ - нагрузка выше допустимой
+            cells = [[f"{payment:,.0f} ₽ · {dti:.0%}{'' if within else ' ⚠️'}"
+                      for payment, dti, within in zip(payments, dtis, withins)]
+                     for payments, dtis, withins in zip(grid["payment"].tolist(), grid["dti"].tolist(),
+                                                        grid["within_cap"].tolist())]
+            payments = pd.DataFrame(cells, index=index, columns=columns)
+            payments.index.name = "Срок \\ Ставка"
+            st.write(f"**Ежемесячный платеж и нагрузка за {max_loan_amount:,.0f} ₽**")
+            st.dataframe(payments, use_container_width=True)
+
+        max_principal = pd.DataFrame(grid["max_principal"], index=index, columns=columns)
+        max_principal.index.name = "Срок \\ Ставка"
+        st.write(f"**Максимальная сумма при нагрузке до {grid['max_dti']:.0%}, ₽**")
+        st.dataframe(max_principal.round(0), use_container_width=True)
+
     def _render_my_reports(self):
 
         st.header("Мои отчеты")
@@ -248,6 +307,8 @@ class CreditOfficerView(BaseView):
                 elif report.status == CreditStatus.REJECTED:
                     st.error("❌ Отклонен")
 
+                self._render_document_download(report)
+
     def _display_report_details(self, report):
 
         col1, col2 = st.columns(2)
@@ -261,6 +322,8 @@ class CreditOfficerView(BaseView):
             st.write(f"**Уровень риска:** {report.risk_level}")
             st.write(f"**Скоринг-балл:** {report.score}/100")
             st.write(f"**Создан:** {report.created_at.strftime('%d.%m.%Y %H:%M')}")
+            if report.rules_version:
+                st.write(f"**Версия правил скоринга:** {report.rules_version}")
 
         if report.recommendations:
             st.write("**Рекомендации:**")
@@ -270,6 +333,25 @@ class CreditOfficerView(BaseView):
         if report.notes:
             st.write(f"**Примечания руководителя:** {report.notes}")
 
+    def _render_document_download(self, report):
+
+        if "document_renderer" not in st.session_state:
+            st.session_state.document_renderer = DocumentRenderer(
+                os.path.join(self.data_controller.data_dir, "documents"))
+        renderer = st.session_state.document_renderer
+
+        state_key = f"document_{report.id}"
+        if st.button("📄 Сформировать документ", key=f"render_{report.id}"):
+            borrower = self.data_controller.get_borrower_by_id(report.borrower_id)
+            st.session_state[state_key] = renderer.render_report(report, borrower)
+
+        path = st.session_state.get(state_key)
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                st.download_button("⬇️ Скачать документ (HTML)", f,
+                                   file_name=f"report_{report.id[:8]}.html",
+                                   mime="text/html", key=f"download_{report.id}")
+
     def _render_rejections(self):
 
         st.header("Отказы в кредитовании")
@@ -287,6 +369,8 @@ class CreditOfficerView(BaseView):
                 if report.blacklist_found:
                     st.error("Причина отказа: Заемщик находится в черном списке банка")
 
+                self._render_document_download(report)
+
     def _render_search_borrowers(self):
 
         st.header("Поиск заемщиков")
@@ -308,16 +392,17 @@ class CreditOfficerView(BaseView):
                 st.warning("Введите данные для поиска")
                 return
 
-            found_borrowers = []
-            for borrower in self.data_controller.borrowers:
-                if search_type == "По ФИО":
-                    if search_query.lower() in borrower.full_name.lower():
-                        found_borrowers.append(borrower)
-                else:
-                    if (passport_series and passport_number and
-                            borrower.passport_series == passport_series and
-                            borrower.passport_number == passport_number):
-                        found_borrowers.append(borrower)
+            # Поиск ограничен отделами пользователя: сервер данных сам область не ограничивает
+            departments = self.report_controller.departments
+            if search_type == "По ФИО":
+                found_borrowers = self.data_controller.search_borrowers(
+                    full_name=search_query, departments=departments)
+            else:
+                found_borrowers = self.data_controller.search_borrowers(
+                    passport_series=passport_series, passport_number=passport_number, departments=departments)
+
+            # Результаты поиска нужны и после перерисовки - для выгрузки
+            st.session_state.found_borrowers = found_borrowers
 
             if found_borrowers:
                 st.success(f"Найдено заемщиков: {len(found_borrowers)}")
@@ -329,9 +414,9 @@ class CreditOfficerView(BaseView):
                         st.write(f"**Доход:** {borrower.income:,.2f} ₽/мес")
                         st.write(f"**Кредитная история:** {borrower.credit_history_score}/100")
 
-                        # Поиск отчетов по этому заемщику
-                        borrower_reports = [r for r in self.data_controller.reports
-                                            if r.borrower_id == borrower.id]
+                        # Поиск отчетов по этому заемщику, включая архив
+                        borrower_reports = self.data_controller.get_reports_by_borrower(
+                            borrower.id, include_archive=True, departments=departments)
 
                         if borrower_reports:
                             st.write("**История отчетов:**")
@@ -348,4 +433,132 @@ class CreditOfficerView(BaseView):
                                          f"{report.status.value} - "
                                          f"{report.max_loan_amount:,.2f} ₽")
             else:
-                st.info("Заемщики не найдены")
\ No newline at end of file
+                st.info("Заемщики не найдены")
+
+        found_borrowers = st.session_state.get("found_borrowers")
+        if found_borrowers:
+            self._render_export(
+                "found_borrowers", "borrowers",
+                lambda export_format: ExportController().stream_borrowers(found_borrowers, export_format)
+            )
+
+    def _render_what_if(self):
+
+        st.header("Что если: анализ чувствительности")
+        st.caption("Расчет выполняется по текущим правилам скоринга и ничего не сохраняет")
+
+        base = st.session_state.get("what_if_borrower")
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            income = st.number_input("Ежемесячный доход (руб)",
+                                     min_value=0.0, step=1000.0, format="%.2f",
+                                     value=float(base.income) if base else 50000.0,
+                                     key="what_if_income")
+            expenses = st.number_input("Ежемесячные расходы (руб)",
+                                       min_value=0.0, step=1000.0, format="%.2f",
+                                       value=float(base.expenses) if base else 30000.0,
+                                       key="what_if_expenses")
+            existing_loans = st.number_input("Существующие кредиты (руб)",
+                                             min_value=0.0, step=1000.0, format="%.2f",
+                                             value=float(base.existing_loans) if base else 0.0,
+                                             key="what_if_loans")
+
+        with col2:
+            credit_history_score = st.slider("Оценка кредитной истории (0-100)", 0, 100,
+                                             int(base.credit_history_score) if base else 70,
+                                             key="what_if_history")
+            employment_years = st.number_input("Стаж работы (лет)",
+                                               min_value=0, max_value=50, step=1,
+                                               value=int(base.employment_years) if base else 1,
+                                               key="what_if_employment")
+
+        if base and base.blacklisted:
+            st.warning("Последний заемщик находится в черном списке: "
+                       "изменение финансовых показателей не повлияет на решение")
+
+        # Временный объект заемщика: в хранилище не попадает
+        borrower = Borrower(
+            id="", full_name="", passport_number="", passport_series="",
+            birth_date=datetime.now(), income=income, expenses=expenses,
+            credit_history_score=credit_history_score, existing_loans=existing_loans,
+            employment_years=int(employment_years), employer_name="", position="",
+            address="", phone="", email="", created_by=""
+        )
+
+        minimal = self.what_if_controller.minimal_changes(borrower)
+        attractiveness, risk = minimal["band"]
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Текущий балл", f"{minimal['score']}/100")
+        with col2:
+            st.metric("Привлекательность", attractiveness)
+        with col3:
+            st.metric("Уровень риска", risk)
+
+        st.subheader("Минимальное изменение для следующей категории")
+
+        if minimal["target_band"] is None:
+            st.success("Заемщик уже находится в лучшей категории привлекательности")
+        else:
+            st.write(f"Цель: привлекательность **{minimal['target_band'][0]}**, "
+                     f"балл от {minimal['target_score']}")
+
+            labels = {
+                "income": "Доход",
+                "expenses": "Расходы",
+                "existing_loans": "Существующие кредиты",
+                "employment_years": "Стаж работы"
+            }
+
+            for name, label in labels.items():
+                change = minimal["changes"].get(name)
+                if change is None:
+                    st.write(f"• {label}: изменением только этого показателя цель не достигается")
+                elif name == "employment_years":
+                    st.write(f"• {label}: {int(change['value'])} лет (+{int(change['delta'])})")
+                else:
+                    st.write(f"• {label}: {change['value']:,.2f} ₽ ({change['delta']:+,.2f} ₽)")
+
+        self._render_what_if_surface(borrower)
+
+    def _render_what_if_surface(self, borrower: Borrower):
+
+        import pandas as pd
+
+        st.subheader("Поверхность балла и максимальной суммы")
+
+        grid = self.what_if_controller.explore(borrower)
+
+        loan_options = [f"{value:,.0f}" for value in grid["existing_loans"]]
+        years_options = [str(value) for value in grid["employment_years"]]
+
+        col1, col2 = st.columns(2)
+        with col1:
+            loan_label = st.selectbox("Существующие кредиты (руб)", loan_options,
+                                      index=len(loan_options) - 2, key="what_if_loans_slice")
+        with col2:
+            years_label = st.selectbox("Стаж работы (лет)", years_options,
+                                       key="what_if_years_slice")
+
+        loan_index = loan_options.index(loan_label)
+        years_index = years_options.index(years_label)
+
+        index = [f"{value:,.0f}" for value in grid["income"]]
+        columns = [f"{value:,.0f}" for value in grid["expenses"]]
+
+        scores = pd.DataFrame(grid["score"][:, :, loan_index, years_index],
+                              index=index, columns=columns)
+        max_loans = pd.DataFrame(grid["max_loan"][:, :, loan_index, years_index],
+                                 index=index, columns=columns)
+        scores.index.name = max_loans.index.name = "Доход \\ Расходы"
+
+        st.write("**Скоринг-балл**")
+        st.dataframe(scores, use_container_width=True)
+
+        st.write("**Максимальная сумма кредита, ₽**")
+        st.dataframe(max_loans.round(0), use_container_width=True)
+
+        st.caption(f"Версия правил скоринга: {grid['rules_version']}")
\ No newline at end of file
@@ -1,6 +1,4 @@
 import streamlit as st
-import pandas as pd
-from datetime import datetime, timedelta
 from models.enums import CreditStatus
 from controllers.data_controller import DataController
 from controllers.report_controller import ReportController
@@ -17,7 +15,7 @@ class DashboardView(BaseView):
 
         st.title("📊 Дашборд системы анализа кредитоспособности")
 
-        stats = self.data_controller.get_statistics()
+        stats = self.data_controller.get_statistics(self.report_controller.departments)
         report_stats = self.report_controller.get_reports_statistics()
 
         col1, col2, col3, col4 = st.columns(4)
@@ -45,6 +43,8 @@ class DashboardView(BaseView):
         with col_right:
             self._render_attractiveness_pie(report_stats)
 
+        self._render_distributions()
+
         st.subheader("📋 Последние отчеты")
         self._render_recent_reports()
 
@@ -53,6 +53,8 @@ class DashboardView(BaseView):
         st.subheader("Статусы отчетов")
 
         if "by_status" in report_stats and report_stats["by_status"]:
+            import pandas as pd
+
             status_data = pd.DataFrame({
                 "Статус": list(report_stats["by_status"].keys()),
                 "Количество": list(report_stats["by_status"].values())
@@ -67,6 +69,8 @@ class DashboardView(BaseView):
         st.subheader("Кредитная привлекательность")
 
         if report_stats.get("total", 0) > 0:
+            import pandas as pd
+
             attractiveness_data = {
                 "Высокая": report_stats.get("high_attractiveness", 0),
                 "Средняя": report_stats.get("medium_attractiveness", 0),
@@ -82,16 +86,61 @@ class DashboardView(BaseView):
         else:
             st.info("Нет данных")
 
+    def _render_distributions(self):
+
+        st.subheader("📈 Распределение баллов и сумм кредита")
+
+        # Перцентили берутся из скетчей, которые обновляются при записи, без сортировки всех отчетов
+        distributions = self.data_controller.get_distributions(self.report_controller.departments)
+        if distributions.get("score").count == 0:
+            st.info("Нет данных для отображения")
+            return
+
+        labels = {(None, None): "Весь портфель"}
+        for status in CreditStatus:
+            if status.value in distributions.groups["by_status"]:
+                labels[("by_status", status.value)] = f"Статус: {status.value}"
+        for user_id in distributions.groups["by_creator"]:
+            user = self.data_controller.get_user_by_id(user_id)
+            labels[("by_creator", user_id)] = f"Сотрудник: {user.full_name if user else 'Неизвестный'}"
+
+        group, key = st.selectbox("Срез", list(labels.keys()), format_func=labels.get, key="distribution_slice")
+
+        import pandas as pd
+
+        score = distributions.get("score", group, key)
+        loan = distributions.get("max_loan_amount", group, key)
+
+        bands = pd.DataFrame([
+            {"Показатель": "Балл",
+             **{f"P{p}": f"{value:.0f}" for p, value in score.percentiles().items()}},
+            {"Показатель": "Сумма кредита",
+             **{f"P{p}": f"{value:,.0f} ₽" for p, value in loan.percentiles().items()}}
+        ])
+        st.caption(f"Перцентили по {score.count} отчетам")
+        st.dataframe(bands, use_container_width=True, hide_index=True)
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.write("**Балл**")
+            st.bar_chart(pd.DataFrame({"Балл от": score.edges, "Количество": score.histogram})
+                         .set_index("Балл от"))
+
+        with col2:
+            st.write("**Сумма кредита**")
+            st.bar_chart(pd.DataFrame({"Сумма от": loan.edges, "Количество": loan.histogram})
+                         .set_index("Сумма от"))
+
     def _render_recent_reports(self):
 
-        all_reports = self.data_controller.get_all_reports()
+        # Читаются только самые новые сегменты области, а не все отчеты
+        recent_reports = self.data_controller.get_recent_reports(10, self.report_controller.departments)
 
-        if not all_reports:
+        if not recent_reports:
             st.info("Нет доступных отчетов")
             return
 
-        recent_reports = sorted(all_reports, key=lambda x: x.created_at, reverse=True)[:10]
-
         report_data = []
         for report in recent_reports:
             report_data.append({
@@ -106,33 +155,9 @@ class DashboardView(BaseView):
             })
 
         if report_data:
+            import pandas as pd
+
             df = pd.DataFrame(report_data)
             st.dataframe(df, use_container_width=True, hide_index=True)
         else:
             st.info("Нет данных об отчетах")
-
-    def _render_quick_stats(self):
-
-        st.subheader("📈 Быстрая статистика")
-
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        recent_reports = [r for r in self.data_controller.reports
-                          if r.created_at > thirty_days_ago]
-
-        if recent_reports:
-            approved = len([r for r in recent_reports if r.status == CreditStatus.APPROVED])
-            rejected = len([r for r in recent_reports if r.status == CreditStatus.REJECTED])
-            pending = len([r for r in recent_reports if r.status == CreditStatus.PENDING])
-
-            col1, col2, col3 = st.columns(3)
-
-            with col1:
-                st.metric("Одобрено (30 дн.)", approved)
-
-            with col2:
-                st.metric("Отклонено (30 дн.)", rejected)
-
-            with col3:
-                st.metric("На рассмотрении", pending)
-        else:
-            st.info("Нет данных за последние 30 дней")
\ No newline at end of file